@@ -93,6 +93,9 @@ class Config:
         self.cmsuser = "cmsuser"
         self.temp_dir = "/tmp"
         self.backdoor = False
+        # If not None, each service serves its metrics over HTTP on the
+        # port of its RPC server plus this offset.
+        self.metrics_port_offset = None
         self.file_log_debug = False
         self.stream_log_detailed = False
 
@@ -100,19 +103,66 @@ class Config:
         self.database = "postgresql+psycopg2://cmsuser@localhost/cms"
         self.database_debug = False
         self.twophase_commit = False
+        # Map the name of a service (or "default") to the size of its
+        # pool of connections and how many more it can open.
+        self.database_pool_size = {"default": [5, 10]}
+        # Whether the connections go through a pooler in transaction
+        # mode (e.g., pgbouncer), so no connection is kept open.
+        self.database_transaction_pooling = False
+        # Statements taking longer than this (in seconds) are logged,
+        # None to disable.
+        self.database_slow_statement_s = 1.0
+        # Connection string of a streaming replica for the read-only
+        # sessions (None for no replica), and how many seconds it can
+        # be behind the primary to be read from.
+        self.database_replica = None
+        self.database_replica_max_lag_s = 5.0
+
+        # FileCacher.
+        # Max size of the local cache of each service, in MiB (None
+        # means unbounded).
+        self.cache_max_size_mib = None
+
+        # EvaluationService and ScoringService.
+        # Interval in seconds between the snapshots of the queues,
+        # restored at startup (None to disable them).
+        self.queue_snapshot_period = 60.0
+
+        # EvaluationService.
+        # How to share the queue among the operations with the same
+        # priority: None (oldest first), "participation" or "task"
+        # (round robin among participations or tasks, each extracting
+        # fair_share_quantum operations at its turn).
+        self.evaluation_fair_share = None
+        self.evaluation_fair_share_quantum = 1
 
         # Worker.
         self.keep_sandbox = True
         self.use_cgroups = True
         self.sandbox_implementation = 'isolate'
+        # Ports on which each Worker serves its file cache to the other
+        # ones (empty to disable the sharing).
+        self.worker_cache_listen_port = []
+        # Addresses on which they do so (by default, or if None, the
+        # address of the Worker).
+        self.worker_cache_listen_address = []
 
         # Sandbox.
         # Max size of each writable file during an evaluation step, in KiB.
         self.max_file_size = 1024 * 1024  # 1 GiB
+        # Directory on a tmpfs where to create the sandboxes instead of
+        # temp_dir, so that their files stay in RAM (None to disable).
+        self.sandbox_tmpfs_dir = None
         # Max processes, CPU time (s), memory (KiB) for compilation runs.
         self.compilation_sandbox_max_processes = 1000
         self.compilation_sandbox_max_time_s = 10.0
         self.compilation_sandbox_max_memory_kib = 512 * 1024  # 512 MiB
+        # Whether to precompile the headers provided by the tasks, for
+        # the languages supporting it (cached in cache_dir).
+        self.compilation_precompiled_headers = False
+        # Whether to build a class-data sharing archive for each Java
+        # submission, to reduce the startup time of the JVM.
+        self.java_class_data_sharing = False
         # Max processes, CPU time (s), memory (KiB) for trusted runs.
         self.trusted_sandbox_max_processes = 1000
         self.trusted_sandbox_max_time_s = 10.0
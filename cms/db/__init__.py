@@ -42,9 +42,12 @@ logger = logging.getLogger(__name__)
 # Define what this package will provide.
 
 __all__ = [
-    "version", "engine",
+    "version", "engine", "replica_engine",
+    # pool
+    "configure_pool",
     # session
     "Session", "ScopedSession", "SessionGen", "custom_psycopg2_connection",
+    "read_only_session", "get_staleness", "observe_session",
     # types
     "CastingArray", "Codename", "Filename", "FilenameSchema",
     "FilenameSchemaArray", "Digest",
@@ -75,21 +78,35 @@ __all__ = [
     # util
     "test_db_connection", "get_contest_list", "is_contest_id",
     "ask_for_contest", "get_submissions", "get_submission_results",
-    "get_datasets_to_judge", "enumerate_files"
+    "get_datasets_to_judge", "enumerate_files", "enumerate_files_query",
+    "estimate_count", "invalidate_submission_results",
 ]
 
 
 # Instantiate or import these objects.
 
-version = 43
+version = 44
+
+from .pool import configure_pool, get_engine_arguments, instrument_engine
 
 engine = create_engine(config.database, echo=config.database_debug,
-                       pool_timeout=60, pool_recycle=120)
+                       **get_engine_arguments())
+instrument_engine(engine)
+
+# The engine of the streaming replica, if any, from which the read-only
+# sessions read when it is recent enough (see read_only_session).
+replica_engine = None
+if config.database_replica is not None:
+    replica_engine = create_engine(config.database_replica,
+                                   echo=config.database_debug,
+                                   **get_engine_arguments())
+    instrument_engine(replica_engine)
 
 metadata = MetaData(engine)
 
 from .session import Session, ScopedSession, SessionGen, \
-    custom_psycopg2_connection
+    custom_psycopg2_connection, read_only_session, get_staleness, \
+    observe_session
 
 from .types import CastingArray, Codename, Filename, FilenameSchema, \
     FilenameSchemaArray, Digest
@@ -110,7 +127,8 @@ from .drop import drop_db
 
 from .util import test_db_connection, get_contest_list, is_contest_id, \
     ask_for_contest, get_submissions, get_submission_results, \
-    get_datasets_to_judge, enumerate_files
+    get_datasets_to_judge, enumerate_files, enumerate_files_query, \
+    estimate_count, invalidate_submission_results
 
 
 configure_mappers()
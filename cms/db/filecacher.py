@@ -29,14 +29,20 @@ import io
 import logging
 import os
 import tempfile
+import time
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 
 import gevent
+import gevent.pool
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
 from cms import config, mkdir, rmtree
-from cms.db import SessionGen, Digest, FSObject, LargeObject
-from cmscommon.digest import Digester
+from cms.db import SessionGen, Digest, FSObject, LargeObject, \
+    custom_psycopg2_connection
+from cms.metrics import registry
+from cmscommon.digest import Digester, bytes_digest
 
 
 logger = logging.getLogger(__name__)
@@ -179,6 +185,56 @@ class FileCacherBackend(metaclass=ABCMeta):
         """
         pass
 
+    def store_many(self, files):
+        """Store many files in the storage at once.
+
+        The default implementation stores them one at a time, using
+        create_file() and commit_file().
+
+        files ({unicode: (bytes, unicode)}): the content and the
+            description of each file to store, indexed by digest.
+
+        """
+        for digest, (content, desc) in files.items():
+            fobj = self.create_file(digest)
+            if fobj is None:
+                continue
+            with io.BytesIO(content) as src:
+                copyfileobj(src, fobj)
+            self.commit_file(fobj, digest, desc)
+
+    def lookup_many(self, digests):
+        """Prepare the retrieval of many files from the storage.
+
+        The result is meant to be split and passed to read_many(),
+        possibly to other greenlets.
+
+        digests ([unicode]): the digests of the files to retrieve.
+
+        return ({unicode: object}): an opaque handle for each digest
+            of a file that (possibly) exists.
+
+        """
+        return dict((digest, digest) for digest in digests)
+
+    def read_many(self, handles):
+        """Retrieve many files from the storage, one after the other.
+
+        handles ({unicode: object}): handles returned by lookup_many().
+
+        yield ((unicode, fileobj)): the digest and a readable binary
+            file-like object for each file that can be found; the file
+            object is valid only until the next item is requested.
+
+        """
+        for digest in handles:
+            try:
+                fobj = self.get_file(digest)
+            except KeyError:
+                continue
+            with fobj:
+                yield digest, fobj
+
 
 class FSBackend(FileCacherBackend):
     """This class implements a backend for FileCacher that keeps all
@@ -407,6 +463,66 @@ class DBBackend(FileCacherBackend):
 
             session.commit()
 
+    def store_many(self, files):
+        """See FileCacherBackend.store_many().
+
+        All the files missing from the database are inserted with a
+        single statement, creating the large objects on the fly, in a
+        single transaction.
+
+        """
+        with SessionGen() as session:
+            stored = set(digest for digest, in
+                         session.query(FSObject.digest)
+                         .filter(FSObject.digest.in_(list(files))))
+            values = list({"digest": digest,
+                           "loid": func.lo_from_bytea(0, content),
+                           "description": desc}
+                          for digest, (content, desc) in files.items()
+                          if digest not in stored)
+            if len(values) == 0:
+                return
+            try:
+                session.execute(FSObject.__table__.insert().values(values))
+                session.commit()
+            except IntegrityError:
+                # Someone stored some of the files in the meantime: the
+                # whole transaction, large objects included, is rolled
+                # back, hence we fall back to one file at a time.
+                session.rollback()
+                logger.warning("Storing %d files at once caused an "
+                               "IntegrityError, retrying one at a time.",
+                               len(values))
+            else:
+                logger.info("%d files stored on the database.", len(values))
+                return
+        super().store_many(files)
+
+    def lookup_many(self, digests):
+        """See FileCacherBackend.lookup_many().
+
+        The handles are the OIDs of the large objects, all fetched
+        with a single query.
+
+        """
+        with SessionGen() as session:
+            return dict(session.query(FSObject.digest, FSObject.loid)
+                        .filter(FSObject.digest.in_(digests)).all())
+
+    def read_many(self, handles):
+        """See FileCacherBackend.read_many().
+
+        All the files are read through the same connection.
+
+        """
+        conn = custom_psycopg2_connection()
+        try:
+            for digest, loid in handles.items():
+                with LargeObject(loid, mode='rb', conn=conn) as fobj:
+                    yield digest, fobj
+        finally:
+            conn.close()
+
     def list(self, session=None):
         """See FileCacherBackend.list().
 
@@ -431,6 +547,182 @@ class DBBackend(FileCacherBackend):
                 return _list(session)
 
 
+class PeerBackend(FileCacherBackend):
+    """This backend first tries to fetch files from the local caches of
+    other services (its peers), exposed through HTTP (see
+    cms.server.file_middleware.CachedFileServer), and falls back to
+    another backend when none of them has the file. The content
+    obtained from peers is verified against the digest.
+
+    All the other operations are delegated to the other backend.
+
+    """
+
+    # Connect and read timeouts for the requests to the peers. The read
+    # timeout (the longest wait for data, not for the whole file) is
+    # generous since a peer missing the file fetches it entirely from
+    # its own peers (or from the database) before sending the first
+    # byte. A peer not answering in time is then considered down, so
+    # that a stuck one delays at most one fetch every DOWN_PERIOD
+    # seconds.
+    TIMEOUT = (3.05, 60)
+
+    # Seconds for which a peer that could not be contacted is not asked
+    # again.
+    DOWN_PERIOD = 60.0
+
+    def __init__(self, peers, backend):
+        """Initialize the backend.
+
+        peers ([string]): the base URLs of the peers, to which the
+            digest is appended to obtain the URL of a file; they are
+            tried in order.
+        backend (FileCacherBackend): the backend to use for the files
+            the peers don't have, and for everything else.
+
+        """
+        self.peers = peers
+        self.backend = backend
+        # Map each peer that could not be contacted to the (monotonic)
+        # time until which it is considered down.
+        self._down_until = dict()
+
+    def _get_from_peers(self, digest):
+        """Try to retrieve a file from the peers.
+
+        digest (unicode): the digest of the file to retrieve.
+
+        return (fileobj|None): a readable binary file-like object with
+            the content of the file, or None if no peer could provide
+            it.
+
+        """
+        # Imported here as it is slow to import and only needed when
+        # peers are configured (e.g., not by the command line tools).
+        import requests
+
+        for peer in self.peers:
+            if time.monotonic() < self._down_until.get(peer, 0.0):
+                continue
+            try:
+                response = requests.get(peer + digest, stream=True,
+                                        timeout=self.TIMEOUT)
+            except requests.RequestException as error:
+                logger.warning("Cannot contact peer %s, not asking it "
+                               "again for %d seconds: %s.",
+                               peer, self.DOWN_PERIOD, error)
+                self._down_until[peer] = time.monotonic() + self.DOWN_PERIOD
+                continue
+            fobj = tempfile.TemporaryFile()
+            d = Digester()
+            try:
+                if response.status_code != 200:
+                    fobj.close()
+                    continue
+                for buf in response.iter_content(FileCacher.CHUNK_SIZE):
+                    d.update(buf)
+                    fobj.write(buf)
+            except requests.RequestException as error:
+                logger.warning("Error while receiving file %s from peer "
+                               "%s: %s.", digest, peer, error)
+                fobj.close()
+                continue
+            finally:
+                response.close()
+            if d.digest() != digest:
+                logger.warning("File %s received from peer %s has the "
+                               "wrong digest.", digest, peer)
+                fobj.close()
+                continue
+            logger.debug("File %s received from peer %s.", digest, peer)
+            fobj.seek(0)
+            return fobj
+        return None
+
+    def get_file(self, digest):
+        """See FileCacherBackend.get_file().
+
+        """
+        fobj = self._get_from_peers(digest)
+        if fobj is None:
+            return self.backend.get_file(digest)
+        return fobj
+
+    def create_file(self, digest):
+        """See FileCacherBackend.create_file().
+
+        """
+        return self.backend.create_file(digest)
+
+    def commit_file(self, fobj, digest, desc=""):
+        """See FileCacherBackend.commit_file().
+
+        """
+        return self.backend.commit_file(fobj, digest, desc)
+
+    def describe(self, digest):
+        """See FileCacherBackend.describe().
+
+        """
+        return self.backend.describe(digest)
+
+    def get_size(self, digest):
+        """See FileCacherBackend.get_size().
+
+        """
+        return self.backend.get_size(digest)
+
+    def delete(self, digest):
+        """See FileCacherBackend.delete().
+
+        """
+        self.backend.delete(digest)
+
+    def list(self):
+        """See FileCacherBackend.list().
+
+        """
+        return self.backend.list()
+
+    def store_many(self, files):
+        """See FileCacherBackend.store_many().
+
+        """
+        self.backend.store_many(files)
+
+    def lookup_many(self, digests):
+        """See FileCacherBackend.lookup_many().
+
+        The files are downloaded from the peers (a few at a time) right
+        away, and only the missing ones are looked up in the other
+        backend.
+
+        """
+        handles = dict()
+        pool = gevent.pool.Pool(4)
+        for digest, fobj in zip(digests,
+                                pool.imap(self._get_from_peers, digests)):
+            if fobj is not None:
+                handles[digest] = (True, fobj)
+        missing = [digest for digest in digests if digest not in handles]
+        for digest, handle in self.backend.lookup_many(missing).items():
+            handles[digest] = (False, handle)
+        return handles
+
+    def read_many(self, handles):
+        """See FileCacherBackend.read_many().
+
+        """
+        fallback = dict()
+        for digest, (from_peer, handle) in handles.items():
+            if from_peer:
+                with handle:
+                    yield digest, handle
+            else:
+                fallback[digest] = handle
+        yield from self.backend.read_many(fallback)
+
+
 class NullBackend(FileCacherBackend):
     """This backend is always empty, it just drops each file that
     receives. It looks mostly like /dev/null. It is useful when you
@@ -461,6 +753,176 @@ class NullBackend(FileCacherBackend):
         return list()
 
 
+class LocalCache:
+    """Bookkeeping of the local file-system cache of a FileCacher.
+
+    Keep track of the files in the cache directory and of their total
+    size, and when the latter goes beyond the configured budget evict
+    the least recently used files. The access order is persisted on
+    disk as the modification time of the cached files (which is bumped
+    on each access), so that it survives restarts. Pinned files are
+    never evicted.
+
+    Also count hits, misses and evictions, for monitoring purposes.
+
+    """
+
+    def __init__(self, path, max_size=None):
+        """Initialize the bookkeeping, scanning the cache directory.
+
+        path (string): the cache directory.
+        max_size (int|None): the budget in bytes, or None for no limit.
+
+        """
+        self.path = path
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_size = 0
+
+        self._pinned = set()
+        self._sizes = OrderedDict()
+        self._size = 0
+        self.scan()
+
+    def scan(self):
+        """Rebuild the bookkeeping from the content of the directory.
+
+        """
+        entries = list()
+        for name in os.listdir(self.path):
+            # Skip the temporary directories.
+            if name.startswith("_") or name.startswith("."):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        entries.sort()
+
+        self._sizes = OrderedDict((name, size) for _, name, size in entries)
+        self._size = sum(self._sizes.values())
+
+    @property
+    def size(self):
+        """Return the total size of the cached files, in bytes."""
+        return self._size
+
+    def hit(self, digest):
+        """Record an access to a file present in the cache.
+
+        digest (unicode): the digest of the accessed file.
+
+        """
+        self.hits += 1
+        if digest not in self._sizes:
+            # Someone put it there behind our back.
+            self.add(digest)
+            return
+        self._sizes.move_to_end(digest)
+        try:
+            os.utime(os.path.join(self.path, digest))
+        except OSError:
+            pass
+
+    def miss(self):
+        """Record an access to a file not present in the cache."""
+        self.misses += 1
+
+    def add(self, digest):
+        """Record that a file has been put in the cache.
+
+        Evict other files if this makes the cache exceed the budget.
+
+        digest (unicode): the digest of the new file.
+
+        """
+        try:
+            size = os.stat(os.path.join(self.path, digest)).st_size
+        except OSError:
+            return
+        self._size -= self._sizes.pop(digest, 0)
+        self._sizes[digest] = size
+        self._size += size
+        self.evict(keep=digest)
+
+    def discard(self, digest):
+        """Record that a file has been removed from the cache.
+
+        digest (unicode): the digest of the removed file.
+
+        """
+        self._size -= self._sizes.pop(digest, 0)
+
+    def pin(self, digests):
+        """Protect the given files from eviction.
+
+        digests (iterable of unicode): the digests to pin.
+
+        """
+        self._pinned.update(digests)
+
+    def unpin(self, digests=None):
+        """Allow the given files to be evicted again.
+
+        digests (iterable of unicode|None): the digests to unpin; all
+            the pinned ones if None.
+
+        """
+        if digests is None:
+            self._pinned.clear()
+        else:
+            self._pinned.difference_update(digests)
+
+    def evict(self, keep=None):
+        """Evict least recently used files until within the budget.
+
+        keep (unicode|None): a digest not to evict, besides the pinned
+            ones (usually the file that has just been added).
+
+        """
+        if self.max_size is None or self._size <= self.max_size:
+            return
+        for digest in list(self._sizes):
+            if self._size <= self.max_size:
+                break
+            if digest == keep or digest in self._pinned:
+                continue
+            size = self._sizes.pop(digest)
+            self._size -= size
+            try:
+                os.unlink(os.path.join(self.path, digest))
+            except OSError:
+                pass
+            self.evictions += 1
+            self.evicted_size += size
+            logger.debug("File %s evicted from the cache.", digest)
+        if self._size > self.max_size:
+            logger.warning("Cache size (%d bytes) exceeds the budget (%d "
+                           "bytes) because of pinned files.",
+                           self._size, self.max_size)
+
+    def get_status(self):
+        """Return the counters and the occupation of the cache.
+
+        return ({str: int|None}): the status of the cache.
+
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "evicted_size": self.evicted_size,
+            "files": len(self._sizes),
+            "pinned": len(self._pinned),
+            "size": self._size,
+            "max_size": self.max_size,
+        }
+
+
 class FileCacher:
     """This class implement a local cache for files stored as FSObject
     in the database.
@@ -481,7 +943,16 @@ class FileCacher:
     # CHUNK_SIZE should be a multiple of these values.
     CHUNK_SIZE = 16 * 1024  # 16 KiB
 
-    def __init__(self, service=None, path=None, null=False):
+    # When bulk loading files, the read size starts from CHUNK_SIZE and
+    # doubles after each full read, up to this value, to reduce the
+    # number of round trips needed for big files.
+    MAX_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+    # How many files each greenlet of load_many() fetches in a round.
+    BULK_ROUND_SIZE = 16
+
+    def __init__(self, service=None, path=None, null=False, max_size=None,
+                 peers=None):
         """Initialize.
 
         By default the database-powered backend will be used, but this
@@ -499,6 +970,12 @@ class FileCacher:
         null (bool): if True, back the FileCacher with a NullBackend,
             that just discards every file it receives. This setting
             takes priority over path.
+        max_size (int|None): the budget in bytes of the file-system
+            cache; if not given, the one in the configuration is used
+            (and if that is not set either, the cache is unbounded).
+        peers ([string]|None): if given, the base URLs of the caches of
+            other services, to try before the backend when fetching a
+            file (see PeerBackend).
 
         """
         self.service = service
@@ -509,6 +986,8 @@ class FileCacher:
             self.backend = DBBackend()
         else:
             self.backend = FSBackend(path)
+        if peers:
+            self.backend = PeerBackend(peers, self.backend)
 
         # First we create the config directories.
         self._create_directory_or_die(config.temp_dir)
@@ -532,6 +1011,28 @@ class FileCacher:
         # Just to make sure it was created.
         self._create_directory_or_die(self.file_dir)
 
+        if max_size is None and config.cache_max_size_mib is not None:
+            max_size = config.cache_max_size_mib * 1024 * 1024
+        self.cache = LocalCache(self.file_dir, max_size)
+
+        if service is not None:
+            registry.counter(
+                "cms_file_cache_hits_total",
+                "Files found in the local cache.",
+                function=lambda: self.cache.hits)
+            registry.counter(
+                "cms_file_cache_misses_total",
+                "Files not found in the local cache.",
+                function=lambda: self.cache.misses)
+            registry.counter(
+                "cms_file_cache_evictions_total",
+                "Files evicted from the local cache.",
+                function=lambda: self.cache.evictions)
+            registry.gauge(
+                "cms_file_cache_size_bytes",
+                "Total size of the files in the local cache.",
+                function=lambda: self.cache.size)
+
     @staticmethod
     def _create_directory_or_die(directory):
         """Create directory and ensure it exists, or raise a RuntimeError."""
@@ -558,6 +1059,7 @@ class FileCacher:
             raise TombstoneError()
         cache_file_path = os.path.join(self.file_dir, digest)
         if if_needed and os.path.exists(cache_file_path):
+            self.cache.hit(digest)
             return
 
         ftmp_handle, temp_file_path = tempfile.mkstemp(dir=self.temp_dir,
@@ -569,6 +1071,100 @@ class FileCacher:
         # Then move it to its real location (this operation is atomic
         # by POSIX requirement)
         os.rename(temp_file_path, cache_file_path)
+        self.cache.add(digest)
+
+    def _fetch_many(self, handles):
+        """Download some files into temporary files.
+
+        The cache bookkeeping is left to the caller.
+
+        handles ({unicode: object}): handles from the backend.
+
+        return (([(unicode, string)], [(unicode, Exception)])): the
+            digests downloaded with the paths of the temporary files
+            containing them, and the digests that failed with the
+            reason.
+
+        """
+        fetched = list()
+        failed = list()
+        try:
+            for digest, fobj in self.backend.read_many(handles):
+                ftmp_handle, temp_file_path = tempfile.mkstemp(
+                    dir=self.temp_dir, text=False)
+                try:
+                    with open(ftmp_handle, 'wb') as ftmp:
+                        chunk_size = self.CHUNK_SIZE
+                        while True:
+                            buf = fobj.read(chunk_size)
+                            if len(buf) == 0:
+                                break
+                            ftmp.write(buf)
+                            if len(buf) == chunk_size:
+                                chunk_size = min(2 * chunk_size,
+                                                 self.MAX_CHUNK_SIZE)
+                except Exception as error:
+                    os.unlink(temp_file_path)
+                    failed.append((digest, error))
+                else:
+                    fetched.append((digest, temp_file_path))
+        except Exception as error:
+            failed.append((None, error))
+        return fetched, failed
+
+    def load_many(self, digests, if_needed=True, workers=4, progress=None):
+        """Load many files into the cache, with parallel downloads.
+
+        The files are downloaded by a few greenlets, each using a single
+        connection to the backend for many files; they are processed
+        in rounds, more or less in the given order, so the caller can
+        put first the files it needs the most. Files that the backend
+        cannot find (and the tombstone) are skipped.
+
+        digests ([unicode]): the digests of the files to load.
+        if_needed (bool): only load the files not present in the local
+            cache.
+        workers (int): the number of parallel downloads.
+        progress (function|None): if given, called after each round
+            with the number of files processed so far and the total.
+
+        return (int): the number of files actually downloaded.
+
+        """
+        to_load = list()
+        for digest in digests:
+            if digest == Digest.TOMBSTONE:
+                continue
+            if if_needed and \
+                    os.path.exists(os.path.join(self.file_dir, digest)):
+                self.cache.hit(digest)
+                continue
+            to_load.append(digest)
+
+        pool = gevent.pool.Pool(workers)
+        loaded = 0
+        round_size = workers * self.BULK_ROUND_SIZE
+        try:
+            for start in range(0, len(to_load), round_size):
+                batch = to_load[start:start + round_size]
+                handles = list(self.backend.lookup_many(batch).items())
+                shards = [dict(handles[i::workers]) for i in range(workers)]
+                for fetched, failed in pool.imap_unordered(
+                        self._fetch_many, shards):
+                    for digest, temp_file_path in fetched:
+                        os.rename(temp_file_path,
+                                  os.path.join(self.file_dir, digest))
+                        self.cache.add(digest)
+                        loaded += 1
+                    for digest, error in failed:
+                        logger.warning("Cannot load file %s: %r.",
+                                       digest, error)
+                if progress is not None:
+                    progress(min(start + round_size, len(to_load)),
+                             len(to_load))
+        finally:
+            pool.kill()
+        return loaded
 
     def get_file(self, digest):
         """Retrieve a file from the storage.
@@ -600,9 +1196,12 @@ class FileCacher:
             logger.debug("File %s not in cache, downloading "
                          "from database.", digest)
 
+            self.cache.miss()
             self.load(digest)
 
             logger.debug("File %s downloaded.", digest)
+        else:
+            self.cache.hit(digest)
 
         return open(cache_file_path, 'rb')
 
@@ -740,6 +1339,7 @@ class FileCacher:
 
             if not os.path.exists(cache_file_path):
                 os.rename(dst.name, cache_file_path)
+                self.cache.add(digest)
             else:
                 os.unlink(dst.name)
 
@@ -767,6 +1367,39 @@ class FileCacher:
         with io.BytesIO(content) as src:
             return self.put_file_from_fobj(src, desc)
 
+    def put_many(self, contents):
+        """Store many files in the storage.
+
+        Like calling `put_file_content' on each of them, but all the
+        files are sent to the backend with a single batched operation
+        (for the database, a single transaction).
+
+        contents ([(bytes, unicode)]): the content and the description
+            of each file to store.
+
+        return ([unicode]): the digests of the stored files, in the
+            same order.
+
+        """
+        digests = list()
+        files = dict()
+        for content, desc in contents:
+            digest = bytes_digest(content)
+            digests.append(digest)
+            files.setdefault(digest, (content, desc))
+
+            cache_file_path = os.path.join(self.file_dir, digest)
+            if not os.path.exists(cache_file_path):
+                with tempfile.NamedTemporaryFile('wb', delete=False,
+                                                 dir=self.temp_dir) as dst:
+                    dst.write(content)
+                os.rename(dst.name, cache_file_path)
+                self.cache.add(digest)
+
+        self.backend.store_many(files)
+
+        return digests
+
     def put_file_from_path(self, src_path, desc=""):
         """Store a file in the storage.
 
@@ -839,6 +1472,32 @@ class FileCacher:
             os.unlink(cache_file_path)
         except OSError:
             pass
+        self.cache.discard(digest)
+
+    def pin(self, digests):
+        """Protect some files in the local cache from eviction.
+
+        digests (iterable of unicode): the digests to pin.
+
+        """
+        self.cache.pin(digests)
+
+    def unpin(self, digests=None):
+        """Allow some pinned files to be evicted from the local cache.
+
+        digests (iterable of unicode|None): the digests to unpin; all
+            the pinned ones if None.
+
+        """
+        self.cache.unpin(digests)
+
+    def get_cache_status(self):
+        """Return the counters and the occupation of the local cache.
+
+        return ({str: int|None}): see LocalCache.get_status().
+
+        """
+        return self.cache.get_status()
 
     def purge_cache(self):
         """Empty the local cache.
@@ -848,6 +1507,7 @@ class FileCacher:
         if not mkdir(config.cache_dir) or not mkdir(self.file_dir):
             logger.error("Cannot create necessary directories.")
             raise RuntimeError("Cannot create necessary directories.")
+        self.cache.scan()
 
     def destroy_cache(self):
         """Completely remove and destroy the cache.
@@ -68,13 +68,18 @@ class LargeObject(io.RawIOBase):
     INV_READ = 0x40000
     INV_WRITE = 0x20000
 
-    def __init__(self, loid, mode='rb'):
+    def __init__(self, loid, mode='rb', conn=None):
         """Open a large object, creating it if required.
 
         loid (int): the large object ID.
         mode (string): how to open the file (`r' -> read, `w' -> write,
             `b' -> binary, which must be always specified). If not
             given, `rb' is used.
+        conn (connection|None): a connection (as returned by
+            custom_psycopg2_connection) to use instead of creating a
+            new one; useful to access many large objects in a row.
+            It must not be in a transaction, and it is left in the
+            same state when the object is closed.
 
         """
         io.RawIOBase.__init__(self)
@@ -93,7 +98,8 @@ class LargeObject(io.RawIOBase):
         self._readable = 'r' in mode
         self._writable = 'w' in mode
 
-        self._conn = custom_psycopg2_connection()
+        self._conn = conn if conn is not None \
+            else custom_psycopg2_connection()
         cursor = self._conn.cursor()
 
         # If the loid is 0, create the large object.
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Connection pools and instrumentation of the database engine.
+
+Each process has a single engine, created when cms.db is imported.
+Its pool is sized according to database_pool_size for the service the
+process runs (see configure_pool), or replaced by a NullPool when the
+connections go through a pooler in transaction mode (e.g., pgbouncer),
+which then does the pooling for all the processes.
+
+The pools measure how long it takes to obtain a connection, and the
+engine measures the duration of each statement, by call site (the
+first caller outside SQLAlchemy), logging the slow ones.
+
+"""
+
+import logging
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+from cms import config
+from cms.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+# Used if database_pool_size has no entry for the service nor a
+# default one (the defaults of SQLAlchemy).
+DEFAULT_POOL_SIZE = [5, 10]
+
+# Seconds to wait for a connection, and after which to replace it.
+POOL_TIMEOUT = 60
+POOL_RECYCLE = 120
+
+
+_checkout_duration = registry.histogram(
+    "cms_db_checkout_seconds",
+    "Time spent obtaining a connection from the pool.")
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool measuring the time spent obtaining connections."""
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            _checkout_duration.observe(time.monotonic() - start)
+
+    def resized(self, pool_size, max_overflow):
+        """Return a new pool as this one, but with a different size.
+
+        As recreate, keep the listeners to the events of this pool
+        (e.g., those of the dialect).
+
+        pool_size (int): the number of connections kept in the pool.
+        max_overflow (int): the number of additional connections that
+            can be opened when all those in the pool are in use.
+
+        return (TimedQueuePool): the new pool.
+
+        """
+        return self.__class__(self._creator, pool_size=pool_size,
+                              max_overflow=max_overflow,
+                              timeout=self._timeout,
+                              recycle=self._recycle, echo=self.echo,
+                              logging_name=self._orig_logging_name,
+                              use_threadlocal=self._use_threadlocal,
+                              reset_on_return=self._reset_on_return,
+                              _dispatch=self.dispatch,
+                              dialect=self._dialect)
+
+
+class TimedNullPool(NullPool):
+    """A NullPool measuring the time spent opening connections."""
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            _checkout_duration.observe(time.monotonic() - start)
+
+
+def get_pool_size(service_name=None):
+    """Return the size of the pool for a service.
+
+    service_name (str|None): the name of the service, or None for the
+        default.
+
+    return ((int, int)): the pool size and the max overflow.
+
+    """
+    sizes = config.database_pool_size
+    pool_size, max_overflow = sizes.get(
+        service_name, sizes.get("default", DEFAULT_POOL_SIZE))
+    return pool_size, max_overflow
+
+
+def get_engine_arguments():
+    """Return the arguments of create_engine about the pool.
+
+    return ({str: object}): the keyword arguments.
+
+    """
+    if config.database_transaction_pooling:
+        return {"poolclass": TimedNullPool, "pool_recycle": POOL_RECYCLE}
+    pool_size, max_overflow = get_pool_size()
+    return {"poolclass": TimedQueuePool, "pool_size": pool_size,
+            "max_overflow": max_overflow, "pool_timeout": POOL_TIMEOUT,
+            "pool_recycle": POOL_RECYCLE}
+
+
+def configure_pool(engine, service_name):
+    """Size the pool of the engine for a service.
+
+    Nothing is done with transaction pooling, as the engine keeps no
+    connection open.
+
+    engine (Engine): the engine, created with get_engine_arguments.
+    service_name (str): the name of the service run by this process.
+
+    """
+    if not isinstance(engine.pool, TimedQueuePool):
+        return
+    pool_size, max_overflow = get_pool_size(service_name)
+    old_pool = engine.pool
+    engine.pool = old_pool.resized(pool_size, max_overflow)
+    old_pool.dispose()
+    logger.debug("Database pool sized %d+%d for %s.",
+                 pool_size, max_overflow, service_name)
+
+
+# Histograms of the duration of the statements, by call site.
+_statement_durations = dict()
+
+
+def _get_call_site():
+    """Return the first caller outside SQLAlchemy and this module.
+
+    return (str): the module and the name of the function.
+
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith("sqlalchemy") and module != __name__:
+            return "%s:%s" % (module, frame.f_code.co_name)
+        frame = frame.f_back
+    return "unknown"
+
+
+def _before_cursor_execute(conn, unused_cursor, unused_statement,
+                           unused_parameters, unused_context,
+                           unused_executemany):
+    conn.info.setdefault("cms_statement_start", []).append(time.monotonic())
+
+
+def _after_cursor_execute(conn, unused_cursor, statement, unused_parameters,
+                          unused_context, unused_executemany):
+    duration = time.monotonic() - conn.info["cms_statement_start"].pop()
+    site = _get_call_site()
+    histogram = _statement_durations.get(site)
+    if histogram is None:
+        histogram = registry.histogram(
+            "cms_db_statement_seconds",
+            "Duration of the statements, by call site.",
+            labels={"site": site})
+        _statement_durations[site] = histogram
+    histogram.observe(duration)
+
+    # Statements of a session (see cms.db.session) are counted in it.
+    session_info = conn.info.get("cms_session_info")
+    if session_info is not None:
+        session_info["statements"] = session_info.get("statements", 0) + 1
+
+    if config.database_slow_statement_s is not None \
+            and duration >= config.database_slow_statement_s:
+        logger.warning("Slow statement (%.3f s) from %s: %s",
+                       duration, site, statement[:1000])
+
+
+def instrument_engine(engine):
+    """Measure the statements executed by the engine.
+
+    engine (Engine): the engine.
+
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -27,13 +27,19 @@ interact with SQLAlchemy objects.
 """
 
 import logging
+import time
+import weakref
 
 import psycopg2
+import sqlalchemy.orm
+from sqlalchemy import event, text
 from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 from cms import config
-from . import engine
+from cms.metrics import registry
+from . import engine, replica_engine
 
 
 logger = logging.getLogger(__name__)
@@ -42,10 +48,205 @@ logger = logging.getLogger(__name__)
 Session = sessionmaker(engine, twophase=config.twophase_commit)
 ScopedSession = scoped_session(Session)
 
+# Sessions reading from the replica, if there is one.
+ReplicaSession = None
+if replica_engine is not None:
+    ReplicaSession = sessionmaker(replica_engine)
+
 # For two-phases transactions:
 # Session = sessionmaker(db, twophase=True)
 
 
+_session_duration = registry.histogram(
+    "cms_db_session_seconds",
+    "Time the sessions of SessionGen and of the web handlers are kept open.")
+
+_session_statements = registry.histogram(
+    "cms_db_session_statements",
+    "Number of statements executed by the sessions of SessionGen and of "
+    "the web handlers.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+
+# The info of the connections on which the statements of each session
+# are counted, until its transaction ends.
+_counted_connections = weakref.WeakKeyDictionary()
+
+
+@event.listens_for(sqlalchemy.orm.Session, "after_begin")
+def _count_statements(session, unused_transaction, connection):
+    """Count the statements on the connection in the session's info.
+
+    The statements are counted by cms.db.pool as long as the
+    connection is used by this session. This applies to all sessions,
+    both on the primary and on the replica.
+
+    """
+    connection.info["cms_session_info"] = session.info
+    _counted_connections.setdefault(session, []).append(connection.info)
+
+
+@event.listens_for(sqlalchemy.orm.Session, "after_transaction_end")
+def _stop_counting_statements(session, transaction):
+    """Stop counting the statements on the connections of the session.
+
+    When its transaction ends, the session gives the connections back
+    to the pool, and later statements on them are not its own.
+
+    """
+    if transaction.parent is not None:
+        return
+    for info in _counted_connections.pop(session, []):
+        if info.get("cms_session_info") is session.info:
+            del info["cms_session_info"]
+
+
+def observe_session(session, start_time):
+    """Record the metrics of a session, once it is done.
+
+    session (Session): the session, closed or rolled back.
+    start_time (float): when (as in time.monotonic) it was created.
+
+    """
+    _session_statements.observe(session.info.get("statements", 0))
+    _session_duration.observe(time.monotonic() - start_time)
+
+
+_replica_lag = registry.gauge(
+    "cms_db_replica_lag_seconds",
+    "How much the replica was behind the primary at the last check.")
+
+
+class ReplicaMonitor:
+    """Keep track of how much a streaming replica is behind.
+
+    The lag is queried at most every CHECK_INTERVAL seconds. It is
+    measured against the primary: it is zero if the replica replayed
+    all the WAL the primary had written just before (or if it is not
+    a replica at all), otherwise it is the time since the commit of
+    the last transaction the replica replayed. Comparing only what
+    the replica received with what it replayed would not do, as they
+    are also equal when the replica is disconnected from the primary.
+
+    """
+
+    CHECK_INTERVAL = 1.0
+
+    PRIMARY_LSN_QUERY = "SELECT pg_current_wal_lsn()"
+
+    LAG_QUERY = text(
+        "SELECT CASE "
+        "WHEN NOT pg_is_in_recovery() THEN 0 "
+        "WHEN pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn) THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+        "END")
+
+    def __init__(self, replica_engine, primary_engine):
+        """Initialization.
+
+        replica_engine (Engine): the engine connecting to the replica.
+        primary_engine (Engine): the engine connecting to the primary.
+
+        """
+        self.engine = replica_engine
+        self.primary_engine = primary_engine
+        self.lag = None
+        self.checked_at = None
+
+    def get_lag(self):
+        """Return how much the replica is behind.
+
+        return (float|None): the lag in seconds, or None if unknown
+            (e.g., the replica or the primary is unreachable), in
+            which case the replica must not be used.
+
+        """
+        now = time.monotonic()
+        if self.checked_at is None \
+                or now - self.checked_at >= self.CHECK_INTERVAL:
+            self.checked_at = now
+            try:
+                lsn = self.primary_engine.execute(
+                    self.PRIMARY_LSN_QUERY).scalar()
+                lag = self.engine.execute(self.LAG_QUERY, lsn=lsn).scalar()
+            except SQLAlchemyError as error:
+                logger.warning("Couldn't get the lag of the replica: %r.",
+                               error)
+                lag = None
+            self.lag = float(lag) if lag is not None else None
+            if self.lag is not None:
+                _replica_lag.set(self.lag)
+        return self.lag
+
+    def can_read(self, last_write=None):
+        """Return whether the replica is recent enough to read from.
+
+        last_write (float|None): when (seconds since the epoch) the
+            client for which we read last wrote to the primary, if
+            known; its reads go to the primary until the write is
+            surely on the replica.
+
+        return (bool): whether the lag is within the bound configured
+            in database_replica_max_lag_s, and last_write is older.
+
+        """
+        max_lag = config.database_replica_max_lag_s
+        if last_write is not None and time.time() - last_write <= max_lag:
+            return False
+        lag = self.get_lag()
+        return lag is not None and lag <= max_lag
+
+
+replica_monitor = None
+if replica_engine is not None:
+    replica_monitor = ReplicaMonitor(replica_engine, engine)
+
+
+_read_only_sessions = {
+    target: registry.counter(
+        "cms_db_read_only_sessions_total",
+        "Number of the read-only sessions, by database they read from.",
+        labels={"target": target})
+    for target in ["primary", "replica"]}
+
+
+def read_only_session(last_write=None):
+    """Return a new session, to be used only for reading.
+
+    It reads from the replica if there is one recent enough (see
+    ReplicaMonitor.can_read), otherwise from the primary; the data it
+    reads can therefore be as old as reported by get_staleness.
+
+    last_write (float|None): when (seconds since the epoch) the client
+        for which we read last wrote, if known.
+
+    return (Session): the new session.
+
+    """
+    if replica_monitor is not None and replica_monitor.can_read(last_write):
+        session = ReplicaSession()
+        session.info["replica"] = True
+        _read_only_sessions["replica"].inc()
+    else:
+        session = Session()
+        _read_only_sessions["primary"].inc()
+    return session
+
+
+def get_staleness(session):
+    """Return how old the data read by a session can be.
+
+    session (Session): a session.
+
+    return (float): zero for the sessions reading from the primary,
+        database_replica_max_lag_s for those reading from the replica.
+
+    """
+    if session.info.get("replica", False):
+        return config.database_replica_max_lag_s
+    return 0.0
+
+
 class SessionGen:
     """This allows us to create handy local sessions simply with:
 
@@ -56,17 +257,36 @@ class SessionGen:
     closed. If one wants to commit the session, they have to call
     commit() explicitly.
 
+    With read_only, the session may read from the replica (see
+    read_only_session).
+
     """
-    def __init__(self):
+    def __init__(self, read_only=False, last_write=None):
+        """Initialization.
+
+        read_only (bool): whether the session will only be used for
+            reading.
+        last_write (float|None): for read-only sessions, when the
+            client for which we read last wrote, if known.
+
+        """
+        self.read_only = read_only
+        self.last_write = last_write
         self.session = None
+        self.start_time = None
 
     def __enter__(self):
-        self.session = Session()
+        self.start_time = time.monotonic()
+        if self.read_only:
+            self.session = read_only_session(self.last_write)
+        else:
+            self.session = Session()
         return self.session
 
     def __exit__(self, unused1, unused2, unused3):
         self.session.rollback()
         self.session.close()
+        observe_session(self.session, self.start_time)
 
 
 def custom_psycopg2_connection(**kwargs):
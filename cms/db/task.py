@@ -413,6 +413,14 @@ class Dataset(Base):
         JSONB,
         nullable=False)
 
+    # Whether ES can skip the evaluations on the testcases whose
+    # outcomes cannot change the score anymore, as the score type
+    # already settled the scores of all the subtasks they belong to.
+    short_circuit_evaluation = Column(
+        Boolean,
+        nullable=False,
+        default=False)
+
     # These one-to-many relationships are the reversed directions of
     # the ones defined in the "child" classes using foreign keys.
 
@@ -32,8 +32,8 @@ from sqlalchemy.exc import OperationalError
 from cms import ConfigError
 from . import SessionGen, Digest, Contest, Participation, Statement, \
     Attachment, Task, Manager, Dataset, Testcase, Submission, File, \
-    SubmissionResult, Executable, UserTest, UserTestFile, UserTestManager, \
-    UserTestResult, UserTestExecutable, PrintJob
+    SubmissionResult, Executable, Evaluation, UserTest, UserTestFile, \
+    UserTestManager, UserTestResult, UserTestExecutable, PrintJob
 
 
 logger = logging.getLogger(__name__)
@@ -249,6 +249,71 @@ def get_submission_results(session, contest_id=None, participation_id=None,
     return query
 
 
+def invalidate_submission_results(session, submission_ids, dataset_id=None,
+                                  level="compilation"):
+    """Invalidate the results of the given submissions in bulk.
+
+    This is the set-based equivalent of calling invalidate_compilation
+    (or invalidate_evaluation) on each of the submission results: the
+    evaluations (and executables) are deleted and the outcomes blanked
+    with a few DELETE and UPDATE statements, without loading anything.
+    Objects already loaded in the session are not updated.
+
+    session (Session): the database session to use.
+    submission_ids ([int]): ids of the submissions whose results are
+        to invalidate.
+    dataset_id (int|None): id of the dataset whose results are to
+        invalidate, or None for all datasets.
+    level (string): "compilation" or "evaluation".
+
+    return (int): the number of invalidated submission results.
+
+    raise (ValueError): if level is not valid.
+
+    """
+    if level not in ("compilation", "evaluation"):
+        raise ValueError("Unexpected invalidation level `%s'." % level)
+
+    def restrict(cls):
+        condition = cls.submission_id.in_(submission_ids)
+        if dataset_id is not None:
+            condition = condition & (cls.dataset_id == dataset_id)
+        return condition
+
+    # Same as SubmissionResult.invalidate_score and
+    # SubmissionResult.invalidate_evaluation.
+    values = {
+        SubmissionResult.score: None,
+        SubmissionResult.score_details: None,
+        SubmissionResult.public_score: None,
+        SubmissionResult.public_score_details: None,
+        SubmissionResult.ranking_score_details: None,
+        SubmissionResult.evaluation_outcome: None,
+        SubmissionResult.evaluation_tries: 0,
+    }
+    session.query(Evaluation).filter(restrict(Evaluation))\
+        .delete(synchronize_session=False)
+
+    if level == "compilation":
+        # Same as SubmissionResult.invalidate_compilation.
+        values.update({
+            SubmissionResult.compilation_outcome: None,
+            SubmissionResult.compilation_text: [],
+            SubmissionResult.compilation_tries: 0,
+            SubmissionResult.compilation_time: None,
+            SubmissionResult.compilation_wall_clock_time: None,
+            SubmissionResult.compilation_memory: None,
+            SubmissionResult.compilation_shard: None,
+            SubmissionResult.compilation_sandbox: None,
+        })
+        session.query(Executable).filter(restrict(Executable))\
+            .delete(synchronize_session=False)
+
+    return session.query(SubmissionResult)\
+        .filter(restrict(SubmissionResult))\
+        .update(values, synchronize_session=False)
+
+
 def get_datasets_to_judge(task):
     """Determine the datasets that ES and SS have to judge.
 
@@ -272,15 +337,41 @@ def get_datasets_to_judge(task):
     return judge
 
 
-def enumerate_files(
+def estimate_count(session, query):
+    """Return the number of rows of a query, as estimated by the DB.
+
+    The estimate comes from the planner statistics, hence it's
+    computed without executing the query, in a time that doesn't
+    depend on the number of rows; it can be quite inaccurate though.
+
+    session (Session): the session to use.
+    query (Query): the query to estimate.
+
+    return (int): the estimated number of rows.
+
+    """
+    compiled = query.statement.compile(dialect=session.bind.dialect)
+    # A plain string is passed as it is to the driver, together with
+    # the parameters of the compiled statement.
+    plan = session.connection().execute(
+        "EXPLAIN (FORMAT JSON) %s" % compiled, compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def enumerate_files_query(
         session, contest=None,
         skip_submissions=False, skip_user_tests=False, skip_print_jobs=False,
         skip_generated=False):
-    """Enumerate all the files (by digest) referenced by the
-    contest.
+    """Build the query enumerating the files referenced by the contest.
 
-    return (set): a set of strings, the digests of the file
-                  referenced in the contest.
+    The arguments have the same meaning as in enumerate_files(). The
+    result isn't executed, so that it can be used as a subquery (for
+    example to compute, in the database, which stored files are not
+    referenced anymore). Its only column contains the digests; the
+    tombstone may appear among them.
+
+    return (CompoundSelect): the union of the queries returning the
+        digests of the files referenced in the contest.
 
     """
     contest_q = session.query(Contest)
@@ -332,7 +423,25 @@ def enumerate_files(
                        .join(Participation.printjobs)
                        .with_entities(PrintJob.digest))
 
+    return union(*queries)
+
+
+def enumerate_files(
+        session, contest=None,
+        skip_submissions=False, skip_user_tests=False, skip_print_jobs=False,
+        skip_generated=False):
+    """Enumerate all the files (by digest) referenced by the
+    contest.
+
+    return (set): a set of strings, the digests of the file
+                  referenced in the contest.
+
+    """
+    query = enumerate_files_query(
+        session, contest,
+        skip_submissions=skip_submissions, skip_user_tests=skip_user_tests,
+        skip_print_jobs=skip_print_jobs, skip_generated=skip_generated)
     # union(...).execute() would be executed outside of the session.
-    digests = set(r[0] for r in session.execute(union(*queries)))
+    digests = set(r[0] for r in session.execute(query))
     digests.discard(Digest.TOMBSTONE)
     return digests
@@ -33,7 +33,10 @@ testcase".
 
 """
 
+import copy
 import logging
+import time
+from collections import OrderedDict
 
 from cms.db import Dataset, Evaluation, Executable, File, Manager, Submission, \
     UserTest, UserTestExecutable
@@ -58,6 +61,104 @@ def _is_contest_multithreaded(contest):
                for l in contest.languages)
 
 
+def _dataset_template(dataset):
+    """Return the data of the jobs that depends only on the dataset.
+
+    dataset (Dataset): the dataset.
+
+    return ({string: object}): the task type (with its parameters),
+        the limits, the managers and whether the sandbox should allow
+        multithreading, keyed as the arguments of the Job
+        constructors, plus the digests of input and output of each
+        testcase (under "testcases").
+
+    """
+    return {
+        "task_type": dataset.task_type,
+        "task_type_parameters": dataset.task_type_parameters,
+        "multithreaded_sandbox":
+            _is_contest_multithreaded(dataset.task.contest),
+        "time_limit": dataset.time_limit,
+        "memory_limit": dataset.memory_limit,
+        # Detached copies, so that the template can outlive the session.
+        "managers": dict((k, Manager(k, v.digest))
+                         for k, v in dataset.managers.items()),
+        "testcases": dict((codename, (testcase.input, testcase.output))
+                          for codename, testcase
+                          in dataset.testcases.items()),
+    }
+
+
+def _object_template(operation, object_, dataset):
+    """Return the data of the jobs that depends on the submitted object.
+
+    operation (ESOperation): an operation on object_ and dataset; only
+        its type is used.
+    object_ (Submission|UserTest): the object of the operation.
+    dataset (Dataset): the dataset of the operation.
+
+    return ({string: object}): the id, language, files and (for
+        evaluations) executables of the object; for user tests also
+        their managers and input.
+
+    """
+    template = {
+        "id": object_.id,
+        "language": object_.language,
+        "files": dict((k, File(k, v.digest))
+                      for k, v in object_.files.items()),
+    }
+    if not operation.for_submission():
+        template["managers"] = dict((k, Manager(k, v.digest))
+                                    for k, v in object_.managers.items())
+        template["input"] = object_.input
+    if operation.type_ in (ESOperation.EVALUATION,
+                           ESOperation.USER_TEST_EVALUATION):
+        result = object_.get_result(dataset)
+        # This should have been created by now.
+        assert result is not None
+        template["executables"] = dict((k, Executable(k, v.digest))
+                                       for k, v in result.executables.items())
+    return template
+
+
+def _user_test_managers(dataset_template, user_test_template):
+    """Return the managers to give to the jobs of a user test.
+
+    These are the ones the user provided, plus those from the dataset
+    that the task type cannot take from the user.
+
+    dataset_template ({string: object}): see _dataset_template.
+    user_test_template ({string: object}): see _object_template.
+
+    return ({string: Manager}): the managers.
+
+    """
+    # Import late to avoid a circular dependency.
+    from cms.grading.tasktypes import get_task_type
+
+    try:
+        language = get_language(user_test_template["language"])
+    except KeyError:
+        language = None
+    managers = dict(user_test_template["managers"])
+    dataset_managers = dataset_template["managers"]
+    task_type = get_task_type(dataset_template["task_type"],
+                              dataset_template["task_type_parameters"])
+    auto_managers = task_type.get_auto_managers()
+    if auto_managers is not None:
+        for manager_filename in auto_managers:
+            if manager_filename.endswith(".%l") and language is not None:
+                manager_filename = manager_filename.replace(
+                    ".%l", language.source_extension)
+            managers[manager_filename] = dataset_managers[manager_filename]
+    else:
+        for manager_filename in dataset_managers:
+            if manager_filename not in managers:
+                managers[manager_filename] = dataset_managers[manager_filename]
+    return managers
+
+
 class Job:
     """Base class for all jobs.
 
@@ -220,15 +321,37 @@ class Job:
                          operation.dataset_id, dataset.id)
             raise ValueError("Dataset mismatch while building job.")
 
+        return Job.from_templates(
+            operation, _dataset_template(dataset),
+            _object_template(operation, object_, dataset))
+
+    @staticmethod
+    def from_templates(operation, dataset_template, object_template):
+        """Produce the job for the operation from the cached data.
+
+        operation (ESOperation): the operation to use.
+        dataset_template ({string: object}): the data of the dataset
+            of the operation (see JobTemplates).
+        object_template ({string: object}): the data of the submission
+            or user test of the operation (see JobTemplates).
+
+        return (Job|None): the job encoding of the operation, as
+            understood by Workers and TaskTypes.
+
+        """
         job = None
         if operation.type_ == ESOperation.COMPILATION:
-            job = CompilationJob.from_submission(operation, object_, dataset)
+            job = CompilationJob._from_submission_templates(
+                operation, dataset_template, object_template)
         elif operation.type_ == ESOperation.EVALUATION:
-            job = EvaluationJob.from_submission(operation, object_, dataset)
+            job = EvaluationJob._from_submission_templates(
+                operation, dataset_template, object_template)
         elif operation.type_ == ESOperation.USER_TEST_COMPILATION:
-            job = CompilationJob.from_user_test(operation, object_, dataset)
+            job = CompilationJob._from_user_test_templates(
+                operation, dataset_template, object_template)
         elif operation.type_ == ESOperation.USER_TEST_EVALUATION:
-            job = EvaluationJob.from_user_test(operation, object_, dataset)
+            job = EvaluationJob._from_user_test_templates(
+                operation, dataset_template, object_template)
         return job
 
 
@@ -295,19 +418,23 @@ class CompilationJob(Job):
                          "but the operation is %s.", operation.type_)
             raise ValueError("Operation is not a compilation")
 
-        multithreaded = _is_contest_multithreaded(submission.task.contest)
+        return CompilationJob._from_submission_templates(
+            operation, _dataset_template(dataset),
+            _object_template(operation, submission, dataset))
 
-        # dict() is required to detach the dictionary that gets added
-        # to the Job from the control of SQLAlchemy
+    @staticmethod
+    def _from_submission_templates(operation, dataset_t, submission_t):
+        # dict() is required to make the job own its dictionaries, as
+        # the templates are shared.
         return CompilationJob(
             operation=operation,
-            task_type=dataset.task_type,
-            task_type_parameters=dataset.task_type_parameters,
-            language=submission.language,
-            multithreaded_sandbox=multithreaded,
-            files=dict(submission.files),
-            managers=dict(dataset.managers),
-            info="compile submission %d" % (submission.id)
+            task_type=dataset_t["task_type"],
+            task_type_parameters=dataset_t["task_type_parameters"],
+            language=submission_t["language"],
+            multithreaded_sandbox=dataset_t["multithreaded_sandbox"],
+            files=dict(submission_t["files"]),
+            managers=dict(dataset_t["managers"]),
+            info="compile submission %d" % (submission_t["id"])
         )
 
     def to_submission(self, sr):
@@ -354,39 +481,21 @@ class CompilationJob(Job):
                          operation.type_)
             raise ValueError("Operation is not a user test compilation")
 
-        multithreaded = _is_contest_multithreaded(user_test.task.contest)
-
-        # Add the managers to be got from the Task.
-        # dict() is required to detach the dictionary that gets added
-        # to the Job from the control of SQLAlchemy
-        try:
-            language = get_language(user_test.language)
-        except KeyError:
-            language = None
-        managers = dict(user_test.managers)
-        task_type = dataset.task_type_object
-        auto_managers = task_type.get_auto_managers()
-        if auto_managers is not None:
-            for manager_filename in auto_managers:
-                if manager_filename.endswith(".%l") and language is not None:
-                    manager_filename = manager_filename.replace(
-                        ".%l", language.source_extension)
-                managers[manager_filename] = dataset.managers[manager_filename]
-        else:
-            for manager_filename in dataset.managers:
-                if manager_filename not in managers:
-                    managers[manager_filename] = \
-                        dataset.managers[manager_filename]
+        return CompilationJob._from_user_test_templates(
+            operation, _dataset_template(dataset),
+            _object_template(operation, user_test, dataset))
 
+    @staticmethod
+    def _from_user_test_templates(operation, dataset_t, user_test_t):
         return CompilationJob(
             operation=operation,
-            task_type=dataset.task_type,
-            task_type_parameters=dataset.task_type_parameters,
-            language=user_test.language,
-            multithreaded_sandbox=multithreaded,
-            files=dict(user_test.files),
-            managers=managers,
-            info="compile user test %d" % (user_test.id)
+            task_type=dataset_t["task_type"],
+            task_type_parameters=dataset_t["task_type_parameters"],
+            language=user_test_t["language"],
+            multithreaded_sandbox=dataset_t["multithreaded_sandbox"],
+            files=dict(user_test_t["files"]),
+            managers=_user_test_managers(dataset_t, user_test_t),
+            info="compile user test %d" % (user_test_t["id"])
         )
 
     def to_user_test(self, ur):
@@ -510,32 +619,32 @@ class EvaluationJob(Job):
                          "but the operation is %s.", operation.type_)
             raise ValueError("Operation is not an evaluation")
 
-        multithreaded = _is_contest_multithreaded(submission.task.contest)
+        return EvaluationJob._from_submission_templates(
+            operation, _dataset_template(dataset),
+            _object_template(operation, submission, dataset))
 
-        submission_result = submission.get_result(dataset)
-        # This should have been created by now.
-        assert submission_result is not None
-
-        testcase = dataset.testcases[operation.testcase_codename]
+    @staticmethod
+    def _from_submission_templates(operation, dataset_t, submission_t):
+        input_, output = dataset_t["testcases"][operation.testcase_codename]
 
         info = "evaluate submission %d on testcase %s" % \
-            (submission.id, testcase.codename)
+            (submission_t["id"], operation.testcase_codename)
 
-        # dict() is required to detach the dictionary that gets added
-        # to the Job from the control of SQLAlchemy
+        # dict() is required to make the job own its dictionaries, as
+        # the templates are shared.
         return EvaluationJob(
             operation=operation,
-            task_type=dataset.task_type,
-            task_type_parameters=dataset.task_type_parameters,
-            language=submission.language,
-            multithreaded_sandbox=multithreaded,
-            files=dict(submission.files),
-            managers=dict(dataset.managers),
-            executables=dict(submission_result.executables),
-            input=testcase.input,
-            output=testcase.output,
-            time_limit=dataset.time_limit,
-            memory_limit=dataset.memory_limit,
+            task_type=dataset_t["task_type"],
+            task_type_parameters=dataset_t["task_type_parameters"],
+            language=submission_t["language"],
+            multithreaded_sandbox=dataset_t["multithreaded_sandbox"],
+            files=dict(submission_t["files"]),
+            managers=dict(dataset_t["managers"]),
+            executables=dict(submission_t["executables"]),
+            input=input_,
+            output=output,
+            time_limit=dataset_t["time_limit"],
+            memory_limit=dataset_t["memory_limit"],
             info=info
         )
 
@@ -578,44 +687,25 @@ class EvaluationJob(Job):
                          operation.type_)
             raise ValueError("Operation is not a user test evaluation")
 
-        multithreaded = _is_contest_multithreaded(user_test.task.contest)
-
-        user_test_result = user_test.get_result(dataset)
-        # This should have been created by now.
-        assert user_test_result is not None
-
-        # Add the managers to be got from the Task.
-        # dict() is required to detach the dictionary that gets added
-        # to the Job from the control of SQLAlchemy
-        language = get_language(user_test.language)
-        managers = dict(user_test.managers)
-        task_type = dataset.task_type_object
-        auto_managers = task_type.get_auto_managers()
-        if auto_managers is not None:
-            for manager_filename in auto_managers:
-                if manager_filename.endswith(".%l") and language is not None:
-                    manager_filename = manager_filename.replace(
-                        ".%l", language.source_extension)
-                managers[manager_filename] = dataset.managers[manager_filename]
-        else:
-            for manager_filename in dataset.managers:
-                if manager_filename not in managers:
-                    managers[manager_filename] = \
-                        dataset.managers[manager_filename]
+        return EvaluationJob._from_user_test_templates(
+            operation, _dataset_template(dataset),
+            _object_template(operation, user_test, dataset))
 
+    @staticmethod
+    def _from_user_test_templates(operation, dataset_t, user_test_t):
         return EvaluationJob(
             operation=operation,
-            task_type=dataset.task_type,
-            task_type_parameters=dataset.task_type_parameters,
-            language=user_test.language,
-            multithreaded_sandbox=multithreaded,
-            files=dict(user_test.files),
-            managers=managers,
-            executables=dict(user_test_result.executables),
-            input=user_test.input,
-            time_limit=dataset.time_limit,
-            memory_limit=dataset.memory_limit,
-            info="evaluate user test %d" % (user_test.id),
+            task_type=dataset_t["task_type"],
+            task_type_parameters=dataset_t["task_type_parameters"],
+            language=user_test_t["language"],
+            multithreaded_sandbox=dataset_t["multithreaded_sandbox"],
+            files=dict(user_test_t["files"]),
+            managers=_user_test_managers(dataset_t, user_test_t),
+            executables=dict(user_test_t["executables"]),
+            input=user_test_t["input"],
+            time_limit=dataset_t["time_limit"],
+            memory_limit=dataset_t["memory_limit"],
+            info="evaluate user test %d" % (user_test_t["id"]),
             get_output=True,
             only_execution=True
         )
@@ -643,35 +733,181 @@ class EvaluationJob(Job):
         ur.output = self.user_output
 
 
+class JobTemplates:
+    """Cache of the data of the jobs shared by many operations.
+
+    All the jobs of a dataset share the task type, the limits and the
+    managers, and those of a submission also share language, files
+    and executables. ES keeps this data here, as plain "templates"
+    detached from the DB, so that building the job of an operation
+    requires no DB access if its dataset and its submission or user
+    test were seen recently (as is the case for the evaluations on
+    all the testcases of a submission).
+
+    The templates of a dataset are discarded when invalidate is called
+    for it, which AWS triggers (through ES) whenever it changes the
+    dataset, and all of them when submissions are invalidated. As a
+    backstop for changes made without AWS (for example by the
+    importers), templates are also discarded after MAX_AGE seconds.
+
+    """
+
+    MAX_AGE = 60.0
+    MAX_OBJECTS = 1000
+
+    def __init__(self):
+        # Map dataset ids to tuples (time of creation, template).
+        self._datasets = dict()
+        # Map tuples (operation type, object id, dataset id) to tuples
+        # (time of creation, template), least recently used first.
+        self._objects = OrderedDict()
+
+    def invalidate(self, dataset_id=None):
+        """Forget the templates of a dataset, or all of them.
+
+        dataset_id (int|None): the id of the dataset whose templates
+            (including those of the submissions and user tests on it)
+            are to be forgotten, or None to forget all templates.
+
+        """
+        if dataset_id is None:
+            self._datasets.clear()
+            self._objects.clear()
+            return
+        self._datasets.pop(dataset_id, None)
+        for key in [key for key in self._objects if key[2] == dataset_id]:
+            del self._objects[key]
+
+    def _lookup(self, entries, key):
+        """Return the template for key, if present and fresh.
+
+        entries ({object: (float, {string: object})}): the cache.
+        key (object): the key of the template.
+
+        return ({string: object}|None): the template, or None.
+
+        """
+        entry = entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.MAX_AGE:
+            return None
+        return entry[1]
+
+    def get_dataset_template(self, dataset_id, session):
+        """Return the template of a dataset.
+
+        dataset_id (int): the id of the dataset.
+        session (Session): the session to use, if the dataset has to
+            be loaded.
+
+        return ({string: object}): the template.
+
+        """
+        template = self._lookup(self._datasets, dataset_id)
+        if template is None:
+            dataset = Dataset.get_from_id(dataset_id, session)
+            template = _dataset_template(dataset)
+            self._datasets[dataset_id] = (time.monotonic(), template)
+        return template
+
+    def get_object_template(self, operation, session):
+        """Return the template of the submission or user test.
+
+        operation (ESOperation): an operation on the object.
+        session (Session): the session to use, if the object has to be
+            loaded.
+
+        return ({string: object}): the template.
+
+        """
+        key = (operation.type_, operation.object_id, operation.dataset_id)
+        template = self._lookup(self._objects, key)
+        if template is not None:
+            self._objects.move_to_end(key)
+            return template
+
+        # The get_from_id method loads from the instance map (if the
+        # object exists there), which thus acts as a cache.
+        if operation.for_submission():
+            object_ = Submission.get_from_id(operation.object_id, session)
+        else:
+            object_ = UserTest.get_from_id(operation.object_id, session)
+        dataset = Dataset.get_from_id(operation.dataset_id, session)
+        template = _object_template(operation, object_, dataset)
+
+        self._objects[key] = (time.monotonic(), template)
+        self._objects.move_to_end(key)
+        while len(self._objects) > self.MAX_OBJECTS:
+            self._objects.popitem(last=False)
+        return template
+
+    def get_job(self, operation, session):
+        """Produce the job for the operation.
+
+        operation (ESOperation): the operation to use.
+        session (Session): the session to use, if data has to be
+            loaded.
+
+        return (Job): the job encoding of the operation.
+
+        """
+        return Job.from_templates(
+            operation,
+            self.get_dataset_template(operation.dataset_id, session),
+            self.get_object_template(operation, session))
+
+
 class JobGroup:
-    """A simple collection of jobs."""
+    """A simple collection of jobs.
+
+    When exported, the items that have the same value in all the jobs
+    (usually the task type, the managers, the files...) are written
+    only once, in the "common" dictionary, instead of once per job.
+
+    """
 
     def __init__(self, jobs=None):
         self.jobs = jobs if jobs is not None else []
 
     def export_to_dict(self):
+        jobs = [job.export_to_dict() for job in self.jobs]
+        common = {}
+        if len(jobs) > 1:
+            for key, value in jobs[0].items():
+                if all(key in job and job[key] == value for job in jobs[1:]):
+                    common[key] = value
+            for job in jobs:
+                for key in common:
+                    del job[key]
         return {
-            "jobs": [job.export_to_dict() for job in self.jobs],
+            "common": common,
+            "jobs": jobs,
         }
 
     @classmethod
     def import_from_dict(cls, data):
+        common = data.get("common", {})
         jobs = []
         for job in data["jobs"]:
-            jobs.append(Job.import_from_dict_with_type(job))
+            # Each job needs its own copy, as jobs are modified while
+            # they are executed.
+            job_data = copy.deepcopy(common)
+            job_data.update(job)
+            jobs.append(Job.import_from_dict_with_type(job_data))
         return cls(jobs)
 
     @staticmethod
-    def from_operations(operations, session):
-        jobs = []
-        for operation in operations:
-            # The get_from_id method loads from the instance map (if the
-            # object exists there), which thus acts as a cache.
-            if operation.for_submission():
-                object_ = Submission.get_from_id(operation.object_id, session)
-            else:
-                object_ = UserTest.get_from_id(operation.object_id, session)
-            dataset = Dataset.get_from_id(operation.dataset_id, session)
-
-            jobs.append(Job.from_operation(operation, object_, dataset))
-        return JobGroup(jobs)
+    def from_operations(operations, session, templates=None):
+        """Produce the group of jobs for the operations.
+
+        operations ([ESOperation]): the operations.
+        session (Session): the session to use to load data.
+        templates (JobTemplates|None): the templates to use; if None,
+            templates are shared only among these operations.
+
+        return (JobGroup): the jobs.
+
+        """
+        if templates is None:
+            templates = JobTemplates()
+        return JobGroup([templates.get_job(operation, session)
+                         for operation in operations])
@@ -194,11 +194,17 @@ class SandboxBase(metaclass=ABCMeta):
         name (string|None): name of the sandbox, which might appear in the
             path and in system logs.
         temp_dir (unicode|None): temporary directory to use; if None, use the
-            default temporary directory specified in the configuration.
+            tmpfs directory specified in the configuration, if any, or the
+            default temporary directory.
 
         """
         self.file_cacher = file_cacher
         self.name = name if name is not None else "unnamed"
+        # Whether the files of the sandbox are in RAM.
+        self.tmpfs = temp_dir is None and config.sandbox_tmpfs_dir is not None
+        if self.tmpfs:
+            temp_dir = config.sandbox_tmpfs_dir
+            os.makedirs(temp_dir, exist_ok=True)
         self.temp_dir = temp_dir if temp_dir is not None else config.temp_dir
 
         self.cmd_file = "commands.log"
@@ -252,6 +258,22 @@ class SandboxBase(metaclass=ABCMeta):
             mem_str = "(memory usage unknown)"
         return "[%s - %s]" % (time_str, mem_str)
 
+    def get_disk_usage(self):
+        """Return the space used by the files of the sandbox.
+
+        return (int): the space allocated to the files and directories
+            under the root path, in bytes.
+
+        """
+        usage = 0
+        for dirpath, dirnames, filenames in os.walk(self.get_root_path()):
+            for name in dirnames + filenames:
+                try:
+                    usage += os.lstat(os.path.join(dirpath, name)).st_blocks
+                except OSError:
+                    pass  # Deleted meanwhile.
+        return usage * 512
+
     @abstractmethod
     def get_root_path(self):
         """Return the toplevel path of the sandbox.
@@ -951,7 +973,9 @@ class IsolateSandbox(SandboxBase):
             dest = src
         if ignore_if_not_existing and not os.path.exists(src):
             return
-        self.dirs.append((src, dest, options))
+        # Setups can be repeated (e.g., for the steps of a compilation).
+        if (src, dest, options) not in self.dirs:
+            self.dirs.append((src, dest, options))
 
     def maybe_add_mapped_directory(self, src, dest=None, options=None):
         """Same as add_mapped_directory, with ignore_if_not_existing."""
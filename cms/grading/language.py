@@ -98,6 +98,31 @@ class Language(metaclass=ABCMeta):
         return self.object_extensions[0] \
             if len(self.object_extensions) > 0 else None
 
+    @property
+    def precompiled_header_extension(self):
+        """Extension of the precompiled headers, or None if the language
+        does not support them.
+
+        A header precompiled to its filename followed by this extension
+        is used by the compiler in place of the header, when they are in
+        the same directory.
+
+        """
+        return None
+
+    @property
+    def extra_executable_filenames(self):
+        """Files that the compilation may produce besides the executable.
+
+        Those produced are stored as executables of the submission (or
+        user test), and put in the evaluation sandbox together with the
+        executable. They are meant for data that does not depend on the
+        submission, e.g., caches used to start the runtime faster: as
+        the files are stored by digest, identical ones are stored once.
+
+        """
+        return []
+
     @abstractmethod
     def get_compilation_commands(self,
                                  source_filenames, executable_filename,
@@ -124,6 +149,26 @@ class Language(metaclass=ABCMeta):
         """
         pass
 
+    def get_precompiled_header_commands(self, header_filenames,
+                                        for_evaluation=True):
+        """Return the commands to precompile some headers.
+
+        Each header is precompiled to its filename followed by
+        precompiled_header_extension. The options must be the same as
+        those of get_compilation_commands with the same for_evaluation,
+        otherwise the compiler would ignore the precompiled headers.
+
+        header_filenames ([string]): the filenames of the headers.
+        for_evaluation (bool): if True, define EVAL during the
+            precompilation; defaults to True.
+
+        return ([[string]]): a list of commands, each a list of
+            strings to be passed to subprocess; empty if the language
+            does not support precompiled headers.
+
+        """
+        return []
+
     @abstractmethod
     def get_evaluation_commands(
             self, executable_filename, main=None, args=None):
@@ -141,6 +186,34 @@ class Language(metaclass=ABCMeta):
         """
         pass
 
+    def prepare_evaluation_sandbox(self, sandbox, executable_filename):
+        """Prepare a sandbox where the evaluation commands will run.
+
+        Called after the executable has been put in the sandbox and
+        before the evaluation commands are run, so the time spent here
+        is not accounted to the submission.
+
+        sandbox (Sandbox): the sandbox.
+        executable_filename (string): the name of the executable.
+
+        return ([string]): the inner paths that the evaluation commands
+            need to write, in addition to those of the task type.
+
+        """
+        return []
+
+    def get_startup_time(self, sandbox):
+        """Return how long the runtime of the language took to start.
+
+        sandbox (Sandbox): the sandbox where the evaluation commands
+            ran, prepared by prepare_evaluation_sandbox.
+
+        return (float|None): the startup time of the last evaluation
+            command in seconds, or None if it is not known.
+
+        """
+        return None
+
     # It's sometimes handy to use Language objects in sets or as dict
     # keys. Since they have no state (they are just collections of
     # constants and static methods) and are designed to be used as
@@ -51,14 +51,33 @@ class Cpp14Gpp(CompiledLanguage):
         """See Language.object_extensions."""
         return [".o"]
 
+    @property
+    def precompiled_header_extension(self):
+        """See Language.precompiled_header_extension."""
+        return ".gch"
+
+    @staticmethod
+    def _get_options(for_evaluation):
+        """Return the options shared by compilation and precompilation."""
+        options = []
+        if for_evaluation:
+            options += ["-DEVAL"]
+        options += ["-std=gnu++14", "-O2", "-pipe"]
+        return options
+
     def get_compilation_commands(self,
                                  source_filenames, executable_filename,
                                  for_evaluation=True):
         """See Language.get_compilation_commands."""
         command = ["/usr/bin/g++"]
-        if for_evaluation:
-            command += ["-DEVAL"]
-        command += ["-std=gnu++14", "-O2", "-pipe", "-static",
-                    "-s", "-o", executable_filename]
+        command += self._get_options(for_evaluation)
+        command += ["-static", "-s", "-o", executable_filename]
         command += source_filenames
         return [command]
+
+    def get_precompiled_header_commands(self, header_filenames,
+                                        for_evaluation=True):
+        """See Language.get_precompiled_header_commands."""
+        return [["/usr/bin/g++"] + self._get_options(for_evaluation)
+                + ["-x", "c++-header", "-o", filename + ".gch", filename]
+                for filename in header_filenames]
@@ -21,8 +21,10 @@ in the system.
 
 """
 
+import re
 from shlex import quote as shell_quote
 
+from cms import config
 from cms.grading import Language
 
 
@@ -37,6 +39,18 @@ class JavaJDK(Language):
 
     USE_JAR = True
 
+    # Name of the class-data sharing archive, stored as an executable
+    # besides the jar.
+    CDS_ARCHIVE = "cms.jsa"
+    # Name of the file where the JVM logs the duration of its startup.
+    STARTUP_LOG = "cms_startup.log"
+
+    # Options of the JVM affecting the layout of the classes, that must
+    # be the same when dumping and when using an archive.
+    JVM_OPTIONS = ["-Xmx512M", "-XX:+UseSerialGC"]
+
+    _STARTUP_TIME_RE = re.compile(br"Create VM, ([0-9.]+) secs")
+
     @property
     def name(self):
         """See Language.name."""
@@ -52,6 +66,17 @@ class JavaJDK(Language):
         """See Language.requires_multithreading."""
         return True
 
+    @property
+    def extra_executable_filenames(self):
+        """See Language.extra_executable_filenames."""
+        # Also when class-data sharing is disabled, for the archives
+        # produced before.
+        return [JavaJDK.CDS_ARCHIVE] if JavaJDK.USE_JAR else []
+
+    @staticmethod
+    def _uses_class_data_sharing():
+        return JavaJDK.USE_JAR and config.java_class_data_sharing
+
     def get_compilation_commands(self,
                                  source_filenames, executable_filename,
                                  for_evaluation=True):
@@ -64,13 +89,53 @@ class JavaJDK(Language):
                            " ".join(["jar", "cf",
                                      shell_quote(executable_filename),
                                      "*.class"])]
-            return [compile_command, jar_command]
+            commands = [compile_command, jar_command]
+            if JavaJDK._uses_class_data_sharing():
+                commands.append(
+                    JavaJDK._get_archive_command(executable_filename))
+            return commands
         else:
             zip_command = ["/bin/sh", "-c",
                            " ".join(["zip", "-r", "-", "*.class", ">",
                                      shell_quote(executable_filename)])]
             return [compile_command, zip_command]
 
+    @staticmethod
+    def _get_archive_command(executable_filename):
+        """Return the command creating the CDS archive for a jar.
+
+        The archive contains the classes of the default class list of
+        the JDK (those in its default archive) and the classes of the
+        JDK that the jar references (found statically with jdeps, so
+        that the submission is not run). It contains no class of the
+        submission, so it stays valid when the jar is copied (changing
+        its modification time), and the class list is sorted, so that
+        the submissions using the same classes of the JDK get the same
+        archive, which is then stored once. Any failure leaves no
+        archive, as the JVM then just starts without it.
+
+        executable_filename (string): the name of the jar.
+
+        return ([string]): the command.
+
+        """
+        jar = shell_quote(executable_filename)
+        script = " ".join([
+            "java_home=$(dirname \"$(dirname \"$(readlink -f "
+            "/usr/bin/java)\")\") &&",
+            "{ cat \"$java_home/lib/classlist\";",
+            "jdeps -verbose:class", jar,
+            "| awk '$2 == \"->\" && NF == 4 {print $3}' | tr . /; }",
+            "2> /dev/null | LC_ALL=C sort -u > cms.classlist &&",
+            "/usr/bin/java -Xshare:dump",
+            "-XX:SharedClassListFile=cms.classlist",
+            "-XX:SharedArchiveFile=%s" % JavaJDK.CDS_ARCHIVE]
+            + JavaJDK.JVM_OPTIONS + [
+            "> /dev/null 2>&1 ||",
+            "rm -f", JavaJDK.CDS_ARCHIVE, ";",
+            "true"])
+        return ["/bin/sh", "-c", script]
+
     def get_evaluation_commands(
             self, executable_filename, main=None, args=None):
         """See Language.get_evaluation_commands."""
@@ -78,14 +143,38 @@ class JavaJDK(Language):
         if JavaJDK.USE_JAR:
             # executable_filename is a jar file, main is the name of
             # the main java class
-            return [["/usr/bin/java", "-Deval=true", "-Xmx512M", "-Xss64M",
-                     # Additional parameters to increase speed and stability. Tuned for Java 8.
-                     # See also: https://wiki.ioinformatics.org/wiki/HostingAnIOI/TechnicalChecklist#Determinism
-                     "-Xbatch", "-XX:+UseSerialGC", "-XX:-TieredCompilation",
-                     "-XX:CICompilerCount=1", "-XX:CompileThreshold=2000", "-XX:-UsePerfData",
-                     "-cp", executable_filename, main] + args]
+            command = ["/usr/bin/java", "-Deval=true", "-Xmx512M", "-Xss64M",
+                       # Additional parameters to increase speed and stability. Tuned for Java 8.
+                       # See also: https://wiki.ioinformatics.org/wiki/HostingAnIOI/TechnicalChecklist#Determinism
+                       "-Xbatch", "-XX:+UseSerialGC", "-XX:-TieredCompilation",
+                       "-XX:CICompilerCount=1", "-XX:CompileThreshold=2000", "-XX:-UsePerfData"]
+            if JavaJDK._uses_class_data_sharing():
+                # With -Xshare:auto the JVM starts normally if the
+                # archive is missing or unusable.
+                command += [
+                    "-Xshare:auto",
+                    "-XX:SharedArchiveFile=%s" % JavaJDK.CDS_ARCHIVE,
+                    "-Xlog:startuptime:file=%s" % JavaJDK.STARTUP_LOG]
+            return [command + ["-cp", executable_filename, main] + args]
         else:
             unzip_command = ["/usr/bin/unzip", executable_filename]
             command = ["/usr/bin/java", "-Deval=true", "-Xmx512M", "-Xss64M",
                        main] + args
             return [unzip_command, command]
+
+    def prepare_evaluation_sandbox(self, sandbox, executable_filename):
+        """See Language.prepare_evaluation_sandbox."""
+        # The archive, if any, is already in the sandbox as an extra
+        # executable; the JVM just needs to write its log.
+        if not JavaJDK._uses_class_data_sharing():
+            return []
+        return [JavaJDK.STARTUP_LOG]
+
+    def get_startup_time(self, sandbox):
+        """See Language.get_startup_time."""
+        if not JavaJDK._uses_class_data_sharing() \
+                or not sandbox.file_exists(JavaJDK.STARTUP_LOG):
+            return None
+        match = JavaJDK._STARTUP_TIME_RE.search(
+            sandbox.get_file_to_string(JavaJDK.STARTUP_LOG, maxlen=None))
+        return float(match.group(1)) if match is not None else None
@@ -43,6 +43,10 @@ class GroupMin(ScoreTypeGroup):
         else:
             return N_("Partially correct")
 
+    def is_settled(self, outcomes, unused_parameter):
+        """See ScoreTypeGroup."""
+        return any(outcome <= 0.0 for outcome in outcomes)
+
     def reduce(self, outcomes, unused_parameter):
         """See ScoreTypeGroup."""
         return min(outcomes)
@@ -45,6 +45,10 @@ class GroupMul(ScoreTypeGroup):
         else:
             return N_("Partially correct")
 
+    def is_settled(self, outcomes, unused_parameter):
+        """See ScoreTypeGroup."""
+        return any(outcome == 0.0 for outcome in outcomes)
+
     def reduce(self, outcomes, unused_parameter):
         """See ScoreTypeGroup."""
         return reduce(lambda x, y: x * y, outcomes)
@@ -46,6 +46,11 @@ class GroupThreshold(ScoreTypeGroup):
         else:
             return N_("Not correct")
 
+    def is_settled(self, outcomes, parameter):
+        """See ScoreTypeGroup."""
+        threshold = parameter[2]
+        return not all(0 < outcome <= threshold for outcome in outcomes)
+
     def reduce(self, outcomes, parameter):
         """See ScoreTypeGroup."""
         threshold = parameter[2]
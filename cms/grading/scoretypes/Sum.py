@@ -38,6 +38,7 @@ class Sum(ScoreTypeAlone):
     N_("Execution time")
     N_("Memory used")
     N_("N/A")
+    N_("Not evaluated")
     TEMPLATE = """\
 <table class="testcase-list">
     <thead>
@@ -68,6 +69,8 @@ class Sum(ScoreTypeAlone):
         <tr class="correct">
             {% elif tc["outcome"] == "Not correct" %}
         <tr class="notcorrect">
+            {% elif tc["outcome"] == "Not evaluated" %}
+        <tr class="undefined">
             {% else %}
         <tr class="partiallycorrect">
             {% endif %}
@@ -127,8 +130,14 @@ class Sum(ScoreTypeAlone):
         public_score = 0.0
 
         for idx in indices:
-            this_score = float(evaluations[idx].outcome) * self.parameters
-            tc_outcome = self.get_public_outcome(this_score)
+            # Evaluations without outcome were skipped by ES (possibly
+            # with a different score type), they count as failed.
+            if evaluations[idx].outcome is None:
+                this_score = 0.0
+                tc_outcome = N_("Not evaluated")
+            else:
+                this_score = float(evaluations[idx].outcome) * self.parameters
+                tc_outcome = self.get_public_outcome(this_score)
             score += this_score
             testcases.append({
                 "idx": idx,
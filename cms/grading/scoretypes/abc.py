@@ -30,9 +30,12 @@ task.
 
 """
 
+import hashlib
+import json
 import logging
 import re
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 
 from cms import FEEDBACK_LEVEL_RESTRICTED
 from cms.locale import DEFAULT_TRANSLATION
@@ -55,6 +58,16 @@ class ScoreType(metaclass=ABCMeta):
 
     TEMPLATE = ""
 
+    # How many rendered score details are kept in memory.
+    DETAILS_CACHE_SIZE = 1000
+
+    # Compiled templates, by their source, shared by all score types
+    # (their objects are built often, e.g., once per CWS request).
+    _templates = dict()
+    # Rendered score details, by the key returned by _details_key,
+    # least recently used first.
+    _details_cache = OrderedDict()
+
     def __init__(self, parameters, public_testcases):
         """Initializer.
 
@@ -76,7 +89,39 @@ class ScoreType(metaclass=ABCMeta):
                 "Unable to instantiate score type (probably due to invalid "
                 "values for the score type parameters): %s." % e)
 
-        self.template = GLOBAL_ENVIRONMENT.from_string(self.TEMPLATE)
+        self.template = self.get_template()
+
+    @classmethod
+    def get_template(cls):
+        """Return the compiled TEMPLATE, compiling it only once.
+
+        return (Template): the template.
+
+        """
+        template = ScoreType._templates.get(cls.TEMPLATE)
+        if template is None:
+            template = GLOBAL_ENVIRONMENT.from_string(cls.TEMPLATE)
+            ScoreType._templates[cls.TEMPLATE] = template
+        return template
+
+    def _details_key(self, score_details, feedback_level, translation):
+        """Return the key of some rendered score details in the cache.
+
+        The details are identified by a digest of their content, so
+        that a new scoring of a submission result misses the cache,
+        while the same details shown to many users hit it.
+
+        score_details (object): the score details.
+        feedback_level (str): the level of details to show to users.
+        translation (Translation): the translation to use.
+
+        return (tuple): the key.
+
+        """
+        digest = hashlib.sha1(json.dumps(
+            score_details, sort_keys=True).encode("utf-8")).hexdigest()
+        return (self.TEMPLATE, digest, feedback_level,
+                translation.identifier)
 
     @staticmethod
     def format_score(score, max_score, unused_score_details,
@@ -128,7 +173,13 @@ class ScoreType(metaclass=ABCMeta):
             # FIXME we should provide to the template all the variables
             # of a typical CWS context as it's entitled to expect them.
             try:
-                return self.template.render(details=score_details,
+                key = self._details_key(
+                    score_details, feedback_level, translation)
+                html = ScoreType._details_cache.get(key)
+                if html is not None:
+                    ScoreType._details_cache.move_to_end(key)
+                    return html
+                html = self.template.render(details=score_details,
                                             feedback_level=feedback_level,
                                             translation=translation,
                                             gettext=_, ngettext=n_)
@@ -136,6 +187,10 @@ class ScoreType(metaclass=ABCMeta):
                 logger.error("Found an invalid score details string. "
                              "Try invalidating scores.")
                 return _("Score details temporarily unavailable.")
+            ScoreType._details_cache[key] = html
+            while len(ScoreType._details_cache) > self.DETAILS_CACHE_SIZE:
+                ScoreType._details_cache.popitem(last=False)
+            return html
 
     @abstractmethod
     def max_scores(self):
@@ -168,6 +223,20 @@ class ScoreType(metaclass=ABCMeta):
         """
         pass
 
+    def get_irrelevant_testcases(self, unused_outcomes):
+        """Return the testcases whose outcomes cannot change the score.
+
+        Used by ES to skip evaluations, when the dataset allows it.
+
+        unused_outcomes ({str: float}): the outcomes of the testcases
+            evaluated so far, by codename.
+
+        return ({str}): the codenames of the testcases, among those not
+            evaluated yet, that do not need to be evaluated.
+
+        """
+        return set()
+
 
 class ScoreTypeAlone(ScoreType):
     """Intermediate class to manage tasks where the score of a
@@ -203,6 +272,7 @@ class ScoreTypeGroup(ScoreTypeAlone):
     N_("Execution time")
     N_("Memory used")
     N_("N/A")
+    N_("Not evaluated")
     TEMPLATE = """\
 {% for st in details %}
     {% if "score_fraction" in st %}
@@ -264,6 +334,8 @@ class ScoreTypeGroup(ScoreTypeAlone):
                 <tr class="correct">
             {% elif tc["outcome"] == "Not correct" %}
                 <tr class="notcorrect">
+            {% elif tc["outcome"] == "Not evaluated" %}
+                <tr class="undefined">
             {% else %}
                 <tr class="partiallycorrect">
             {% endif %}
@@ -372,6 +444,23 @@ class ScoreTypeGroup(ScoreTypeAlone):
 
         return score, public_score, headers
 
+    def get_irrelevant_testcases(self, outcomes):
+        """See ScoreType.get_irrelevant_testcases.
+
+        A testcase is irrelevant when all the subtasks containing it
+        are settled (see is_settled).
+
+        """
+        irrelevant = set(self.public_testcases.keys()) - set(outcomes.keys())
+        targets = self.retrieve_target_testcases()
+        for st_idx, parameter in enumerate(self.parameters):
+            target = targets[st_idx]
+            if not self.is_settled(
+                    [outcomes[tc_idx] for tc_idx in target
+                     if tc_idx in outcomes], parameter):
+                irrelevant.difference_update(target)
+        return irrelevant
+
     def compute_score(self, submission_result):
         """See ScoreType.compute_score."""
         # Actually, this means it didn't even compile!
@@ -394,8 +483,13 @@ class ScoreTypeGroup(ScoreTypeAlone):
             public_testcases = []
             previous_tc_all_correct = True
             for tc_idx in target:
-                tc_outcome = self.get_public_outcome(
-                    float(evaluations[tc_idx].outcome), parameter)
+                # Evaluations without outcome were skipped by ES, as
+                # they could not change the score.
+                if evaluations[tc_idx].outcome is None:
+                    tc_outcome = N_("Not evaluated")
+                else:
+                    tc_outcome = self.get_public_outcome(
+                        float(evaluations[tc_idx].outcome), parameter)
 
                 testcases.append({
                     "idx": tc_idx,
@@ -414,9 +508,15 @@ class ScoreTypeGroup(ScoreTypeAlone):
                 else:
                     public_testcases.append({"idx": tc_idx})
 
-            st_score_fraction = self.reduce(
-                [float(evaluations[tc_idx].outcome) for tc_idx in target],
-                parameter)
+            # Skipped evaluations count as failed: they were skipped
+            # because the subtask was settled by a failure anyway, and
+            # the score type might have changed since then.
+            outcomes = [float(evaluations[tc_idx].outcome)
+                        if evaluations[tc_idx].outcome is not None
+                        else 0.0
+                        for tc_idx in target]
+            st_score_fraction = self.reduce(outcomes, parameter) \
+                if len(outcomes) > 0 else 0.0
             st_score = st_score_fraction * parameter[0]
 
             score += st_score
@@ -456,6 +556,19 @@ class ScoreTypeGroup(ScoreTypeAlone):
         """
         pass
 
+    def is_settled(self, unused_outcomes, unused_parameter):
+        """Return whether the score of a subtask is already determined.
+
+        unused_outcomes ([float]): the outcomes of the submission in
+            some of the testcases of the group.
+        unused_parameter (list): the parameters of the group.
+
+        return (bool): True if reduce returns the same value whatever
+            the outcomes of the other testcases of the group.
+
+        """
+        return False
+
     @abstractmethod
     def reduce(self, unused_outcomes, unused_parameter):
         """Return the score of a subtask given the outcomes.
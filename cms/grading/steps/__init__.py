@@ -23,6 +23,8 @@ from .evaluation import EVALUATION_MESSAGES, evaluation_step, \
     evaluation_step_after_run, evaluation_step_before_run, \
     human_evaluation_message
 from .messages import HumanMessage, MessageCollection
+from .precompiledheaders import PrecompiledHeaderCache, \
+    precompiled_headers_step
 from .stats import execution_stats, merge_execution_stats
 from .trusted import checker_step, extract_outcome_and_text, trusted_step
 from .whitediff import _WHITES, _white_diff, white_diff_step,\
@@ -38,6 +40,8 @@ __all__ = [
     "human_evaluation_message",
     # messages.py
     "HumanMessage", "MessageCollection",
+    # precompiledheaders.py
+    "PrecompiledHeaderCache", "precompiled_headers_step",
     # stats_test.py
     "execution_stats", "merge_execution_stats",
     # trusted.py
@@ -64,6 +64,28 @@ COMPILATION_MESSAGES = MessageCollection([
 ])
 
 
+def prepare_compilation_sandbox(sandbox):
+    """Set up the sandbox for running compilers.
+
+    Make additional directories visible and set the limits for
+    compilations.
+
+    sandbox (Sandbox): the sandbox to set up, already created.
+
+    """
+    sandbox.add_mapped_directory("/etc")
+    # Directory required to be visible during a compilation with GHC.
+    # GHC looks for the Haskell's package database in
+    # "/usr/lib/ghc/package.conf.d" (already visible by isolate's default,
+    # but it is a symlink to "/var/lib/ghc/package.conf.d"
+    sandbox.maybe_add_mapped_directory("/var/lib/ghc")
+    sandbox.preserve_env = True
+    sandbox.max_processes = config.compilation_sandbox_max_processes
+    sandbox.timeout = config.compilation_sandbox_max_time_s
+    sandbox.wallclock_timeout = 2 * sandbox.timeout + 1
+    sandbox.address_space = config.compilation_sandbox_max_memory_kib * 1024
+
+
 def compilation_step(sandbox, commands):
     """Execute some compilation commands in the sandbox.
 
@@ -90,17 +112,7 @@ def compilation_step(sandbox, commands):
 
     """
     # Set sandbox parameters suitable for compilation.
-    sandbox.add_mapped_directory("/etc")
-    # Directory required to be visible during a compilation with GHC.
-    # GHC looks for the Haskell's package database in
-    # "/usr/lib/ghc/package.conf.d" (already visible by isolate's default,
-    # but it is a symlink to "/var/lib/ghc/package.conf.d"
-    sandbox.maybe_add_mapped_directory("/var/lib/ghc")
-    sandbox.preserve_env = True
-    sandbox.max_processes = config.compilation_sandbox_max_processes
-    sandbox.timeout = config.compilation_sandbox_max_time_s
-    sandbox.wallclock_timeout = 2 * sandbox.timeout + 1
-    sandbox.address_space = config.compilation_sandbox_max_memory_kib * 1024
+    prepare_compilation_sandbox(sandbox)
 
     # Run the compilation commands, copying stdout and stderr to stats.
     stats = generic_step(sandbox, commands, "compilation", collect_output=True)
@@ -79,6 +79,11 @@ EVALUATION_MESSAGES = MessageCollection([
                  N_("Execution failed because the return code was nonzero"),
                  N_("Your submission failed because it exited with a return "
                     "code different from 0.")),
+    HumanMessage("notevaluated",
+                 N_("Not evaluated"),
+                 N_("Your submission was not run on this testcase, because "
+                    "its outcome could not change the score of the "
+                    "subtasks containing it.")),
 ])
 
 
@@ -191,6 +196,10 @@ def evaluation_step_before_run(sandbox, command,
 
     # config.max_file_size is in KiB
     sandbox.fsize = config.max_file_size * 1024
+    # In a tmpfs, the files written take RAM as the memory of the
+    # program does, so each of them is bound by the memory limit too.
+    if sandbox.tmpfs and memory_limit is not None:
+        sandbox.fsize = min(sandbox.fsize, memory_limit)
 
     sandbox.stdin_file = stdin_redirect
     sandbox.stdout_file = stdout_redirect
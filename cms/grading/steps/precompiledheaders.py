@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Precompilation of the headers of the compilations.
+
+When a task provides headers (for example, the one of a grader or of a
+stub) the compilation of every submission parses them again, together
+with all the system headers they include, which for C++ can take most
+of the compilation time. Languages supporting it can precompile these
+headers once; the result is cached on the Worker's machine and copied
+in the sandbox of every later compilation with the same headers and
+options.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from cms import config
+from cms.grading.Sandbox import Sandbox
+from .compilation import prepare_compilation_sandbox
+from .utils import generic_step
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrecompiledHeaderCache:
+    """Cache of precompiled headers, shared by the Workers of a machine.
+
+    Each entry is a directory, containing the precompiled headers of a
+    compilation, named after a digest of everything that affects them:
+    the precompilation commands (hence the language and its options),
+    the names and digests of the headers (all of them, as they can
+    include each other) and the size and modification time of the
+    compilers, so that upgrading the toolchain invalidates the entries.
+
+    Entries are written atomically and never modified; the least
+    recently used ones are deleted when there are more than
+    MAX_ENTRIES.
+
+    """
+
+    MAX_ENTRIES = 64
+
+    def __init__(self, path=None):
+        """Initialization.
+
+        path (str|None): the directory of the cache; by default, pch
+            in the cache directory of CMS.
+
+        """
+        self.path = path if path is not None \
+            else os.path.join(config.cache_dir, "pch")
+
+    @staticmethod
+    def get_key(commands, headers):
+        """Return the key of the entry for a precompilation.
+
+        commands ([[str]]): the precompilation commands.
+        headers ({str: str}): the filenames and digests of the headers
+            available to the compilation.
+
+        return (str|None): the key, or None if a compiler could not be
+            found.
+
+        """
+        toolchain = []
+        for executable in sorted(set(command[0] for command in commands)):
+            try:
+                stat = os.stat(executable)
+            except OSError:
+                return None
+            toolchain.append([executable, stat.st_size, stat.st_mtime_ns])
+        data = json.dumps([commands, sorted(headers.items()), toolchain])
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def load(self, key, sandbox, filenames):
+        """Copy the precompiled headers of an entry in a sandbox.
+
+        key (str): the key of the entry.
+        sandbox (Sandbox): the sandbox where to copy them.
+        filenames ([str]): the filenames of the precompiled headers.
+
+        return (bool): whether the entry exists and was copied.
+
+        """
+        entry = os.path.join(self.path, key)
+        if not os.path.isdir(entry):
+            return False
+        copied = []
+        try:
+            for filename in filenames:
+                with open(os.path.join(entry, filename), "rb") as src, \
+                        sandbox.create_file(filename) as dst:
+                    copied.append(filename)
+                    shutil.copyfileobj(src, dst)
+            # Record the use, for the eviction.
+            os.utime(entry)
+        except OSError:
+            # Probably deleted meanwhile by another Worker.
+            logger.warning("Could not load precompiled headers %s.", key,
+                           exc_info=True)
+            for filename in copied:
+                sandbox.remove_file(filename)
+            return False
+        return True
+
+    def store(self, key, sandbox, filenames):
+        """Create an entry with the precompiled headers in a sandbox.
+
+        key (str): the key of the entry.
+        sandbox (Sandbox): the sandbox where they were precompiled.
+        filenames ([str]): the filenames of the precompiled headers.
+
+        """
+        os.makedirs(self.path, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=self.path, prefix=".")
+        try:
+            for filename in filenames:
+                with sandbox.get_file(filename) as src, \
+                        open(os.path.join(temp_dir, filename), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            os.rename(temp_dir, os.path.join(self.path, key))
+        except OSError:
+            # Also when another Worker stored the same entry meanwhile.
+            logger.debug("Could not store precompiled headers %s.", key,
+                         exc_info=True)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Delete the least recently used entries in excess."""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.startswith("."):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.MAX_ENTRIES, 0)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def precompiled_headers_step(sandbox, language, headers,
+                             for_evaluation=True):
+    """Put the precompiled headers of a compilation in the sandbox.
+
+    Does nothing unless compilation_precompiled_headers is enabled and
+    the language supports precompiled headers. Otherwise, take them
+    from the cache or, if missing, precompile them in the sandbox and
+    add them to the cache. The compiler uses a precompiled header only
+    if it is included before any other code in the source.
+
+    Failures are not fatal, as the compilation works (only more
+    slowly) without the precompiled headers.
+
+    sandbox (Sandbox): the sandbox of the compilation, already created
+        and containing the headers.
+    language (Language): the language of the compilation.
+    headers ({str: str}): the filenames and digests of the headers to
+        precompile.
+    for_evaluation (bool): as passed to get_compilation_commands.
+
+    return (bool): whether the precompiled headers are in the sandbox.
+
+    """
+    extension = language.precompiled_header_extension
+    if not config.compilation_precompiled_headers or extension is None \
+            or len(headers) == 0:
+        return False
+
+    header_filenames = sorted(headers)
+    filenames = [filename + extension for filename in header_filenames]
+    commands = language.get_precompiled_header_commands(
+        header_filenames, for_evaluation)
+    cache = PrecompiledHeaderCache()
+    key = cache.get_key(commands, headers)
+    if key is None:
+        logger.warning("Compiler not found, not precompiling headers.")
+        return False
+    if cache.load(key, sandbox, filenames):
+        logger.debug("Using cached precompiled headers %s.", key)
+        return True
+
+    prepare_compilation_sandbox(sandbox)
+    stats = generic_step(sandbox, commands, "precompilation")
+    if stats is None or stats["exit_status"] != Sandbox.EXIT_OK:
+        logger.warning("Could not precompile headers %s in sandbox %s, "
+                       "compiling without them.",
+                       ", ".join(header_filenames), sandbox.get_root_path())
+        for filename in filenames:
+            if sandbox.file_exists(filename):
+                sandbox.remove_file(filename)
+        return False
+    logger.info("Precompiled headers %s in %.3f seconds.",
+                ", ".join(header_filenames), stats["execution_time"])
+    cache.store(key, sandbox, filenames)
+    return True
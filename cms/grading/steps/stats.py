@@ -26,6 +26,12 @@
 """Computing and merging statistics about command executions in the sandbox."""
 
 from cms.grading.Sandbox import Sandbox
+from cms.metrics import registry
+
+
+# Upper bounds (in bytes) of the buckets of the histogram of the space
+# used by the sandboxes in RAM.
+DISK_USAGE_BUCKETS = tuple(2 ** i for i in range(20, 34, 2))
 
 
 # TODO: stats grew enough to justify having a proper object representing them.
@@ -49,6 +55,13 @@ def execution_stats(sandbox, collect_output=False):
     }
     if stats["exit_status"] == Sandbox.EXIT_SIGNAL:
         stats["signal"] = sandbox.get_killing_signal()
+    if sandbox.tmpfs:
+        stats["execution_disk_usage"] = sandbox.get_disk_usage()
+        registry.histogram(
+            "cms_sandbox_disk_usage_bytes",
+            "Space used by the sandboxes in RAM after their executions.",
+            buckets=DISK_USAGE_BUCKETS).observe(
+                stats["execution_disk_usage"])
 
     if collect_output:
         stats["stdout"] = sandbox.get_file_to_string(sandbox.stdout_file)\
@@ -74,8 +87,9 @@ def merge_execution_stats(first_stats, second_stats, concurrent=True):
         concurrent or not (see return value).
 
     return (dict): the merged statistics, using the following algorithm:
-        * execution times are added;
-        * memory usages are added (if concurrent) or max'd (if not);
+        * execution times (and startup times, if present) are added;
+        * memory usages (and disk usages, if present) are added (if
+            concurrent) or max'd (if not);
         * wall clock times are max'd (if concurrent) or added (if not);
         * exit_status and related values (signal) are from the first non-OK,
             if present, or OK;
@@ -91,6 +105,11 @@ def merge_execution_stats(first_stats, second_stats, concurrent=True):
 
     ret = first_stats.copy()
     ret["execution_time"] += second_stats["execution_time"]
+    if "execution_startup_time" in ret \
+            or "execution_startup_time" in second_stats:
+        ret["execution_startup_time"] = \
+            ret.get("execution_startup_time", 0.0) \
+            + second_stats.get("execution_startup_time", 0.0)
 
     if concurrent:
         ret["execution_wall_clock_time"] = max(
@@ -102,6 +121,12 @@ def merge_execution_stats(first_stats, second_stats, concurrent=True):
             second_stats["execution_wall_clock_time"]
         ret["execution_memory"] = max(ret["execution_memory"],
                                       second_stats["execution_memory"])
+    if "execution_disk_usage" in ret \
+            or "execution_disk_usage" in second_stats:
+        first_usage = ret.get("execution_disk_usage", 0)
+        second_usage = second_stats.get("execution_disk_usage", 0)
+        ret["execution_disk_usage"] = first_usage + second_usage \
+            if concurrent else max(first_usage, second_usage)
 
     if first_stats["exit_status"] == Sandbox.EXIT_OK:
         ret["exit_status"] = second_stats["exit_status"]
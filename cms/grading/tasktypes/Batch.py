@@ -27,10 +27,11 @@ from cms.grading.ParameterTypes import ParameterTypeCollection, \
     ParameterTypeChoice, ParameterTypeString
 from cms.grading.languagemanager import LANGUAGES, get_language
 from cms.grading.steps import compilation_step, evaluation_step, \
-    human_evaluation_message
+    human_evaluation_message, precompiled_headers_step
 from . import TaskType, \
     check_executables_number, check_files_number, check_manager_present, \
-    create_sandbox, delete_sandbox, eval_output, is_manager_for_compilation
+    create_sandbox, delete_sandbox, eval_output, get_extra_executables, \
+    is_header, is_manager_for_compilation, store_extra_executables
 
 
 logger = logging.getLogger(__name__)
@@ -208,10 +209,14 @@ class Batch(TaskType):
             filename = codename.replace(".%l", source_ext)
             filenames_to_compile.append(filename)
             filenames_and_digests_to_get[filename] = file_.digest
-        # Any other useful manager (just copy).
+        # Any other useful manager (just copy), keeping track of the
+        # headers to precompile them.
+        headers = {}
         for filename, manager in job.managers.items():
             if is_manager_for_compilation(filename, language):
                 filenames_and_digests_to_get[filename] = manager.digest
+                if is_header(filename, language):
+                    headers[filename] = manager.digest
 
         # Prepare the compilation command.
         executable_filename = self._executable_filename(job.files.keys())
@@ -225,6 +230,7 @@ class Batch(TaskType):
         # Copy required files in the sandbox (includes the grader if present).
         for filename, digest in filenames_and_digests_to_get.items():
             sandbox.create_file_from_storage(filename, digest)
+        precompiled_headers_step(sandbox, language, headers)
 
         # Run the compilation.
         box_success, compilation_success, text, stats = \
@@ -241,25 +247,28 @@ class Batch(TaskType):
                 "Executable %s for %s" % (executable_filename, job.info))
             job.executables[executable_filename] = \
                 Executable(executable_filename, digest)
+            store_extra_executables(job, sandbox, language)
 
         # Cleanup.
         delete_sandbox(sandbox, job.success, job.keep_sandbox)
 
     def evaluate(self, job, file_cacher):
         """See TaskType.evaluate."""
-        if not check_executables_number(job, 1):
+        language = get_language(job.language)
+        extra_executables = get_extra_executables(job, language)
+        if not check_executables_number(job, 1 + len(extra_executables)):
             return
 
         # Prepare the execution
-        executable_filename = next(iter(job.executables.keys()))
-        language = get_language(job.language)
+        executable_filename = next(filename for filename in job.executables
+                                   if filename not in extra_executables)
         main = self.GRADER_BASENAME \
             if self._uses_grader() else executable_filename
         commands = language.get_evaluation_commands(
             executable_filename, main=main)
-        executables_to_get = {
-            executable_filename: job.executables[executable_filename].digest
-        }
+        executables_to_get = dict(
+            (filename, executable.digest)
+            for filename, executable in job.executables.items())
         files_to_get = {
             self._actual_input: job.input
         }
@@ -286,6 +295,8 @@ class Batch(TaskType):
             sandbox.create_file_from_storage(filename, digest, executable=True)
         for filename, digest in files_to_get.items():
             sandbox.create_file_from_storage(filename, digest)
+        files_allowing_write += language.prepare_evaluation_sandbox(
+            sandbox, executable_filename)
 
         # Actually performs the execution
         box_success, evaluation_success, stats = evaluation_step(
@@ -297,6 +308,10 @@ class Batch(TaskType):
             stdin_redirect=stdin_redirect,
             stdout_redirect=stdout_redirect,
             multiprocess=job.multithreaded_sandbox)
+        if stats is not None:
+            startup_time = language.get_startup_time(sandbox)
+            if startup_time is not None:
+                stats["execution_startup_time"] = startup_time
 
         outcome = None
         text = None
@@ -32,10 +32,12 @@ from cms.grading.Sandbox import wait_without_std, Sandbox
 from cms.grading.languagemanager import LANGUAGES, get_language
 from cms.grading.steps import compilation_step, evaluation_step_before_run, \
     evaluation_step_after_run, extract_outcome_and_text, \
-    human_evaluation_message, merge_execution_stats, trusted_step
+    human_evaluation_message, merge_execution_stats, \
+    precompiled_headers_step, trusted_step
 from cms.grading.tasktypes import check_files_number
 from . import TaskType, check_executables_number, check_manager_present, \
-    create_sandbox, delete_sandbox, is_manager_for_compilation
+    create_sandbox, delete_sandbox, get_extra_executables, is_header, \
+    is_manager_for_compilation, store_extra_executables
 
 
 logger = logging.getLogger(__name__)
@@ -199,10 +201,14 @@ class Communication(TaskType):
             filename = codename.replace(".%l", source_ext)
             filenames_to_compile.append(filename)
             filenames_and_digests_to_get[filename] = file_.digest
-        # Any other useful manager (just copy).
+        # Any other useful manager (just copy), keeping track of the
+        # headers to precompile them.
+        headers = {}
         for filename, manager in job.managers.items():
             if is_manager_for_compilation(filename, language):
                 filenames_and_digests_to_get[filename] = manager.digest
+                if is_header(filename, language):
+                    headers[filename] = manager.digest
 
         # Prepare the compilation command
         executable_filename = self._executable_filename(job.files.keys())
@@ -216,6 +222,7 @@ class Communication(TaskType):
         # Copy all required files in the sandbox.
         for filename, digest in filenames_and_digests_to_get.items():
             sandbox.create_file_from_storage(filename, digest)
+        precompiled_headers_step(sandbox, language, headers)
 
         # Run the compilation.
         box_success, compilation_success, text, stats = \
@@ -232,16 +239,19 @@ class Communication(TaskType):
                 "Executable %s for %s" % (executable_filename, job.info))
             job.executables[executable_filename] = \
                 Executable(executable_filename, digest)
+            store_extra_executables(job, sandbox, language)
 
         # Cleanup.
         delete_sandbox(sandbox, job.success, job.keep_sandbox)
 
     def evaluate(self, job, file_cacher):
         """See TaskType.evaluate."""
-        if not check_executables_number(job, 1):
+        language = get_language(job.language)
+        extra_executables = get_extra_executables(job, language)
+        if not check_executables_number(job, 1 + len(extra_executables)):
             return
-        executable_filename = next(iter(job.executables.keys()))
-        executable_digest = job.executables[executable_filename].digest
+        executable_filename = next(filename for filename in job.executables
+                                   if filename not in extra_executables)
 
         # Make sure the required manager is among the job managers.
         if not check_manager_present(job, self.MANAGER_FILENAME):
@@ -283,8 +293,9 @@ class Communication(TaskType):
                         for i in indices]
         job.sandboxes.extend(s.get_root_path() for s in sandbox_user)
         for i in indices:
-            sandbox_user[i].create_file_from_storage(
-                executable_filename, executable_digest, executable=True)
+            for filename, executable in job.executables.items():
+                sandbox_user[i].create_file_from_storage(
+                    filename, executable.digest, executable=True)
 
         # Start the manager. Redirecting to stdin is unnecessary, but for
         # historical reasons the manager can choose to read from there
@@ -321,7 +332,6 @@ class Communication(TaskType):
             multiprocess=job.multithreaded_sandbox)
 
         # Start the user submissions compiled with the stub.
-        language = get_language(job.language)
         main = self.STUB_BASENAME if self._uses_stub() else executable_filename
         processes = [None for i in indices]
         for i in indices:
@@ -336,6 +346,8 @@ class Communication(TaskType):
                 stdout_redirect = sandbox_fifo_user_to_manager[i]
             if self.num_processes != 1:
                 args.append(str(i))
+            writable_files = language.prepare_evaluation_sandbox(
+                sandbox_user[i], executable_filename)
             commands = language.get_evaluation_commands(
                 executable_filename,
                 main=main,
@@ -351,6 +363,7 @@ class Communication(TaskType):
                 job.time_limit,
                 job.memory_limit,
                 dirs_map={fifo_dir[i]: (sandbox_fifo_dir[i], "rw")},
+                writable_files=writable_files,
                 stdin_redirect=stdin_redirect,
                 stdout_redirect=stdout_redirect,
                 multiprocess=job.multithreaded_sandbox)
@@ -364,6 +377,10 @@ class Communication(TaskType):
 
         # Coalesce the results of the user sandboxes.
         user_results = [evaluation_step_after_run(s) for s in sandbox_user]
+        for sandbox, (_, _, stats) in zip(sandbox_user, user_results):
+            startup_time = language.get_startup_time(sandbox)
+            if stats is not None and startup_time is not None:
+                stats["execution_startup_time"] = startup_time
         box_success_user = all(r[0] for r in user_results)
         evaluation_success_user = all(r[1] for r in user_results)
         stats_user = reduce(merge_execution_stats,
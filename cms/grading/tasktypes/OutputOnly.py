@@ -59,6 +59,9 @@ class OutputOnly(TaskType):
 
     # Other constants to specify the task type behaviour and parameters.
     ALLOW_PARTIAL_SUBMISSION = True
+    # Evaluating is just comparing an uploaded file with the correct
+    # output.
+    EVALUATE_TESTCASES_TOGETHER = True
 
     _EVALUATION = ParameterTypeChoice(
         "Output evaluation",
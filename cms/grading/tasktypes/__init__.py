@@ -24,10 +24,10 @@ import logging
 
 from cms import plugin_list
 from .abc import TaskType
-from .util import create_sandbox, delete_sandbox, \
+from .util import create_sandbox, delete_sandbox, is_header, \
     is_manager_for_compilation, set_configuration_error, \
     check_executables_number, check_files_number, check_manager_present, \
-    eval_output
+    eval_output, get_extra_executables, store_extra_executables
 
 
 logger = logging.getLogger(__name__)
@@ -38,10 +38,10 @@ __all__ = [
     # abc
     "TaskType",
     # util
-    "create_sandbox", "delete_sandbox",
+    "create_sandbox", "delete_sandbox", "is_header",
     "is_manager_for_compilation", "set_configuration_error",
     "check_executables_number", "check_files_number", "check_manager_present",
-    "eval_output",
+    "eval_output", "get_extra_executables", "store_extra_executables",
 ]
 
 
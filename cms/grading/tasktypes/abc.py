@@ -61,6 +61,12 @@ class TaskType(metaclass=ABCMeta):
     # Each item is an instance of TaskTypeParameter.
     ACCEPTED_PARAMETERS = []
 
+    # If EVALUATE_TESTCASES_TOGETHER is True, then the evaluations of a
+    # submission on the testcases are cheap and independent: ES sends
+    # all those it has queued to the same worker, in a single job
+    # group, and the worker executes them concurrently.
+    EVALUATE_TESTCASES_TOGETHER = False
+
     @classmethod
     def parse_handler(cls, handler, prefix):
         """Ensure that the parameters list template agrees with the
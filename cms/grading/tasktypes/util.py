@@ -34,6 +34,7 @@ import os
 import shutil
 
 from cms import config
+from cms.db import Executable
 from cms.grading import JobException
 from cms.grading.Job import CompilationJob, EvaluationJob
 from cms.grading.Sandbox import Sandbox
@@ -109,6 +110,19 @@ def is_manager_for_compilation(filename, language):
                for obj in language.object_extensions))
 
 
+def is_header(filename, language):
+    """Return whether a manager is a header of the language.
+
+    filename (str): filename of the manager.
+    language (Language): the programming language of the submission.
+
+    return (bool): whether the manager is a header.
+
+    """
+    return any(filename.endswith(header)
+               for header in language.header_extensions)
+
+
 def set_configuration_error(job, msg, *args):
     """Log a configuration error and set the correct results in the job.
 
@@ -154,6 +168,40 @@ def check_executables_number(job, n_executables):
     return True
 
 
+def store_extra_executables(job, sandbox, language):
+    """Store the extra executables produced by a compilation.
+
+    These are the files of Language.extra_executable_filenames that
+    the compilation commands created in the sandbox.
+
+    job (Job): the job currently running.
+    sandbox (Sandbox): the sandbox where the compilation ran.
+    language (Language): the language of the compilation.
+
+    """
+    for filename in language.extra_executable_filenames:
+        if sandbox.file_exists(filename):
+            digest = sandbox.get_file_to_storage(
+                filename, "Executable %s for %s" % (filename, job.info))
+            job.executables[filename] = Executable(filename, digest)
+
+
+def get_extra_executables(job, language):
+    """Return the extra executables of a job.
+
+    job (Job): the job currently running.
+    language (Language): the language of the job.
+
+    return ({string: Executable}): the executables of the job that
+        are in Language.extra_executable_filenames, to put in the
+        evaluation sandbox besides the actual executables.
+
+    """
+    return dict((filename, executable)
+                for filename, executable in job.executables.items()
+                if filename in language.extra_executable_filenames)
+
+
 def check_files_number(job, n_files, or_more=False):
     """Check that the required number of files were provided by the user.
 
@@ -24,10 +24,13 @@ __all__ = [
     "RPCError", "rpc_method", "RemoteServiceServer", "RemoteServiceClient",
     # service
     "Service",
+    # tracing
+    "LatencyHistogram", "Tracer", "end_span", "start_span", "tracer",
     # triggeredservice
     "Executor", "TriggeredService",
     # priorityqueue
-    "FakeQueueItem", "PriorityQueue", "QueueEntry", "QueueItem",
+    "FairPriorityQueue", "FakeQueueItem", "PriorityQueue", "QueueEntry",
+    "QueueItem",
     # web_rpc
     "RPCMiddleware",
     # web_service
@@ -38,9 +41,11 @@ __all__ = [
 # Instantiate or import these objects.
 
 from .PsycoGevent import make_psycopg_green
-from .priorityqueue import FakeQueueItem, PriorityQueue, QueueEntry, QueueItem
+from .priorityqueue import FairPriorityQueue, FakeQueueItem, \
+    PriorityQueue, QueueEntry, QueueItem
 from .rpc import RPCError, rpc_method, RemoteServiceServer, RemoteServiceClient
 from .service import Service
+from .tracing import LatencyHistogram, Tracer, end_span, start_span, tracer
 from .triggeredservice import Executor, TriggeredService
 from .web_rpc import RPCMiddleware
 from .web_service import WebService
@@ -38,6 +38,7 @@ together the three data point: item, priority, and timestamp.
 
 """
 
+from collections import OrderedDict
 from functools import total_ordering
 
 from gevent.event import Event
@@ -51,8 +52,13 @@ class QueueItem:
 
     Must be hashable.
 
+    Items that want their latency traced set trace to a dict (see
+    cms.io.tracing), excluded from equality and hashing.
+
     """
 
+    trace = None
+
     def to_dict(self):
         """Return a dict() representation of the object."""
         return self.__dict__
@@ -259,6 +265,52 @@ class PriorityQueue:
 
         return True
 
+    def push_many(self, entries):
+        """Push several items in the queue.
+
+        When many items are pushed with respect to the size of the
+        queue, the heap is rebuilt in linear time instead of lifting
+        each new item.
+
+        entries ([(QueueItem, int|None, datetime|None)]): the items to
+            add, each with its priority and timestamp (as in push).
+
+        return (int): the number of items actually pushed.
+
+        """
+        now = None
+        first = len(self._queue)
+        for item, priority, timestamp in entries:
+            if item in self._reverse:
+                continue
+            if priority is None:
+                priority = PriorityQueue.PRIORITY_MEDIUM
+            if timestamp is None:
+                if now is None:
+                    now = make_datetime()
+                timestamp = now
+
+            self._reverse[item] = len(self._queue)
+            self._queue.append(
+                QueueEntry(item, priority, timestamp, self._next_index))
+            self._next_index += 1
+
+        size = len(self._queue)
+        pushed = size - first
+        if pushed == 0:
+            return 0
+        if pushed * size.bit_length() > size:
+            for idx in range(size // 2 - 1, -1, -1):
+                self._down_heap(idx)
+        else:
+            for idx in range(first, size):
+                self._up_heap(idx)
+
+        # Signal to listener greenlets that there might be something.
+        self._event.set()
+
+        return pushed
+
     def top(self, wait=False):
         """Return the first element in the queue without extracting it.
 
@@ -362,6 +414,14 @@ class PriorityQueue:
         """
         return self.length() == 0
 
+    def entries(self):
+        """Return all the entries in the queue, in no particular order.
+
+        return ([QueueEntry]): the entries.
+
+        """
+        return list(self._queue)
+
     def get_status(self):
         """Return the content of the queue. Note that the order may be not
         correct, but the first element is the one at the top.
@@ -377,6 +437,312 @@ class PriorityQueue:
                 for entry in self._queue]
 
 
+class FairPriorityQueue:
+
+    """A priority queue sharing each priority level among flows.
+
+    It has the same interface as PriorityQueue, and items with
+    different priorities are extracted in the same order. Items with
+    the same priority, though, are not extracted in timestamp order,
+    but are grouped in flows (for example, the operations of each
+    participation) and the flows are served with deficit round robin:
+    each flow in turn extracts up to quantum items, the oldest first,
+    before passing to the next one. Therefore, a flow with many items
+    doesn't delay those of the other flows.
+
+    Each flow is a PriorityQueue, so all operations cost O(log n),
+    plus O(log l) to find the highest priority among the l levels
+    currently in use.
+
+    """
+
+    def __init__(self, key, quantum=1):
+        """Create a fair priority queue.
+
+        key (function): given an item, return the (hashable) key of
+            its flow.
+        quantum (int): how many items a flow extracts at each turn.
+
+        """
+        if quantum < 1:
+            raise ValueError("The quantum must be positive.")
+        self._key = key
+        self._quantum = quantum
+
+        # For each priority in use, the flows having items with that
+        # priority, in round robin order: an OrderedDict associating
+        # to the key of each flow a PriorityQueue with its items.
+        self._levels = {}
+
+        # For each priority in use, how many items the flow at the
+        # head of the level can still extract in its current turn
+        # (missing if its turn hasn't started yet).
+        self._deficit = {}
+
+        # Reverse lookup for the items in the queue: a dictionary
+        # associating to each item its priority and flow key.
+        self._reverse = {}
+
+        # Event to signal that there are items in the queue.
+        self._event = Event()
+
+    def __len__(self):
+        return len(self._reverse)
+
+    def _verify(self):
+        """Make sure that the internal state of the queue is consistent.
+
+        This is used only for testing.
+
+        """
+        if sum(len(flow) for level in self._levels.values()
+               for flow in level.values()) != len(self._reverse):
+            return False
+        if self._event.isSet() == self.empty():
+            return False
+        if not set(self._deficit) <= set(self._levels):
+            return False
+        for level in self._levels.values():
+            if len(level) == 0:
+                return False
+            for flow in level.values():
+                if flow.empty() or not flow._verify():
+                    return False
+        for item, (priority, key) in self._reverse.items():
+            if item not in self._levels[priority][key]:
+                return False
+        return True
+
+    def __contains__(self, item):
+        """Implement the 'in' operator for an item in the queue.
+
+        item (QueueItem): an item to search.
+
+        return (bool): True if item is in the queue.
+
+        """
+        return item in self._reverse
+
+    def _drop_flow_if_empty(self, priority, key):
+        """Forget a flow of a level if it has no more items.
+
+        priority (int): the priority of the level.
+        key (object): the key of the flow.
+
+        """
+        level = self._levels[priority]
+        if not level[key].empty():
+            return
+        if next(iter(level)) == key:
+            # Its turn ends.
+            self._deficit.pop(priority, None)
+        del level[key]
+        if len(level) == 0:
+            del self._levels[priority]
+
+    def push(self, item, priority=None, timestamp=None):
+        """Push an item in the queue. If timestamp is not specified,
+        uses the current time.
+
+        item (QueueItem): the item to add to the queue.
+        priority (int|None): the priority of the item, or None for
+            medium priority.
+        timestamp (datetime|None): the time of the submission, or None
+            to use now.
+
+        return (bool): false if the element was already in the queue
+            and was not pushed again, true otherwise.
+
+        """
+        if item in self._reverse:
+            return False
+
+        if priority is None:
+            priority = PriorityQueue.PRIORITY_MEDIUM
+        if timestamp is None:
+            timestamp = make_datetime()
+
+        key = self._key(item)
+        level = self._levels.setdefault(priority, OrderedDict())
+        if key not in level:
+            # New flows wait for their turn after the existing ones.
+            level[key] = PriorityQueue()
+        level[key].push(item, priority, timestamp)
+        self._reverse[item] = (priority, key)
+
+        # Signal to listener greenlets that there might be something.
+        self._event.set()
+
+        return True
+
+    def push_many(self, entries):
+        """Push several items in the queue.
+
+        entries ([(QueueItem, int|None, datetime|None)]): the items to
+            add, each with its priority and timestamp (as in push).
+
+        return (int): the number of items actually pushed.
+
+        """
+        now = None
+        flows = OrderedDict()
+        for item, priority, timestamp in entries:
+            if item in self._reverse:
+                continue
+            if priority is None:
+                priority = PriorityQueue.PRIORITY_MEDIUM
+            if timestamp is None:
+                if now is None:
+                    now = make_datetime()
+                timestamp = now
+            key = self._key(item)
+            self._reverse[item] = (priority, key)
+            flows.setdefault((priority, key), []).append(
+                (item, priority, timestamp))
+
+        for (priority, key), flow_entries in flows.items():
+            level = self._levels.setdefault(priority, OrderedDict())
+            if key not in level:
+                level[key] = PriorityQueue()
+            level[key].push_many(flow_entries)
+
+        if len(flows) > 0:
+            self._event.set()
+        return sum(len(flow_entries) for flow_entries in flows.values())
+
+    def _head(self):
+        """Return the flow whose top item is to be extracted first.
+
+        return ((int, object, PriorityQueue)): the priority and the
+            key of the flow, and the flow itself.
+
+        """
+        priority = min(self._levels)
+        key, flow = next(iter(self._levels[priority].items()))
+        return priority, key, flow
+
+    def top(self, wait=False):
+        """Return the first element in the queue without extracting it.
+
+        wait (bool): if True, block until an element is present.
+
+        return (QueueEntry): first element in the queue.
+
+        raise (LookupError): on empty queue if wait was false.
+
+        """
+        while self.empty():
+            if not wait:
+                raise LookupError("Empty queue.")
+            self._event.wait()
+        return self._head()[2].top()
+
+    def pop(self, wait=False):
+        """Extract (and return) the first element in the queue.
+
+        wait (bool): if True, block until an element is present.
+
+        return (QueueEntry): first element in the queue.
+
+        raise (LookupError): on empty queue, if wait was false.
+
+        """
+        self.top(wait)
+        priority, key, flow = self._head()
+        entry = flow.pop()
+        del self._reverse[entry.item]
+
+        deficit = self._deficit.pop(priority, self._quantum) - 1
+        if flow.empty():
+            self._drop_flow_if_empty(priority, key)
+        elif deficit > 0:
+            self._deficit[priority] = deficit
+        else:
+            # Its turn ends, the next flow starts its own.
+            self._levels[priority].move_to_end(key)
+
+        if self.empty():
+            # Signal that there is nothing left for listeners.
+            self._event.clear()
+        return entry
+
+    def remove(self, item):
+        """Remove an item from the queue. Raise a KeyError if not present.
+
+        item (QueueItem): the item to remove.
+
+        return (QueueEntry): the complete entry removed.
+
+        raise (KeyError): if item not present.
+
+        """
+        priority, key = self._reverse.pop(item)
+        entry = self._levels[priority][key].remove(item)
+        self._drop_flow_if_empty(priority, key)
+
+        if self.empty():
+            self._event.clear()
+
+        return entry
+
+    def set_priority(self, item, priority):
+        """Change the priority of an item inside the queue. Raises an
+        exception if the item is not in the queue.
+
+        The item goes at the end of its flow's turn in the new level.
+
+        item (QueueItem): the item whose priority needs to change.
+        priority (int): the new priority.
+
+        raise (LookupError): if item not present.
+
+        """
+        if self._reverse[item][0] == priority:
+            return
+        entry = self.remove(item)
+        self.push(item, priority, entry.timestamp)
+
+    def length(self):
+        """Return the number of elements in the queue.
+
+        return (int): length of the queue
+
+        """
+        return len(self._reverse)
+
+    def empty(self):
+        """Return if the queue is empty.
+
+        return (bool): is the queue empty?
+
+        """
+        return self.length() == 0
+
+    def entries(self):
+        """Return all the entries in the queue, in no particular order.
+
+        return ([QueueEntry]): the entries.
+
+        """
+        return [entry for level in self._levels.values()
+                for flow in level.values() for entry in flow.entries()]
+
+    def get_status(self):
+        """Return the content of the queue. Note that the order may be not
+        correct, but the first element is the one at the top.
+
+        return ([QueueEntry]): a list of entries containing the
+            representation of the item, the priority and the
+            timestamp.
+
+        """
+        status = []
+        for priority in sorted(self._levels):
+            for flow in self._levels[priority].values():
+                status.extend(flow.get_status())
+        return status
+
+
 # Fake objects for testing follow.
 
 
@@ -37,14 +37,17 @@ import gevent
 import gevent.event
 import gevent.socket
 from gevent.backdoor import BackdoorServer
+from gevent.pywsgi import WSGIServer
 from gevent.server import StreamServer
 
 from cms import ConfigError, config, mkdir, ServiceCoord, Address, \
     get_service_address
 from cms.log import root_logger, shell_handler, ServiceFilter, \
     DetailedFormatter, LogServiceHandler, FileHandler
+from cms.metrics import make_wsgi_app, register_process_metrics, registry
 from .rpc import rpc_method, RemoteServiceServer, RemoteServiceClient, \
     FakeRemoteServiceClient
+from .tracing import tracer
 
 
 logger = logging.getLogger(__name__)
@@ -99,6 +102,14 @@ class Service:
         self.rpc_server = StreamServer(address, self._connection_handler)
         self.backdoor = None
 
+        # If configured, we serve our metrics over HTTP.
+        self.metrics_server = None
+        if config.metrics_port_offset is not None:
+            self.metrics_server = WSGIServer(
+                (address.ip, address.port + config.metrics_port_offset),
+                make_wsgi_app(self.export_metrics), log=None)
+        register_process_metrics()
+
     def initialize_logging(self):
         """Set up additional logging handlers.
 
@@ -316,6 +327,14 @@ class Service:
         if config.backdoor:
             self.start_backdoor()
 
+        if self.metrics_server is not None:
+            try:
+                self.metrics_server.start()
+            except OSError:
+                logger.error("Cannot serve the metrics on port %d.",
+                             self.metrics_server.address[1], exc_info=True)
+                self.metrics_server = None
+
         logger.info("%s %d up and running!", *self._my_coord)
 
         # This call will block until self.rpc_server.stop() is called.
@@ -323,6 +342,9 @@ class Service:
 
         logger.info("%s %d is shutting down", *self._my_coord)
 
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
         if config.backdoor:
             self.stop_backdoor()
 
@@ -347,6 +369,47 @@ class Service:
         """
         return string
 
+    def export_metrics(self):
+        """Return our metrics in the Prometheus text format.
+
+        return (string): the metrics of the registry and the latency
+            histograms, labelled with our coord.
+
+        """
+        labels = {"service": self.name, "shard": self.shard}
+        return registry.export_text(labels) + tracer.export_text(labels)
+
+    @rpc_method
+    def metrics(self):
+        """Return our metrics in the Prometheus text format.
+
+        Same as the HTTP endpoint, for services not exposing it.
+
+        return (string): see export_metrics.
+
+        """
+        return self.export_metrics()
+
+    @rpc_method
+    def latency_status(self):
+        """Return the latency histograms of the stages seen by us.
+
+        return ({string: dict}): for each stage, its histogram (see
+            cms.io.tracing.LatencyHistogram.to_dict).
+
+        """
+        return tracer.get_status()
+
+    @rpc_method
+    def latency_metrics(self):
+        """Return the latency histograms in the Prometheus text format.
+
+        return (string): the histograms, labelled with our coord.
+
+        """
+        return tracer.export_text({"service": self.name,
+                                   "shard": self.shard})
+
     @rpc_method
     def quit(self, reason=""):
         """Shut down the service
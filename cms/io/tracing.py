@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Latency tracing of the operations flowing through the services.
+
+A trace is a dict mapping the name of a stage (e.g., "queue",
+"execution") to a list [start, end] of timestamps (seconds since the
+epoch, so that they can be compared across services, clock skew
+permitting). Traces are attached to the queue items (as their trace
+attribute) and travel with them in their dict representation, so that
+the spans recorded by a service (e.g., a Worker) reach the service
+that completes the operation (e.g., EvaluationService).
+
+Each service keeps, in the module-level tracer, a latency histogram
+for each stage it observed, which can be queried through the
+latency_status and latency_metrics RPC methods of Service.
+
+"""
+
+import bisect
+import time
+
+from cms.metrics import format_labels
+
+
+# Upper bounds (in seconds) of the buckets of the histograms.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def start_span(trace, stage, timestamp=None):
+    """Record the start of a stage in a trace.
+
+    trace ({string: [float|None]}|None): the trace; if None, nothing
+        is done (the item is not traced).
+    stage (string): the name of the stage.
+    timestamp (float|None): when the stage started, or None for now.
+
+    """
+    if trace is None:
+        return
+    trace[stage] = [time.time() if timestamp is None else timestamp, None]
+
+
+def end_span(trace, stage, timestamp=None):
+    """Record the end of a stage in a trace.
+
+    Nothing is done if the stage was not started.
+
+    trace ({string: [float|None]}|None): the trace; if None, nothing
+        is done (the item is not traced).
+    stage (string): the name of the stage.
+    timestamp (float|None): when the stage ended, or None for now.
+
+    return (float|None): the duration of the stage, or None if it was
+        not started.
+
+    """
+    if trace is None or stage not in trace:
+        return None
+    span = trace[stage]
+    span[1] = time.time() if timestamp is None else timestamp
+    return span[1] - span[0]
+
+
+class LatencyHistogram:
+    """A histogram of latencies, with fixed buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialization.
+
+        buckets ([float]): the sorted upper bounds of the buckets; an
+            additional bucket collects all larger values.
+
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a value to the histogram.
+
+        value (float): the latency, in seconds.
+
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """Return the number of values in each bucket or in the smaller.
+
+        return ([(float, int)]): for each bucket, its upper bound
+            (inf for the last) and the number of values not larger.
+
+        """
+        res = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            res.append((bound, total))
+        return res
+
+    def to_dict(self):
+        """Return a JSON-friendly representation of the histogram."""
+        return {
+            "buckets": [[bound, count]
+                        for bound, count in self.cumulative_counts()[:-1]],
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class Tracer:
+    """The collection of the latency histograms of a service."""
+
+    METRIC_NAME = "cms_stage_latency_seconds"
+
+    def __init__(self):
+        self._histograms = {}
+
+    def observe(self, stage, seconds):
+        """Add a latency to the histogram of a stage.
+
+        stage (string): the name of the stage.
+        seconds (float): the latency.
+
+        """
+        if stage not in self._histograms:
+            self._histograms[stage] = LatencyHistogram()
+        # Spans measured across services might be slightly negative
+        # because of clock skew.
+        self._histograms[stage].observe(max(seconds, 0.0))
+
+    def record(self, trace):
+        """Add all the complete spans of a trace to the histograms.
+
+        trace ({string: [float|None]}|None): the trace.
+
+        """
+        if trace is None:
+            return
+        for stage, (start, end) in trace.items():
+            if start is not None and end is not None:
+                self.observe(stage, end - start)
+
+    def clear(self):
+        """Forget all the histograms."""
+        self._histograms.clear()
+
+    def get_status(self):
+        """Return the histograms.
+
+        return ({string: dict}): for each stage, the histogram as
+            returned by LatencyHistogram.to_dict.
+
+        """
+        return dict((stage, histogram.to_dict())
+                    for stage, histogram in self._histograms.items())
+
+    def export_text(self, labels=None):
+        """Return the histograms in the Prometheus text format.
+
+        labels ({string: string}|None): labels to add to all samples
+            (e.g., the service name).
+
+        return (string): the histograms, one metric family with a
+            "stage" label.
+
+        """
+        common = sorted((labels or {}).items())
+        lines = [
+            "# HELP %s Latency of the stages of the processing of "
+            "the operations." % Tracer.METRIC_NAME,
+            "# TYPE %s histogram" % Tracer.METRIC_NAME,
+        ]
+        for stage in sorted(self._histograms):
+            histogram = self._histograms[stage]
+            for bound, count in histogram.cumulative_counts():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append("%s_bucket%s %d" % (
+                    Tracer.METRIC_NAME,
+                    format_labels(common + [("stage", stage), ("le", le)]),
+                    count))
+            stage_labels = format_labels(common + [("stage", stage)])
+            lines.append("%s_sum%s %r" % (
+                Tracer.METRIC_NAME, stage_labels, histogram.sum))
+            lines.append("%s_count%s %d" % (
+                Tracer.METRIC_NAME, stage_labels, histogram.count))
+        return "\n".join(lines) + "\n"
+
+
+# The tracer of this process.
+tracer = Tracer()
@@ -21,14 +21,19 @@ on notifications and sweeper loops.
 
 """
 
+import json
 import logging
+import os
 import time
 from abc import ABCMeta, abstractmethod
 
 import gevent
 from gevent.event import Event
 
-from cms.io import PriorityQueue, Service, rpc_method
+from cms import config
+from cms.io import PriorityQueue, Service, end_span, rpc_method, start_span
+from cms.metrics import registry
+from cmscommon.datetime import make_datetime, make_timestamp
 
 
 logger = logging.getLogger(__name__)
@@ -59,6 +64,8 @@ class Executor(metaclass=ABCMeta):
 
         self._batch_executions = batch_executions
         self._operation_queue = PriorityQueue()
+        # Number of operations extracted from the queue to execute.
+        self.executed_operations = 0
 
     def __contains__(self, item):
         """Return whether the item is in the queue.
@@ -81,6 +88,27 @@ class Executor(metaclass=ABCMeta):
         """
         return self._operation_queue.get_status()
 
+    def get_queue_length(self):
+        """Return the number of operations in the queue.
+
+        return (int): the length of the queue.
+
+        """
+        return len(self._operation_queue)
+
+    def get_snapshot(self):
+        """Return the operations to save in a snapshot of the queue.
+
+        Subclasses should add the operations they extracted from the
+        queue but not yet completed, as they would be lost otherwise.
+
+        return ([(QueueItem, int, datetime)]): the operations, with
+            their priorities and timestamps.
+
+        """
+        return [(entry.item, entry.priority, entry.timestamp)
+                for entry in self._operation_queue.entries()]
+
     def enqueue(self, item, priority=None, timestamp=None):
         """Add an item to the queue.
 
@@ -92,7 +120,25 @@ class Executor(metaclass=ABCMeta):
         return (bool): True if successfully enqueued.
 
         """
-        return self._operation_queue.push(item, priority, timestamp)
+        pushed = self._operation_queue.push(item, priority, timestamp)
+        if pushed:
+            start_span(item.trace, "queue")
+        return pushed
+
+    def enqueue_many(self, entries):
+        """Add several items to the queue.
+
+        entries ([(QueueItem, int|None, datetime|None)]): the items to
+            add, each with its priority and timestamp.
+
+        return (int): the number of items successfully enqueued.
+
+        """
+        entries = list(entries)
+        for item, _, _ in entries:
+            if item not in self._operation_queue:
+                start_span(item.trace, "queue")
+        return self._operation_queue.push_many(entries)
 
     def dequeue(self, item):
         """Remove an item from the queue.
@@ -121,6 +167,9 @@ class Executor(metaclass=ABCMeta):
                         max_operations == 0 or
                         len(to_execute) < max_operations):
                     to_execute.append(self._operation_queue.pop())
+            for entry in to_execute:
+                end_span(entry.item.trace, "queue")
+            self.executed_operations += len(to_execute)
 
             assert len(to_execute) > 0, "Expected at least one element."
             if self._batch_executions:
@@ -227,6 +276,12 @@ class TriggeredService(Service):
         self._sweeper_started = False
         self._sweeper_timeout = None
 
+        self._snapshots_started = False
+
+        self._swept_operations = registry.counter(
+            "cms_swept_operations_total",
+            "Number of missing operations found by the sweeper.")
+
     def add_executor(self, executor):
         """Add an executor for the service.
 
@@ -234,6 +289,15 @@ class TriggeredService(Service):
         # Set up and spawn the executors.
         #
         # TODO: link to greenlet and react to deaths.
+        labels = {"executor": executor.__class__.__name__,
+                  "index": "%d" % len(self._executors)}
+        registry.gauge("cms_queue_length",
+                       "Number of operations waiting in the queue.",
+                       labels, function=executor.get_queue_length)
+        registry.counter("cms_operations_total",
+                         "Number of operations extracted from the queue.",
+                         labels,
+                         function=lambda: executor.executed_operations)
         self._executors.append(executor)
         gevent.spawn(executor.run)
 
@@ -263,6 +327,23 @@ class TriggeredService(Service):
                 ret += 1
         return ret
 
+    def enqueue_many(self, entries):
+        """Add several operations to the queue of each executor.
+
+        entries ([(QueueItem, int|None, datetime|None)]): the
+            operations to enqueue, each with its priority and
+            timestamp.
+
+        return (int): the number of successful additions, summed over
+            the executors.
+
+        """
+        entries = list(entries)
+        ret = 0
+        for executor in self._executors:
+            ret += executor.enqueue_many(entries)
+        return ret
+
     def dequeue(self, operation):
         """Remove an operation from the queue of each executor.
 
@@ -287,6 +368,141 @@ class TriggeredService(Service):
         else:
             logger.warning("Service tried to start the sweeper loop twice.")
 
+    def start_queue_snapshots(self, period):
+        """Restore the queues from the last snapshot and save new ones.
+
+        A restarted service can this way resume working on the
+        operations it had in its queues immediately, instead of
+        waiting for the sweeper to find them all; the sweeper still
+        reconciles the queues with what changed while the service was
+        down. To be called after adding the executors, and only by
+        services implementing item_from_snapshot (otherwise no snapshot
+        is taken, as it could not be restored).
+
+        period (float|None): the interval in seconds between snapshots,
+            or None to disable them.
+
+        """
+        if period is None:
+            return
+        if type(self).item_from_snapshot is \
+                TriggeredService.item_from_snapshot:
+            logger.error("Service cannot restore queue snapshots, not "
+                         "taking them.")
+            return
+        if self._snapshots_started:
+            logger.warning("Service tried to start the snapshots twice.")
+            return
+        self._snapshots_started = True
+
+        self.restore_queue_snapshot()
+        self.add_timeout(self.write_queue_snapshot, None, period,
+                         immediately=False)
+
+    def get_queue_snapshot_path(self):
+        """Return the path of the snapshot of our queues.
+
+        return (str): the path.
+
+        """
+        return os.path.join(config.data_dir, "queues",
+                            "%s_%d.json" % (self.name, self.shard))
+
+    def write_queue_snapshot(self):
+        """Save the operations of all executors to disk.
+
+        The snapshot is written to a temporary file and then moved in
+        place, so that a crash never leaves a partial one.
+
+        """
+        snapshot = {
+            "timestamp": make_timestamp(),
+            "executors": [
+                [[self.item_to_snapshot(item), priority,
+                  make_timestamp(timestamp)]
+                 for item, priority, timestamp in executor.get_snapshot()]
+                for executor in self._executors],
+        }
+        path = self.get_queue_snapshot_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+        logger.debug("Saved a snapshot of %d operations.",
+                     sum(len(entries) for entries in snapshot["executors"]))
+
+    def restore_queue_snapshot(self):
+        """Enqueue the operations saved in the last snapshot.
+
+        return (int): the number of operations enqueued.
+
+        """
+        path = self.get_queue_snapshot_path()
+        try:
+            with open(path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError):
+            logger.warning("Cannot read queue snapshot %s.", path,
+                           exc_info=True)
+            return 0
+
+        counter = 0
+        try:
+            for executor, entries in zip(self._executors,
+                                         snapshot["executors"]):
+                entries = [(self.item_from_snapshot(data), priority,
+                            make_datetime(timestamp))
+                           for data, priority, timestamp in entries]
+                counter += executor.enqueue_many(
+                    self.validate_snapshot(entries))
+        except Exception:
+            logger.warning("Cannot restore queue snapshot %s.", path,
+                           exc_info=True)
+        logger.info("Restored %d operation(s) from the snapshot taken "
+                    "%d seconds ago.", counter,
+                    make_timestamp() - snapshot["timestamp"])
+        return counter
+
+    def item_to_snapshot(self, item):
+        """Return the representation of an item in a snapshot.
+
+        item (QueueItem): an item in a queue.
+
+        return (object): a JSON-encodable representation of item.
+
+        """
+        return item.to_dict()
+
+    def item_from_snapshot(self, data):
+        """Return the item represented in a snapshot.
+
+        Must be implemented by the services using snapshots, as
+        start_queue_snapshots does nothing otherwise.
+
+        data (object): the output of item_to_snapshot.
+
+        return (QueueItem): the item.
+
+        """
+        raise NotImplementedError("Please subclass this class.")
+
+    def validate_snapshot(self, entries):
+        """Return the entries of a snapshot that are still to do.
+
+        The snapshot might be some time old: this gives the subclasses
+        a chance to discard the operations done since then.
+
+        entries ([(QueueItem, int, datetime)]): the operations of
+            the snapshot, with their priorities and timestamps.
+
+        return ([(QueueItem, int, datetime)]): the operations to
+            enqueue.
+
+        """
+        return entries
+
     def _sweeper_loop(self):
         """Regularly check for missed operations.
 
@@ -324,6 +540,7 @@ class TriggeredService(Service):
         logger.info("Start looking for missing operations.")
         start_time = time.time()
         counter = self._missing_operations()
+        self._swept_operations.inc(counter)
         logger.info("Found %d missed operation(s) in %d ms.",
                     counter, (time.time() - start_time) * 1000)
 
@@ -45,13 +45,48 @@
 
 import logging
 import sys
+from collections import Counter, deque
 
 import gevent.lock
 
 from cmscommon.terminal import colors, add_color_to_string, has_color_support
 
 
-class StreamHandler(logging.StreamHandler):
+class BatchHandlerMixin:
+    """Let a stream handler write many records at once.
+
+    Writing records one at a time flushes the stream after each of
+    them; handle_many instead takes the lock once, writes all the
+    records and flushes at the end.
+
+    """
+    def handle_many(self, records):
+        """Conditionally emit all the given records.
+
+        As for handle, the filters of the handler decide whether each
+        record is emitted or not.
+
+        records ([LogRecord]): the records to emit.
+
+        """
+        self.acquire()
+        try:
+            if getattr(self, "stream", None) is None:
+                # A FileHandler opened with delay=True.
+                self.stream = self._open()
+            for record in records:
+                if not self.filter(record):
+                    continue
+                try:
+                    self.stream.write(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            self.flush()
+        finally:
+            self.release()
+
+
+class StreamHandler(BatchHandlerMixin, logging.StreamHandler):
     """Subclass to make gevent-aware.
 
     Use a gevent lock instead of a threading one to block only the
@@ -65,7 +100,7 @@ class StreamHandler(logging.StreamHandler):
         self.lock = gevent.lock.RLock()
 
 
-class FileHandler(logging.FileHandler):
+class FileHandler(BatchHandlerMixin, logging.FileHandler):
     """Subclass to make gevent-aware.
 
     Use a gevent lock instead of a threading one to block only the
@@ -98,7 +133,23 @@ class LogServiceHandler(logging.Handler):
     For args, we just format them into msg to produce the message. We
     then store the message as msg and drop args.
 
+    Records are not sent one by one: they are buffered and sent in a
+    single LogBatch call when BATCH_SIZE of them are pending or when
+    the oldest has been waiting for MAX_DELAY seconds. If the buffer
+    grows (because LogService is unreachable or slow), the handler
+    degrades: above SOFT_LIMIT pending records DEBUG messages are
+    dropped and only one INFO message every INFO_SAMPLING is kept,
+    above HARD_LIMIT everything is dropped. What is dropped is counted
+    and reported to LogService in a warning once it is reachable.
+
     """
+
+    BATCH_SIZE = 100
+    MAX_DELAY = 0.2
+    SOFT_LIMIT = 1000
+    HARD_LIMIT = 10000
+    INFO_SAMPLING = 10
+
     def __init__(self, log_service):
         """Initialize the handler.
 
@@ -110,36 +161,175 @@ class LogServiceHandler(logging.Handler):
         logging.Handler.__init__(self)
         self._log_service = log_service
 
+        # Encoded records waiting to be sent.
+        self._pending = deque()
+        # Map level names to the number of records dropped since the
+        # last report.
+        self._dropped = Counter()
+        # Number of INFO records seen while over SOFT_LIMIT, to sample
+        # them.
+        self._info_seen = 0
+        # The greenlet that will send the pending records, if any.
+        self._flush_greenlet = None
+        # Whether a greenlet is currently sending records.
+        self._sending = False
+
     def createLock(self):
         """Set self.lock to a new gevent RLock.
 
         """
         self.lock = gevent.lock.RLock()
 
+    def _should_drop(self, record):
+        """Return whether to drop the record as we are overloaded.
+
+        record (LogRecord): the record to emit.
+
+        return (bool): True if the record must not be buffered.
+
+        """
+        pending = len(self._pending)
+        if pending >= self.HARD_LIMIT:
+            return True
+        if pending >= self.SOFT_LIMIT:
+            if record.levelno <= logging.DEBUG:
+                return True
+            if record.levelno < logging.WARNING:
+                self._info_seen += 1
+                return self._info_seen % self.INFO_SAMPLING != 1
+        return False
+
     # Taken from CPython, combining emit and makePickle, and adapted to
-    # not pickle the dictionary and use its items as keyword parameters
-    # for LogService.Log.
+    # not pickle the dictionary but to return it, so that its items
+    # can be sent as the attributes of the record to LogService.
+    def _encode(self, record):
+        """Return a JSON-encodable dictionary describing the record.
+
+        record (LogRecord): the record to encode.
+
+        return ({str: object}): the attributes of the record.
+
+        """
+        ei = record.exc_info
+        if ei:
+            # just to get traceback text into record.exc_text ...
+            self.format(record)
+            record.exc_info = None  # to avoid Unpickleable error
+        # See issue #14436: If msg or args are objects, they may not be
+        # available on the receiving end. So we convert the msg % args
+        # to a string, save it as msg and zap the args.
+        d = dict(record.__dict__)
+        d['msg'] = record.getMessage()
+        d['args'] = None
+        # Attributes coming from "extra" may be arbitrary objects; a
+        # single one that cannot be encoded would lose the whole batch.
+        for key, value in d.items():
+            if not isinstance(value, (str, int, float, bool, type(None))):
+                d[key] = str(value)
+        if ei:
+            record.exc_info = ei  # for next handler
+        return d
+
     def emit(self, record):
         try:
-            ei = record.exc_info
-            if ei:
-                # just to get traceback text into record.exc_text ...
-                self.format(record)
-                record.exc_info = None  # to avoid Unpickleable error
-            # See issue #14436: If msg or args are objects, they may not be
-            # available on the receiving end. So we convert the msg % args
-            # to a string, save it as msg and zap the args.
-            d = dict(record.__dict__)
-            d['msg'] = record.getMessage()
-            d['args'] = None
-            if ei:
-                record.exc_info = ei  # for next handler
-            self._log_service.Log(**d)
+            if self._should_drop(record):
+                self._dropped[record.levelname] += 1
+                return
+            self._pending.append(self._encode(record))
+            if len(self._pending) >= self.BATCH_SIZE:
+                self._schedule_flush(0)
+            elif self._flush_greenlet is None:
+                self._schedule_flush(self.MAX_DELAY)
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
 
+    def _schedule_flush(self, delay):
+        """Make sure the pending records are sent within delay seconds.
+
+        delay (float): the maximum number of seconds to wait.
+
+        """
+        if self._sending:
+            # The running flush will pick up the new records.
+            return
+        if self._flush_greenlet is not None:
+            if delay >= self.MAX_DELAY:
+                return
+            self._flush_greenlet.kill(block=False)
+        if delay > 0:
+            self._flush_greenlet = gevent.spawn_later(
+                delay, self._send_pending)
+        else:
+            self._flush_greenlet = gevent.spawn(self._send_pending)
+
+    def _report_dropped(self):
+        """Queue a warning saying how many records were dropped."""
+        if not self._dropped:
+            return
+        dropped = ", ".join("%d %s" % (count, levelname)
+                            for levelname, count
+                            in sorted(self._dropped.items()))
+        self._dropped.clear()
+        record = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            "Dropped log messages because LogService could not keep up: "
+            "%s.", (dropped,), None)
+        # Give the record the same context (e.g., service coords) the
+        # regular ones get.
+        self.filter(record)
+        self._pending.appendleft(self._encode(record))
+
+    def _send_pending(self):
+        """Send all the pending records to LogService, in batches.
+
+        If LogService cannot be reached, the records stay pending and
+        another attempt is scheduled.
+
+        """
+        self._flush_greenlet = None
+        if self._sending:
+            return
+        self._sending = True
+        try:
+            self._report_dropped()
+            while len(self._pending) > 0:
+                if not self._log_service.connected:
+                    break
+                batch = [self._pending.popleft() for _ in
+                         range(min(self.BATCH_SIZE, len(self._pending)))]
+                result = self._log_service.LogBatch(records=batch)
+                if result.ready() and not result.successful() \
+                        and not self._log_service.connected:
+                    # The connection dropped while writing: the records
+                    # are still ours, try again later.
+                    self._pending.extendleft(reversed(batch))
+                    break
+        finally:
+            self._sending = False
+        if len(self._pending) > 0 and self._flush_greenlet is None:
+            self._schedule_flush(self.MAX_DELAY)
+
+    def flush(self):
+        """Send the pending records immediately, if possible."""
+        self.acquire()
+        try:
+            if self._flush_greenlet is not None:
+                self._flush_greenlet.kill(block=False)
+                self._flush_greenlet = None
+            self._send_pending()
+        finally:
+            self.release()
+
+    def close(self):
+        """Send the pending records and close the handler."""
+        try:
+            self.flush()
+        except Exception:
+            pass
+        logging.Handler.close(self)
+
 
 def get_color_hash(string):
     """Deterministically return a color based on the string's content.
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Metrics of the services, exported in the Prometheus text format.
+
+Each process has a registry (the module-level registry) of counters,
+gauges and histograms, identified by a name and a (possibly empty) set
+of labels. Counters and gauges can also be backed by a function,
+called only when the metrics are exported, so that values already
+tracked elsewhere (e.g., the length of a queue) cost nothing until
+somebody looks at them.
+
+Services serve the registry over HTTP (see Service and the
+metrics_port_offset configuration), adding their name and shard as
+labels.
+
+"""
+
+import bisect
+import logging
+import os
+import threading
+
+import psutil
+
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds (in seconds) of the buckets of the histograms, by
+# default.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    """Return the labels in the format of the samples.
+
+    labels ([(string, object)]): the labels, as pairs name, value.
+
+    return (string): the labels, between braces, or an empty string if
+        there are none.
+
+    """
+    if len(labels) == 0:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\")
+                     .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels)
+
+
+def format_value(value):
+    """Return a value in the format of the samples.
+
+    value (int|float): the value.
+
+    return (string): its representation.
+
+    """
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        if value == float("-inf"):
+            return "-Inf"
+        return repr(value)
+    return "%d" % value
+
+
+class Metric:
+    """Base class for the metrics."""
+
+    TYPE = None
+
+    def __init__(self, name, description, labels=None, function=None):
+        """Initialization.
+
+        name (string): the name of the metric.
+        description (string): the help text of the metric.
+        labels ({string: string}|None): the labels of this series.
+        function (function|None): if given, called without arguments
+            to get the value of the metric when it is exported.
+
+        """
+        self.name = name
+        self.description = description
+        self.labels = sorted((labels or {}).items())
+        self.function = function
+        self.value = 0
+
+    def get_value(self):
+        """Return the current value of the metric."""
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+    def samples(self):
+        """Return the samples of the metric.
+
+        return ([(string, [(string, object)], int|float)]): for each
+            sample, the suffix of the name, the additional labels and
+            the value.
+
+        """
+        return [("", [], self.get_value())]
+
+
+class Counter(Metric):
+    """A value that only increases (e.g., the number of operations)."""
+
+    TYPE = "counter"
+
+    def inc(self, amount=1):
+        """Increase the counter.
+
+        amount (int|float): the (non-negative) increment.
+
+        """
+        self.value += amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down (e.g., the length of a queue)."""
+
+    TYPE = "gauge"
+
+    def set(self, value):
+        """Set the value of the gauge.
+
+        value (int|float): the new value.
+
+        """
+        self.value = value
+
+    def inc(self, amount=1):
+        """Increase the gauge by amount."""
+        self.value += amount
+
+    def dec(self, amount=1):
+        """Decrease the gauge by amount."""
+        self.value -= amount
+
+
+class Histogram(Metric):
+    """The distribution of some values (e.g., durations), in buckets."""
+
+    TYPE = "histogram"
+
+    def __init__(self, name, description, labels=None,
+                 buckets=DEFAULT_BUCKETS):
+        """Initialization.
+
+        buckets ([float]): the sorted upper bounds of the buckets; an
+            additional bucket collects all larger values.
+
+        See Metric for the other arguments.
+
+        """
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a value to the histogram.
+
+        value (float): the value.
+
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def samples(self):
+        """See Metric.samples."""
+        res = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            res.append(("_bucket", [("le", format_value(float(bound)))],
+                        total))
+        res.append(("_sum", [], self.sum))
+        res.append(("_count", [], self.count))
+        return res
+
+
+class MetricsRegistry:
+    """The collection of the metrics of a process."""
+
+    def __init__(self):
+        # Map (name, labels) to the metric, in order of registration.
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, description, labels, **kwargs):
+        """Return the metric with name and labels, creating it if needed.
+
+        raise (ValueError): if a metric with the same name but of a
+            different type exists.
+
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                for other in self._metrics.values():
+                    if other.name == name and not isinstance(other, cls):
+                        raise ValueError("Metric %s already registered as "
+                                         "a %s." % (name, other.TYPE))
+                metric = cls(name, description, labels, **kwargs)
+                self._metrics[key] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s already registered as a %s." %
+                                 (name, metric.TYPE))
+            return metric
+
+    def counter(self, name, description, labels=None, function=None):
+        """Return a counter, creating it if needed.
+
+        name (string): the name of the counter (conventionally ending
+            in _total).
+        description (string): the help text.
+        labels ({string: string}|None): the labels of the series.
+        function (function|None): if given, the function giving the
+            value of the counter (replacing any previous one).
+
+        return (Counter): the counter.
+
+        """
+        metric = self._get(Counter, name, description, labels)
+        if function is not None:
+            metric.function = function
+        return metric
+
+    def gauge(self, name, description, labels=None, function=None):
+        """Return a gauge, creating it if needed.
+
+        See counter for the arguments.
+
+        return (Gauge): the gauge.
+
+        """
+        metric = self._get(Gauge, name, description, labels)
+        if function is not None:
+            metric.function = function
+        return metric
+
+    def histogram(self, name, description, labels=None,
+                  buckets=DEFAULT_BUCKETS):
+        """Return a histogram, creating it if needed.
+
+        buckets ([float]): the upper bounds of the buckets, used only
+            if the histogram is created.
+
+        See counter for the other arguments.
+
+        return (Histogram): the histogram.
+
+        """
+        return self._get(Histogram, name, description, labels,
+                         buckets=buckets)
+
+    def unregister(self, name, labels=None):
+        """Remove a metric, if present.
+
+        name (string): the name of the metric.
+        labels ({string: string}|None): the labels of the series.
+
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._metrics.pop(key, None)
+
+    def clear(self):
+        """Remove all the metrics."""
+        with self._lock:
+            self._metrics.clear()
+
+    def export_text(self, labels=None):
+        """Return the metrics in the Prometheus text format.
+
+        labels ({string: string}|None): labels to add to all samples
+            (e.g., the service name).
+
+        return (string): the metrics, grouped in families by name.
+
+        """
+        common = sorted((labels or {}).items())
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = dict()
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+
+        lines = []
+        for name in sorted(families):
+            family = families[name]
+            lines.append("# HELP %s %s" % (name, family[0].description))
+            lines.append("# TYPE %s %s" % (name, family[0].TYPE))
+            for metric in family:
+                try:
+                    samples = metric.samples()
+                except Exception:
+                    logger.warning("Cannot compute metric %s.", name,
+                                   exc_info=True)
+                    continue
+                for suffix, extra, value in samples:
+                    lines.append("%s%s%s %s" % (
+                        name, suffix,
+                        format_labels(common + metric.labels + extra),
+                        format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+# The registry of this process.
+registry = MetricsRegistry()
+
+
+def register_process_metrics():
+    """Register the metrics about the resources used by this process."""
+    process = psutil.Process(os.getpid())
+    registry.counter(
+        "cms_process_cpu_seconds_total",
+        "CPU time (user and system) used by the process.",
+        function=lambda: sum(process.cpu_times()[:2]))
+    registry.gauge(
+        "cms_process_resident_memory_bytes",
+        "Resident memory of the process.",
+        function=lambda: process.memory_info().rss)
+    registry.gauge(
+        "cms_process_open_fds",
+        "Number of file descriptors open by the process.",
+        function=process.num_fds)
+    registry.gauge(
+        "cms_process_start_time_seconds",
+        "Start time of the process, since the epoch.",
+        function=process.create_time)
+
+
+def make_wsgi_app(export):
+    """Return a WSGI application serving metrics at /metrics.
+
+    export (function): called without arguments for each request, it
+        returns the metrics in the text format.
+
+    return (function): the WSGI application.
+
+    """
+    def application(environ, start_response):
+        if environ.get("PATH_INFO", "/") not in ("/", "/metrics"):
+            start_response("404 Not Found",
+                           [("Content-Type", "text/plain")])
+            return [b"Not found.\n"]
+        body = export().encode("utf-8")
+        start_response("200 OK", [
+            ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+            ("Content-Length", "%d" % len(body))])
+        return [body]
+
+    return application
@@ -21,8 +21,6 @@
 
 import logging
 
-import pkg_resources
-
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +46,10 @@ def plugin_list(entry_point_group):
     return ([type]): the requested plugin classes.
 
     """
+    # Imported here as it is slow to import and only needed by the
+    # code using plugins (e.g., not by most command line tools).
+    import pkg_resources
+
     classes = []
     for entry_point in pkg_resources.iter_entry_points(entry_point_group):
         try:
@@ -196,7 +196,8 @@ HANDLERS = [
 
     (r"/users", UserListHandler),
     (r"/users/([0-9]+)/remove", RemoveUserHandler),
-    (r"/teams", SimpleHandler("teams.html")),
+    (r"/teams", SimpleHandler("teams.html",
+                              navigation_lists=("team",))),
     (r"/users/add", AddUserHandler),
     (r"/teams/add", AddTeamHandler),
     (r"/user/([0-9]+)", UserHandler),
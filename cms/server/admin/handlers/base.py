@@ -35,12 +35,14 @@ from datetime import datetime, timedelta
 from functools import wraps
 
 import tornado.web
+from sqlalchemy import tuple_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import subqueryload
+from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from cms import __version__, config
-from cms.db import Admin, Contest, Participation, Question, Submission, \
-    SubmissionResult, Task, Team, User, UserTest
+from cms.db import Admin, Contest, Evaluation, Participation, Question, \
+    Submission, SubmissionResult, Task, User, UserTest, estimate_count
 from cms.grading.scoretypes import get_score_type_class
 from cms.grading.tasktypes import get_task_type_class
 from cms.server import CommonRequestHandler, FileHandlerMixin
@@ -201,6 +203,15 @@ class BaseHandler(CommonRequestHandler):
     PERMISSION_MESSAGING = "messaging"
     AUTHENTICATED = "authenticated"
 
+    # The lists of objects (among the kinds of NavigationCache) that
+    # the pages of the handler need, on top of the ones the sidebar
+    # uses; they are given to the templates as "<kind>_list".
+    NAVIGATION_LISTS = ()
+
+    # Below this estimated number of submissions, a list counts them
+    # exactly, as it is cheap enough.
+    EXACT_COUNT_THRESHOLD = 10000
+
     def try_commit(self):
         """Try to commit the current session.
 
@@ -217,6 +228,7 @@ class BaseHandler(CommonRequestHandler):
                 "Operation failed.", "%s" % error)
             return False
         else:
+            self.service.navigation_cache.invalidate()
             self.service.add_notification(
                 make_datetime(),
                 "Operation successful.", "")
@@ -308,11 +320,21 @@ class BaseHandler(CommonRequestHandler):
                 .filter(Question.reply_timestamp.is_(None))\
                 .filter(Question.ignored.is_(False))\
                 .count()
-        # TODO: not all pages require all these data.
-        params["contest_list"] = self.sql_session.query(Contest).all()
-        params["task_list"] = self.sql_session.query(Task).all()
-        params["user_list"] = self.sql_session.query(User).all()
-        params["team_list"] = self.sql_session.query(Team).all()
+        # The navigation data comes from a cache, and only what the
+        # page needs is retrieved.
+        navigation_cache = self.service.navigation_cache
+        kinds = set(self.NAVIGATION_LISTS)
+        if self.contest is None:
+            # The sidebar lists contests and tasks, and counts users
+            # and teams.
+            kinds.update(("contest", "task"))
+            params["user_count"] = navigation_cache.get_count(
+                self.sql_session, "user")
+            params["team_count"] = navigation_cache.get_count(
+                self.sql_session, "team")
+        for kind in kinds:
+            params["%s_list" % kind] = navigation_cache.get_list(
+                self.sql_session, kind)
         return params
 
     def write_error(self, status_code, **kwargs):
@@ -551,40 +573,140 @@ class BaseHandler(CommonRequestHandler):
         else:
             dest["password"] = hash_password("", method)
 
-    def render_params_for_submissions(self, query, page, page_size=50):
+    def _get_keyset_argument(self, name):
+        """Return the submission whose key a page starts from.
+
+        name (string): the name of the query argument holding the id of
+            the submission.
+
+        return ((datetime, int)|None): the key (timestamp and id) of
+            the submission, or None if not given or not existing.
+
+        raise (HTTPError): 400 if the argument is not an id.
+
+        """
+        value = self.get_query_argument(name, None)
+        if value is None:
+            return None
+        try:
+            submission_id = int(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400)
+        return self.sql_session.query(Submission.timestamp, Submission.id)\
+            .filter(Submission.id == submission_id).first()
+
+    def _load_scoring_evaluations(self, submissions):
+        """Load the evaluations of the results being scored.
+
+        The submission lists show the evaluations only of the results
+        that are evaluated but not scored yet, usually few, so only
+        theirs are loaded, with a single query.
+
+        submissions ([Submission]): the submissions of the page.
+
+        """
+        scoring = dict()
+        for submission in submissions:
+            for sr in submission.results:
+                if sr.get_status() == SubmissionResult.SCORING:
+                    scoring[(sr.submission_id, sr.dataset_id)] = sr
+        if len(scoring) == 0:
+            return
+
+        evaluations = dict((key, list()) for key in scoring)
+        for evaluation in self.sql_session.query(Evaluation)\
+                .options(joinedload(Evaluation.testcase))\
+                .filter(tuple_(Evaluation.submission_id,
+                               Evaluation.dataset_id).in_(list(scoring))):
+            evaluations[(evaluation.submission_id,
+                         evaluation.dataset_id)].append(evaluation)
+        for key, sr in scoring.items():
+            set_committed_value(sr, "evaluations", evaluations[key])
+
+    def render_params_for_submissions(self, query, page_size=50,
+                                      estimate=False):
         """Add data about the requested submissions to r_params.
 
+        Submissions are shown from the most recent, and pages are
+        identified by keyset (the timestamp and id of a submission)
+        rather than by offset, so that even the deepest ones are fast:
+        the "before" or "after" query arguments, if given, are the id
+        of the submission just after (i.e., newer than) or just before
+        the page. Only what the submission lists show is loaded; in
+        particular, the evaluations only of the results being scored.
+
         query (sqlalchemy.orm.query.Query): the query giving back all
             interesting submissions.
-        page (int): the index of the page to display.
         page_size(int): the number of submissions per page.
+        estimate (bool): whether to estimate the number of the
+            submissions using the DB statistics, rather than counting
+            them, for lists that can be very long; if the estimate is
+            below EXACT_COUNT_THRESHOLD they are counted anyway.
 
         """
+        count = None
+        if estimate:
+            count = estimate_count(self.sql_session, query)
+            if count < self.EXACT_COUNT_THRESHOLD:
+                count = None
+        if count is None:
+            estimate = False
+            count = query.count()
+
         query = query\
-            .options(subqueryload(Submission.task))\
-            .options(subqueryload(Submission.participation))\
+            .options(joinedload(Submission.task)
+                     .load_only(Task.id, Task.name, Task.contest_id,
+                                Task.active_dataset_id))\
+            .options(joinedload(Submission.participation)
+                     .joinedload(Participation.user)
+                     .load_only(User.id, User.username))\
             .options(subqueryload(Submission.files))\
             .options(subqueryload(Submission.token))\
             .options(subqueryload(Submission.results)
-                     .subqueryload(SubmissionResult.evaluations))\
-            .order_by(Submission.timestamp.desc())
+                     .defer(SubmissionResult.compilation_stdout)
+                     .defer(SubmissionResult.compilation_stderr)
+                     .defer(SubmissionResult.compilation_sandbox))
+        key = tuple_(Submission.timestamp, Submission.id)
+
+        before = self._get_keyset_argument("before")
+        after = self._get_keyset_argument("after")
+        if after is not None:
+            submissions = query\
+                .filter(key > tuple_(*after))\
+                .order_by(Submission.timestamp.asc(), Submission.id.asc())\
+                .limit(page_size + 1).all()
+            has_newer = len(submissions) > page_size
+            submissions = submissions[page_size - 1::-1]
+            has_older = True
+        else:
+            if before is not None:
+                query = query.filter(key < tuple_(*before))
+            submissions = query\
+                .order_by(Submission.timestamp.desc(), Submission.id.desc())\
+                .limit(page_size + 1).all()
+            has_newer = before is not None
+            has_older = len(submissions) > page_size
+            submissions = submissions[:page_size]
 
-        offset = page * page_size
-        count = query.count()
+        self._load_scoring_evaluations(submissions)
 
         if self.r_params is None:
             self.r_params = self.render_params()
 
         # A page showing paginated submissions can use these
-        # parameters: total number of submissions, submissions to
-        # display in this page, index of the current page, total
-        # number of pages.
+        # parameters: (possibly estimated) total number of submissions,
+        # submissions to display in this page and the arguments to
+        # pass to get the newer and older pages (None if there are no
+        # such pages).
         self.r_params["submission_count"] = count
-        self.r_params["submissions"] = \
-            query.slice(offset, offset + page_size).all()
-        self.r_params["submission_page"] = page
-        self.r_params["submission_pages"] = \
-            (count + page_size - 1) // page_size
+        self.r_params["submission_count_estimated"] = estimate
+        self.r_params["submissions"] = submissions
+        self.r_params["submission_page"] = {
+            "newer": {"after": submissions[0].id}
+            if has_newer and len(submissions) > 0 else None,
+            "older": {"before": submissions[-1].id}
+            if has_older and len(submissions) > 0 else None,
+        }
 
     def render_params_for_user_tests(self, query, page, page_size=50):
         """Add data about the requested user tests to r_params.
@@ -642,7 +764,8 @@ class FileFromDigestHandler(FileHandler):
         self.fetch(digest, "text/plain", filename)
 
 
-def SimpleHandler(page, authenticated=True, permission_all=False):
+def SimpleHandler(page, authenticated=True, permission_all=False,
+                  navigation_lists=()):
     if permission_all:
         class Cls(BaseHandler):
             @require_permission(BaseHandler.PERMISSION_ALL)
@@ -660,6 +783,7 @@ def SimpleHandler(page, authenticated=True, permission_all=False):
             def get(self):
                 self.r_params = self.render_params()
                 self.render(page, **self.r_params)
+    Cls.NAVIGATION_LISTS = navigation_lists
     return Cls
 
 
@@ -170,7 +170,8 @@ class ResourcesListHandler(BaseHandler):
         self.render("resourceslist.html", **self.r_params)
 
 
-class ContestListHandler(SimpleHandler("contests.html")):
+class ContestListHandler(SimpleHandler("contests.html",
+                                       navigation_lists=("contest",))):
     """Get returns the list of all contests, post perform operations on
     a specific contest (removing them from CMS).
 
@@ -41,8 +41,7 @@ class ContestSubmissionsHandler(BaseHandler):
 
         query = self.sql_session.query(Submission).join(Task)\
             .filter(Task.contest == contest)
-        page = int(self.get_query_argument("page", 0))
-        self.render_params_for_submissions(query, page)
+        self.render_params_for_submissions(query, estimate=True)
 
         self.render("contest_submissions.html", **self.r_params)
 
@@ -185,8 +185,7 @@ class ParticipationHandler(BaseHandler):
 
         submission_query = self.sql_session.query(Submission)\
             .filter(Submission.participation == participation)
-        page = int(self.get_query_argument("page", 0))
-        self.render_params_for_submissions(submission_query, page)
+        self.render_params_for_submissions(submission_query)
 
         self.r_params["participation"] = participation
         self.r_params["selected_user"] = participation.user
@@ -58,8 +58,7 @@ class DatasetSubmissionsHandler(BaseHandler):
 
         submission_query = self.sql_session.query(Submission)\
             .filter(Submission.task == task)
-        page = int(self.get_query_argument("page", 0))
-        self.render_params_for_submissions(submission_query, page)
+        self.render_params_for_submissions(submission_query)
 
         self.r_params["task"] = task
         self.r_params["active_dataset"] = task.active_dataset
@@ -136,6 +135,7 @@ class CloneDatasetHandler(BaseHandler):
             self.get_memory_limit(attrs, "memory_limit")
             self.get_task_type(attrs, "task_type", "TaskTypeOptions_")
             self.get_score_type(attrs, "score_type", "score_type_parameters")
+            self.get_bool(attrs, "short_circuit_evaluation")
 
             # Create the dataset.
             attrs["autojudge"] = False
@@ -380,6 +380,8 @@ class AddManagerHandler(BaseHandler):
         self.sql_session.add(manager)
 
         if self.try_commit():
+            self.service.evaluation_service.dataset_updated(
+                dataset_id=dataset.id)
             self.redirect(self.url("task", task.id))
         else:
             self.redirect(fallback_page)
@@ -402,7 +404,9 @@ class DeleteManagerHandler(BaseHandler):
 
         self.sql_session.delete(manager)
 
-        self.try_commit()
+        if self.try_commit():
+            self.service.evaluation_service.dataset_updated(
+                dataset_id=dataset.id)
         self.write("./%d" % task_id)
 
 
@@ -473,6 +477,8 @@ class AddTestcaseHandler(BaseHandler):
         if self.try_commit():
             # max_score and/or extra_headers might have changed.
             self.service.proxy_service.reinitialize()
+            self.service.evaluation_service.dataset_updated(
+                dataset_id=dataset.id)
             self.redirect(self.url("task", task.id))
         else:
             self.redirect(fallback_page)
@@ -539,6 +545,8 @@ class AddTestcasesHandler(BaseHandler):
         self.service.add_notification(
             make_datetime(), successful_subject, successful_text)
         self.service.proxy_service.reinitialize()
+        self.service.evaluation_service.dataset_updated(
+            dataset_id=dataset.id)
         self.redirect(self.url("task", task.id))
 
 
@@ -562,6 +570,8 @@ class DeleteTestcaseHandler(BaseHandler):
         if self.try_commit():
             # max_score and/or extra_headers might have changed.
             self.service.proxy_service.reinitialize()
+            self.service.evaluation_service.dataset_updated(
+                dataset_id=dataset.id)
         self.write("./%d" % task_id)
 
 
@@ -176,6 +176,8 @@ class TaskHandler(BaseHandler):
                                    "TaskTypeOptions_%d_" % dataset.id)
                 self.get_score_type(attrs, "score_type_%d" % dataset.id,
                                     "score_type_parameters_%d" % dataset.id)
+                attrs["short_circuit_evaluation"] = bool(self.get_argument(
+                    "short_circuit_evaluation_%d" % dataset.id, False))
 
                 # Update the dataset.
                 dataset.set_attrs(attrs)
@@ -204,6 +206,10 @@ class TaskHandler(BaseHandler):
             # Update the task and score on RWS.
             self.service.proxy_service.dataset_updated(
                 task_id=task.id)
+            # Limits and task types might have changed.
+            for dataset in task.datasets:
+                self.service.evaluation_service.dataset_updated(
+                    dataset_id=dataset.id)
         self.redirect(self.url("task", task_id))
 
 
@@ -418,6 +424,7 @@ class AddDatasetHandler(BaseHandler):
             self.get_memory_limit(attrs, "memory_limit")
             self.get_task_type(attrs, "task_type", "TaskTypeOptions_")
             self.get_score_type(attrs, "score_type", "score_type_parameters")
+            self.get_bool(attrs, "short_circuit_evaluation")
 
             # Create the dataset.
             attrs["autojudge"] = False
@@ -444,7 +451,8 @@ class AddDatasetHandler(BaseHandler):
             self.redirect(fallback_page)
 
 
-class TaskListHandler(SimpleHandler("tasks.html")):
+class TaskListHandler(SimpleHandler("tasks.html",
+                                    navigation_lists=("task",))):
     """Get returns the list of all tasks, post perform operations on
     a specific task (removing them from CMS).
 
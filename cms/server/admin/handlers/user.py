@@ -96,7 +96,8 @@ class UserHandler(BaseHandler):
         self.redirect(fallback_page)
 
 
-class UserListHandler(SimpleHandler("users.html")):
+class UserListHandler(SimpleHandler("users.html",
+                                    navigation_lists=("user",))):
     """Get returns the list of all users, post perform operations on
     a specific user (removing them from CMS).
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cache of the data AWS needs to draw its navigation.
+
+"""
+
+import time
+
+from sqlalchemy import func
+
+from cms.db import Contest, Task, Team, User
+
+
+class NavigationCache:
+    """Process-level cache of the lists used to navigate AWS.
+
+    For each kind of object (contests, tasks, users and teams) keep a
+    lightweight list of rows, with just the few columns the pages show,
+    and the number of objects, so that they don't need to be loaded in
+    the ORM at every request.
+
+    Every write made through AWS invalidates the cache, bumping its
+    version; a list computed while the version changed is not stored,
+    as it could miss the write. Writes made by other means (e.g., the
+    import scripts) are picked up after at most MAX_AGE seconds.
+
+    """
+
+    MAX_AGE = 30.0
+
+    COLUMNS = {
+        "contest": (Contest.id, Contest.name, Contest.description),
+        "task": (Task.id, Task.name, Task.title),
+        "user": (User.id, User.username, User.first_name, User.last_name),
+        "team": (Team.id, Team.code, Team.name),
+    }
+
+    def __init__(self):
+        self.version = 0
+        # Map ("list", kind) and ("count", kind) to a tuple (version,
+        # time of the computation, value).
+        self._entries = dict()
+
+    def invalidate(self):
+        """Forget all the lists, as something changed."""
+        self.version += 1
+        self._entries.clear()
+
+    def _get(self, key, compute):
+        """Return the cached value for key, computing it if needed.
+
+        key (tuple): the key of the value.
+        compute (function): called with no arguments, returns the
+            up-to-date value.
+
+        return (object): the value.
+
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            version, timestamp, value = entry
+            if version == self.version and now - timestamp < self.MAX_AGE:
+                return value
+
+        version = self.version
+        value = compute()
+        if version == self.version:
+            self._entries[key] = (version, now, value)
+        return value
+
+    def get_list(self, session, kind):
+        """Return the lightweight list of the objects of a kind.
+
+        session (Session): the session to use, if the list has to be
+            fetched.
+        kind (string): one of the keys of COLUMNS.
+
+        return ([tuple]): one named tuple for each object, ordered by
+            id, with the attributes named as the columns in COLUMNS.
+
+        """
+        columns = self.COLUMNS[kind]
+        return self._get(
+            ("list", kind),
+            lambda: session.query(*columns).order_by(columns[0]).all())
+
+    def get_count(self, session, kind):
+        """Return the number of the objects of a kind.
+
+        session (Session): the session to use, if the count has to be
+            fetched.
+        kind (string): one of the keys of COLUMNS.
+
+        return (int): the number of objects.
+
+        """
+        id_column = self.COLUMNS[kind][0]
+        return self._get(
+            ("count", kind),
+            lambda: session.query(func.count(id_column)).scalar())
@@ -38,6 +38,7 @@ from cmscommon.binary import hex_to_bin
 from .authentication import AWSAuthMiddleware
 from .handlers import HANDLERS
 from .jinja2_toolbox import AWS_ENVIRONMENT
+from .navigation import NavigationCache
 from .rpc_authorization import rpc_authorization_checker
 
 
@@ -78,6 +79,9 @@ class AdminWebServer(WebService):
         # A list of pending notifications.
         self.notifications = []
 
+        # The lists of contests, tasks, users and teams for the pages.
+        self.navigation_cache = NavigationCache()
+
         self.admin_web_server = self.connect_to(
             ServiceCoord("AdminWebServer", 0))
         self.evaluation_service = self.connect_to(
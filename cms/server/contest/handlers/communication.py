@@ -50,6 +50,9 @@ class CommunicationHandler(ContestHandler):
     and the contest managers..
 
     """
+
+    read_only = True
+
     @tornado.web.authenticated
     @multi_contest
     def get(self):
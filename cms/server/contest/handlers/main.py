@@ -31,12 +31,13 @@ import ipaddress
 import json
 import logging
 import re
+from datetime import timedelta
 
 import tornado.web
 from sqlalchemy.orm.exc import NoResultFound
 
 from cms import config
-from cms.db import PrintJob, User, Participation, Team
+from cms.db import PrintJob, User, Participation, Team, get_staleness
 from cms.grading.steps import COMPILATION_MESSAGES, EVALUATION_MESSAGES
 from cms.server import multi_contest
 from cms.server.contest.authentication import validate_login
@@ -61,6 +62,9 @@ class MainHandler(ContestHandler):
     """Home page handler.
 
     """
+
+    read_only = True
+
     @multi_contest
     def get(self):
         self.render("overview.html", **self.r_params)
@@ -230,6 +234,7 @@ class NotificationsHandler(ContestHandler):
     """
 
     refresh_cookie = False
+    read_only = True
 
     @tornado.web.authenticated
     @multi_contest
@@ -240,8 +245,12 @@ class NotificationsHandler(ContestHandler):
         if last_notification is not None:
             last_notification = make_datetime(float(last_notification))
 
+        # Communications newer than the data we read could still be
+        # missing, and the client would not ask for them again.
+        snapshot = self.timestamp - timedelta(
+            seconds=get_staleness(self.sql_session))
         res = get_communications(self.sql_session, participation,
-                                 self.timestamp, after=last_notification)
+                                 snapshot, after=last_notification)
 
         # Simple notifications
         notifications = self.service.notifications
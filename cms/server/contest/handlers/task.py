@@ -45,6 +45,9 @@ class TaskDescriptionHandler(ContestHandler):
     """Shows the data of a task in the contest.
 
     """
+
+    read_only = True
+
     @tornado.web.authenticated
     @actual_phase_required(0, 3)
     @multi_contest
@@ -31,6 +31,7 @@
 
 import logging
 import re
+import time
 
 import tornado.web
 from sqlalchemy.orm import joinedload
@@ -39,6 +40,7 @@ from cms import config, FEEDBACK_LEVEL_FULL
 from cms.db import Submission, SubmissionResult
 from cms.grading.languagemanager import get_language
 from cms.grading.scoring import task_score
+from cms.io import tracer
 from cms.server import multi_contest
 from cms.server.contest.submission import get_submission_count, \
     UnacceptableSubmission, accept_submission
@@ -77,12 +79,15 @@ class SubmitHandler(ContestHandler):
 
         query_args = dict()
 
+        start_time = time.monotonic()
         try:
             submission = accept_submission(
                 self.sql_session, self.service.file_cacher, self.current_user,
                 task, self.timestamp, self.request.files,
                 self.get_argument("language", None), official)
             self.sql_session.commit()
+            tracer.observe("submission_storage",
+                           time.monotonic() - start_time)
         except UnacceptableSubmission as e:
             logger.info("Sent error: `%s' - `%s'", e.subject, e.formatted_text)
             self.notify_error(e.subject, e.text, e.text_params)
@@ -106,6 +111,9 @@ class TaskSubmissionsHandler(ContestHandler):
     """Shows the data of a task in the contest.
 
     """
+
+    read_only = True
+
     @tornado.web.authenticated
     @actual_phase_required(0, 3)
     @multi_contest
@@ -180,6 +188,7 @@ class SubmissionStatusHandler(ContestHandler):
     }
 
     refresh_cookie = False
+    read_only = True
 
     def add_task_score(self, participation, task, data):
         """Add the task score information to the dict to be returned.
@@ -276,6 +285,7 @@ class SubmissionStatusHandler(ContestHandler):
 class SubmissionDetailsHandler(ContestHandler):
 
     refresh_cookie = False
+    read_only = True
 
     @tornado.web.authenticated
     @actual_phase_required(0, 3)
@@ -26,8 +26,8 @@ is irrelevant and duplicates are allowed.
 
 """
 
-from .check import get_submission_count, check_max_number, \
-    get_latest_submission, check_min_interval
+from .check import SubmissionStats, get_submission_count, \
+    check_max_number, get_latest_submission, check_min_interval
 from .file_matching import InvalidFilesOrLanguage, match_files_and_language
 from .file_retrieval import ReceivedFile, InvalidArchive, \
     extract_files_from_archive, extract_files_from_tornado
@@ -39,8 +39,8 @@ from .workflow import UnacceptableSubmission, accept_submission, \
 
 __all__ = [
     # check.py
-    "get_submission_count", "check_max_number", "get_latest_submission",
-    "check_min_interval",
+    "SubmissionStats", "get_submission_count", "check_max_number",
+    "get_latest_submission", "check_min_interval",
     # file_retrieval.py
     "ReceivedFile", "InvalidArchive", "extract_files_from_archive",
     "extract_files_from_tornado",
@@ -92,9 +92,77 @@ def get_submission_count(
     return q.scalar()
 
 
+class SubmissionStats:
+    """Figures about the submissions a contestant sent in.
+
+    Hold the number of submissions (or user tests) of a participation
+    and the timestamp of the latest one, both on a given task and on
+    all the tasks of its contest. They are all fetched with a single
+    aggregate query, the first time any of them is needed, so that
+    many checks can be performed with a single round trip to the
+    database (or none at all, if no check needs them).
+
+    """
+
+    def __init__(self, sql_session, participation, task, cls=Submission):
+        """Prepare to fetch the figures.
+
+        sql_session (Session): the SQLAlchemy session to use.
+        participation (Participation): the participation to fetch data
+            for.
+        task (Task): the task to fetch data for (the contest is the
+            task's one).
+        cls (type): if the UserTest class is given, look at user tests
+            rather than submissions.
+
+        """
+        self.sql_session = sql_session
+        self.participation = participation
+        self.task = task
+        self.cls = cls
+        self._row = None
+
+    def _fetch(self):
+        if self._row is None:
+            cls = self.cls
+            on_task = cls.task == self.task
+            q = self.sql_session.query(
+                func.count(cls.id),
+                func.count(cls.id).filter(on_task),
+                func.max(cls.timestamp),
+                func.max(cls.timestamp).filter(on_task))
+            q = _filter_submission_query(
+                q, self.participation, self.task.contest, None, cls)
+            self._row = q.one()
+        return self._row
+
+    def get_count(self, task=None):
+        """Return the number of submissions on the task or contest.
+
+        task (Task|None): if given count only on the task, otherwise
+            on all the contest's tasks.
+
+        return (int): the count.
+
+        """
+        return self._fetch()[0 if task is None else 1]
+
+    def get_latest_timestamp(self, task=None):
+        """Return the timestamp of the latest submission.
+
+        task (Task|None): if given look only at the task, otherwise at
+            all the contest's tasks.
+
+        return (datetime|None): the timestamp, if there are any
+            submissions.
+
+        """
+        return self._fetch()[2 if task is None else 3]
+
+
 def check_max_number(
         sql_session, max_number, participation, contest=None, task=None,
-        cls=Submission):
+        cls=Submission, stats=None):
     """Check whether user already sent in given number of submissions.
 
     Verify whether the given participation did already hit the given
@@ -110,14 +178,20 @@ def check_max_number(
     task (Task|None): if given count only on this task (trumps contest).
     cls (type): if the UserTest class is given, count user tests rather
         than submissions.
+    stats (SubmissionStats|None): if given, take the count from here
+        (it must refer to the same participation, task or contest's
+        tasks, and class) rather than querying the database.
 
     return (bool): whether the contestant can submit more.
 
     """
     if max_number is None or participation.unrestricted:
         return True
-    count = get_submission_count(
-        sql_session, participation, contest=contest, task=task, cls=cls)
+    if stats is not None:
+        count = stats.get_count(task=task)
+    else:
+        count = get_submission_count(
+            sql_session, participation, contest=contest, task=task, cls=cls)
     return count < max_number
 
 
@@ -148,7 +222,7 @@ def get_latest_submission(
 
 def check_min_interval(
         sql_session, min_interval, timestamp, participation, contest=None,
-        task=None, cls=Submission):
+        task=None, cls=Submission, stats=None):
     """Check whether user sent in latest submission long enough ago.
 
     Verify whether at least the given amount of time has passed since
@@ -163,6 +237,9 @@ def check_min_interval(
     task (Task|None): if given look only at this task (trumps contest).
     cls (type): if the UserTest class is given, fetch user tests rather
         than submissions.
+    stats (SubmissionStats|None): if given, take the latest timestamp
+        from here (it must refer to the same participation, task or
+        contest's tasks, and class) rather than querying the database.
 
     return (bool): whether the contestant's "cool down" period has
         expired and they can submit again.
@@ -170,7 +247,10 @@ def check_min_interval(
     """
     if min_interval is None or participation.unrestricted:
         return True
-    submission = get_latest_submission(
-        sql_session, participation, contest=contest, task=task, cls=cls)
-    return (submission is None
-            or timestamp - submission.timestamp >= min_interval)
+    if stats is not None:
+        latest = stats.get_latest_timestamp(task=task)
+    else:
+        submission = get_latest_submission(
+            sql_session, participation, contest=contest, task=task, cls=cls)
+        latest = submission.timestamp if submission is not None else None
+    return latest is None or timestamp - latest >= min_interval
@@ -32,7 +32,7 @@ import logging
 from cms import config
 from cms.db import Submission, File, UserTestManager, UserTestFile, UserTest
 from cmscommon.datetime import make_timestamp
-from .check import check_max_number, check_min_interval
+from .check import SubmissionStats, check_max_number, check_min_interval
 from .file_matching import InvalidFilesOrLanguage, match_files_and_language
 from .file_retrieval import InvalidArchive, extract_files_from_tornado
 from .utils import fetch_file_digests_from_previous_submission, StorageFailed, \
@@ -92,10 +92,13 @@ def accept_submission(sql_session, file_cacher, participation, task, timestamp,
     contest = participation.contest
     assert task.contest is contest
 
-    # Check whether the contestant is allowed to submit.
+    # Check whether the contestant is allowed to submit. The data all
+    # checks need is fetched at once, and only if some check needs it.
+
+    stats = SubmissionStats(sql_session, participation, task)
 
     if not check_max_number(sql_session, contest.max_submission_number,
-                            participation, contest=contest):
+                            participation, contest=contest, stats=stats):
         raise UnacceptableSubmission(
             N_("Too many submissions!"),
             N_("You have reached the maximum limit of "
@@ -103,7 +106,7 @@ def accept_submission(sql_session, file_cacher, participation, task, timestamp,
             contest.max_submission_number)
 
     if not check_max_number(sql_session, task.max_submission_number,
-                            participation, task=task):
+                            participation, task=task, stats=stats):
         raise UnacceptableSubmission(
             N_("Too many submissions!"),
             N_("You have reached the maximum limit of "
@@ -111,7 +114,8 @@ def accept_submission(sql_session, file_cacher, participation, task, timestamp,
             task.max_submission_number)
 
     if not check_min_interval(sql_session, contest.min_submission_interval,
-                              timestamp, participation, contest=contest):
+                              timestamp, participation, contest=contest,
+                              stats=stats):
         raise UnacceptableSubmission(
             N_("Submissions too frequent!"),
             N_("Among all tasks, you can submit again "
@@ -119,7 +123,8 @@ def accept_submission(sql_session, file_cacher, participation, task, timestamp,
             contest.min_submission_interval.total_seconds())
 
     if not check_min_interval(sql_session, task.min_submission_interval,
-                              timestamp, participation, task=task):
+                              timestamp, participation, task=task,
+                              stats=stats):
         raise UnacceptableSubmission(
             N_("Submissions too frequent!"),
             N_("For this task, you can submit again "
@@ -174,15 +179,16 @@ def accept_submission(sql_session, file_cacher, participation, task, timestamp,
         except StorageFailed:
             logger.error("Submission local copy failed.", exc_info=True)
 
-    # We now have to send all the files to the destination...
+    # We now have to send all the files to the destination, at once...
     try:
-        for codename, content in files.items():
-            digest = file_cacher.put_file_content(
-                content,
-                "Submission file %s sent by %s at %d." % (
-                    codename, participation.user.username,
-                    make_timestamp(timestamp)))
-            digests[codename] = digest
+        codenames = list(files.keys())
+        stored_digests = file_cacher.put_many([
+            (files[codename],
+             "Submission file %s sent by %s at %d." % (
+                 codename, participation.user.username,
+                 make_timestamp(timestamp)))
+            for codename in codenames])
+        digests.update(zip(codenames, stored_digests))
 
     # In case of error, the server aborts the submission
     except Exception as error:
@@ -259,10 +265,15 @@ def accept_user_test(sql_session, file_cacher, participation, task, timestamp,
     if not task_type.testable:
         raise TestingNotAllowed()
 
-    # Check whether the contestant is allowed to send a test.
+    # Check whether the contestant is allowed to send a test. The data
+    # all checks need is fetched at once, and only if some check needs
+    # it.
+
+    stats = SubmissionStats(sql_session, participation, task, cls=UserTest)
 
     if not check_max_number(sql_session, contest.max_user_test_number,
-                            participation, contest=contest, cls=UserTest):
+                            participation, contest=contest, cls=UserTest,
+                            stats=stats):
         raise UnacceptableUserTest(
             N_("Too many tests!"),
             N_("You have reached the maximum limit of "
@@ -270,7 +281,8 @@ def accept_user_test(sql_session, file_cacher, participation, task, timestamp,
             contest.max_user_test_number)
 
     if not check_max_number(sql_session, task.max_user_test_number,
-                            participation, task=task, cls=UserTest):
+                            participation, task=task, cls=UserTest,
+                            stats=stats):
         raise UnacceptableUserTest(
             N_("Too many tests!"),
             N_("You have reached the maximum limit of "
@@ -279,7 +291,7 @@ def accept_user_test(sql_session, file_cacher, participation, task, timestamp,
 
     if not check_min_interval(sql_session, contest.min_user_test_interval,
                               timestamp, participation, contest=contest,
-                              cls=UserTest):
+                              cls=UserTest, stats=stats):
         raise UnacceptableUserTest(
             N_("Tests too frequent!"),
             N_("Among all tasks, you can test again "
@@ -288,7 +300,7 @@ def accept_user_test(sql_session, file_cacher, participation, task, timestamp,
 
     if not check_min_interval(sql_session, task.min_user_test_interval,
                               timestamp, participation, task=task,
-                              cls=UserTest):
+                              cls=UserTest, stats=stats):
         raise UnacceptableUserTest(
             N_("Tests too frequent!"),
             N_("For this task, you can test again "
@@ -356,15 +368,16 @@ def accept_user_test(sql_session, file_cacher, participation, task, timestamp,
         except StorageFailed:
             logger.error("Test local copy failed.", exc_info=True)
 
-    # We now have to send all the files to the destination...
+    # We now have to send all the files to the destination, at once...
     try:
-        for codename, content in files.items():
-            digest = file_cacher.put_file_content(
-                content,
-                "Test file %s sent by %s at %d." % (
-                    codename, participation.user.username,
-                    make_timestamp(timestamp)))
-            digests[codename] = digest
+        codenames = list(files.keys())
+        stored_digests = file_cacher.put_many([
+            (files[codename],
+             "Test file %s sent by %s at %d." % (
+                 codename, participation.user.username,
+                 make_timestamp(timestamp)))
+            for codename in codenames])
+        digests.update(zip(codenames, stored_digests))
 
     # In case of error, the server aborts the submission
     except Exception as error:
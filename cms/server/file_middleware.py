@@ -16,7 +16,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from werkzeug.exceptions import HTTPException, NotFound, ServiceUnavailable
+import re
+
+import gevent.event
+from werkzeug.exceptions import Forbidden, HTTPException, \
+    MethodNotAllowed, NotFound, ServiceUnavailable
 from werkzeug.wrappers import Response, Request
 from werkzeug.wsgi import responder, wrap_file
 
@@ -119,3 +123,106 @@ class FileServerMiddleware:
             return exc
 
         return response
+
+
+class CachedFileServer:
+    """Serve the files of a FileCacher, by digest, to other services.
+
+    This is the server side of the PeerBackend of the FileCacher: a GET
+    request to /<digest> returns the content of the file. Files missing
+    from the local cache are fetched first, through the cacher (which
+    may in turn ask its own peers, and then the database): this way,
+    when many services ask for the same file at the same time, they can
+    be organized in a tree and the database is only queried once.
+    Requests for a file that is already being fetched wait for that
+    fetch to finish. As the server can read any file, requests should
+    be restricted to the addresses of the services using it.
+
+    """
+
+    DIGEST_RE = re.compile(r"^/([0-9a-f]{40})$")
+
+    def __init__(self, file_cacher, allowed_addresses=None):
+        """Create an instance.
+
+        file_cacher (FileCacher): the cacher to retrieve files from.
+        allowed_addresses ({string}|None): the IP addresses of the
+            clients allowed to fetch files, or None to allow all.
+
+        """
+        self.file_cacher = file_cacher
+        self.allowed_addresses = allowed_addresses
+        # Map each digest being fetched to the result of the fetch.
+        self._fetching = dict()
+
+    def __call__(self, environ, start_response):
+        """Execute this instance as a WSGI application.
+
+        See the PEP for the meaning of parameters. The separation of
+        __call__ and wsgi_app eases the insertion of middlewares.
+
+        """
+        return self.wsgi_app(environ, start_response)
+
+    def _get_file(self, digest):
+        """Return a file, fetching it once for all concurrent requests.
+
+        digest (unicode): the digest of the file to get.
+
+        return (fileobj): a readable binary file-like object with the
+            content of the file.
+
+        raise (KeyError): if the file cannot be found.
+        raise (TombstoneError): if the digest is the tombstone.
+
+        """
+        result = self._fetching.get(digest)
+        if result is not None:
+            # Raises the error of the fetch, if any; otherwise the file
+            # is now in the local cache.
+            result.get()
+            return self.file_cacher.get_file(digest)
+        result = gevent.event.AsyncResult()
+        self._fetching[digest] = result
+        try:
+            fobj = self.file_cacher.get_file(digest)
+        except Exception as error:
+            result.set_exception(error)
+            raise
+        else:
+            result.set()
+            return fobj
+        finally:
+            del self._fetching[digest]
+
+    @responder
+    def wsgi_app(self, environ, start_response):
+        """Execute this instance as a WSGI application.
+
+        See the PEP for the meaning of parameters. The separation of
+        __call__ and wsgi_app eases the insertion of middlewares.
+
+        """
+        request = Request(environ)
+        if self.allowed_addresses is not None \
+                and request.remote_addr not in self.allowed_addresses:
+            return Forbidden()
+        if request.method != "GET":
+            return MethodNotAllowed()
+        match = self.DIGEST_RE.match(request.path)
+        if match is None:
+            return NotFound()
+        digest = match.group(1)
+
+        try:
+            fobj = self._get_file(digest)
+        except (KeyError, TombstoneError):
+            return NotFound()
+
+        response = Response()
+        response.status_code = 200
+        response.mimetype = "application/octet-stream"
+        response.response = \
+            wrap_file(environ, fobj, buffer_size=FileCacher.CHUNK_SIZE)
+        response.direct_passthrough = True
+        return response
@@ -27,12 +27,13 @@
 """
 
 import logging
+import time
 from functools import wraps
 from urllib.parse import quote, urlencode
 
 from tornado.web import RequestHandler
 
-from cms.db import Session
+from cms.db import Session, observe_session, read_only_session
 from cms.server.file_middleware import FileServerMiddleware
 from cmscommon.datetime import make_datetime
 
@@ -164,10 +165,22 @@ class CommonRequestHandler(RequestHandler):
     # requests.
     refresh_cookie = True
 
+    # Whether this handler only reads from the database, so that it can
+    # use a session reading from the replica (see read_only_session).
+    read_only = False
+
+    # The cookie holding when the client last sent a request that could
+    # write to the database.
+    LAST_WRITE_COOKIE = "last_write"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.timestamp = make_datetime()
-        self.sql_session = Session()
+        self.sql_session_start = time.monotonic()
+        if self.read_only:
+            self.sql_session = read_only_session(self.get_last_write())
+        else:
+            self.sql_session = Session()
         self.r_params = None
         self.contest = None
         self.url = None
@@ -179,11 +192,27 @@ class CommonRequestHandler(RequestHandler):
         super().prepare()
         self.url = Url(get_url_root(self.request.path))
         self.set_header("Cache-Control", "no-cache, must-revalidate")
+        # Let the next requests of the client read its own writes.
+        if self.request.method == "POST":
+            self.set_cookie(self.LAST_WRITE_COOKIE, "%.3f" % time.time())
+
+    def get_last_write(self):
+        """Return when the client last sent a request that could write.
+
+        return (float|None): the time (seconds since the epoch), or None
+            if unknown.
+
+        """
+        try:
+            return float(self.get_cookie(self.LAST_WRITE_COOKIE))
+        except (TypeError, ValueError):
+            return None
 
     def finish(self, *args, **kwargs):
         """Finish this response, ending the HTTP request.
 
-        We override this method in order to properly close the database.
+        We override this method in order to properly close the database
+        session, and record its metrics.
 
         TODO - Now that we have greenlet support, this method could be
         refactored in terms of context manager or something like
@@ -195,6 +224,7 @@ class CommonRequestHandler(RequestHandler):
                 self.sql_session.close()
             except Exception as error:
                 logger.warning("Couldn't close SQL connection: %r", error)
+            observe_session(self.sql_session, self.sql_session_start)
         try:
             super().finish(*args, **kwargs)
         except OSError:
@@ -35,21 +35,28 @@ from collections import defaultdict
 from datetime import timedelta
 from functools import wraps
 
+import gevent
 import gevent.lock
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
-from cms import ServiceCoord, get_service_shards
+from cms import ConfigError, ServiceCoord, config, get_service_shards
 from cms.db import SessionGen, Digest, Dataset, Evaluation, Submission, \
-    SubmissionResult, Testcase, UserTest, UserTestResult, get_submissions, \
-    get_submission_results, get_datasets_to_judge
+    SubmissionResult, Task, Testcase, UserTest, UserTestResult, \
+    get_submissions, get_datasets_to_judge, invalidate_submission_results
 from cms.grading.Job import JobGroup
-from cms.io import Executor, TriggeredService, rpc_method
-from .esoperations import ESOperation, get_relevant_operations, \
+from cms.grading.steps import EVALUATION_MESSAGES
+from cms.grading.tasktypes import get_task_type_class
+from cms.io import Executor, FairPriorityQueue, TriggeredService, \
+    end_span, rpc_method, start_span, tracer
+from cms.metrics import registry
+from cmscommon.datetime import make_timestamp
+from .esoperations import ESOperation, get_relevant_operations_by_id, \
     get_submissions_operations, get_user_tests_operations, \
     submission_get_operations, submission_to_evaluate, \
     user_test_get_operations
 from .flushingdict import FlushingDict
+from .testcasestats import TestcaseStatistics
 from .workerpool import WorkerPool
 
 
@@ -61,6 +68,15 @@ class EvaluationExecutor(Executor):
     # Real maximum number of operations to be sent to a worker.
     MAX_OPERATIONS_PER_BATCH = 25
 
+    # The flows among which the queue is shared fairly, for each value
+    # of config.evaluation_fair_share. Tasks are approximated with
+    # datasets, as only the active dataset of a task is judged with a
+    # priority higher than extra low.
+    FAIR_SHARE_KEYS = {
+        "participation": lambda operation: operation.participation_id,
+        "task": lambda operation: operation.dataset_id,
+    }
+
     def __init__(self, evaluation_service):
         """Create the single executor for ES.
 
@@ -69,6 +85,16 @@ class EvaluationExecutor(Executor):
         """
         super().__init__(True)
 
+        if config.evaluation_fair_share is not None:
+            if config.evaluation_fair_share \
+                    not in EvaluationExecutor.FAIR_SHARE_KEYS:
+                raise ConfigError("Unknown evaluation_fair_share `%s'." %
+                                  config.evaluation_fair_share)
+            self._operation_queue = FairPriorityQueue(
+                EvaluationExecutor.FAIR_SHARE_KEYS[
+                    config.evaluation_fair_share],
+                config.evaluation_fair_share_quantum)
+
         self.evaluation_service = evaluation_service
         self.pool = WorkerPool(self.evaluation_service)
 
@@ -82,6 +108,11 @@ class EvaluationExecutor(Executor):
         for i in range(get_service_shards("Worker")):
             worker = ServiceCoord("Worker", i)
             self.pool.add_worker(worker)
+        for state in ("busy", "free", "disabled", "disconnected"):
+            registry.gauge("cms_workers", "Number of workers in each state.",
+                           {"state": state},
+                           function=lambda state=state:
+                           self.pool.get_counts()[state])
 
     def __contains__(self, item):
         """Return whether the item is in execution.
@@ -122,6 +153,7 @@ class EvaluationExecutor(Executor):
             perform.
 
         """
+        entries = entries + self._other_testcases_entries(entries)
         with self._current_execution_lock:
             self._currently_executing = []
             for entry in entries:
@@ -131,6 +163,7 @@ class EvaluationExecutor(Executor):
                 # will return it to us, and we will use it to
                 # re-enqueue it.
                 operation.side_data = (entry.priority, entry.timestamp)
+                start_span(operation.trace, "dispatch")
                 self._currently_executing.append(operation)
         while len(self._currently_executing) > 0:
             self.pool.wait_for_workers()
@@ -142,6 +175,65 @@ class EvaluationExecutor(Executor):
                     self._currently_executing = []
                     break
 
+    def _other_testcases_entries(self, entries):
+        """Extract the evaluations to execute together with a batch.
+
+        For the task types that evaluate the testcases together, all
+        the queued evaluations of a submission go to the worker in the
+        same job group as the first one extracted, regardless of the
+        size of the batches.
+
+        entries ([QueueEntry]): the batch extracted from the queue.
+
+        return ([QueueEntry]): the entries of the evaluations of the
+            same submissions (and datasets) on the other testcases,
+            removed from the queue.
+
+        """
+        res = []
+        seen = set()
+        for entry in entries:
+            operation = entry.item
+            key = (operation.object_id, operation.dataset_id)
+            if operation.type_ != ESOperation.EVALUATION or key in seen:
+                continue
+            seen.add(key)
+            template = self.pool.get_dataset_template(operation.dataset_id)
+            try:
+                task_type = get_task_type_class(template["task_type"])
+            except KeyError:
+                continue
+            if not task_type.EVALUATE_TESTCASES_TOGETHER:
+                continue
+            for codename in sorted(template["testcases"]):
+                other = ESOperation(ESOperation.EVALUATION,
+                                    operation.object_id,
+                                    operation.dataset_id,
+                                    codename)
+                if other in self._operation_queue:
+                    other_entry = self._operation_queue.remove(other)
+                    end_span(other_entry.item.trace, "queue")
+                    res.append(other_entry)
+        self.executed_operations += len(res)
+        return res
+
+    def get_snapshot(self):
+        """Return the operations to save in a snapshot of the queue.
+
+        Besides the queue, include the operations extracted but not
+        yet completed, as they would be lost with the service.
+
+        return ([(ESOperation, int, datetime)]): the operations, with
+            their priorities and timestamps.
+
+        """
+        with self._current_execution_lock:
+            operations = self._currently_executing + \
+                self.pool.get_operations()
+        return super().get_snapshot() + [
+            (operation,) + tuple(operation.side_data)
+            for operation in operations]
+
     def dequeue(self, operation):
         """Remove an item from the queue.
 
@@ -212,6 +304,11 @@ class EvaluationService(TriggeredService):
     # The maximum time since the last result before processing.
     MAX_FLUSHING_TIME_SECONDS = 2
 
+    # How many submissions an invalidation processes at a time.
+    INVALIDATION_CHUNK_SIZE = 200
+    # How many invalidations invalidation_status reports.
+    INVALIDATION_HISTORY = 10
+
     def __init__(self, shard, contest_id=None):
         super().__init__(shard)
 
@@ -224,6 +321,10 @@ class EvaluationService(TriggeredService):
             EvaluationService.MAX_FLUSHING_TIME_SECONDS,
             self.write_results)
 
+        # Statistics of the results of the testcases, to push first the
+        # evaluations that likely fail.
+        self.testcase_statistics = TestcaseStatistics()
+
         # This lock is used to avoid inserting in the queue (which
         # itself is already thread-safe) an operation which is already
         # being processed. Such operation might be in one of the
@@ -247,10 +348,16 @@ class EvaluationService(TriggeredService):
         # operations in state 4.
         self.post_finish_lock = gevent.lock.RLock()
 
+        # Invalidations run in the background, one at a time; the
+        # latest ones are kept to report their progress.
+        self._invalidation_lock = gevent.lock.Semaphore()
+        self._invalidations = []
+
         self.scoring_service = self.connect_to(
             ServiceCoord("ScoringService", 0))
 
         self.add_executor(EvaluationExecutor(self))
+        self.start_queue_snapshots(config.queue_snapshot_period)
         self.start_sweeper(117.0)
 
         self.add_timeout(self.check_workers_timeout, None,
@@ -274,8 +381,9 @@ class EvaluationService(TriggeredService):
         for dataset in get_datasets_to_judge(submission.task):
             submission_result = submission.get_result(dataset)
             number_of_operations = 0
-            for operation, priority, timestamp in submission_get_operations(
-                    submission_result, submission, dataset):
+            for operation, priority, timestamp in \
+                    self.testcase_statistics.sort(submission_get_operations(
+                        submission_result, submission, dataset)):
                 number_of_operations += 1
                 if self.enqueue(operation, priority, timestamp):
                     new_operations += 1
@@ -319,18 +427,57 @@ class EvaluationService(TriggeredService):
         """
         counter = 0
         with SessionGen() as session:
+            counter += self.enqueue_many(
+                get_submissions_operations(session, self.contest_id))
+            counter += self.enqueue_many(
+                get_user_tests_operations(session, self.contest_id))
 
-            for operation, timestamp, priority in \
-                    get_submissions_operations(session, self.contest_id):
-                if self.enqueue(operation, timestamp, priority):
-                    counter += 1
+        return counter
 
-            for operation, timestamp, priority in \
-                    get_user_tests_operations(session, self.contest_id):
-                if self.enqueue(operation, timestamp, priority):
-                    counter += 1
+    def item_to_snapshot(self, operation):
+        """See TriggeredService.item_to_snapshot."""
+        return [operation.type_, operation.object_id, operation.dataset_id,
+                operation.testcase_codename, operation.participation_id]
 
-        return counter
+    def item_from_snapshot(self, data):
+        """See TriggeredService.item_from_snapshot."""
+        return ESOperation(*data)
+
+    @with_post_finish_lock
+    def validate_snapshot(self, entries):
+        """Keep only the operations of the snapshot still to do.
+
+        The operations of the submissions and user tests of the
+        snapshot are computed again, so that we don't repeat the ones
+        done since the snapshot was taken (and only the ones for the
+        contest we are running for are kept). New submissions are
+        left to the sweeper.
+
+        entries ([(ESOperation, int, datetime)]): the operations of
+            the snapshot, with their priorities and timestamps.
+
+        return ([(ESOperation, int, datetime)]): the operations to
+            enqueue.
+
+        """
+        submission_ids = set()
+        user_test_ids = set()
+        for operation, _, _ in entries:
+            if operation.for_submission():
+                submission_ids.add(operation.object_id)
+            else:
+                user_test_ids.add(operation.object_id)
+
+        with SessionGen() as session:
+            operations = []
+            if submission_ids:
+                operations += get_submissions_operations(
+                    session, self.contest_id, submission_ids=submission_ids)
+            if user_test_ids:
+                operations += get_user_tests_operations(
+                    session, self.contest_id, user_test_ids=user_test_ids)
+        valid = set(operation for operation, _, _ in operations)
+        return [entry for entry in entries if entry[0] in valid]
 
     @rpc_method
     def workers_status(self):
@@ -389,6 +536,25 @@ class EvaluationService(TriggeredService):
         # enqueue() returns the number of successful pushes.
         return super().enqueue(operation, priority, timestamp) > 0
 
+    @with_post_finish_lock
+    def enqueue_many(self, entries):
+        """Push several operations in the queue.
+
+        As enqueue, but for many operations at once; among those with
+        the same priority and timestamp, the evaluations that likely
+        fail are pushed first.
+
+        entries ([(ESOperation, int, datetime)]): the operations to put
+            in the queue, each with its priority and timestamp.
+
+        return (int): the number of operations pushed.
+
+        """
+        executor = self.get_executor()
+        return super().enqueue_many(
+            entry for entry in self.testcase_statistics.sort(entries)
+            if entry[0] not in executor and entry[0] not in self.result_cache)
+
     @with_post_finish_lock
     def action_finished(self, data, shard, error=None):
         """Callback from a worker, to signal that is finished some
@@ -438,6 +604,7 @@ class EvaluationService(TriggeredService):
                 if isinstance(to_ignore, list) and operation in to_ignore:
                     logger.info("`%s' result ignored as requested", operation)
                 else:
+                    start_span(operation.trace, "writing")
                     self.result_cache.add(operation, Result(job, job.success))
 
     @with_post_finish_lock
@@ -493,6 +660,11 @@ class EvaluationService(TriggeredService):
                 self.write_results_one_object_and_type(
                     session, object_result, operation_results)
 
+            for type_, object_id, dataset_id in by_object_and_type.keys():
+                if type_ == ESOperation.EVALUATION:
+                    self.skip_irrelevant_evaluations(
+                        session, object_id, dataset_id)
+
             logger.info("Committing evaluations...")
             session.commit()
 
@@ -515,6 +687,10 @@ class EvaluationService(TriggeredService):
             logger.info("Committing evaluation outcomes...")
             session.commit()
 
+            for operation, _ in items:
+                end_span(operation.trace, "writing")
+                tracer.record(operation.trace)
+
             logger.info("Ending operations for %s objects...",
                         len(by_object_and_type))
             for type_, object_id, dataset_id in by_object_and_type.keys():
@@ -538,6 +714,60 @@ class EvaluationService(TriggeredService):
 
         logger.info("Done")
 
+    def skip_irrelevant_evaluations(self, session, submission_id,
+                                    dataset_id):
+        """Skip the evaluations that cannot change the score anymore.
+
+        Only for the datasets with short_circuit_evaluation: the
+        testcases that the score type deems irrelevant, given the
+        outcomes received so far, get an evaluation without outcome,
+        and their operations are removed from the queue (or ignored,
+        if already sent to a worker).
+
+        session (Session): the DB session to use.
+        submission_id (int): the id of the submission.
+        dataset_id (int): the id of the dataset.
+
+        """
+        dataset = Dataset.get_from_id(dataset_id, session)
+        if dataset is None or not dataset.short_circuit_evaluation:
+            return
+        submission_result = SubmissionResult.get_from_id(
+            (submission_id, dataset_id), session)
+        if submission_result is None or submission_result.evaluated():
+            return
+
+        evaluated = set()
+        outcomes = dict()
+        for evaluation in submission_result.evaluations:
+            evaluated.add(evaluation.codename)
+            if evaluation.outcome is not None:
+                outcomes[evaluation.codename] = float(evaluation.outcome)
+        try:
+            irrelevant = dataset.score_type_object.get_irrelevant_testcases(
+                outcomes)
+        except Exception:
+            logger.error("Couldn't compute the irrelevant testcases of "
+                         "submission %d(%d).", submission_id, dataset_id,
+                         exc_info=True)
+            return
+
+        for codename in sorted(irrelevant - evaluated):
+            operation = ESOperation(ESOperation.EVALUATION,
+                                    submission_id, dataset_id, codename)
+            try:
+                self.dequeue(operation)
+            except KeyError:
+                pass  # Ok, the operation wasn't in the queue.
+            try:
+                self.get_executor().pool.ignore_operation(operation)
+            except LookupError:
+                pass  # Ok, the operation wasn't in the pool.
+            logger.info("Skipping %s.", operation)
+            submission_result.evaluations.append(Evaluation(
+                text=[EVALUATION_MESSAGES.get("notevaluated").message],
+                testcase=dataset.testcases[codename]))
+
     def write_results_one_object_and_type(
             self, session, object_result, operation_results):
         """Write to the DB the results for one object and type.
@@ -588,6 +818,10 @@ class EvaluationService(TriggeredService):
         elif operation.type_ == ESOperation.EVALUATION:
             if result.job_success:
                 result.job.to_submission(object_result)
+                self.testcase_statistics.record(
+                    operation.dataset_id, operation.testcase_codename,
+                    result.job.outcome,
+                    result.job.plus.get("execution_time"))
             else:
                 if result.job.plus is not None and \
                    result.job.plus.get("tombstone") is True:
@@ -828,7 +1062,19 @@ class EvaluationService(TriggeredService):
             session.commit()
 
     @rpc_method
-    @with_post_finish_lock
+    def dataset_updated(self, dataset_id):
+        """This RPC informs ES that a dataset was modified (e.g., its
+        limits, managers or testcases), so that the jobs on it are no
+        longer built from the old data.
+
+        dataset_id (int): the id of the dataset.
+
+        """
+        logger.info("Dataset %d was updated, forgetting its job "
+                    "templates.", dataset_id)
+        self.get_executor().pool.invalidate_job_templates(dataset_id)
+
+    @rpc_method
     def invalidate_submission(self,
                               contest_id=None,
                               submission_id=None,
@@ -853,6 +1099,10 @@ class EvaluationService(TriggeredService):
         the workers are ignored. New appropriate operations are
         enqueued.
 
+        The work is done in the background, in chunks of submissions,
+        so that a large invalidation doesn't block the service; its
+        progress is reported by invalidation_status.
+
         submission_id (int|None): id of the submission to invalidate,
             or None.
         dataset_id (int|None): id of the dataset to invalidate, or
@@ -874,27 +1124,117 @@ class EvaluationService(TriggeredService):
         if contest_id is None:
             contest_id = self.contest_id
 
+        progress = {
+            "level": level,
+            "filters": {"contest_id": contest_id,
+                        "submission_id": submission_id,
+                        "dataset_id": dataset_id,
+                        "participation_id": participation_id,
+                        "task_id": task_id},
+            "total": None,
+            "done": 0,
+            "started": make_timestamp(),
+            "finished": None,
+            "error": None,
+        }
+        self._invalidations.append(progress)
+        del self._invalidations[:-EvaluationService.INVALIDATION_HISTORY]
+
+        gevent.spawn(self._invalidate, progress, contest_id, submission_id,
+                     dataset_id, participation_id, task_id, level)
+
+    def _invalidate(self, progress, contest_id, submission_id, dataset_id,
+                    participation_id, task_id, level):
+        """Do the work requested to invalidate_submission.
+
+        The submissions are processed in chunks, yielding to the other
+        greenlets in between; the invalidations are serialized.
+
+        progress (dict): the progress of the invalidation, updated
+            while it proceeds.
+
+        The other arguments are as in invalidate_submission.
+
+        """
+        with self._invalidation_lock:
+            try:
+                with SessionGen() as session:
+                    # When invalidating a dataset we need to know the
+                    # task_id, otherwise get_submissions will return all
+                    # the submissions of the contest.
+                    if dataset_id is not None and task_id is None \
+                            and submission_id is None:
+                        task_id = Dataset.get_from_id(
+                            dataset_id, session).task_id
+                    # We only fetch the ids of the involved submissions,
+                    # the rest is done chunk by chunk.
+                    submission_ids = [row[0] for row in get_submissions(
+                        session,
+                        # Give contest_id only if all others are None.
+                        contest_id
+                        if {participation_id, task_id, submission_id}
+                        == {None}
+                        else None,
+                        participation_id, task_id, submission_id)
+                        .with_entities(Submission.id)
+                        .order_by(Submission.id)
+                        .all()]
+
+                progress["total"] = len(submission_ids)
+                logger.info("Submissions to invalidate %s for: %d.",
+                            level, len(submission_ids))
+
+                chunk_size = EvaluationService.INVALIDATION_CHUNK_SIZE
+                for i in range(0, len(submission_ids), chunk_size):
+                    chunk = submission_ids[i:i + chunk_size]
+                    self._invalidate_chunk(chunk, dataset_id, level)
+                    progress["done"] += len(chunk)
+                    # Let the other greenlets (e.g., the ones receiving
+                    # the results from the workers) run.
+                    gevent.sleep(0)
+            except Exception as error:
+                logger.error("Invalidation failed: %r.", error,
+                             exc_info=True)
+                progress["error"] = repr(error)
+            else:
+                logger.info("Invalidate successfully completed.")
+            finally:
+                progress["finished"] = make_timestamp()
+
+    @with_post_finish_lock
+    def _invalidate_chunk(self, submission_ids, dataset_id, level):
+        """Invalidate the results of some submissions.
+
+        submission_ids ([int]): the ids of the submissions.
+        dataset_id (int|None): the id of the dataset to invalidate, or
+            None for all datasets.
+        level (string): 'compilation' or 'evaluation'
+
+        """
         with SessionGen() as session:
-            # When invalidating a dataset we need to know the task_id,
-            # otherwise get_submissions will return all the submissions of
-            # the contest.
-            if dataset_id is not None and task_id is None \
-                    and submission_id is None:
-                task_id = Dataset.get_from_id(dataset_id, session).task_id
-            # First we load all involved submissions.
-            submissions = get_submissions(
-                session,
-                # Give contest_id only if all others are None.
-                contest_id
-                if {participation_id, task_id, submission_id} == {None}
-                else None,
-                participation_id, task_id, submission_id).all()
-
-            # Then we get all relevant operations, and we remove them
+            # All involved (submission, dataset) pairs: all of the
+            # task's datasets unless one was specified.
+            query = session.query(Submission.id, Dataset.id)\
+                .join(Submission.task)\
+                .join(Task.datasets)\
+                .filter(Submission.id.in_(submission_ids))
+            if dataset_id is not None:
+                query = query.filter(Dataset.id == dataset_id)
+            pairs = query.all()
+
+            dataset_ids = set(pair[1] for pair in pairs)
+            codenames = defaultdict(list)
+            if dataset_ids:
+                for testcase_dataset_id, codename in session.query(
+                        Testcase.dataset_id, Testcase.codename)\
+                        .filter(Testcase.dataset_id.in_(dataset_ids)):
+                    codenames[testcase_dataset_id].append(codename)
+
+            # First we get all relevant operations, and we remove them
             # both from the queue and from the pool (i.e., we ignore
             # the workers involved in those operations).
-            operations = get_relevant_operations(
-                level, submissions, dataset_id)
+            operations = get_relevant_operations_by_id(
+                level, pairs, codenames)
             for operation in operations:
                 try:
                     self.dequeue(operation)
@@ -904,40 +1244,58 @@ class EvaluationService(TriggeredService):
                     self.get_executor().pool.ignore_operation(operation)
                 except LookupError:
                     pass  # Ok, the operation wasn't in the pool.
+            # The executables (and possibly the datasets) are going to
+            # change.
+            self.get_executor().pool.invalidate_job_templates()
 
-            # Then we find all existing results in the database, and
-            # we remove them.
-            submission_results = get_submission_results(
-                session,
-                # Give contest_id only if all others are None.
-                contest_id
-                if {participation_id,
-                    task_id,
-                    submission_id,
-                    dataset_id} == {None}
-                else None,
-                participation_id,
-                # Provide the task_id only if the entire task has to be
-                # reevaluated and not only a specific dataset.
-                task_id if dataset_id is None else None,
-                submission_id, dataset_id).all()
-            logger.info("Submission results to invalidate %s for: %d.",
-                        level, len(submission_results))
-            for submission_result in submission_results:
-                # We invalidate the appropriate data and queue the
-                # operations to recompute those data.
-                if level == "compilation":
-                    submission_result.invalidate_compilation()
-                elif level == "evaluation":
-                    submission_result.invalidate_evaluation()
+            # Then we remove the existing results from the database.
+            invalidate_submission_results(
+                session, submission_ids, dataset_id, level)
 
             # Finally, we re-enqueue the operations for the
             # submissions.
-            for submission in submissions:
-                self.submission_enqueue_operations(submission)
+            self.enqueue_many(get_submissions_operations(
+                session, submission_ids=submission_ids))
+
+            # Results to evaluate on datasets without testcases have
+            # no operation, we just need to finalize their evaluation.
+            empty_dataset_ids = dataset_ids - set(codenames)
+            if empty_dataset_ids:
+                submission_results = session.query(SubmissionResult)\
+                    .filter(SubmissionResult.submission_id
+                            .in_(submission_ids))\
+                    .filter(SubmissionResult.dataset_id
+                            .in_(empty_dataset_ids))\
+                    .all()
+                for submission_result in submission_results:
+                    if submission_result.dataset \
+                            in get_datasets_to_judge(
+                                submission_result.submission.task) \
+                            and submission_to_evaluate(submission_result):
+                        logger.info(
+                            "Result %d(%d) has already all evaluations, "
+                            "finalizing it.",
+                            submission_result.submission_id,
+                            submission_result.dataset_id)
+                        submission_result.set_evaluation_outcome()
+                        session.commit()
+                        self.evaluation_ended(submission_result)
 
             session.commit()
-        logger.info("Invalidate successfully completed.")
+
+    @rpc_method
+    def invalidation_status(self):
+        """Return the progress of the latest invalidations.
+
+        return ([dict]): for each of the latest invalidations, oldest
+            first, a dictionary with the level, the filters, the
+            number of submissions involved ("total", None while they
+            are being searched), the number of those already processed
+            ("done"), the start and end times (the latter None if
+            still running) and the error, if any.
+
+        """
+        return self._invalidations
 
     @rpc_method
     def disable_worker(self, shard):
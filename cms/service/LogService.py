@@ -95,27 +95,50 @@ class LogService(Service):
         exc_text (string): the text of the logged exception.
 
         """
-        record = logging.makeLogRecord(kwargs)
+        self._handle_records([logging.makeLogRecord(kwargs)])
 
+    @rpc_method
+    def LogBatch(self, records):
+        """Log many messages.
+
+        Receive the attributes of many LogRecords, as sent by the
+        LogServiceHandler of the other services, rebuild and handle
+        them, writing them out all at once.
+
+        records ([{str: object}]): for each message, the attributes
+            described in Log.
+
+        """
+        self._handle_records([logging.makeLogRecord(attributes)
+                              for attributes in records])
+
+    def _handle_records(self, records):
+        """Show, write and remember the given records.
+
+        records ([LogRecord]): the records to handle.
+
+        """
         # Show in stdout, together with the messages we produce
         # ourselves.
-        shell_handler.handle(record)
+        shell_handler.handle_many(records)
         # Write on the global log file.
-        self.file_handler.handle(record)
-
-        if record.levelno >= logging.WARNING:
-            if hasattr(record, "service_name") and \
-                    hasattr(record, "service_shard"):
-                coord = "%s,%s" % (record.service_name, record.service_shard)
-            else:
-                coord = ""
-            self._last_messages.append({
-                "message": record.msg,
-                "coord": coord,
-                "operation": getattr(record, "operation", ""),
-                "severity": record.levelname,
-                "timestamp": record.created,
-                "exc_text": getattr(record, "exc_text", None)})
+        self.file_handler.handle_many(records)
+
+        for record in records:
+            if record.levelno >= logging.WARNING:
+                if hasattr(record, "service_name") and \
+                        hasattr(record, "service_shard"):
+                    coord = "%s,%s" % (record.service_name,
+                                       record.service_shard)
+                else:
+                    coord = ""
+                self._last_messages.append({
+                    "message": record.msg,
+                    "coord": coord,
+                    "operation": getattr(record, "operation", ""),
+                    "severity": record.levelname,
+                    "timestamp": record.created,
+                    "exc_text": getattr(record, "exc_text", None)})
 
     @rpc_method
     def last_messages(self):
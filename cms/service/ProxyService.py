@@ -30,6 +30,7 @@
 import json
 import logging
 import string
+import time
 from urllib.parse import urljoin, urlsplit
 
 import gevent
@@ -41,7 +42,8 @@ from sqlalchemy import not_
 from cms import config
 from cms.db import SessionGen, Contest, Participation, Task, Submission, \
     get_submissions
-from cms.io import Executor, QueueItem, TriggeredService, rpc_method
+from cms.io import Executor, QueueItem, TriggeredService, rpc_method, \
+    tracer
 from cmscommon.datetime import make_timestamp
 
 
@@ -103,6 +105,7 @@ class ProxyOperation(QueueItem):
     def __init__(self, type_, data):
         self.type_ = type_
         self.data = data
+        self.trace = {}
 
     def __str__(self):
         return "sending data of type %s to ranking" % (
@@ -191,6 +194,7 @@ class ProxyExecutor(Executor):
         for entry in entries:
             data[entry.item.type_].update(entry.item.data)
 
+        start_time = time.monotonic()
         try:
             for i in range(self.TYPE_COUNT):
                 # Send entities of type i.
@@ -206,6 +210,10 @@ class ProxyExecutor(Executor):
                         self._ranking, "%s/" % name, data[i], operation)
                     data[i].clear()
 
+            tracer.observe("send", time.monotonic() - start_time)
+            for entry in entries:
+                tracer.record(entry.item.trace)
+
         except CannotSendError:
             # A log message has already been produced.
             gevent.sleep(self.FAILURE_WAIT)
@@ -29,7 +29,8 @@ import logging
 
 from cms import ServiceCoord, config
 from cms.db import SessionGen, Submission, Dataset, get_submission_results
-from cms.io import Executor, TriggeredService, rpc_method
+from cms.io import Executor, TriggeredService, end_span, rpc_method, \
+    start_span, tracer
 from cmscommon.datetime import make_datetime
 from .scoringoperations import ScoringOperation, get_operations
 
@@ -54,6 +55,7 @@ class ScoringExecutor(Executor):
 
         """
         operation = entry.item
+        start_span(operation.trace, "scoring")
         with SessionGen() as session:
             # Obtain submission.
             submission = Submission.get_from_id(operation.submission_id,
@@ -102,12 +104,17 @@ class ScoringExecutor(Executor):
 
             # Store it.
             session.commit()
+            end_span(operation.trace, "scoring")
+            tracer.record(operation.trace)
 
             # If dataset is the active one, update RWS.
             if dataset is submission.task.active_dataset:
+                latency = \
+                    (make_datetime() - submission.timestamp).total_seconds()
+                tracer.observe("submission_to_score", latency)
                 logger.info(
                     "Submission scored %.1f seconds after submission",
-                    (make_datetime() - submission.timestamp).total_seconds())
+                    latency)
                 self.proxy_service.submission_scored(
                     submission_id=submission.id)
 
@@ -138,6 +145,7 @@ class ScoringService(TriggeredService):
             must_be_present=ranking_enabled)
 
         self.add_executor(ScoringExecutor(self.proxy_service))
+        self.start_queue_snapshots(config.queue_snapshot_period)
         self.start_sweeper(347.0)
 
     def _missing_operations(self):
@@ -148,12 +156,15 @@ class ScoringService(TriggeredService):
         enqueue them.
 
         """
-        counter = 0
         with SessionGen() as session:
-            for operation, timestamp in get_operations(session):
-                self.enqueue(operation, timestamp=timestamp)
-                counter += 1
-        return counter
+            operations = get_operations(session)
+        self.enqueue_many((operation, None, timestamp)
+                          for operation, timestamp in operations)
+        return len(operations)
+
+    def item_from_snapshot(self, data):
+        """See TriggeredService.item_from_snapshot."""
+        return ScoringOperation.from_dict(data)
 
     @rpc_method
     def new_evaluation(self, submission_id, dataset_id):
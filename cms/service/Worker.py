@@ -28,13 +28,18 @@ import logging
 import time
 
 import gevent.lock
+import gevent.pool
+from gevent.pywsgi import WSGIServer
 
+from cms import config, ServiceCoord, get_service_address
 from cms.db import SessionGen, Contest, enumerate_files
 from cms.db.filecacher import FileCacher, TombstoneError
 from cms.grading import JobException
 from cms.grading.Job import CompilationJob, EvaluationJob, JobGroup
-from cms.grading.tasktypes import get_task_type
-from cms.io import Service, rpc_method
+from cms.grading.tasktypes import get_task_type, get_task_type_class
+from cms.io import Service, end_span, rpc_method, start_span, tracer
+from cms.metrics import registry
+from cms.server.file_middleware import CachedFileServer
 
 
 logger = logging.getLogger(__name__)
@@ -51,18 +56,84 @@ class Worker(Service):
     JOB_TYPE_COMPILATION = "compile"
     JOB_TYPE_EVALUATION = "evaluate"
 
+    # Maximum number of jobs of a job group executed at the same time
+    # (see TaskType.EVALUATE_TESTCASES_TOGETHER); it must leave free
+    # some of the ids of the sandboxes of the worker.
+    MAX_CONCURRENT_JOBS = 4
+
     def __init__(self, shard, fake_worker_time=None):
         Service.__init__(self, shard)
-        self.file_cacher = FileCacher(self)
+
+        # If configured, Workers share their caches: each one asks the
+        # files it misses to its parent in a binary tree, which in turn
+        # fetches them from its own parent (so that, unless a Worker is
+        # down, only the root queries the database); a Worker serves
+        # files only to its children.
+        self.cache_server = None
+        peers = []
+        cache_ports = config.worker_cache_listen_port
+        if shard < len(cache_ports):
+            if shard > 0:
+                parent = (shard - 1) // 2
+                peers.append("http://%s:%d/" % (
+                    self._get_cache_address(parent), cache_ports[parent]))
+        self.file_cacher = FileCacher(self, peers=peers)
+        if shard < len(cache_ports):
+            children = set(
+                get_service_address(ServiceCoord(self.name, child)).ip
+                for child in (2 * shard + 1, 2 * shard + 2)
+                if child < len(cache_ports))
+            self.cache_server = WSGIServer(
+                (self._get_cache_address(shard), cache_ports[shard]),
+                CachedFileServer(self.file_cacher,
+                                 allowed_addresses=children))
 
         self.work_lock = gevent.lock.RLock()
         self._last_end_time = None
         self._total_free_time = 0
         self._total_busy_time = 0
         self._number_execution = 0
+        registry.counter(
+            "cms_worker_busy_seconds_total", "Time spent executing jobs.",
+            function=lambda: self._total_busy_time)
+        registry.counter(
+            "cms_worker_idle_seconds_total",
+            "Time spent waiting for jobs, after the first one.",
+            function=lambda: self._total_free_time)
+        registry.counter(
+            "cms_worker_executions_total", "Number of job groups executed.",
+            function=lambda: self._number_execution)
+        registry.gauge(
+            "cms_worker_busy_ratio",
+            "Fraction of the time spent executing jobs, since the first.",
+            function=self.get_busy_ratio)
 
         self._fake_worker_time = fake_worker_time
 
+    def _get_cache_address(self, shard):
+        """Return the address on which a Worker serves its cache.
+
+        shard (int): the shard of the Worker.
+
+        return (string): the configured address, or by default the
+            address of the Worker.
+
+        """
+        addresses = config.worker_cache_listen_address
+        if shard < len(addresses) and addresses[shard] is not None:
+            return addresses[shard]
+        return get_service_address(ServiceCoord(self.name, shard)).ip
+
+    def run(self):
+        """Start the Worker, and its cache server if configured.
+
+        """
+        if self.cache_server is not None:
+            self.cache_server.start()
+        Service.run(self)
+        if self.cache_server is not None:
+            self.cache_server.stop()
+
     @rpc_method
     def precache_files(self, contest_id):
         """RPC to ask the worker to precache of files in the contest.
@@ -79,20 +150,48 @@ class Worker(Service):
             contest = Contest.get_from_id(contest_id, session)
             files = enumerate_files(session, contest, skip_submissions=True,
                                     skip_user_tests=True, skip_print_jobs=True)
-        for digest in files:
-            try:
-                self.file_cacher.load(digest, if_needed=True)
-            except KeyError:
-                # No problem (at this stage) if we cannot find the
-                # file
-                pass
+            # The files of the active datasets go first, as they are
+            # the ones needed to evaluate the submissions.
+            active = set()
+            for task in contest.tasks:
+                dataset = task.active_dataset
+                if dataset is None:
+                    continue
+                active.update(manager.digest
+                              for manager in dataset.managers.values())
+                for testcase in dataset.testcases.values():
+                    active.add(testcase.input)
+                    active.add(testcase.output)
+        active &= files
+        files = sorted(active) + sorted(files - active)
+
+        # These are the files of the current contest: keep them in the
+        # cache even when it is full.
+        self.file_cacher.unpin()
+        self.file_cacher.pin(files)
+
+        def progress(done, total):
+            logger.info("Precached %d/%d files.", done, total)
+
+        self.file_cacher.load_many(files, if_needed=True, progress=progress)
 
         logger.info("Precaching finished.")
 
+    @rpc_method
+    def cache_status(self):
+        """Return the status of the local file cache.
+
+        return ({str: int|None}): the hit, miss and eviction counters
+            of the cache, with its current and maximum size.
+
+        """
+        return self.file_cacher.get_cache_status()
+
     @rpc_method
     def execute_job_group(self, job_group_dict):
         """Receive a group of jobs in a list format and executes them one by
-        one.
+        one (except those that can run concurrently, see
+        _can_run_concurrently).
 
         job_group_dict ({}): a JobGroup exported to dict.
 
@@ -106,25 +205,15 @@ class Worker(Service):
         if self.work_lock.acquire(False):
             try:
                 logger.info("Starting job group.")
+                concurrent_jobs = []
                 for job in job_group.jobs:
-                    logger.info("Starting job.",
-                                extra={"operation": job.info})
-
-                    job.shard = self.shard
-
-                    if self._fake_worker_time is None:
-                        task_type = get_task_type(job.task_type,
-                                                  job.task_type_parameters)
-                        try:
-                            task_type.execute_job(job, self.file_cacher)
-                        except TombstoneError:
-                            job.success = False
-                            job.plus = {"tombstone": True}
+                    if Worker._can_run_concurrently(job):
+                        concurrent_jobs.append(job)
                     else:
-                        self._fake_work(job)
-
-                    logger.info("Finished job.",
-                                extra={"operation": job.info})
+                        self._execute_job(job)
+                if len(concurrent_jobs) > 0:
+                    gevent.pool.Pool(Worker.MAX_CONCURRENT_JOBS).map(
+                        self._execute_job, concurrent_jobs)
 
                 logger.info("Finished job group.")
                 return job_group.export_to_dict()
@@ -147,6 +236,52 @@ class Worker(Service):
             self._finalize(start_time)
             raise JobException(err_msg)
 
+    @staticmethod
+    def _can_run_concurrently(job):
+        """Return whether a job can run concurrently with others.
+
+        job (Job): a job of a job group.
+
+        return (bool): True for the evaluations of the task types that
+            evaluate the testcases together.
+
+        """
+        if not isinstance(job, EvaluationJob):
+            return False
+        try:
+            task_type = get_task_type_class(job.task_type)
+        except KeyError:
+            return False
+        return task_type.EVALUATE_TESTCASES_TOGETHER
+
+    def _execute_job(self, job):
+        """Execute a job, filling it with the results.
+
+        job (Job): the job to execute.
+
+        """
+        logger.info("Starting job.", extra={"operation": job.info})
+
+        job.shard = self.shard
+        trace = job.operation.trace if job.operation is not None else None
+        start_span(trace, "execution")
+
+        if self._fake_worker_time is None:
+            task_type = get_task_type(job.task_type,
+                                      job.task_type_parameters)
+            try:
+                task_type.execute_job(job, self.file_cacher)
+            except TombstoneError:
+                job.success = False
+                job.plus = {"tombstone": True}
+        else:
+            self._fake_work(job)
+
+        duration = end_span(trace, "execution")
+        if duration is not None:
+            tracer.observe("execution", duration)
+        logger.info("Finished job.", extra={"operation": job.info})
+
     def _fake_work(self, job):
         """Fill the job with fake success data after waiting for some time."""
         time.sleep(self._fake_worker_time)
@@ -162,6 +297,18 @@ class Worker(Service):
         elif isinstance(job, EvaluationJob):
             job.outcome = "1.0"
 
+    def get_busy_ratio(self):
+        """Return the fraction of the time spent executing jobs.
+
+        return (float): the busy time over the total time since the
+            start of the first job (0.0 before any job).
+
+        """
+        total_time = self._total_busy_time + self._total_free_time
+        if total_time == 0:
+            return 0.0
+        return self._total_busy_time / total_time
+
     def _finalize(self, start_time):
         end_time = time.time()
         busy_time = end_time - start_time
@@ -171,8 +318,7 @@ class Worker(Service):
         self._last_end_time = end_time
         self._total_busy_time += busy_time
         self._total_free_time += free_time
-        ratio = self._total_busy_time * 100.0 / \
-            (self._total_busy_time + self._total_free_time)
+        ratio = self.get_busy_ratio() * 100.0
         avg_free_time = 0.0
         if self._number_execution > 0:
             avg_free_time = self._total_free_time / self._number_execution
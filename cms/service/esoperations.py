@@ -172,7 +172,8 @@ def submission_get_operations(submission_result, submission, dataset):
 
         yield ESOperation(ESOperation.COMPILATION,
                           submission.id,
-                          dataset.id), \
+                          dataset.id,
+                          participation_id=submission.participation_id), \
             priority, \
             submission.timestamp
 
@@ -193,7 +194,8 @@ def submission_get_operations(submission_result, submission, dataset):
                 yield ESOperation(ESOperation.EVALUATION,
                                   submission.id,
                                   dataset.id,
-                                  testcase_codename), \
+                                  testcase_codename,
+                                  submission.participation_id), \
                     priority, \
                     submission.timestamp
 
@@ -222,7 +224,8 @@ def user_test_get_operations(user_test, dataset):
 
         yield ESOperation(ESOperation.USER_TEST_COMPILATION,
                           user_test.id,
-                          dataset.id), \
+                          dataset.id,
+                          participation_id=user_test.participation_id), \
             priority, \
             user_test.timestamp
 
@@ -236,7 +239,8 @@ def user_test_get_operations(user_test, dataset):
 
         yield ESOperation(ESOperation.USER_TEST_EVALUATION,
                           user_test.id,
-                          dataset.id), \
+                          dataset.id,
+                          participation_id=user_test.participation_id), \
             priority, \
             user_test.timestamp
 
@@ -283,12 +287,43 @@ def get_relevant_operations(level, submissions, dataset_id=None):
     return operations
 
 
-def get_submissions_operations(session, contest_id=None):
+def get_relevant_operations_by_id(level, results, codenames):
+    """Return all possible operations involving the given results.
+
+    The same as get_relevant_operations, but working on ids, without
+    the need to load the submissions and their datasets.
+
+    level (string): the starting level; if 'compilation', then we
+        return operations for both compilation and evaluation; if
+        'evaluation', we return evaluations only.
+    results ([(int, int)]): the ids of the submission and of the
+        dataset of each result we want the operations for.
+    codenames ({int: [str]}): the codenames of the testcases of each
+        dataset in results.
+
+    return ([ESOperation]): list of relevant operations.
+
+    """
+    operations = []
+    for submission_id, dataset_id in results:
+        if level == 'compilation':
+            operations.append(ESOperation(
+                ESOperation.COMPILATION, submission_id, dataset_id))
+        for codename in codenames[dataset_id]:
+            operations.append(ESOperation(
+                ESOperation.EVALUATION, submission_id, dataset_id, codename))
+    return operations
+
+
+def get_submissions_operations(session, contest_id=None,
+                               submission_ids=None):
     """Return all the operations to do for submissions in the contest.
 
     session (Session): the database session to use.
     contest_id (int|None): the contest for which we want the operations.
         If none, get operations for any contest.
+    submission_ids ([int]|None): if given, only return the operations
+        for these submissions.
 
     return ([ESOperation, float, int]): a list of operation, timestamp
         and priority.
@@ -300,6 +335,8 @@ def get_submissions_operations(session, contest_id=None):
         contest_filter = literal(True)
     else:
         contest_filter = Task.contest_id == contest_id
+    if submission_ids is not None:
+        contest_filter = contest_filter & Submission.id.in_(submission_ids)
 
     # Retrieve the compilation operations for all submissions without
     # the corresponding result for a dataset to judge. Since we have
@@ -321,7 +358,8 @@ def get_submissions_operations(session, contest_id=None):
                            (Dataset.id != Task.active_dataset_id,
                             literal(PriorityQueue.PRIORITY_EXTRA_LOW))
                            ], else_=literal(PriorityQueue.PRIORITY_HIGH)),
-                       Submission.timestamp)\
+                       Submission.timestamp,
+                       Submission.participation_id)\
         .all()
 
     # Retrieve all the compilation operations for submissions
@@ -341,13 +379,16 @@ def get_submissions_operations(session, contest_id=None):
                            (SubmissionResult.compilation_tries == 0,
                             literal(PriorityQueue.PRIORITY_HIGH))
                            ], else_=literal(PriorityQueue.PRIORITY_MEDIUM)),
-                       Submission.timestamp)\
+                       Submission.timestamp,
+                       Submission.participation_id)\
         .all()
 
     for data in to_compile:
-        submission_id, dataset_id, priority, timestamp = data
+        submission_id, dataset_id, priority, timestamp, participation_id = \
+            data
         operations.append((
-            ESOperation(ESOperation.COMPILATION, submission_id, dataset_id),
+            ESOperation(ESOperation.COMPILATION, submission_id, dataset_id,
+                        participation_id=participation_id),
             priority, timestamp))
 
     # Retrieve all the evaluation operations for a dataset to
@@ -377,25 +418,30 @@ def get_submissions_operations(session, contest_id=None):
                             literal(PriorityQueue.PRIORITY_MEDIUM))
                            ], else_=literal(PriorityQueue.PRIORITY_LOW)),
                        Submission.timestamp,
-                       Testcase.codename)\
+                       Testcase.codename,
+                       Submission.participation_id)\
         .all()
 
     for data in to_evaluate:
-        submission_id, dataset_id, priority, timestamp, codename = data
+        submission_id, dataset_id, priority, timestamp, codename, \
+            participation_id = data
         operations.append((
             ESOperation(
-                ESOperation.EVALUATION, submission_id, dataset_id, codename),
+                ESOperation.EVALUATION, submission_id, dataset_id, codename,
+                participation_id),
             priority, timestamp))
 
     return operations
 
 
-def get_user_tests_operations(session, contest_id=None):
+def get_user_tests_operations(session, contest_id=None, user_test_ids=None):
     """Return all the operations to do for user tests in the contest.
 
     session (Session): the database session to use.
     contest_id (int|None): the contest for which we want the operations.
         If none, get operations for any contest.
+    user_test_ids ([int]|None): if given, only return the operations
+        for these user tests.
 
     return ([ESOperation, float, int]): a list of operation, timestamp
         and priority.
@@ -407,6 +453,8 @@ def get_user_tests_operations(session, contest_id=None):
         contest_filter = literal(True)
     else:
         contest_filter = Task.contest_id == contest_id
+    if user_test_ids is not None:
+        contest_filter = contest_filter & UserTest.id.in_(user_test_ids)
 
     # Retrieve the compilation operations for all user tests without
     # the corresponding result for a dataset to judge. Since we have
@@ -428,7 +476,8 @@ def get_user_tests_operations(session, contest_id=None):
                            (Dataset.id != Task.active_dataset_id,
                             literal(PriorityQueue.PRIORITY_EXTRA_LOW))
                            ], else_=literal(PriorityQueue.PRIORITY_HIGH)),
-                       UserTest.timestamp)\
+                       UserTest.timestamp,
+                       UserTest.participation_id)\
         .all()
 
     # Retrieve all the compilation operations for user_tests
@@ -448,14 +497,17 @@ def get_user_tests_operations(session, contest_id=None):
                            (UserTestResult.compilation_tries == 0,
                             literal(PriorityQueue.PRIORITY_HIGH))
                            ], else_=literal(PriorityQueue.PRIORITY_MEDIUM)),
-                       UserTest.timestamp)\
+                       UserTest.timestamp,
+                       UserTest.participation_id)\
         .all()
 
     for data in to_compile:
-        user_test_id, dataset_id, priority, timestamp = data
+        user_test_id, dataset_id, priority, timestamp, participation_id = \
+            data
         operations.append((
             ESOperation(ESOperation.USER_TEST_COMPILATION,
-                        user_test_id, dataset_id),
+                        user_test_id, dataset_id,
+                        participation_id=participation_id),
             priority, timestamp))
 
     # Retrieve all the evaluation operations for a dataset to judge,
@@ -476,14 +528,17 @@ def get_user_tests_operations(session, contest_id=None):
                            (UserTestResult.evaluation_tries == 0,
                             literal(PriorityQueue.PRIORITY_MEDIUM))
                            ], else_=literal(PriorityQueue.PRIORITY_LOW)),
-                       UserTest.timestamp)\
+                       UserTest.timestamp,
+                       UserTest.participation_id)\
         .all()
 
     for data in to_evaluate:
-        user_test_id, dataset_id, priority, timestamp = data
+        user_test_id, dataset_id, priority, timestamp, participation_id = \
+            data
         operations.append((
             ESOperation(
-                ESOperation.USER_TEST_EVALUATION, user_test_id, dataset_id),
+                ESOperation.USER_TEST_EVALUATION, user_test_id, dataset_id,
+                participation_id=participation_id),
             priority, timestamp))
 
     return operations
@@ -496,19 +551,27 @@ class ESOperation(QueueItem):
     USER_TEST_COMPILATION = "compile_test"
     USER_TEST_EVALUATION = "evaluate_test"
 
-    # Testcase codename is only needed for EVALUATION type of operation
-    def __init__(self, type_, object_id, dataset_id, testcase_codename=None):
+    # Testcase codename is only needed for EVALUATION type of operation.
+    # The participation is not part of the identity of the operation,
+    # and is only used to schedule the operations fairly (hence it
+    # might be None, e.g., for operations built to be dequeued).
+    def __init__(self, type_, object_id, dataset_id, testcase_codename=None,
+                 participation_id=None):
         self.type_ = type_
         self.object_id = object_id
         self.dataset_id = dataset_id
         self.testcase_codename = testcase_codename
+        self.participation_id = participation_id
+        self.trace = {}
 
     @staticmethod
     def from_dict(d):
-        return ESOperation(d["type"],
-                           d["object_id"],
-                           d["dataset_id"],
-                           d["testcase_codename"])
+        operation = ESOperation(d["type"],
+                                d["object_id"],
+                                d["dataset_id"],
+                                d["testcase_codename"])
+        operation.trace = d.get("trace", {})
+        return operation
 
     def __eq__(self, other):
         # We may receive a non-ESOperation other when comparing with
@@ -555,5 +618,6 @@ class ESOperation(QueueItem):
             "type": self.type_,
             "object_id": self.object_id,
             "dataset_id": self.dataset_id,
-            "testcase_codename": self.testcase_codename
+            "testcase_codename": self.testcase_codename,
+            "trace": self.trace,
         }
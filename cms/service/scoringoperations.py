@@ -83,6 +83,7 @@ class ScoringOperation(QueueItem):
     def __init__(self, submission_id, dataset_id):
         self.submission_id = submission_id
         self.dataset_id = dataset_id
+        self.trace = {}
 
     def __eq__(self, other):
         if self.__class__ != other.__class__:
@@ -102,6 +103,10 @@ class ScoringOperation(QueueItem):
             self.submission_id,
             self.dataset_id)
 
+    @staticmethod
+    def from_dict(d):
+        return ScoringOperation(d["submission_id"], d["dataset_id"])
+
     def to_dict(self):
         return {"submission_id": self.submission_id,
                 "dataset_id": self.dataset_id}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Statistics of the testcases, to evaluate the likely failures first.
+
+"""
+
+from collections import defaultdict
+
+from .esoperations import ESOperation
+
+
+class TestcaseStatistics:
+    """How often each testcase of each dataset fails, and how slow it is.
+
+    The statistics are exponential moving averages of the results
+    written by ES, so they follow the submissions of the moment. They
+    are used to order the evaluations of a submission so that the
+    testcases that most likely fail (and, among similar ones, the
+    slowest) are dispatched first: the verdicts, and the decisions of
+    the short-circuit evaluation, arrive sooner.
+
+    Only the relative order of the operations is affected: since the
+    queue breaks the ties of priority and timestamp by insertion
+    order, it is enough to push them sorted.
+
+    """
+
+    # Weight of a new result in the moving averages.
+    WEIGHT = 0.1
+
+    def __init__(self):
+        # Map dataset id to a dict from testcase codename to the
+        # moving averages [failure rate, execution time].
+        self._stats = defaultdict(dict)
+
+    def record(self, dataset_id, codename, outcome, execution_time):
+        """Take into account the result of an evaluation.
+
+        dataset_id (int): the id of the dataset.
+        codename (str): the codename of the testcase.
+        outcome (str|float|None): the outcome; non-positive outcomes
+            are failures; if None, the result is ignored.
+        execution_time (float|None): the execution time, if known.
+
+        """
+        if outcome is None:
+            return
+        failed = 1.0 if float(outcome) <= 0.0 else 0.0
+        time = execution_time if execution_time is not None else 0.0
+        stats = self._stats[dataset_id].get(codename)
+        if stats is None:
+            self._stats[dataset_id][codename] = [failed, time]
+        else:
+            stats[0] += TestcaseStatistics.WEIGHT * (failed - stats[0])
+            stats[1] += TestcaseStatistics.WEIGHT * (time - stats[1])
+
+    def _key(self, operation):
+        """Return the sorting key of an operation (smaller goes first).
+
+        operation (ESOperation): the operation.
+
+        return ((float, float)): the opposites of the failure rate and
+            of the execution time of the testcase; zero for unknown
+            testcases and for the other types of operation.
+
+        """
+        if operation.type_ != ESOperation.EVALUATION:
+            return (0.0, 0.0)
+        stats = self._stats.get(operation.dataset_id, {}).get(
+            operation.testcase_codename)
+        if stats is None:
+            return (0.0, 0.0)
+        return (-stats[0], -stats[1])
+
+    def sort(self, entries):
+        """Sort the operations to push, likely failures first.
+
+        The sort is stable, so the operations without statistics
+        keep their order.
+
+        entries ([(ESOperation, int, datetime)]): the operations, each
+            with its priority and timestamp.
+
+        return ([(ESOperation, int, datetime)]): the sorted entries.
+
+        """
+        if not self._stats:
+            return list(entries)
+        return sorted(entries, key=lambda entry: self._key(entry[0]))
@@ -33,7 +33,8 @@ import gevent.lock
 from gevent.event import Event
 
 from cms.db import SessionGen
-from cms.grading.Job import JobGroup
+from cms.grading.Job import JobGroup, JobTemplates
+from cms.io import end_span, start_span
 from cmscommon.datetime import make_datetime, make_timestamp
 
 
@@ -101,12 +102,24 @@ class WorkerPool:
         # set does not mean that there is a worker available.
         self._workers_available_event = Event()
 
+        # The data shared by the jobs of the same dataset and
+        # submission, to build jobs without accessing the DB.
+        self._job_templates = JobTemplates()
+
     def __len__(self):
         return len(self._worker)
 
     def __contains__(self, operation):
         return operation in self._operations_reverse
 
+    def get_operations(self):
+        """Return the operations assigned to the workers.
+
+        return ([ESOperation]): the operations.
+
+        """
+        return list(self._operations_reverse)
+
     def _remove_operations(self, shard, new_operation):
         """Safely remove operations from a worker, assigning a new status.
 
@@ -209,9 +222,15 @@ class WorkerPool:
         logger.debug("Worker %s acquired.", shard)
         self._start_time[shard] = make_datetime()
 
+        for operation in operations:
+            end_span(operation.trace, "dispatch")
+            start_span(operation.trace, "preparation")
         with SessionGen() as session:
-            job_group_dict = \
-                JobGroup.from_operations(operations, session).export_to_dict()
+            job_group = JobGroup.from_operations(
+                operations, session, templates=self._job_templates)
+        for operation in operations:
+            end_span(operation.trace, "preparation")
+        job_group_dict = job_group.export_to_dict()
 
         logger.info("Asking worker %s to %s.", shard,
                     ", ".join("`%s'" % operation for operation in operations))
@@ -222,6 +241,32 @@ class WorkerPool:
             plus=shard)
         return shard
 
+    def get_dataset_template(self, dataset_id):
+        """Return the data of the jobs of a dataset.
+
+        dataset_id (int): the id of the dataset.
+
+        return ({string: object}): the template of the dataset, see
+            JobTemplates.get_dataset_template (cached, so usually
+            without accessing the DB).
+
+        """
+        with SessionGen() as session:
+            return self._job_templates.get_dataset_template(
+                dataset_id, session)
+
+    def invalidate_job_templates(self, dataset_id=None):
+        """Forget the cached data used to build the jobs.
+
+        To be called when the data of datasets and submissions might
+        have changed (e.g., because submissions are being invalidated).
+
+        dataset_id (int|None): if given, forget only the data of the
+            jobs on this dataset.
+
+        """
+        self._job_templates.invalidate(dataset_id)
+
     def release_worker(self, shard):
         """To be called by ES when it receives a notification that an
         operation finished.
@@ -315,6 +360,28 @@ class WorkerPool:
                          "that cannot be found.", operation)
             raise
 
+    def get_counts(self):
+        """Return the number of workers in each state.
+
+        return ({str: int}): the number of "busy" workers (executing
+            operations), of "free" ones (connected and waiting for
+            operations), of "disabled" ones, and of the "disconnected"
+            ones (that are neither busy nor disabled).
+
+        """
+        counts = {"busy": 0, "free": 0, "disabled": 0, "disconnected": 0}
+        for shard, worker in self._worker.items():
+            operations = self._operations[shard]
+            if operations == WorkerPool.WORKER_DISABLED:
+                counts["disabled"] += 1
+            elif isinstance(operations, list):
+                counts["busy"] += 1
+            elif worker.connected:
+                counts["free"] += 1
+            else:
+                counts["disconnected"] += 1
+        return counts
+
     def get_status(self):
         """Returns a dict with info about the current status of all
         workers.
@@ -222,6 +222,14 @@ def default_argument_parser(description, cls, ask_contest=None):
                           "no shard specified for service %s, "
                           "quitting." % (cls.__name__,))
 
+    # Size the pool of connections to the database for the service, if
+    # it uses the database (i.e., it imported cms.db).
+    if "cms.db" in sys.modules:
+        from cms.db import configure_pool, engine, replica_engine
+        configure_pool(engine, cls.__name__)
+        if replica_engine is not None:
+            configure_pool(replica_engine, cls.__name__)
+
     if ask_contest is None:
         return cls(args.shard)
     contest_id = contest_id_from_args(args.contest_id, ask_contest)
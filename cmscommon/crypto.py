@@ -28,7 +28,6 @@ from string import ascii_lowercase
 
 import bcrypt
 from Crypto import Random
-from Crypto.Cipher import AES
 
 from cmscommon.binary import bin_to_hex, hex_to_bin, bin_to_b64, b64_to_bin
 
@@ -77,6 +76,9 @@ def encrypt_binary(pt, key_hex):
         (more precisely, base64-encoded with alphabet "a-zA-Z0-9.-_").
 
     """
+    # Imported here as it is slow to import and only needed by CWS.
+    from Crypto.Cipher import AES
+
     key = hex_to_bin(key_hex)
     # Pad the plaintext to make its length become a multiple of the block size
     # (that is, for AES, 16 bytes), using a byte 0x01 followed by as many bytes
@@ -108,6 +110,8 @@ def decrypt_binary(ct_b64, key_hex):
     raise (ValueError): if the ciphertext is invalid.
 
     """
+    from Crypto.Cipher import AES
+
     key = hex_to_bin(key_hex)
     try:
         # Convert the ciphertext from a URL-safe base64 encoding to a
@@ -16,11 +16,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import itertools
 import re
 import time
-from collections import deque
+from collections import OrderedDict, deque
 from weakref import WeakSet
 
+import gevent
 from gevent import Timeout
 from gevent.pywsgi import WSGIHandler
 from gevent.queue import Queue, Empty
@@ -75,6 +77,11 @@ def format_event(id_, event, data):
     return b'\n'.join(result)
 
 
+# Sent to the clients that missed some events, to ask them to load
+# the data again.
+_REINIT = b"event:reinit\n\n"
+
+
 class Publisher:
     """The publish part of a pub-sub broadcast system.
 
@@ -84,38 +91,120 @@ class Publisher:
     a cache for a while, instantiating subscribers, each with its own
     queue, and pushing new messages to all these queues.
 
+    Optionally, the messages put within a tick are coalesced into a
+    single frame, encoded once and pushed at the end of the tick to all
+    subscribers, so that the cost of the fan-out does not grow with the
+    number of messages; moreover, a message can replace an older one
+    with the same coalescing key still waiting for its frame. Also
+    optionally, subscribers lagging too much behind (i.e., with too
+    many frames waiting to be sent) are dropped, after telling them to
+    reinit, instead of buffering for them without bound.
+
     """
-    def __init__(self, size):
+    def __init__(self, size, tick=None, max_lag=None):
         """Instantiate a new publisher.
 
-        size (int): the number of messages to keep in cache.
+        size (int): the number of frames to keep in cache (each frame
+            is a single message, if tick is None).
+        tick (float|None): if given, the seconds during which messages
+            are coalesced in a frame.
+        max_lag (int|None): if given, the maximum number of frames
+            waiting to be sent to a subscriber.
 
         """
         # We use a deque as it's efficient to add messages to one end
         # and have the ones at the other end be dropped when the total
-        # number exceeds the given limit.
+        # number exceeds the given limit. Each element is a tuple
+        # (key of the first message, key of the last one, frame).
         self._cache = deque(maxlen=size)
         # We use a WeakSet as we want queues to be vanish automatically
         # when no one else is using (i.e. fetching from) them.
         self._sub_queues = WeakSet()
 
-    def put(self, event, data):
+        self._tick = tick
+        self._max_lag = max_lag
+        self._last_key = 0
+        # The messages waiting for the next frame, as tuples (key,
+        # message), indexed by their coalescing key.
+        self._pending = OrderedDict()
+        self._unique = itertools.count()
+        self._flush_scheduled = False
+
+    def put(self, event, data, coalesce_key=None):
         """Dispatch a new item to all subscribers.
 
         See format_event for details about the parameters.
 
         event (unicode): the type of event the client will receive.
         data (unicode): the associated data.
+        coalesce_key (object|None): if given (and coalescing), a
+            message with the same event and coalesce_key still waiting
+            to be sent is discarded, as this one supersedes it.
 
         """
-        # Number of microseconds since epoch.
-        key = int(time.time() * 1_000_000)
+        # Number of microseconds since epoch, strictly increasing.
+        key = max(int(time.time() * 1_000_000), self._last_key + 1)
+        self._last_key = key
         msg = format_event("%x" % key, event, data)
-        # Put into cache.
-        self._cache.append((key, msg))
-        # Send to all subscribers.
-        for queue in self._sub_queues:
-            queue.put(msg)
+
+        if self._tick is None:
+            self._publish(key, key, msg)
+            return
+
+        if coalesce_key is None:
+            pending_key = next(self._unique)
+        else:
+            pending_key = (event, coalesce_key)
+            # Moved to the end, as the key of the message is the newest.
+            self._pending.pop(pending_key, None)
+        self._pending[pending_key] = (key, msg)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            gevent.spawn_later(self._tick, self.flush)
+
+    def flush(self):
+        """Send the pending messages to all subscribers as a frame."""
+        self._flush_scheduled = False
+        if len(self._pending) == 0:
+            return
+        messages = list(self._pending.values())
+        self._pending.clear()
+        self._publish(messages[0][0], messages[-1][0],
+                      b"".join(msg for _, msg in messages))
+
+    def _publish(self, first_key, last_key, frame):
+        """Put a frame into the cache and send it to all subscribers.
+
+        first_key (int): the key of the first message of the frame.
+        last_key (int): the key of the last message of the frame.
+        frame (bytes): the encoded messages.
+
+        """
+        self._cache.append((first_key, last_key, frame))
+        for queue in list(self._sub_queues):
+            if self._max_lag is not None and queue.qsize() >= self._max_lag:
+                self._drop(queue)
+            else:
+                queue.put(frame)
+
+    def _drop(self, queue):
+        """Stop sending frames to a subscriber lagging behind.
+
+        Its queue is emptied and filled with a request to reinit,
+        followed by None, which makes the subscriber close the stream.
+
+        queue (Queue): the queue of the subscriber.
+
+        """
+        self._sub_queues.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put(_REINIT)
+        queue.put(None)
+
+    def get_subscriber_count(self):
+        """Return the number of subscribers receiving frames."""
+        return len(self._sub_queues)
 
     def get_subscriber(self, last_event_id=None):
         """Obtain a new subscriber.
@@ -139,12 +228,12 @@ class Publisher:
             last_event_key = int(last_event_id, 16)
             if len(self._cache) > 0 and last_event_key >= self._cache[0][0]:
                 # All missed events are in cache.
-                for key, msg in self._cache:
+                for _, key, frame in self._cache:
                     if key > last_event_key:
-                        queue.put(msg)
+                        queue.put(frame)
             else:
                 # Some events may be missing. Ask to reinit.
-                queue.put(b"event:reinit\n\n")
+                queue.put(_REINIT)
         # Store the queue and return a subscriber bound to it.
         self._sub_queues.add(queue)
         return Subscriber(queue)
@@ -167,6 +256,9 @@ class Subscriber:
 
         """
         self._queue = queue
+        # Whether the publisher dropped us, and the stream should be
+        # closed after sending the messages retrieved so far.
+        self.closed = False
 
     def get(self):
         """Retrieve new messages.
@@ -187,7 +279,11 @@ class Subscriber:
         # Fetch all items that are immediately available.
         try:
             while True:
-                yield self._queue.get_nowait()
+                msg = self._queue.get_nowait()
+                if msg is None:
+                    self.closed = True
+                    return
+                yield msg
         except Empty:
             pass
 
@@ -212,24 +308,29 @@ class EventSource:
     _PING_TIMEOUT = 15
 
     _CACHE_SIZE = 250
+    # See Publisher.
+    _TICK = None
+    _MAX_LAG = None
 
     def __init__(self):
         """Create an event source.
 
         """
-        self._pub = Publisher(self._CACHE_SIZE)
+        self._pub = Publisher(self._CACHE_SIZE, self._TICK, self._MAX_LAG)
 
-    def send(self, event, data):
+    def send(self, event, data, coalesce_key=None):
         """Send the event to the stream.
 
         Intended for subclasses to push new events to clients. See
-        format_event for the meaning of the parameters.
+        format_event and Publisher.put for the meaning of the
+        parameters.
 
         event (unicode): the type of the event.
         data (unicode): the data of the event.
+        coalesce_key (object|None): the coalescing key of the event.
 
         """
-        self._pub.put(event, data)
+        self._pub.put(event, data, coalesce_key)
 
     def __call__(self, environ, start_response):
         """Execute this instance as a WSGI application.
@@ -386,8 +487,9 @@ class EventSource:
                     break
 
                 # If we decided this is one-shot, stop the long-poll as
-                # soon as we sent the client some real data.
-                if one_shot and got_sth:
+                # soon as we sent the client some real data. Also stop
+                # if the publisher dropped us.
+                if (one_shot and got_sth) or sub.closed:
                     break
 
         # An empty iterable tells the server not to send anything.
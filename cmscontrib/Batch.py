@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run many commands of the command line tools in a single process.
+
+Each line of the input is the command line of one of the tools of
+cmscontrib (with or without the "cms" prefix), split as a shell would,
+e.g.:
+
+    cmsAddUser -p secret John Doe jdoe
+    AddParticipation -c 1 jdoe
+
+Empty lines and lines starting with # are ignored. Starting the
+interpreter, importing the tools and connecting to the database happen
+only once, so scripts running many commands (e.g., to create all the
+users of a contest) can stream them to a single process. Commands
+must not need to ask anything (e.g., they must be given the contest
+id), as the standard input may be that of the batch.
+
+"""
+
+# We enable monkey patching to make many libraries gevent-friendly
+# (for instance, urllib3, used by requests). Tools doing it again
+# later are fine.
+import gevent.monkey
+gevent.monkey.patch_all()  # noqa
+
+import argparse
+import importlib
+import logging
+import re
+import shlex
+import sys
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_tool(name):
+    """Return the main function of a tool.
+
+    name (str): the name of the tool, e.g., AddUser or cmsAddUser.
+
+    return (function): the main function of the tool.
+
+    raise (KeyError): if there is no such tool.
+    raise (ImportError): if the tool exists but cannot be imported
+        (e.g., because of a missing dependency).
+
+    """
+    if name.startswith("cms"):
+        name = name[len("cms"):]
+    if re.fullmatch(r"[A-Z][A-Za-z]*", name) is None or name == "Batch":
+        raise KeyError("Unknown tool `%s'." % name)
+    try:
+        module = importlib.import_module("cmscontrib.%s" % name)
+    except ModuleNotFoundError as error:
+        if error.name != "cmscontrib.%s" % name:
+            raise
+        raise KeyError("Unknown tool `%s'." % name)
+    if not hasattr(module, "main"):
+        raise KeyError("Unknown tool `%s'." % name)
+    return module.main
+
+
+def run_command(argv):
+    """Run a command line of a tool, in this process.
+
+    argv ([str]): the command line, starting with the name of the
+        tool.
+
+    return (int): the exit status of the command.
+
+    """
+    try:
+        main = get_tool(argv[0])
+    except KeyError as error:
+        logger.error("%s", error.args[0])
+        return 1
+    except ImportError:
+        logger.error("Cannot import tool `%s'.", argv[0], exc_info=True)
+        return 1
+
+    # The tools parse their arguments from sys.argv.
+    old_argv = sys.argv
+    sys.argv = argv
+    try:
+        status = main()
+    except SystemExit as exit_:
+        # E.g., from argparse for invalid arguments.
+        if exit_.code is None:
+            status = 0
+        elif isinstance(exit_.code, int):
+            status = exit_.code
+        else:
+            logger.error("%s", exit_.code)
+            status = 1
+    except Exception:
+        logger.error("Unexpected error while running `%s'.",
+                     " ".join(argv), exc_info=True)
+        status = 1
+    finally:
+        sys.argv = old_argv
+    return status if status is not None else 0
+
+
+def run_batch(lines, exit_on_failure=False):
+    """Run the commands in some lines.
+
+    lines (iterable of str): the lines, each with a command.
+    exit_on_failure (bool): whether to stop at the first failed
+        command.
+
+    return (int): the number of failed commands.
+
+    """
+    failures = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        try:
+            argv = shlex.split(line)
+        except ValueError as error:
+            logger.error("Cannot parse line %d: %s.", number, error)
+            status = 1
+        else:
+            status = run_command(argv)
+        if status != 0:
+            logger.error("Command at line %d failed with exit status %d.",
+                         number, status)
+            failures += 1
+            if exit_on_failure:
+                break
+    return failures
+
+
+def main():
+    """Parse arguments and launch process.
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Run many commands of the CMS tools in one process.")
+    parser.add_argument(
+        "input", action="store", type=argparse.FileType("r"), nargs="?",
+        default=sys.stdin,
+        help="file with one command per line (default: standard input)")
+    parser.add_argument(
+        "-x", "--exit-on-failure", action="store_true",
+        help="stop at the first command that fails")
+    args = parser.parse_args()
+
+    failures = run_batch(args.input, args.exit_on_failure)
+    if failures > 0:
+        logger.error("%d command(s) failed.", failures)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
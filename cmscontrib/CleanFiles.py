@@ -23,48 +23,279 @@ and removes unreferenced file objects from the file store. If required,
 it also replaces all the executable digests in the database with a
 tombstone digest, to make executables removable in the clean pass.
 
+The orphans are computed by the database itself (with an anti-join
+against the referenced digests) when the file store is the database,
+and with a streaming merge of two sorted lists when it is a directory,
+so that the set of all digests is never loaded in memory. Orphans are
+deleted in batches, by a few parallel workers; each batch is checked
+again against the references just before deleting it, and committed on
+its own, so that interrupting the script and running it again is safe.
+
+With the incremental mode, only the files stored after the previous
+successful run (as recorded in a small state file) are considered.
+
 """
 
 import argparse
+import io
+import json
 import logging
+import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from cms.db import SessionGen, Digest, Executable, enumerate_files
-from cms.db.filecacher import FileCacher
+from sqlalchemy import func, select
+
+from cms import config
+from cms.db import SessionGen, Digest, Executable, FSObject, LargeObject, \
+    enumerate_files_query
+from cms.db.filecacher import FileCacher, DBBackend, FSBackend
 
 
 logger = logging.getLogger()
 
 
+DEFAULT_STATE_PATH = os.path.join(config.data_dir, "clean_files.json")
+
+
 def make_tombstone(session):
-    count = 0
-    for exe in session.query(Executable).all():
-        if exe.digest != Digest.TOMBSTONE:
-            count += 1
-        exe.digest = Digest.TOMBSTONE
+    count = session.query(Executable)\
+        .filter(Executable.digest != Digest.TOMBSTONE)\
+        .update({Executable.digest: Digest.TOMBSTONE},
+                synchronize_session=False)
     logger.info("Replaced %d executables with the tombstone.", count)
 
 
-def clean_files(session, dry_run):
-    filecacher = FileCacher()
-    files = set(file[0] for file in filecacher.list())
-    logger.info("A total number of %d files are present in the file store",
-                len(files))
-    found_digests = enumerate_files(session)
-    logger.info("Found %d digests while scanning", len(found_digests))
-    files -= found_digests
-    logger.info("%d digests are orphan.", len(files))
+def _referenced_digests(session):
+    """Return the column of the digests referenced by the contests.
+
+    return (Column): the only column of a subquery returning all the
+        digests referenced in the database (possibly the tombstone).
+
+    """
+    referenced = enumerate_files_query(session).alias("referenced")
+    return next(iter(referenced.c))
+
+
+def _batches(iterable, size):
+    """Split the given iterable in lists of at most the given size."""
+    batch = list()
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = list()
+    if len(batch) > 0:
+        yield batch
+
+
+def _merge_orphans(stored, referenced):
+    """Yield the stored digests that are not referenced.
+
+    stored (iterable of unicode): the stored digests, sorted.
+    referenced (iterable of unicode): the referenced digests, sorted.
+
+    """
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for digest in stored:
+        while current is not None and current < digest:
+            current = next(referenced, None)
+        if current != digest:
+            yield digest
+
+
+def _db_orphans(session, since):
+    """Return the orphans of a database store, and their total size.
+
+    session (Session): the session to use for the scan.
+    since (int|None): if given, only consider the large objects whose
+        OID is greater than this.
+
+    return ((int, int, iterable of unicode)): the number of orphans,
+        their total size in bytes, and their digests.
+
+    """
+    referenced = _referenced_digests(session)
+    orphans = session.query(FSObject.digest, FSObject.loid)\
+        .outerjoin(referenced.table, referenced == FSObject.digest)\
+        .filter(referenced.is_(None))
+    if since is not None:
+        orphans = orphans.filter(FSObject.loid > since)
+
+    # Compute the sizes in the same statement, opening each large
+    # object, seeking to its end and closing it right away (the items
+    # of a select list are evaluated in order, and PostgreSQL doesn't
+    # flatten subqueries calling volatile functions like these).
+    orphans_sq = orphans.subquery()
+    opened = select([
+        func.lo_open(orphans_sq.c.loid, LargeObject.INV_READ).label("fd")
+    ]).alias("opened")
+    sized = select([
+        func.lo_lseek64(opened.c.fd, 0, io.SEEK_END).label("size"),
+        func.lo_close(opened.c.fd),
+    ]).alias("sized")
+    count, total_size = session.execute(select([
+        func.count(), func.coalesce(func.sum(sized.c.size), 0)
+    ])).fetchone()
+
+    digests = (row.digest for row in orphans.order_by(None).yield_per(10000))
+    return count, int(total_size), digests
+
+
+def _fs_orphans(session, path, since):
+    """Return the orphans of a file-system store, and their total size.
+
+    session (Session): the session to use for the scan.
+    path (string): the root of the file-system store.
+    since (float|None): if given, only consider the files modified
+        after this timestamp.
+
+    return ((int, int, iterable of unicode)): the number of orphans,
+        their total size in bytes, and their digests.
+
+    """
+    # The digests are hexadecimal strings, hence the "C" collation sorts
+    # them in the same order as Python does.
+    referenced = _referenced_digests(session)
+    referenced_q = select([referenced])\
+        .order_by(referenced.collate("\"C\""))\
+        .execution_options(stream_results=True)
+    referenced_digests = (row[0] for row in session.execute(referenced_q))
+
+    # Skip the temporary files created by FSBackend.create_file().
+    stored = sorted(name for name in os.listdir(path)
+                    if not name.startswith("."))
+
+    count = 0
     total_size = 0
-    for orphan in files:
-        total_size += filecacher.get_size(orphan)
+    digests = list()
+    for digest in _merge_orphans(stored, referenced_digests):
+        try:
+            st = os.stat(os.path.join(path, digest))
+        except OSError:
+            continue
+        if since is not None and st.st_mtime <= since:
+            continue
+        count += 1
+        total_size += st.st_size
+        digests.append(digest)
+    return count, total_size, digests
+
+
+def _delete_batch(backend, digests):
+    """Delete the given orphans, if they are still unreferenced.
+
+    Each batch runs in its own transaction and is committed right
+    away, making the deletion resumable.
+
+    backend (FileCacherBackend): the store to delete the files from.
+    digests ([unicode]): the digests to delete.
+
+    return (int): the number of files actually deleted.
+
+    """
+    with SessionGen() as session:
+        referenced = _referenced_digests(session)
+        still_referenced = select([referenced]).where(referenced.in_(digests))
+
+        if isinstance(backend, DBBackend):
+            condition = FSObject.digest.in_(digests) \
+                & ~FSObject.digest.in_(still_referenced)
+            session.execute(select([func.lo_unlink(FSObject.loid)])
+                            .where(condition))
+            deleted = session.query(FSObject).filter(condition)\
+                .delete(synchronize_session=False)
+            session.commit()
+            return deleted
+
+        to_keep = set(row[0] for row in session.execute(still_referenced))
+    deleted = 0
+    for digest in digests:
+        if digest not in to_keep:
+            backend.delete(digest)
+            deleted += 1
+    return deleted
+
+
+def _delete_orphans(backend, digests, batch_size, workers):
+    """Delete the orphans in batches, with some parallel workers.
+
+    return (int): the number of files actually deleted.
+
+    """
+    deleted = 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(digests, batch_size):
+            # Keep a bounded number of batches in flight, to avoid
+            # consuming the whole (possibly streamed) list of orphans.
+            if len(pending) >= 2 * workers:
+                deleted += pending.popleft().result()
+                logger.info("%d files deleted from the file store", deleted)
+            pending.append(executor.submit(_delete_batch, backend, batch))
+        while len(pending) > 0:
+            deleted += pending.popleft().result()
+    return deleted
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict()
+
+
+def _save_state(state_path, state):
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "wt", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.rename(temp_path, state_path)
+
+
+def clean_files(session, dry_run, path=None, incremental=False,
+                state_path=DEFAULT_STATE_PATH, batch_size=1000, workers=4):
+    """Remove the unreferenced files from the file store.
+
+    session (Session): the session to use to scan the references.
+    dry_run (bool): only report what would be deleted.
+    path (string|None): the root of the file-system store, if the
+        store is not the database.
+    incremental (bool): only consider the files stored after the
+        previous successful run.
+    state_path (string): where to keep the state of the incremental
+        mode.
+    batch_size (int): how many files to delete in each transaction.
+    workers (int): how many batches to delete in parallel.
+
+    """
+    filecacher = FileCacher(path=path)
+    backend = filecacher.backend
+    state_key = "database" if path is None else os.path.abspath(path)
+    state = _load_state(state_path)
+    since = state.get(state_key) if incremental else None
+
+    if isinstance(backend, FSBackend):
+        mark = time.time()
+        count, total_size, orphans = _fs_orphans(session, backend.path, since)
+    else:
+        mark = session.query(func.max(FSObject.loid)).scalar()
+        count, total_size, orphans = _db_orphans(session, since)
+
+    if since is not None:
+        logger.info("Considering only the files stored after the last run.")
+    logger.info("%d digests are orphan.", count)
     logger.info("Orphan files take %s bytes of disk space",
                 "{:,}".format(total_size))
     if not dry_run:
-        for count, orphan in enumerate(files):
-            filecacher.delete(orphan)
-            if count % 100 == 0:
-                logger.info("%d files deleted from the file store", count)
-        logger.info("All orphan files have been deleted")
+        deleted = _delete_orphans(backend, orphans, batch_size, workers)
+        logger.info("All orphan files have been deleted (%d).", deleted)
+        if mark is not None:
+            state[state_key] = mark
+            _save_state(state_path, state)
 
 
 def main():
@@ -73,13 +304,32 @@ def main():
         "If -t is specified, also replace all executables with the tombstone")
     parser.add_argument("-t", "--tombstone", action="store_true")
     parser.add_argument("-n", "--dry-run", action="store_true")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="only consider files stored after the last run")
+    parser.add_argument("-p", "--path", action="store", type=str,
+                        help="clean the file-system store at this path "
+                        "instead of the database")
+    parser.add_argument("-s", "--state-file", action="store", type=str,
+                        default=DEFAULT_STATE_PATH,
+                        help="where to record the last run for -i")
+    parser.add_argument("-b", "--batch-size", action="store", type=int,
+                        default=1000,
+                        help="number of files deleted in each transaction")
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        default=4,
+                        help="number of batches deleted in parallel")
     args = parser.parse_args()
     with SessionGen() as session:
         if args.tombstone:
             make_tombstone(session)
-        clean_files(session, args.dry_run)
-        if not args.dry_run:
-            session.commit()
+            # The batches are rechecked in their own sessions, which
+            # must see the tombstones.
+            if not args.dry_run:
+                session.commit()
+        clean_files(session, args.dry_run, path=args.path,
+                    incremental=args.incremental,
+                    state_path=args.state_file,
+                    batch_size=args.batch_size, workers=args.workers)
     return 0
 
 
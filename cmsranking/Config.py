@@ -56,6 +56,12 @@ class Config:
 
         # Buffers
         self.buffer_size = 100  # Needs to be strictly positive.
+        # Events are sent to the clients in frames, each collecting the
+        # events of event_tick seconds (None to send them one by one);
+        # clients with more than event_max_lag frames (or events) not
+        # yet sent are asked to reload their data (None for no limit).
+        self.event_tick = 0.25
+        self.event_max_lag = 120
 
         # File system.
         # TODO: move to cmscommon as it is used both here and in cms/conf.py
@@ -241,8 +241,10 @@ class StoreHandler:
 class DataWatcher(EventSource):
     """Receive the messages from the entities store and redirect them."""
 
-    def __init__(self, stores, buffer_size):
+    def __init__(self, stores, buffer_size, tick=None, max_lag=None):
         self._CACHE_SIZE = buffer_size
+        self._TICK = tick
+        self._MAX_LAG = max_lag
         EventSource.__init__(self)
 
         stores["contest"].add_create_callback(
@@ -280,7 +282,9 @@ class DataWatcher(EventSource):
 
     def score_callback(self, user, task, score):
         # FIXME Use score_precision.
-        self.send("score", "%s %s %0.2f" % (user, task, score))
+        # Only the latest score of a user on a task matters.
+        self.send("score", "%s %s %0.2f" % (user, task, score),
+                  coalesce_key=(user, task))
 
 
 class SubListHandler:
@@ -575,7 +579,8 @@ def main():
 
     toplevel_handler = RoutingHandler(
         RootHandler(config.web_dir),
-        DataWatcher(stores, config.buffer_size),
+        DataWatcher(stores, config.buffer_size, config.event_tick,
+                    config.event_max_lag),
         ImageHandler(
             os.path.join(config.lib_dir, '%(name)s'),
             os.path.join(config.web_dir, 'img', 'logo.png')),
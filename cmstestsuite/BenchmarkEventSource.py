@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Load test of the fan-out of the events of RankingWebServer.
+
+Serve an EventSource over HTTP on localhost, connect many spectators
+(by default 5000, a few of which never read), publish batches of score
+changes (as ProxyService would send them) and measure how long each
+batch takes to be published and to reach all the reading spectators,
+together with the spectators dropped for lagging behind and the peak
+memory of the process. Run it with and without coalescing (-t 0) to
+compare.
+
+"""
+
+import argparse
+import resource
+import socket
+import sys
+import time
+
+import gevent
+import gevent.socket
+from gevent.pywsgi import WSGIServer
+
+from cmscommon.eventsource import EventSource
+
+
+class BenchmarkEventSource(EventSource):
+
+    def __init__(self, tick, max_lag):
+        self._TICK = tick
+        self._MAX_LAG = max_lag
+        EventSource.__init__(self)
+
+
+class Spectator:
+    """A client of the event stream, recording when markers arrive."""
+
+    def __init__(self, address, reading):
+        """Connect to the event stream.
+
+        address ((str, int)): the address of the server.
+        reading (bool): whether to read the stream (otherwise, the
+            spectator just stays connected, as a stuck client would).
+
+        """
+        self.socket = gevent.socket.create_connection(address)
+        if not reading:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.socket.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n"
+                            b"Accept: text/event-stream\r\n\r\n")
+        self.seen = dict()
+        self.reinit = False
+        self.greenlet = gevent.spawn(self.read) if reading else None
+
+    def read(self):
+        tail = b""
+        while True:
+            data = self.socket.recv(65536)
+            if not data:
+                return
+            data = tail + data
+            now = time.monotonic()
+            start = 0
+            while True:
+                start = data.find(b"data:end ", start)
+                if start == -1:
+                    break
+                end = data.find(b"\n", start)
+                if end == -1:
+                    break
+                self.seen[int(data[start + 9:end])] = now
+                start = end
+            if b"event:reinit" in data:
+                self.reinit = True
+            tail = data[-64:]
+
+    def close(self):
+        if self.greenlet is not None:
+            self.greenlet.kill()
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the event stream of RWS.")
+    parser.add_argument(
+        "-n", "--spectators", action="store", type=int, default=5000,
+        help="number of spectators (default 5000)")
+    parser.add_argument(
+        "-s", "--stuck", action="store", type=int, default=50,
+        help="number of spectators not reading (default 50)")
+    parser.add_argument(
+        "-b", "--batches", action="store", type=int, default=10,
+        help="number of batches of score changes (default 10)")
+    parser.add_argument(
+        "-e", "--events", action="store", type=int, default=2000,
+        help="score changes per batch (default 2000)")
+    parser.add_argument(
+        "-t", "--tick", action="store", type=float, default=0.25,
+        help="coalescing tick in seconds, 0 to disable (default 0.25)")
+    parser.add_argument(
+        "-l", "--max-lag", action="store", type=int, default=120,
+        help="maximum lag of a spectator, 0 for none (default 120)")
+    args = parser.parse_args()
+
+    # Each spectator needs two file descriptors.
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 2 * args.spectators + 100
+    if hard_limit != resource.RLIM_INFINITY and hard_limit < needed:
+        print("At most %d files can be open, %d needed." %
+              (hard_limit, needed))
+        return 1
+    resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard_limit))
+
+    event_source = BenchmarkEventSource(args.tick or None,
+                                        args.max_lag or None)
+    server = WSGIServer(("127.0.0.1", 0), event_source, log=None,
+                        backlog=1024)
+    server.start()
+
+    print("Connecting %d spectators." % args.spectators)
+    spectators = []
+    for i in range(args.spectators):
+        spectators.append(Spectator(server.address, i >= args.stuck))
+        if i % 100 == 0:
+            gevent.sleep(0)
+    while event_source._pub.get_subscriber_count() < args.spectators:
+        gevent.sleep(0.1)
+    readers = [s for s in spectators if s.greenlet is not None]
+
+    for batch in range(args.batches):
+        start = time.monotonic()
+        for i in range(args.events):
+            user, task = i % 1000, i // 1000
+            event_source.send("score", "%d %d %d.00" % (user, task, batch),
+                              coalesce_key=(user, task))
+        event_source.send("score", "end %d" % batch)
+        published = time.monotonic()
+        deadline = published + 60
+        while time.monotonic() < deadline and \
+                any(batch not in s.seen for s in readers):
+            gevent.sleep(0.01)
+        received = [s.seen[batch] for s in readers if batch in s.seen]
+        print("Batch %2d: published in %7.1f ms, received by %d/%d "
+              "spectators in %7.1f ms (max)" % (
+                  batch, (published - start) * 1000, len(received),
+                  len(readers),
+                  (max(received) - start) * 1000 if received else 0))
+        gevent.sleep(0.5)
+
+    print("Spectators dropped: %d (%d stuck), reinit received by %d." % (
+        args.spectators - event_source._pub.get_subscriber_count(),
+        args.stuck, sum(s.reinit for s in spectators)))
+    print("Peak memory: %d MiB." %
+          (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+    for spectator in spectators:
+        spectator.close()
+    server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
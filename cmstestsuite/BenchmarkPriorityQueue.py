@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the cost of the operations of the queues of ES.
+
+Fill a PriorityQueue and a FairPriorityQueue with many ESOperations
+(by default one million, from a thousand participations, with the
+priorities ES would use) and time, per operation, push, remove,
+set_priority and pop.
+
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from cms.io import FairPriorityQueue, PriorityQueue
+from cms.service.esoperations import ESOperation
+from cmscommon.datetime import make_datetime
+
+
+def make_entries(entries, participations, seed):
+    """Return the entries to push, in random order.
+
+    entries (int): how many entries.
+    participations (int): among how many participations they are
+        shared.
+    seed (int): the seed of the random generator.
+
+    return ([(ESOperation, int, datetime)]): the entries.
+
+    """
+    rnd = random.Random(seed)
+    priorities = [PriorityQueue.PRIORITY_HIGH, PriorityQueue.PRIORITY_MEDIUM,
+                  PriorityQueue.PRIORITY_MEDIUM, PriorityQueue.PRIORITY_LOW]
+    res = []
+    for i in range(entries):
+        operation = ESOperation(ESOperation.EVALUATION, i // 100, 1,
+                                "%03d" % (i % 100),
+                                rnd.randrange(participations))
+        res.append((operation, rnd.choice(priorities),
+                    make_datetime(rnd.uniform(0, 5 * 3600))))
+    rnd.shuffle(res)
+    return res
+
+
+def measure(name, function, arguments):
+    """Call function on each argument and print the time per call.
+
+    name (str): the name of the measure.
+    function (function): the function to time.
+    arguments ([object]): the arguments.
+
+    """
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    elapsed = time.perf_counter() - start
+    print("  %-13s %9d ops %8.2f s %8.2f us/op" % (
+        name, len(arguments), elapsed,
+        elapsed / max(len(arguments), 1) * 1e6))
+
+
+def benchmark(queue, entries, rnd):
+    """Run all the measures on a queue.
+
+    queue (PriorityQueue|FairPriorityQueue): an empty queue.
+    entries ([(ESOperation, int, datetime)]): the entries to use.
+    rnd (random.Random): the random generator.
+
+    """
+    measure("push", lambda entry: queue.push(*entry), entries)
+    sample = [entry[0] for entry in rnd.sample(entries, len(entries) // 10)]
+    measure("remove", queue.remove, sample)
+    measure("push again", lambda item: queue.push(item), sample)
+    measure("set_priority",
+            lambda item: queue.set_priority(item,
+                                            PriorityQueue.PRIORITY_HIGH),
+            sample)
+    measure("pop", lambda _: queue.pop(), range(len(queue)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the operation queues of ES.")
+    parser.add_argument(
+        "-n", "--entries", action="store", type=int, default=1_000_000,
+        help="number of operations in the queue (default 1000000)")
+    parser.add_argument(
+        "-p", "--participations", action="store", type=int, default=1000,
+        help="number of participations (default 1000)")
+    parser.add_argument(
+        "-q", "--quantum", action="store", type=int, default=1,
+        help="quantum of the fair queue (default 1)")
+    parser.add_argument(
+        "-s", "--seed", action="store", type=int, default=0,
+        help="seed of the random generator (default 0)")
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries, args.participations, args.seed)
+    queues = [
+        ("PriorityQueue", PriorityQueue()),
+        ("FairPriorityQueue by participation",
+         FairPriorityQueue(lambda operation: operation.participation_id,
+                           args.quantum)),
+    ]
+    for name, queue in queues:
+        print(name)
+        benchmark(queue, entries, random.Random(args.seed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
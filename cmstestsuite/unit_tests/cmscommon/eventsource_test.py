@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the eventsource module."""
+
+import unittest
+
+import gevent
+
+from cmscommon.eventsource import Publisher
+
+
+def events(data):
+    """Return the (event, data) pairs in some encoded messages."""
+    res = []
+    for message in data.decode("utf-8").split("\n\n")[:-1]:
+        fields = dict(line.split(":", 1) for line in message.split("\n"))
+        res.append((fields.get("event"), fields.get("data")))
+    return res
+
+
+def last_id(data):
+    """Return the id of the last message in some encoded messages."""
+    return [line for line in data.decode("utf-8").split("\n")
+            if line.startswith("id:")][-1][3:]
+
+
+class TestPublisher(unittest.TestCase):
+
+    def test_immediate(self):
+        publisher = Publisher(10)
+        subscriber = publisher.get_subscriber()
+        publisher.put("score", "u t 1.00")
+        publisher.put("user", "create u")
+        self.assertEqual(events(b"".join(subscriber.get())),
+                         [("score", "u t 1.00"), ("user", "create u")])
+
+    def test_coalesced(self):
+        publisher = Publisher(10, tick=1000)
+        subscriber = publisher.get_subscriber()
+        publisher.put("score", "u t 1.00", coalesce_key=("u", "t"))
+        publisher.put("user", "create v")
+        publisher.put("score", "u t 2.00", coalesce_key=("u", "t"))
+        publisher.put("score", "u s 1.00", coalesce_key=("u", "s"))
+        publisher.flush()
+        frames = list(subscriber.get())
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(events(frames[0]), [("user", "create v"),
+                                             ("score", "u t 2.00"),
+                                             ("score", "u s 1.00")])
+
+    def test_tick(self):
+        publisher = Publisher(10, tick=0.01)
+        subscriber = publisher.get_subscriber()
+        publisher.put("user", "create u")
+        gevent.sleep(0.05)
+        self.assertEqual(events(b"".join(subscriber.get())),
+                         [("user", "create u")])
+
+    def test_replay(self):
+        publisher = Publisher(10, tick=1000)
+        previous = publisher.get_subscriber()
+        publisher.put("user", "create u")
+        publisher.flush()
+        first = list(previous.get())[-1]
+        publisher.put("user", "create v")
+        publisher.flush()
+
+        subscriber = publisher.get_subscriber(last_id(first))
+        self.assertEqual(events(b"".join(subscriber.get())),
+                         [("user", "create v")])
+
+    def test_replay_too_old(self):
+        publisher = Publisher(1)
+        previous = publisher.get_subscriber()
+        publisher.put("user", "create u")
+        first = list(previous.get())[-1]
+        publisher.put("user", "create v")
+        publisher.put("user", "create w")
+
+        subscriber = publisher.get_subscriber(last_id(first))
+        self.assertEqual(events(b"".join(subscriber.get())),
+                         [("reinit", None)])
+
+    def test_lagging_subscriber(self):
+        publisher = Publisher(10, max_lag=2)
+        slow = publisher.get_subscriber()
+        fast = publisher.get_subscriber()
+        for i in range(3):
+            publisher.put("user", "create %d" % i)
+            if i < 2:
+                self.assertEqual(len(list(fast.get())), 1)
+        self.assertEqual(publisher.get_subscriber_count(), 1)
+        self.assertEqual(events(b"".join(slow.get())), [("reinit", None)])
+        self.assertTrue(slow.closed)
+        self.assertFalse(fast.closed)
+        self.assertEqual(len(list(fast.get())), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the Batch script"""
+
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import Admin
+from cmscontrib.Batch import get_tool, run_batch, run_command
+
+
+class TestBatch(DatabaseMixin, unittest.TestCase):
+
+    def tearDown(self):
+        self.delete_data()
+        super().tearDown()
+
+    def get_admins(self):
+        return sorted(a.username for a in self.session.query(Admin).all())
+
+    def test_success(self):
+        self.assertEqual(run_batch([
+            "# Some admins.",
+            "cmsAddAdmin -p pwd first",
+            "",
+            "AddAdmin --password 'a b' second",
+        ]), 0)
+        self.assertEqual(self.get_admins(), ["first", "second"])
+
+    def test_failures(self):
+        self.assertEqual(run_batch([
+            "cmsAddAdmin -p pwd first",
+            "cmsAddAdmin -p pwd first",
+            "cmsAddAdmin --invalid-option second",
+            "cmsUnknownTool",
+            "cmsAddAdmin 'unterminated",
+            "cmsAddAdmin -p pwd third",
+        ]), 4)
+        self.assertEqual(self.get_admins(), ["first", "third"])
+
+    def test_exit_on_failure(self):
+        self.assertEqual(run_batch([
+            "cmsAddAdmin --invalid-option first",
+            "cmsAddAdmin -p pwd second",
+        ], exit_on_failure=True), 1)
+        self.assertEqual(self.get_admins(), [])
+
+    def test_unknown_tools(self):
+        for name in ["cmsBatch", "importing", "os", "cmscontrib.AddAdmin"]:
+            self.assertEqual(run_command([name]), 1)
+
+    def test_broken_tool(self):
+        # A tool failing to import is not mistaken for an unknown one.
+        error = ModuleNotFoundError("No module named 'missing'",
+                                    name="missing")
+        with patch("importlib.import_module", side_effect=error):
+            with self.assertRaises(ModuleNotFoundError):
+                get_tool("cmsAddAdmin")
+            with self.assertLogs("cmscontrib.Batch", "ERROR") as logs:
+                self.assertEqual(run_command(["cmsAddAdmin"]), 1)
+        self.assertIn("Cannot import tool", logs.output[0])
+        self.assertIn("missing", logs.output[0])
+
+
+class TestStartup(unittest.TestCase):
+    """Check that the tools do not import what they don't need."""
+
+    # Modules that are slow to import and needed only by the services
+    # or by some of the tools.
+    SLOW_MODULES = ["Crypto.Cipher", "pkg_resources", "requests", "tornado",
+                    "cms.grading", "cms.server"]
+
+    def test_import_budget(self):
+        modules = subprocess.check_output(
+            [sys.executable, "-c",
+             "import sys, cmscontrib.RemoveUser; print(*sys.modules)"],
+            env=os.environ, stderr=subprocess.DEVNULL).decode().split()
+        for module in self.SLOW_MODULES:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
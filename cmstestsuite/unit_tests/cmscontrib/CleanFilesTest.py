@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the CleanFiles script"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import FSObject
+from cmscommon.digest import bytes_digest
+from cmscontrib.CleanFiles import clean_files, _merge_orphans
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
+
+
+_CONTENT_1 = b"referenced"
+_CONTENT_2 = b"orphan"
+_CONTENT_3 = b"another orphan"
+_DIGEST_1 = bytes_digest(_CONTENT_1)
+_DIGEST_2 = bytes_digest(_CONTENT_2)
+_DIGEST_3 = bytes_digest(_CONTENT_3)
+
+
+class TestMergeOrphans(unittest.TestCase):
+
+    def test_merge(self):
+        self.assertEqual(
+            list(_merge_orphans(["a", "b", "c", "e"], ["b", "d", "e", "f"])),
+            ["a", "c"])
+
+    def test_nothing_referenced(self):
+        self.assertEqual(list(_merge_orphans(["a", "b"], [])), ["a", "b"])
+
+    def test_nothing_stored(self):
+        self.assertEqual(list(_merge_orphans([], ["a"])), [])
+
+
+class TestCleanFiles(DatabaseMixin, FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest()
+        self.task = self.add_task(contest=self.contest)
+        self.add_statement(task=self.task, digest=_DIGEST_1)
+        self.session.commit()
+        self.state_path = self.get_path("state.json")
+
+    def tearDown(self):
+        self.delete_data()
+        super().tearDown()
+
+    def stored_digests(self):
+        self.session.expire_all()
+        return set(fso.digest for fso in self.session.query(FSObject))
+
+    def clean(self, **kwargs):
+        clean_files(self.session, state_path=self.state_path, **kwargs)
+        self.session.rollback()
+
+    def test_db_dry_run(self):
+        self.add_fsobject(_DIGEST_1, _CONTENT_1)
+        self.add_fsobject(_DIGEST_2, _CONTENT_2)
+        self.clean(dry_run=True)
+        self.assertEqual(self.stored_digests(), {_DIGEST_1, _DIGEST_2})
+
+    def test_db_clean(self):
+        self.add_fsobject(_DIGEST_1, _CONTENT_1)
+        self.add_fsobject(_DIGEST_2, _CONTENT_2)
+        self.add_fsobject(_DIGEST_3, _CONTENT_3)
+        self.clean(dry_run=False, batch_size=1, workers=2)
+        self.assertEqual(self.stored_digests(), {_DIGEST_1})
+
+    def test_db_incremental(self):
+        self.add_fsobject(_DIGEST_1, _CONTENT_1)
+        self.clean(dry_run=False, incremental=True)
+        self.assertTrue(os.path.exists(self.state_path))
+
+        self.add_fsobject(_DIGEST_2, _CONTENT_2)
+        self.clean(dry_run=False, incremental=True)
+        self.assertEqual(self.stored_digests(), {_DIGEST_1})
+
+    def test_db_incremental_skips_handled(self):
+        handled = list()
+
+        def handle_orphans(unused_backend, digests, *unused_args):
+            # Consider the orphans handled, but (say) don't delete them.
+            handled.append(sorted(digests))
+            return 0
+
+        self.add_fsobject(_DIGEST_1, _CONTENT_1)
+        self.add_fsobject(_DIGEST_2, _CONTENT_2)
+        with patch("cmscontrib.CleanFiles._delete_orphans",
+                   side_effect=handle_orphans):
+            self.clean(dry_run=False, incremental=True)
+            self.add_fsobject(_DIGEST_3, _CONTENT_3)
+            self.clean(dry_run=False, incremental=True)
+        self.assertEqual(handled, [[_DIGEST_2], [_DIGEST_3]])
+
+        # Without the incremental mode, all orphans are considered.
+        self.clean(dry_run=False)
+        self.assertEqual(self.stored_digests(), {_DIGEST_1})
+
+    def test_fs_clean(self):
+        path = self.makedirs("store")
+        for digest, content in ((_DIGEST_1, _CONTENT_1),
+                                (_DIGEST_2, _CONTENT_2)):
+            self.write_file(os.path.join("store", digest), content)
+        self.clean(dry_run=False, path=path)
+        self.assertEqual(os.listdir(path), [_DIGEST_1])
+
+
+if __name__ == "__main__":
+    unittest.main()
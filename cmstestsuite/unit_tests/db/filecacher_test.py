@@ -26,13 +26,17 @@
 import os
 import random
 import shutil
+import time
 import unittest
 from io import BytesIO
+from unittest.mock import Mock, patch
+
+import requests
 
 # Needs to be first to allow for monkey patching the DB connection string.
 from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
 
-from cms.db.filecacher import FileCacher
+from cms.db.filecacher import FileCacher, PeerBackend
 from cmscommon.digest import Digester, bytes_digest
 
 
@@ -356,6 +360,76 @@ class TestFileCacherBase:
         # Check that the file was stored correctly.
         self.check_stored_file(digest)
 
+    def test_load_many(self):
+        """Put some files in the storage, drop them from the local cache
+        and load them back all at once.
+
+        """
+        # One of the files is bigger than CHUNK_SIZE, to exercise the
+        # growing read size.
+        contents = [os.urandom(100), os.urandom(100),
+                    os.urandom(3 * FileCacher.CHUNK_SIZE + 1)]
+        digests = [self.file_cacher.put_file_content(content)
+                   for content in contents]
+        for digest in digests:
+            self.file_cacher.drop(digest)
+        missing = bytes_digest(b"not stored")
+
+        calls = []
+        loaded = self.file_cacher.load_many(
+            digests + [missing], workers=2,
+            progress=lambda done, total: calls.append((done, total)))
+
+        self.assertEqual(loaded, 3)
+        self.assertEqual(calls, [(4, 4)])
+        for digest, content in zip(digests, contents):
+            with open(os.path.join(self.cache_base_path, digest), "rb") as f:
+                self.assertEqual(f.read(), content)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache_base_path, missing)))
+
+        # Files already cached are not downloaded again.
+        self.assertEqual(self.file_cacher.load_many(digests), 0)
+
+    def test_load_many_read_error(self):
+        """A file failing while being read is skipped, without leaving
+        its temporary file behind.
+
+        """
+        content = os.urandom(100)
+        digest = self.file_cacher.put_file_content(content)
+        self.file_cacher.drop(digest)
+
+        broken = Mock()
+        broken.read.side_effect = RuntimeError("connection lost")
+        with patch.object(self.file_cacher.backend, "read_many",
+                          return_value=iter([(digest, broken)])):
+            with self.assertLogs("cms.db.filecacher", "WARNING"):
+                self.assertEqual(self.file_cacher.load_many([digest]), 0)
+
+        self.assertEqual(os.listdir(self.file_cacher.temp_dir), [])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache_base_path, digest)))
+
+    def test_put_many(self):
+        """Put some files (one of them already stored, one repeated) in
+        the storage all at once and check they are all there.
+
+        """
+        contents = [os.urandom(100), os.urandom(100), os.urandom(100)]
+        self.file_cacher.put_file_content(contents[0])
+        contents.append(contents[1])
+
+        digests = self.file_cacher.put_many(
+            (content, "Test #%d" % i) for i, content in enumerate(contents))
+
+        self.assertEqual(digests,
+                         [bytes_digest(content) for content in contents])
+        for digest, content in zip(digests, contents):
+            self.file_cacher.drop(digest)
+            self.assertEqual(self.file_cacher.get_file_content(digest),
+                             content)
+
 
 class TestFileCacherDB(TestFileCacherBase, DatabaseMixin, unittest.TestCase):
     """Tests for the FileCacher service with a database backend."""
@@ -378,5 +452,119 @@ class TestFileCacherFS(TestFileCacherBase, unittest.TestCase):
         shutil.rmtree("fs-storage", ignore_errors=True)
 
 
+class TestFileCacherEviction(unittest.TestCase):
+    """Tests for the size-bounded local cache of FileCacher."""
+
+    def setUp(self):
+        super().setUp()
+        # With a null backend the files only live in the local cache.
+        self.file_cacher = FileCacher(null=True, max_size=250)
+
+    def put(self, content):
+        digest = self.file_cacher.put_file_content(content)
+        return os.path.join(self.file_cacher.file_dir, digest), digest
+
+    def test_evict_least_recently_used(self):
+        path_a, digest_a = self.put(b"a" * 100)
+        path_b, _ = self.put(b"b" * 100)
+        # Access the first one, so that the second is evicted.
+        self.file_cacher.get_file_content(digest_a)
+        path_c, _ = self.put(b"c" * 100)
+
+        self.assertTrue(os.path.exists(path_a))
+        self.assertFalse(os.path.exists(path_b))
+        self.assertTrue(os.path.exists(path_c))
+        status = self.file_cacher.get_cache_status()
+        self.assertEqual(status["hits"], 1)
+        self.assertEqual(status["evictions"], 1)
+        self.assertEqual(status["size"], 200)
+
+    def test_pinned_not_evicted(self):
+        path_a, digest_a = self.put(b"a" * 100)
+        self.file_cacher.pin([digest_a])
+        path_b, _ = self.put(b"b" * 100)
+        path_c, _ = self.put(b"c" * 100)
+
+        self.assertTrue(os.path.exists(path_a))
+        self.assertFalse(os.path.exists(path_b))
+        self.assertTrue(os.path.exists(path_c))
+
+    def test_miss(self):
+        with self.assertRaises(KeyError):
+            self.file_cacher.get_file(bytes_digest(b"missing"))
+        self.assertEqual(self.file_cacher.get_cache_status()["misses"], 1)
+
+    def test_order_survives_restart(self):
+        path_a, digest_a = self.put(b"a" * 100)
+        path_b, _ = self.put(b"b" * 100)
+        # Simulate an old access to the second file.
+        os.utime(path_b, (0, 0))
+        self.file_cacher.cache.scan()
+        self.put(b"c" * 100)
+
+        self.assertTrue(os.path.exists(path_a))
+        self.assertFalse(os.path.exists(path_b))
+
+
+class TestPeerBackend(unittest.TestCase):
+    """Tests for the backend fetching files from other caches."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = b"some content"
+        self.digest = bytes_digest(self.content)
+        self.fallback = Mock()
+        self.fallback.get_file.return_value = BytesIO(b"from fallback")
+        self.backend = PeerBackend(["http://peer1/", "http://peer2/"],
+                                   self.fallback)
+
+    @staticmethod
+    def response(status_code, content=b""):
+        response = Mock()
+        response.status_code = status_code
+        response.iter_content.return_value = [content]
+        return response
+
+    def test_from_peer(self):
+        with patch("requests.get", side_effect=[
+                self.response(404), self.response(200, self.content)]):
+            with self.backend.get_file(self.digest) as fobj:
+                self.assertEqual(fobj.read(), self.content)
+        self.fallback.get_file.assert_not_called()
+
+    def test_wrong_digest(self):
+        with patch("requests.get", side_effect=[
+                self.response(200, b"corrupted"),
+                self.response(200, b"corrupted")]):
+            with self.backend.get_file(self.digest) as fobj:
+                self.assertEqual(fobj.read(), b"from fallback")
+
+    def test_peers_down(self):
+        with patch("requests.get",
+                   side_effect=requests.ConnectionError()):
+            with self.backend.get_file(self.digest) as fobj:
+                self.assertEqual(fobj.read(), b"from fallback")
+
+    def test_peer_down_not_asked_again(self):
+        with patch("requests.get", side_effect=[
+                requests.ConnectionError(), self.response(404)]) as get:
+            self.backend.get_file(self.digest).close()
+        self.assertEqual(get.call_count, 2)
+
+        # Only the second peer is asked, until the first one's period
+        # as down ends.
+        with patch("requests.get",
+                   return_value=self.response(404)) as get:
+            self.backend.get_file(self.digest).close()
+        get.assert_called_once_with("http://peer2/" + self.digest,
+                                    stream=True, timeout=PeerBackend.TIMEOUT)
+
+        with patch("requests.get", return_value=self.response(404)) as get, \
+                patch("time.monotonic",
+                      return_value=time.monotonic() + PeerBackend.DOWN_PERIOD):
+            self.backend.get_file(self.digest).close()
+        self.assertEqual(get.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the pools and the instrumentation of the engine."""
+
+import unittest
+from unittest.mock import patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from sqlalchemy import create_engine
+
+from cms import config
+from cms.db import SessionGen, configure_pool, engine
+from cms.db.pool import TimedNullPool, TimedQueuePool, _checkout_duration, \
+    _statement_durations, get_engine_arguments, get_pool_size
+
+
+class TestPoolSize(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(config, "database_pool_size",
+                               {"default": [3, 4], "Worker": [1, 0]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_engine(self):
+        engine = create_engine(config.database, **get_engine_arguments())
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_get_pool_size(self):
+        self.assertEqual(get_pool_size("Worker"), (1, 0))
+        self.assertEqual(get_pool_size("EvaluationService"), (3, 4))
+        self.assertEqual(get_pool_size(), (3, 4))
+
+    def test_get_pool_size_no_default(self):
+        with patch.object(config, "database_pool_size", {}):
+            self.assertEqual(get_pool_size("Worker"), (5, 10))
+
+    def test_configure_pool(self):
+        engine = self.make_engine()
+        self.assertIsInstance(engine.pool, TimedQueuePool)
+        self.assertEqual(engine.pool.size(), 3)
+
+        configure_pool(engine, "Worker")
+        self.assertIsInstance(engine.pool, TimedQueuePool)
+        self.assertEqual(engine.pool.size(), 1)
+        self.assertEqual(engine.pool._max_overflow, 0)
+        # The new pool still initializes the dialect.
+        self.assertEqual(engine.execute("SELECT 1").scalar(), 1)
+
+    def test_transaction_pooling(self):
+        with patch.object(config, "database_transaction_pooling", True):
+            engine = self.make_engine()
+        self.assertIsInstance(engine.pool, TimedNullPool)
+        configure_pool(engine, "Worker")
+        self.assertIsInstance(engine.pool, TimedNullPool)
+        self.assertEqual(engine.execute("SELECT 1").scalar(), 1)
+
+    def test_checkout_measured(self):
+        engine = self.make_engine()
+        count = _checkout_duration.count
+        engine.execute("SELECT 1")
+        self.assertEqual(_checkout_duration.count, count + 1)
+
+
+class TestStatements(DatabaseMixin, unittest.TestCase):
+
+    def test_counted_by_session(self):
+        with SessionGen() as session:
+            session.execute("SELECT 1")
+            session.execute("SELECT 2")
+            self.assertEqual(session.info["statements"], 2)
+
+    def test_counted_across_commits(self):
+        with SessionGen() as session:
+            session.execute("SELECT 1")
+            session.commit()
+            session.execute("SELECT 2")
+            self.assertEqual(session.info["statements"], 2)
+
+    def test_not_counted_after_session(self):
+        # The connection goes back to the pool: the statements later
+        # executed on it are not counted in the closed session.
+        with SessionGen() as session:
+            session.execute("SELECT 1")
+            info = session.connection().info
+        self.assertNotIn("cms_session_info", info)
+        engine.execute("SELECT 2")
+        self.assertEqual(session.info["statements"], 1)
+
+    def test_call_site(self):
+        site = "%s:%s" % (__name__, "test_call_site")
+        count = _statement_durations[site].count \
+            if site in _statement_durations else 0
+        self.session.execute("SELECT 1")
+        self.assertEqual(_statement_durations[site].count, count + 1)
+
+    def test_slow_statement_logged(self):
+        with patch.object(config, "database_slow_statement_s", 0.0):
+            with self.assertLogs("cms.db.pool", "WARNING") as logs:
+                self.session.execute("SELECT 1")
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("test_slow_statement_logged", logs.output[0])
+        self.assertIn("SELECT 1", logs.output[0])
+
+    def test_slow_statement_disabled(self):
+        with patch.object(config, "database_slow_statement_s", None), \
+                patch("cms.db.pool.logger") as logger:
+            self.session.execute("SELECT 1")
+        logger.warning.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the read-only sessions and the replica."""
+
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from cms import config
+from cms.db import engine, SessionGen, get_staleness, read_only_session
+from cms.db.session import ReplicaMonitor
+
+
+class TestReplicaMonitor(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The database for testing is not a replica, so it is never
+        # behind.
+        self.monitor = ReplicaMonitor(engine, engine)
+
+    def test_lag(self):
+        self.assertEqual(self.monitor.get_lag(), 0.0)
+        self.assertTrue(self.monitor.can_read())
+
+    def test_lag_cached(self):
+        self.monitor.get_lag()
+        self.monitor.engine = Mock()
+        self.assertEqual(self.monitor.get_lag(), 0.0)
+        self.monitor.engine.execute.assert_not_called()
+
+    def test_measured_against_primary(self):
+        self.monitor.primary_engine = Mock()
+        self.monitor.primary_engine.execute.return_value.scalar\
+            .return_value = "0/3000060"
+        self.monitor.engine = Mock()
+        self.monitor.engine.execute.return_value.scalar.return_value = 0
+        self.assertEqual(self.monitor.get_lag(), 0.0)
+        self.assertEqual(self.monitor.engine.execute.call_args[1],
+                         {"lsn": "0/3000060"})
+
+    def test_too_behind(self):
+        self.monitor.engine = Mock()
+        self.monitor.engine.execute.return_value.scalar.return_value = \
+            config.database_replica_max_lag_s + 1
+        self.assertFalse(self.monitor.can_read())
+
+    def test_never_replayed(self):
+        # No transaction replayed yet, so no lag can be computed.
+        self.monitor.engine = Mock()
+        self.monitor.engine.execute.return_value.scalar.return_value = None
+        self.assertIsNone(self.monitor.get_lag())
+        self.assertFalse(self.monitor.can_read())
+
+    def test_unreachable(self):
+        self.monitor.engine = Mock()
+        self.monitor.engine.execute.side_effect = \
+            OperationalError("SELECT", {}, Exception())
+        with self.assertLogs("cms.db.session", "WARNING"):
+            self.assertIsNone(self.monitor.get_lag())
+        self.assertFalse(self.monitor.can_read())
+
+    def test_primary_unreachable(self):
+        self.monitor.primary_engine = Mock()
+        self.monitor.primary_engine.execute.side_effect = \
+            OperationalError("SELECT", {}, Exception())
+        with self.assertLogs("cms.db.session", "WARNING"):
+            self.assertFalse(self.monitor.can_read())
+
+    def test_read_your_writes(self):
+        self.assertFalse(self.monitor.can_read(time.time()))
+        self.assertTrue(self.monitor.can_read(
+            time.time() - config.database_replica_max_lag_s - 1))
+
+
+class TestReadOnlySession(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.monitor = ReplicaMonitor(engine, engine)
+
+    def use_replica(self):
+        patcher = patch.multiple("cms.db.session",
+                                 replica_monitor=self.monitor,
+                                 ReplicaSession=sessionmaker(engine))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_replica(self):
+        session = read_only_session()
+        self.addCleanup(session.close)
+        self.assertFalse(session.info.get("replica", False))
+        self.assertEqual(get_staleness(session), 0.0)
+
+    def test_replica(self):
+        self.use_replica()
+        with SessionGen(read_only=True) as session:
+            self.assertTrue(session.info["replica"])
+            self.assertEqual(get_staleness(session),
+                             config.database_replica_max_lag_s)
+            self.assertEqual(session.execute("SELECT 1").scalar(), 1)
+
+    def test_replica_statements_counted(self):
+        self.use_replica()
+        with SessionGen(read_only=True) as session:
+            self.assertTrue(session.info["replica"])
+            session.execute("SELECT 1")
+            session.execute("SELECT 2")
+            self.assertEqual(session.info["statements"], 2)
+
+    def test_replica_after_write(self):
+        self.use_replica()
+        with SessionGen(read_only=True, last_write=time.time()) as session:
+            self.assertFalse(session.info.get("replica", False))
+        with SessionGen() as session:
+            self.assertFalse(session.info.get("replica", False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for util.py."""
+
+import unittest
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import Evaluation, Executable, Submission, estimate_count, \
+    invalidate_submission_results
+
+
+class TestInvalidateSubmissionResults(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest()
+        self.participation = self.add_participation(contest=self.contest)
+        self.task = self.add_task(contest=self.contest)
+        self.datasets = [self.add_dataset(task=self.task),
+                         self.add_dataset(task=self.task)]
+        self.testcases = [self.add_testcase(dataset)
+                          for dataset in self.datasets]
+        self.submission, self.results = self.add_submission_with_results(
+            self.task, self.participation, True)
+        self.other, self.other_results = self.add_submission_with_results(
+            self.task, self.participation, True)
+        for result, testcase in zip(self.results + self.other_results,
+                                    self.testcases * 2):
+            self.add_executable(result)
+            self.add_evaluation(result, testcase)
+            result.set_evaluation_outcome()
+        self.session.flush()
+
+    def reload(self):
+        self.session.expire_all()
+
+    def test_compilation(self):
+        self.assertEqual(invalidate_submission_results(
+            self.session, [self.submission.id]), 2)
+        self.reload()
+        for result in self.results:
+            self.assertFalse(result.compiled())
+            self.assertEqual(result.compilation_tries, 0)
+            self.assertEqual(result.compilation_text, [])
+            self.assertFalse(result.evaluated())
+            self.assertEqual(result.executables, {})
+            self.assertEqual(result.evaluations, [])
+        for result in self.other_results:
+            self.assertTrue(result.evaluated())
+            self.assertEqual(len(result.executables), 1)
+
+    def test_evaluation_one_dataset(self):
+        self.assertEqual(invalidate_submission_results(
+            self.session, [self.submission.id, self.other.id],
+            self.datasets[0].id, "evaluation"), 2)
+        self.reload()
+        for result in self.results + self.other_results:
+            self.assertTrue(result.compiled())
+            self.assertEqual(len(result.executables), 1)
+            invalidated = result.dataset is self.datasets[0]
+            self.assertEqual(result.evaluated(), not invalidated)
+            self.assertEqual(len(result.evaluations), 0 if invalidated else 1)
+        self.assertEqual(self.session.query(Evaluation).count(), 2)
+        self.assertEqual(self.session.query(Executable).count(), 4)
+
+    def test_invalid_level(self):
+        with self.assertRaises(ValueError):
+            invalidate_submission_results(
+                self.session, [self.submission.id], level="scoring")
+
+
+class TestEstimateCount(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest()
+        self.task = self.add_task(contest=self.contest)
+        self.participation = self.add_participation(contest=self.contest)
+        for _ in range(200):
+            self.add_submission(self.task, self.participation)
+        self.session.flush()
+        self.session.execute("ANALYZE submissions")
+
+    def test_estimate(self):
+        estimate = estimate_count(self.session, self.session.query(Submission))
+        self.assertIsInstance(estimate, int)
+        self.assertAlmostEqual(estimate, 200, delta=20)
+
+    def test_estimate_with_parameters(self):
+        # The parameters of the query are passed along.
+        query = self.session.query(Submission)\
+            .filter(Submission.participation_id == self.participation.id)\
+            .filter(Submission.id < 0)
+        self.assertLess(estimate_count(self.session, query), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
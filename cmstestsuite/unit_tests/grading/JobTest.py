@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the jobs and their creation from the operations.
+
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import File, Manager, UserTestExecutable
+from cms.grading.Job import EvaluationJob, JobGroup, JobTemplates
+from cms.service.esoperations import ESOperation
+from cmstestsuite.unit_tests.testidgenerator import unique_digest
+
+
+class TestJobGroup(unittest.TestCase):
+
+    def test_shared_items_exported_once(self):
+        managers = {"grader.cpp": Manager("grader.cpp", "d1")}
+        files = {"foo.%l": File("foo.%l", "d2")}
+        jobs = [EvaluationJob(operation=ESOperation(ESOperation.EVALUATION,
+                                                    1, 1, codename),
+                              task_type="Batch", language="C++11 / g++",
+                              managers=managers, files=files,
+                              input="in" + codename, output="out" + codename)
+                for codename in ["001", "002"]]
+
+        data = JobGroup(jobs).export_to_dict()
+        self.assertEqual(data["common"]["managers"], {"grader.cpp": "d1"})
+        self.assertEqual(data["common"]["task_type"], "Batch")
+        self.assertNotIn("input", data["common"])
+        for job_data in data["jobs"]:
+            self.assertNotIn("managers", job_data)
+            self.assertIn("input", job_data)
+
+        imported = JobGroup.import_from_dict(data).jobs
+        self.assertEqual([job.input for job in imported], ["in001", "in002"])
+        for job in imported:
+            self.assertEqual(job.task_type, "Batch")
+            self.assertEqual(job.managers["grader.cpp"].digest, "d1")
+            self.assertEqual(job.files["foo.%l"].digest, "d2")
+        # Mutable items must not be shared among the imported jobs.
+        imported[0].sandboxes.append("/tmp/sandbox")
+        self.assertEqual(imported[1].sandboxes, [])
+
+    def test_import_without_common(self):
+        job = EvaluationJob(task_type="Batch", input="in")
+        data = {"jobs": [job.export_to_dict()]}
+        imported = JobGroup.import_from_dict(data).jobs
+        self.assertEqual(imported[0].input, "in")
+
+
+class TestJobTemplates(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest(languages=[])
+        self.participation = self.add_participation(contest=self.contest)
+        self.task = self.add_task(contest=self.contest)
+        self.dataset = self.add_dataset(
+            task=self.task, task_type="Batch",
+            task_type_parameters=["alone", ["", ""], "diff"],
+            time_limit=1.0, memory_limit=2 ** 28)
+        self.manager = self.add_manager(dataset=self.dataset)
+        self.testcases = [self.add_testcase(dataset=self.dataset)
+                          for _ in range(2)]
+        self.submission = self.add_submission(
+            task=self.task, participation=self.participation,
+            language="C++11 / g++")
+        self.file = self.add_file(submission=self.submission)
+        result = self.add_submission_result(self.submission, self.dataset)
+        self.executable = self.add_executable(result)
+        self.session.flush()
+
+        self.templates = JobTemplates()
+
+    def evaluation(self, testcase):
+        return ESOperation(ESOperation.EVALUATION, self.submission.id,
+                           self.dataset.id, testcase.codename)
+
+    def test_evaluation(self):
+        testcase = self.testcases[0]
+        job = self.templates.get_job(self.evaluation(testcase), self.session)
+        self.assertEqual(job.task_type, "Batch")
+        self.assertEqual(job.task_type_parameters,
+                         ["alone", ["", ""], "diff"])
+        self.assertEqual(job.language, "C++11 / g++")
+        self.assertEqual(job.time_limit, 1.0)
+        self.assertEqual(job.input, testcase.input)
+        self.assertEqual(job.output, testcase.output)
+        self.assertEqual(job.managers[self.manager.filename].digest,
+                         self.manager.digest)
+        self.assertEqual(job.files[self.file.filename].digest,
+                         self.file.digest)
+        self.assertEqual(job.executables[self.executable.filename].digest,
+                         self.executable.digest)
+
+    def test_cached(self):
+        self.templates.get_job(self.evaluation(self.testcases[0]),
+                               self.session)
+        # No DB access is needed for the other testcases.
+        job = self.templates.get_job(self.evaluation(self.testcases[1]),
+                                     None)
+        self.assertEqual(job.input, self.testcases[1].input)
+
+        self.templates.invalidate()
+        with self.assertRaises(AttributeError):
+            self.templates.get_job(self.evaluation(self.testcases[1]), None)
+
+    def test_invalidate_dataset(self):
+        other_dataset = self.add_dataset(
+            task=self.task, task_type="Batch",
+            task_type_parameters=["alone", ["", ""], "diff"],
+            time_limit=3.0)
+        other_testcase = self.add_testcase(dataset=other_dataset)
+        self.add_submission_result(self.submission, other_dataset)
+        self.session.flush()
+        other_operation = ESOperation(ESOperation.EVALUATION,
+                                      self.submission.id, other_dataset.id,
+                                      other_testcase.codename)
+        self.templates.get_job(self.evaluation(self.testcases[0]),
+                               self.session)
+        self.templates.get_job(other_operation, self.session)
+        self.dataset.time_limit = 2.0
+        self.session.flush()
+
+        self.templates.invalidate(self.dataset.id)
+        self.assertEqual(self.templates.get_job(
+            self.evaluation(self.testcases[0]), self.session).time_limit, 2.0)
+        # The templates of the other dataset are still cached.
+        self.assertEqual(
+            self.templates.get_job(other_operation, None).time_limit, 3.0)
+
+    def test_expired(self):
+        self.templates.get_job(self.evaluation(self.testcases[0]),
+                               self.session)
+        self.dataset.time_limit = 2.0
+        self.session.flush()
+        self.assertEqual(self.templates.get_job(
+            self.evaluation(self.testcases[0]), self.session).time_limit, 1.0)
+        with patch.object(JobTemplates, "MAX_AGE", 0.0):
+            self.assertEqual(self.templates.get_job(
+                self.evaluation(self.testcases[0]),
+                self.session).time_limit, 2.0)
+
+    def test_compilation_and_evaluation_separate(self):
+        operation = ESOperation(ESOperation.COMPILATION, self.submission.id,
+                                self.dataset.id)
+        job = self.templates.get_job(operation, self.session)
+        self.assertEqual(job.executables, {})
+        job = self.templates.get_job(self.evaluation(self.testcases[0]),
+                                     self.session)
+        self.assertIn(self.executable.filename, job.executables)
+
+    def test_user_test(self):
+        user_test = self.add_user_test(task=self.task,
+                                       participation=self.participation,
+                                       language="C++11 / g++")
+        manager = self.add_user_test_manager(user_test=user_test)
+        result = self.add_user_test_result(user_test, self.dataset)
+        self.session.flush()
+        executable = UserTestExecutable("foo", unique_digest(),
+                                        user_test_result=result)
+
+        operation = ESOperation(ESOperation.USER_TEST_EVALUATION,
+                                user_test.id, self.dataset.id)
+        task_type = MagicMock()
+        task_type.get_auto_managers.return_value = []
+        with patch("cms.grading.tasktypes.get_task_type",
+                   return_value=task_type):
+            job = self.templates.get_job(operation, self.session)
+        self.assertEqual(job.input, user_test.input)
+        self.assertTrue(job.only_execution)
+        # No manager is taken from the dataset.
+        self.assertEqual(set(job.managers), {manager.filename})
+        self.assertEqual(job.executables[executable.filename].digest,
+                         executable.digest)
+
+    def test_from_operations(self):
+        operations = [self.evaluation(testcase)
+                      for testcase in self.testcases]
+        job_group = JobGroup.from_operations(operations, self.session,
+                                             templates=self.templates)
+        self.assertEqual([job.input for job in job_group.jobs],
+                         [testcase.input for testcase in self.testcases])
+        self.assertEqual([job.operation for job in job_group.jobs],
+                         operations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,9 +20,12 @@
 """Tests for general utility functions."""
 
 import io
+import os
 import unittest
+from unittest.mock import patch
 
-from cms.grading.Sandbox import Truncator
+from cms.grading.Sandbox import StupidSandbox, Truncator
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
 
 
 class TestTruncator(unittest.TestCase):
@@ -62,5 +65,39 @@ class TestTruncator(unittest.TestCase):
         self.perform_truncator_test(100, 40, 7)
 
 
+class TestTmpfs(FileSystemMixin, unittest.TestCase):
+    """Test the sandboxes in the tmpfs directory."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch("cms.grading.Sandbox.config.sandbox_tmpfs_dir",
+                        self.get_path("tmpfs"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_created_in_tmpfs(self):
+        sandbox = StupidSandbox(None)
+        self.assertTrue(sandbox.tmpfs)
+        self.assertEqual(os.path.dirname(sandbox.get_root_path()),
+                         self.get_path("tmpfs"))
+        sandbox.cleanup(delete=True)
+
+    def test_explicit_temp_dir(self):
+        sandbox = StupidSandbox(None, temp_dir=self.base_dir)
+        self.assertFalse(sandbox.tmpfs)
+        self.assertEqual(os.path.dirname(sandbox.get_root_path()),
+                         self.base_dir)
+        sandbox.cleanup(delete=True)
+
+    def test_disk_usage(self):
+        sandbox = StupidSandbox(None)
+        empty_usage = sandbox.get_disk_usage()
+        with sandbox.create_file("output.txt") as f:
+            f.write(b"a" * 100000)
+        self.assertGreaterEqual(sandbox.get_disk_usage(),
+                                empty_usage + 100000)
+        sandbox.cleanup(delete=True)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for the Java language."""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cms import config
+from cms.grading.languages.java_jdk import JavaJDK
+
+
+class FakeSandbox:
+    """A sandbox keeping its files in memory."""
+
+    def __init__(self, files):
+        self.files = dict(files)
+
+    def file_exists(self, path):
+        return path in self.files
+
+    def get_file_to_string(self, path, maxlen=1024):
+        return self.files[path][:maxlen]
+
+
+
+class TestJavaJDK(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.language = JavaJDK()
+
+    @patch.object(config, "java_class_data_sharing", False)
+    def test_commands_without_cds(self):
+        commands = self.language.get_compilation_commands(
+            ["foo.java"], "foo")
+        self.assertEqual(len(commands), 2)
+        command, = self.language.get_evaluation_commands("foo", main="foo")
+        self.assertFalse(any("Shared" in arg for arg in command))
+        self.assertEqual(command[-3:], ["-cp", "foo", "foo"])
+
+    @patch.object(config, "java_class_data_sharing", True)
+    def test_commands_with_cds(self):
+        commands = self.language.get_compilation_commands(
+            ["foo.java"], "foo")
+        self.assertEqual(len(commands), 3)
+        self.assertIn("-Xshare:dump", commands[2][2])
+        self.assertIn("sort -u > cms.classlist", commands[2][2])
+        self.assertIn("rm -f cms.jsa", commands[2][2])
+        # The archive is stored by itself, not inside the jar.
+        self.assertNotIn("jar uf", commands[2][2])
+        command, = self.language.get_evaluation_commands(
+            "foo", main="foo", args=["1"])
+        self.assertIn("-XX:SharedArchiveFile=cms.jsa", command)
+        self.assertIn("-Xlog:startuptime:file=cms_startup.log", command)
+        self.assertEqual(command[-4:], ["-cp", "foo", "foo", "1"])
+
+    @patch.object(config, "java_class_data_sharing", False)
+    def test_prepare_without_cds(self):
+        sandbox = MagicMock()
+        self.assertEqual(
+            self.language.prepare_evaluation_sandbox(sandbox, "foo"), [])
+        self.assertIsNone(self.language.get_startup_time(sandbox))
+        sandbox.create_file.assert_not_called()
+
+    @patch.object(config, "java_class_data_sharing", True)
+    def test_prepare_with_cds(self):
+        sandbox = MagicMock()
+        self.assertEqual(
+            self.language.prepare_evaluation_sandbox(sandbox, "foo"),
+            ["cms_startup.log"])
+        sandbox.create_file.assert_not_called()
+
+    def test_extra_executable_filenames(self):
+        # The archive is recognized also when class-data sharing has
+        # been disabled after the compilation.
+        for enabled in [True, False]:
+            with patch.object(config, "java_class_data_sharing", enabled):
+                self.assertEqual(
+                    self.language.extra_executable_filenames, ["cms.jsa"])
+
+    @patch.object(config, "java_class_data_sharing", True)
+    def test_startup_time(self):
+        sandbox = FakeSandbox({})
+        self.assertIsNone(self.language.get_startup_time(sandbox))
+        sandbox.files["cms_startup.log"] = b""
+        self.assertIsNone(self.language.get_startup_time(sandbox))
+        sandbox.files["cms_startup.log"] = \
+            b"[0.002s][info][startuptime] Genesis, 0.0011234 secs\n" \
+            b"[0.041s][info][startuptime] Create VM, 0.0402030 secs\n"
+        self.assertAlmostEqual(self.language.get_startup_time(sandbox),
+                               0.040203)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -157,6 +157,48 @@ class TestGroupMin(ScoreTypeTestMixin, unittest.TestCase):
         self.assertComputeScore(gmin.compute_score(sr),
                                 s2 + s3 * 0.1, 0.0, [0, s2, s3 * 0.1])
 
+    def test_irrelevant_testcases(self):
+        parameters = [[10, "1_*"], [20, "2_*"], [30, "[23]_1"]]
+        gmin = GroupMin(parameters, self._public_testcases)
+
+        # Nothing is settled before the first failure.
+        self.assertEqual(gmin.get_irrelevant_testcases({}), {"3_0"})
+        self.assertEqual(gmin.get_irrelevant_testcases({"1_0": 0.5}),
+                         {"3_0"})
+        # A zero settles its subtask, but 2_1 is also in the third one.
+        self.assertEqual(
+            gmin.get_irrelevant_testcases({"1_0": 0.0, "2_0": 0.0}),
+            {"1_1", "3_0"})
+        self.assertEqual(
+            gmin.get_irrelevant_testcases({"2_0": 0.0, "3_1": 0.0}),
+            {"2_1", "3_0"})
+
+    def test_compute_score_not_evaluated(self):
+        s1, s2, s3 = 10.5, 30.5, 59
+        parameters = [[s1, "1_*"], [s2, "2_*"], [s3, "3_*"]]
+        gmin = GroupMin(parameters, self._public_testcases)
+        sr = self.get_submission_result(self._public_testcases)
+
+        self.set_outcome(sr, "3_0", 0.0)
+        self.set_outcome(sr, "3_1", None)
+        score, subtasks, _, _, _ = gmin.compute_score(sr)
+        self.assertAlmostEqual(score, s1 + s2)
+        self.assertEqual([tc["outcome"] for tc in subtasks[2]["testcases"]],
+                         ["Not correct", "Not evaluated"])
+
+    def test_compute_score_not_evaluated_counts_as_failed(self):
+        # The outcome of the skipped evaluation would not have mattered
+        # with GroupMin, but it does if the score type is changed.
+        s1, s2, s3 = 10.5, 30.5, 59
+        parameters = [[s1, "1_*"], [s2, "2_*"], [s3, "3_*"]]
+        gmin = GroupMin(parameters, self._public_testcases)
+        sr = self.get_submission_result(self._public_testcases)
+
+        self.set_outcome(sr, "3_1", None)
+        score, subtasks, _, _, _ = gmin.compute_score(sr)
+        self.assertAlmostEqual(score, s1 + s2)
+        self.assertEqual(subtasks[2]["score_fraction"], 0.0)
+
 
 if __name__ == "__main__":
     unittest.main()
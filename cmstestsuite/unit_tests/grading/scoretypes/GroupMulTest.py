@@ -157,6 +157,15 @@ class TestGroupMul(ScoreTypeTestMixin, unittest.TestCase):
                                 s2 + s3 * 0.5 * 0.1, 0.0,
                                 [0, s2, s3 * 0.5 * 0.1])
 
+    def test_irrelevant_testcases(self):
+        parameters = [[10, "1_*"], [20, "2_*"], [30, "3_*"]]
+        gmul = GroupMul(parameters, self._public_testcases)
+
+        # Only a zero settles a subtask, partial results do not.
+        self.assertEqual(
+            gmul.get_irrelevant_testcases({"1_0": 0.5, "2_0": 0.0}),
+            {"2_1"})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -173,6 +173,17 @@ class TestGroupThreshold(ScoreTypeTestMixin, unittest.TestCase):
         self.assertComputeScore(st.compute_score(sr),
                                 s2, 0.0, [0, s2, 0])
 
+    def test_irrelevant_testcases(self):
+        parameters = [[10, "1_*", 10], [20, "2_*", 20], [30, "3_*", 30]]
+        st = GroupThreshold(parameters, self._public_testcases)
+
+        # Outcomes over the threshold, or equal to 0, settle a subtask.
+        self.assertEqual(
+            st.get_irrelevant_testcases({"1_0": 5.5, "2_0": 25.0,
+                                         "3_0": 0.0}),
+            {"2_1", "3_1"})
+        self.assertEqual(st.get_irrelevant_testcases({}), set())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -19,7 +19,10 @@
 """Tests for the Sum score type."""
 
 import unittest
+from unittest.mock import patch
 
+from cms import FEEDBACK_LEVEL_FULL, FEEDBACK_LEVEL_RESTRICTED
+from cms.grading.scoretypes import ScoreType
 from cms.grading.scoretypes.Sum import Sum
 from cmstestsuite.unit_tests.grading.scoretypes.scoretypetestutils \
     import ScoreTypeTestMixin
@@ -78,6 +81,55 @@ class TestSum(ScoreTypeTestMixin, unittest.TestCase):
         self.assertComputeScore(st.compute_score(sr),
                                 testcase_score * 2.2, testcase_score * 0.2, [])
 
+    def test_compute_score_not_evaluated(self):
+        testcase_score = 10.5
+        st = Sum(testcase_score, self._public_testcases)
+        sr = self.get_submission_result(self._public_testcases)
+
+        self.set_outcome(sr, "1", None)
+        score, testcases, public_score, _, _ = st.compute_score(sr)
+        self.assertAlmostEqual(score, testcase_score * 3)
+        self.assertAlmostEqual(public_score, 0.0)
+        self.assertEqual(testcases[1]["outcome"], "Not evaluated")
+        self.assertIn("undefined", st.get_html_details(testcases))
+
+    def test_template_compiled_once(self):
+        self.assertIs(Sum(10, self._public_testcases).template,
+                      Sum(20, self._public_testcases).template)
+
+    def test_html_details_cached(self):
+        ScoreType._details_cache.clear()
+        st = Sum(10.5, self._public_testcases)
+        sr = self.get_submission_result(self._public_testcases)
+        details = st.compute_score(sr)[1]
+
+        with patch.object(st.template, "render",
+                          wraps=st.template.render) as render:
+            html = st.get_html_details(details)
+            self.assertIn("Correct", html)
+            self.assertEqual(
+                Sum(10.5, self._public_testcases).get_html_details(details),
+                html)
+            self.assertEqual(render.call_count, 1)
+
+            # Different details or feedback level are rendered again.
+            st.get_html_details(details, FEEDBACK_LEVEL_FULL)
+            self.set_outcome(sr, "1", 0.0)
+            other = st.get_html_details(st.compute_score(sr)[1],
+                                        FEEDBACK_LEVEL_RESTRICTED)
+            self.assertNotEqual(other, html)
+            self.assertEqual(render.call_count, 3)
+
+    def test_html_details_cache_bounded(self):
+        ScoreType._details_cache.clear()
+        st = Sum(10.5, self._public_testcases)
+        with patch.object(ScoreType, "DETAILS_CACHE_SIZE", 2):
+            for outcome in [0.0, 0.5, 1.0]:
+                sr = self.get_submission_result(self._public_testcases)
+                self.set_outcome(sr, "0", outcome)
+                st.get_html_details(st.compute_score(sr)[1])
+        self.assertEqual(len(ScoreType._details_cache), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for the precompiled headers step."""
+
+import io
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cms import config
+from cms.grading.Sandbox import Sandbox
+from cms.grading.steps import PrecompiledHeaderCache, \
+    precompiled_headers_step
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
+from cmstestsuite.unit_tests.grading.steps.stats_test import get_stats
+
+
+HEADERS = {"grader.h": "digest of grader.h", "types.h": "digest of types.h"}
+
+
+class FakeFile(io.BytesIO):
+    """A file of the fake sandbox, keeping its content when closed."""
+
+    def __init__(self, files, path):
+        super().__init__()
+        self._files = files
+        self._path = path
+
+    def close(self):
+        self._files[self._path] = self.getvalue()
+        super().close()
+
+
+class TestPrecompiledHeadersStep(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.compiler = self.write_file("g++", b"compiler")
+
+        self.language = MagicMock()
+        self.language.precompiled_header_extension = ".gch"
+        self.language.get_precompiled_header_commands.side_effect = \
+            lambda filenames, for_evaluation: [
+                [self.compiler, str(for_evaluation), "-o", f + ".gch", f]
+                for f in filenames]
+
+        for name, value in [("cache_dir", self.base_dir),
+                            ("compilation_precompiled_headers", True)]:
+            patcher = patch.object(config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = patch("cms.grading.steps.precompiledheaders.generic_step")
+        self.generic_step = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.generic_step.return_value = get_stats(
+            1.0, 1.5, 1000 * 1024, Sandbox.EXIT_OK)
+
+    def new_sandbox(self, files=None):
+        """Return a fake sandbox containing files."""
+        files = files if files is not None else {}
+        sandbox = MagicMock()
+        sandbox.files = files
+        sandbox.create_file.side_effect = lambda path: FakeFile(files, path)
+        sandbox.get_file.side_effect = lambda path: io.BytesIO(files[path])
+        sandbox.file_exists.side_effect = lambda path: path in files
+        return sandbox
+
+    def test_disabled(self):
+        sandbox = self.new_sandbox()
+        with patch.object(config, "compilation_precompiled_headers", False):
+            self.assertFalse(precompiled_headers_step(
+                sandbox, self.language, HEADERS))
+        self.generic_step.assert_not_called()
+
+    def test_not_supported(self):
+        self.language.precompiled_header_extension = None
+        self.assertFalse(precompiled_headers_step(
+            self.new_sandbox(), self.language, HEADERS))
+        self.generic_step.assert_not_called()
+
+    def test_no_headers(self):
+        self.assertFalse(precompiled_headers_step(
+            self.new_sandbox(), self.language, {}))
+        self.generic_step.assert_not_called()
+
+    def test_precompiled_then_cached(self):
+        # The first time, the headers are precompiled in the sandbox.
+        sandbox = self.new_sandbox({"grader.h.gch": b"pch 1",
+                                    "types.h.gch": b"pch 2"})
+        self.assertTrue(precompiled_headers_step(
+            sandbox, self.language, HEADERS))
+        self.generic_step.assert_called_once_with(sandbox, [
+            [self.compiler, "True", "-o", "grader.h.gch", "grader.h"],
+            [self.compiler, "True", "-o", "types.h.gch", "types.h"],
+        ], "precompilation")
+
+        # The second time, they are copied from the cache.
+        self.generic_step.reset_mock()
+        sandbox = self.new_sandbox()
+        self.assertTrue(precompiled_headers_step(
+            sandbox, self.language, HEADERS))
+        self.generic_step.assert_not_called()
+        self.assertEqual(sandbox.files, {"grader.h.gch": b"pch 1",
+                                         "types.h.gch": b"pch 2"})
+
+    def test_precompilation_failed(self):
+        self.generic_step.return_value = get_stats(
+            1.0, 1.5, 1000 * 1024, Sandbox.EXIT_NONZERO_RETURN)
+        sandbox = self.new_sandbox({"grader.h.gch": b"partial"})
+        self.assertFalse(precompiled_headers_step(
+            sandbox, self.language, HEADERS))
+        sandbox.remove_file.assert_called_once_with("grader.h.gch")
+
+        # Nothing was cached, so the next compilation tries again.
+        self.generic_step.reset_mock()
+        precompiled_headers_step(self.new_sandbox(), self.language, HEADERS)
+        self.generic_step.assert_called_once()
+
+    def test_missing_compiler(self):
+        os.remove(self.compiler)
+        self.assertFalse(precompiled_headers_step(
+            self.new_sandbox(), self.language, HEADERS))
+        self.generic_step.assert_not_called()
+
+
+class TestPrecompiledHeaderCache(FileSystemMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.compiler = self.write_file("g++", b"compiler")
+        self.commands = [[self.compiler, "-O2", "grader.h"]]
+        self.cache = PrecompiledHeaderCache(self.get_path("pch"))
+
+    def test_key(self):
+        key = PrecompiledHeaderCache.get_key(self.commands, HEADERS)
+        self.assertEqual(
+            PrecompiledHeaderCache.get_key(self.commands, dict(HEADERS)), key)
+        # Changing options, headers, or compiler changes the key.
+        self.assertNotEqual(PrecompiledHeaderCache.get_key(
+            [[self.compiler, "-O3", "grader.h"]], HEADERS), key)
+        self.assertNotEqual(PrecompiledHeaderCache.get_key(
+            self.commands, {"grader.h": "digest of grader.h"}), key)
+        self.assertNotEqual(PrecompiledHeaderCache.get_key(
+            self.commands, dict(HEADERS, **{"types.h": "new digest"})), key)
+        self.write_file("g++", b"upgraded compiler")
+        self.assertNotEqual(
+            PrecompiledHeaderCache.get_key(self.commands, HEADERS), key)
+
+    def test_eviction(self):
+        sandbox = MagicMock()
+        sandbox.get_file.side_effect = lambda path: io.BytesIO(b"pch")
+        with patch.object(PrecompiledHeaderCache, "MAX_ENTRIES", 2):
+            for i, key in enumerate(["a", "b", "c"]):
+                self.cache.store(key, sandbox, ["grader.h.gch"])
+                os.utime(os.path.join(self.cache.path, key), (i, i))
+        self.assertEqual(sorted(os.listdir(self.cache.path)), ["b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
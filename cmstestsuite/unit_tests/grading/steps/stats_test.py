@@ -74,6 +74,17 @@ class TestExecutionStats(unittest.TestCase):
                          get_stats(0.1, 0.5, 1000 * 1024, Sandbox.EXIT_SIGNAL,
                                    signal=11))
 
+    def test_success_in_tmpfs(self):
+        self.sandbox.tmpfs = True
+        self.sandbox.fake_execute_data(
+            True, b"o", b"e", 0.1, 0.5, 1000, "OK")
+        self.sandbox.execute_without_std(["command"], wait=True)
+
+        stats = execution_stats(self.sandbox)
+        expected = get_stats(0.1, 0.5, 1000 * 1024, Sandbox.EXIT_OK)
+        expected["execution_disk_usage"] = self.sandbox.get_disk_usage()
+        self.assertEqual(stats, expected)
+
     def test_success_with_output(self):
         self.sandbox.fake_execute_data(
             True, b"o", b"e", 0.1, 0.5, 1000, "OK")
@@ -197,6 +208,35 @@ class TestMergeExecutionStats(unittest.TestCase):
         self.assertStats(
             m, get_stats(0, 0, 0, Sandbox.EXIT_OK, stdout="o1", stderr="e2"))
 
+    def test_startup_times_added(self):
+        r0 = get_stats(1.0, 2.0, 300, Sandbox.EXIT_OK)
+        r0["execution_startup_time"] = 0.25
+        r1 = get_stats(0.1, 0.2, 0.3, Sandbox.EXIT_OK)
+        r1["execution_startup_time"] = 0.5
+        self.assertAlmostEqual(
+            merge_execution_stats(r0, r1)["execution_startup_time"], 0.75)
+        # A missing startup time counts as zero, but the key is added
+        # only if at least one has it.
+        del r1["execution_startup_time"]
+        self.assertAlmostEqual(
+            merge_execution_stats(r0, r1)["execution_startup_time"], 0.25)
+        self.assertNotIn("execution_startup_time",
+                         merge_execution_stats(r1, r1))
+
+    def test_disk_usages_merged(self):
+        r0 = get_stats(1.0, 2.0, 300, Sandbox.EXIT_OK)
+        r0["execution_disk_usage"] = 4096
+        r1 = get_stats(0.1, 0.2, 0.3, Sandbox.EXIT_OK)
+        r1["execution_disk_usage"] = 8192
+        self.assertEqual(
+            merge_execution_stats(r0, r1)["execution_disk_usage"], 12288)
+        self.assertEqual(merge_execution_stats(
+            r0, r1, concurrent=False)["execution_disk_usage"], 8192)
+        self.assertNotIn("execution_disk_usage",
+                         merge_execution_stats(
+                             get_stats(1.0, 2.0, 300, Sandbox.EXIT_OK),
+                             get_stats(1.0, 2.0, 300, Sandbox.EXIT_OK)))
+
     def test_failure_second_none(self):
         with self.assertRaises(ValueError):
             merge_execution_stats(None, None)
@@ -19,7 +19,7 @@
 """Tests for the Batch task type."""
 
 import unittest
-from unittest.mock import MagicMock, call, ANY
+from unittest.mock import MagicMock, call, patch, ANY
 
 from cms.db import File, Manager, Executable
 from cms.grading.Job import CompilationJob, EvaluationJob
@@ -36,6 +36,7 @@ GRADER_L1 = Manager(digest="digest of grader.l1", filename="grader.l1")
 GRADER_L2 = Manager(digest="digest of grader.l2", filename="grader.l2")
 HEADER_L1 = Manager(digest="digest of grader.hl1", filename="graderl.hl1")
 EXE_FOO = Executable(digest="digest of foo", filename="foo")
+EXE_FOO_EXTRA = Executable(digest="digest of foo.x", filename="foo.x")
 
 
 class TestGetCompilationCommands(TaskTypeTestMixin, unittest.TestCase):
@@ -159,6 +160,24 @@ class TestCompile(TaskTypeTestMixin, unittest.TestCase):
         sandbox.get_file_to_storage.assert_called_once_with("foo", ANY)
         sandbox.cleanup.assert_called_once_with(delete=True)
 
+    def test_alone_success_extra_executables(self):
+        # The extra executables that the compilation produced are stored
+        # besides the executable.
+        tt, job = self.prepare(["alone", ["", ""], "diff"],
+                               {"foo.%l": FILE_FOO_L1})
+        sandbox = self.expect_sandbox()
+        sandbox.file_exists.side_effect = lambda path: path == "foo.x"
+        sandbox.get_file_to_storage.side_effect = \
+            lambda path, description: "digest of %s" % path
+
+        with patch.object(LANG_1, "extra_executable_filenames",
+                          ["foo.x", "foo.y"]):
+            tt.compile(job, self.file_cacher)
+
+        self.assertResultsInJob(job)
+        self.assertEqual(sorted(job.executables), ["foo", "foo.x"])
+        self.assertEqual(job.executables["foo.x"].digest, "digest of foo.x")
+
     def test_alone_failure_missing_file(self):
         # For some reason the user submission is missing. This should not
         # happen and is the admin's (or CMS') fault. No sandbox should be
@@ -250,6 +269,9 @@ class TestCompile(TaskTypeTestMixin, unittest.TestCase):
             call("grader.hl1", "digest of grader.hl1"),
         ], any_order=True)
         self.assertEqual(sandbox.create_file_from_storage.call_count, 3)
+        # Only the header of the language is precompiled.
+        self.precompiled_headers_step.assert_called_once_with(
+            sandbox, LANG_1, {"grader.hl1": "digest of grader.hl1"})
         # Compilation step called correctly.
         self.compilation_step.assert_called_once_with(
             sandbox, fake_compilation_commands(
@@ -367,6 +389,56 @@ class TestEvaluate(TaskTypeTestMixin, unittest.TestCase):
         self.assertResultsInJob(job)
         sandbox.cleanup.assert_called_once_with(delete=True)
 
+    def test_stdio_diff_language_startup(self):
+        # The language can prepare the sandbox, asking for more writable
+        # files, and report the startup time of its runtime.
+        tt, job = self.prepare(["alone", ["", ""], "diff"], {"foo": EXE_FOO})
+        self.evaluation_step.return_value = (True, True, dict(STATS_OK))
+        sandbox = self.expect_sandbox()
+
+        with patch.object(LANG_1, "prepare_evaluation_sandbox",
+                          return_value=["startup.log"]) as prepare, \
+                patch.object(LANG_1, "get_startup_time", return_value=0.25):
+            tt.evaluate(job, self.file_cacher)
+
+        prepare.assert_called_once_with(sandbox, "foo")
+        self.evaluation_step.assert_called_once_with(
+            sandbox,
+            fake_evaluation_commands(EVALUATION_COMMAND_1, "foo", "foo"),
+            2.5, 123 * 1024 * 1024,
+            writable_files=["startup.log"],
+            stdin_redirect="input.txt",
+            stdout_redirect="output.txt",
+            multiprocess=True)
+        self.assertEqual(job.plus["execution_startup_time"], 0.25)
+        self.assertResultsInJob(job)
+
+    def test_stdio_diff_extra_executables(self):
+        # The extra executables are put in the sandbox, but are not the
+        # executable to run.
+        tt, job = self.prepare(["alone", ["", ""], "diff"],
+                               {"foo.x": EXE_FOO_EXTRA, "foo": EXE_FOO})
+        sandbox = self.expect_sandbox()
+
+        with patch.object(LANG_1, "extra_executable_filenames", ["foo.x"]):
+            tt.evaluate(job, self.file_cacher)
+
+        sandbox.create_file_from_storage.assert_has_calls([
+            call("foo", "digest of foo", executable=True),
+            call("foo.x", "digest of foo.x", executable=True),
+            call("input.txt", "digest of input"),
+        ], any_order=True)
+        self.assertEqual(sandbox.create_file_from_storage.call_count, 3)
+        self.evaluation_step.assert_called_once_with(
+            sandbox,
+            fake_evaluation_commands(EVALUATION_COMMAND_1, "foo", "foo"),
+            2.5, 123 * 1024 * 1024,
+            writable_files=[],
+            stdin_redirect="input.txt",
+            stdout_redirect="output.txt",
+            multiprocess=True)
+        self.assertResultsInJob(job)
+
     def test_stdio_diff_failure_missing_file(self):
         # For some reason the executable is missing. This should not happen
         # and is the admin's (or CMS') fault. No sandbox should be created.
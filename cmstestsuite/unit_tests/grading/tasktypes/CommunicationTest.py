@@ -391,6 +391,7 @@ class TestEvaluate(TaskTypeTestMixin, FileSystemMixin, unittest.TestCase):
                  stdin_redirect="input.txt", multiprocess=True),
             call(sandbox_usr, cmdline_usr, 2.5, 123 * 1024 * 1024,
                  dirs_map={os.path.join(self.base_dir, "0"): ("/fifo0", "rw")},
+                 writable_files=[],
                  stdin_redirect=None,
                  stdout_redirect=None,
                  multiprocess=True),
@@ -589,6 +590,7 @@ class TestEvaluate(TaskTypeTestMixin, FileSystemMixin, unittest.TestCase):
         cmdline_usr = ["run1", "foo", "stub"]
         self.evaluation_step_before_run.assert_has_calls([
             call(sandbox_usr, cmdline_usr, ANY, ANY, dirs_map=ANY,
+                 writable_files=ANY,
                  stdin_redirect="/fifo0/m_to_u0",
                  stdout_redirect="/fifo0/u0_to_m",
                  multiprocess=ANY)])
@@ -645,11 +647,13 @@ class TestEvaluate(TaskTypeTestMixin, FileSystemMixin, unittest.TestCase):
                  stdin_redirect="input.txt", multiprocess=True),
             call(sandbox_usr0, cmdline_usr0, 2.5, 123 * 1024 * 1024,
                  dirs_map={os.path.join(self.base_dir, "0"): ("/fifo0", "rw")},
+                 writable_files=[],
                  stdin_redirect=None,
                  stdout_redirect=None,
                  multiprocess=True),
             call(sandbox_usr1, cmdline_usr1, 2.5, 123 * 1024 * 1024,
                  dirs_map={os.path.join(self.base_dir, "1"): ("/fifo1", "rw")},
+                 writable_files=[],
                  stdin_redirect=None,
                  stdout_redirect=None,
                  multiprocess=True),
@@ -773,10 +777,12 @@ class TestEvaluate(TaskTypeTestMixin, FileSystemMixin, unittest.TestCase):
         cmdline_usr1 = ["run1", "foo", "stub", "1"]
         self.evaluation_step_before_run.assert_has_calls([
             call(sandbox_usr0, cmdline_usr0, ANY, ANY, dirs_map=ANY,
+                 writable_files=ANY,
                  stdin_redirect="/fifo0/m_to_u0",
                  stdout_redirect="/fifo0/u0_to_m",
                  multiprocess=ANY),
             call(sandbox_usr1, cmdline_usr1, ANY, ANY, dirs_map=ANY,
+                 writable_files=ANY,
                  stdin_redirect="/fifo1/m_to_u1",
                  stdout_redirect="/fifo1/u1_to_m",
                  multiprocess=ANY)
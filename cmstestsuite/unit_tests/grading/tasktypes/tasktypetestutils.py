@@ -46,11 +46,14 @@ def make_language(name, source_extensions, header_extensions,
                             source_extensions=source_extensions,
                             source_extension=source_extensions[0],
                             header_extensions=header_extensions,
-                            header_extension=header_extensions[0])
+                            header_extension=header_extensions[0],
+                            extra_executable_filenames=[])
     language.get_compilation_commands.side_effect = \
         functools.partial(fake_compilation_commands, compilation_command)
     language.get_evaluation_commands.side_effect = \
         functools.partial(fake_evaluation_commands, evaluation_command)
+    language.prepare_evaluation_sandbox.return_value = []
+    language.get_startup_time.return_value = None
     return language
 
 
@@ -117,6 +120,8 @@ class TaskTypeTestMixin:
 
         # Mock various steps, if the task type uses them.
         self.compilation_step = self._maybe_patch("compilation_step")
+        self.precompiled_headers_step = self._maybe_patch(
+            "precompiled_headers_step")
         self.evaluation_step = self._maybe_patch("evaluation_step")
         self.evaluation_step_before_run = self._maybe_patch(
             "evaluation_step_before_run")
@@ -26,7 +26,7 @@ import gevent
 import gevent.event
 import gevent.socket
 
-from cms.io import FakeQueueItem, PriorityQueue
+from cms.io import FairPriorityQueue, FakeQueueItem, PriorityQueue
 from cmscommon.datetime import make_datetime
 
 
@@ -73,6 +73,34 @@ class TestPriorityQueue(unittest.TestCase):
         with self.assertRaises(LookupError):
             self.queue.pop()
 
+    def test_push_many(self):
+        """Test pushing many items at once."""
+        self.queue.push(self.item_a, PriorityQueue.PRIORITY_LOW)
+        self.assertEqual(self.queue.push_many([
+            (self.item_a, PriorityQueue.PRIORITY_HIGH, None),
+            (self.item_b, PriorityQueue.PRIORITY_MEDIUM, make_datetime(10)),
+            (self.item_c, PriorityQueue.PRIORITY_MEDIUM, make_datetime(5)),
+        ]), 2)
+        self.assertTrue(self.queue._verify())
+        self.assertEqual([self.queue.pop().item for _ in range(3)],
+                         [self.item_c, self.item_b, self.item_a])
+
+    def test_push_many_heapify(self):
+        """Test pushing many items with respect to the queue size."""
+        items = [FakeQueueItem("%03d" % i) for i in range(100)]
+        self.queue.push(items[50], PriorityQueue.PRIORITY_LOW,
+                        make_datetime(50))
+        self.assertEqual(self.queue.push_many(
+            (item, PriorityQueue.PRIORITY_MEDIUM if i % 2 == 0
+             else PriorityQueue.PRIORITY_LOW, make_datetime(100 - i))
+            for i, item in enumerate(items)), 99)
+        self.assertTrue(self.queue._verify())
+        popped = [self.queue.pop() for _ in range(100)]
+        self.assertEqual(
+            [(entry.priority, entry.timestamp) for entry in popped],
+            sorted((entry.priority, entry.timestamp) for entry in popped))
+        self.assertTrue(self.queue._verify())
+
     def test_set_priority(self):
         """Test that priority get changed and item moved."""
         self.queue.push(self.item_a, PriorityQueue.PRIORITY_LOW)
@@ -176,5 +204,102 @@ class TestPriorityQueue(unittest.TestCase):
         self.queue._verify()
 
 
+class TestFairPriorityQueue(unittest.TestCase):
+
+    def setUp(self):
+        # The flow of each item is the first letter of its title.
+        self.queue = FairPriorityQueue(lambda item: str(item)[0])
+
+    def push(self, title, timestamp, priority=PriorityQueue.PRIORITY_MEDIUM):
+        item = FakeQueueItem(title)
+        self.assertTrue(self.queue.push(item, priority,
+                                        make_datetime(timestamp)))
+        return item
+
+    def pop_all(self):
+        titles = []
+        while not self.queue.empty():
+            self.assertEqual(self.queue.top().item, self.queue.top().item)
+            top = self.queue.top().item
+            self.assertEqual(self.queue.pop().item, top)
+            self.assertTrue(self.queue._verify())
+            titles.append(str(top))
+        return titles
+
+    def test_round_robin(self):
+        """Test that the flows take turns, each in timestamp order."""
+        for i in range(4):
+            self.push("a%d" % i, i)
+        self.push("b0", 10)
+        self.push("c0", 11)
+        self.push("b1", 12)
+        self.assertEqual(len(self.queue), 7)
+        self.assertTrue(self.queue._verify())
+        self.assertEqual(self.pop_all(),
+                         ["a0", "b0", "c0", "a1", "b1", "a2", "a3"])
+
+    def test_quantum(self):
+        """Test that each flow extracts quantum items at its turn."""
+        self.queue = FairPriorityQueue(lambda item: str(item)[0], quantum=2)
+        for i in range(3):
+            self.push("a%d" % i, i)
+            self.push("b%d" % i, 10 + i)
+        self.assertEqual(self.pop_all(),
+                         ["a0", "a1", "b0", "b1", "a2", "b2"])
+
+    def test_priorities(self):
+        """Test that priorities are respected across flows."""
+        self.push("a0", 0, PriorityQueue.PRIORITY_LOW)
+        self.push("a1", 1, PriorityQueue.PRIORITY_HIGH)
+        self.push("b0", 2, PriorityQueue.PRIORITY_LOW)
+        self.push("b1", 3, PriorityQueue.PRIORITY_HIGH)
+        self.push("c0", 4, PriorityQueue.PRIORITY_MEDIUM)
+        self.assertEqual(self.queue.get_status()[0]["item"]["_title"], "a1")
+        self.assertEqual(self.pop_all(), ["a1", "b1", "c0", "a0", "b0"])
+
+    def test_duplicates(self):
+        item = self.push("a0", 0)
+        self.assertFalse(self.queue.push(FakeQueueItem("a0")))
+        self.assertIn(item, self.queue)
+        self.assertEqual(self.queue.push_many([
+            (FakeQueueItem("a0"), None, None),
+            (FakeQueueItem("a1"), None, make_datetime(1)),
+        ]), 1)
+        self.assertEqual(len(self.queue), 2)
+
+    def test_remove(self):
+        a0 = self.push("a0", 0)
+        self.push("a1", 1)
+        b0 = self.push("b0", 2)
+        self.assertEqual(self.queue.remove(b0).item, b0)
+        self.assertTrue(self.queue._verify())
+        self.assertEqual(self.queue.remove(a0).item, a0)
+        self.assertTrue(self.queue._verify())
+        with self.assertRaises(KeyError):
+            self.queue.remove(a0)
+        self.assertEqual(self.pop_all(), ["a1"])
+        with self.assertRaises(LookupError):
+            self.queue.pop()
+
+    def test_set_priority(self):
+        self.push("a0", 0)
+        self.push("a1", 1)
+        b0 = self.push("b0", 2)
+        self.queue.set_priority(b0, PriorityQueue.PRIORITY_HIGH)
+        self.assertTrue(self.queue._verify())
+        self.assertEqual(self.pop_all(), ["b0", "a0", "a1"])
+        with self.assertRaises(LookupError):
+            self.queue.set_priority(b0, PriorityQueue.PRIORITY_LOW)
+
+    def test_pop_waiting(self):
+        greenlet = gevent.spawn(self.queue.pop, wait=True)
+        gevent.sleep(0.01)
+        self.assertFalse(greenlet.ready())
+        item = self.push("a0", 0)
+        gevent.sleep(0.01)
+        self.assertEqual(greenlet.get(timeout=1).item, item)
+        self.assertTrue(self.queue._verify())
+
+
 if __name__ == "__main__":
     unittest.main()
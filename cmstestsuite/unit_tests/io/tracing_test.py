@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the latency tracing.
+
+"""
+
+import unittest
+
+from cms.io.tracing import LatencyHistogram, Tracer, end_span, start_span
+
+
+class TestSpans(unittest.TestCase):
+
+    def test_span(self):
+        trace = {}
+        start_span(trace, "queue", 10.0)
+        self.assertEqual(trace, {"queue": [10.0, None]})
+        self.assertEqual(end_span(trace, "queue", 12.5), 2.5)
+        self.assertEqual(trace, {"queue": [10.0, 12.5]})
+
+    def test_not_started(self):
+        trace = {}
+        self.assertIsNone(end_span(trace, "queue"))
+        self.assertEqual(trace, {})
+
+    def test_untraced(self):
+        start_span(None, "queue")
+        self.assertIsNone(end_span(None, "queue"))
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = LatencyHistogram(buckets=(1.0, 10.0))
+        for value in (0.5, 1.0, 3.0, 20.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative_counts(),
+                         [(1.0, 2), (10.0, 3), (float("inf"), 4)])
+        self.assertEqual(histogram.to_dict(), {
+            "buckets": [[1.0, 2], [10.0, 3]],
+            "count": 4,
+            "sum": 24.5,
+        })
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+
+    def test_record(self):
+        self.tracer.record({"queue": [1.0, 1.5],
+                            "execution": [2.0, 4.0],
+                            "writing": [5.0, None]})
+        # Clock skew between services.
+        self.tracer.record({"execution": [2.0, 1.9]})
+        status = self.tracer.get_status()
+        self.assertEqual(sorted(status), ["execution", "queue"])
+        self.assertEqual(status["queue"]["count"], 1)
+        self.assertEqual(status["execution"]["count"], 2)
+        self.assertEqual(status["execution"]["sum"], 2.0)
+
+    def test_export_text(self):
+        self.tracer.observe("queue", 0.2)
+        self.tracer.observe("queue", 700.0)
+        text = self.tracer.export_text({"service": "EvaluationService"})
+        lines = text.splitlines()
+        self.assertEqual(lines[1],
+                         "# TYPE cms_stage_latency_seconds histogram")
+        self.assertIn('cms_stage_latency_seconds_bucket{'
+                      'service="EvaluationService",stage="queue",le="0.25"}'
+                      ' 1', lines)
+        self.assertIn('cms_stage_latency_seconds_bucket{'
+                      'service="EvaluationService",stage="queue",le="+Inf"}'
+                      ' 2', lines)
+        self.assertIn('cms_stage_latency_seconds_count{'
+                      'service="EvaluationService",stage="queue"} 2', lines)
+        self.assertTrue(text.endswith("\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,10 +23,13 @@
 import unittest
 from unittest.mock import patch
 
+import os
+
 import gevent
 
-from cms import Address
+from cms import Address, config
 from cms.io import Executor, FakeQueueItem, TriggeredService
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
 
 
 class Notifier:
@@ -88,10 +91,14 @@ class FakeTriggeredService(TriggeredService):
             del self._operations[0]
         return counter
 
+    def item_from_snapshot(self, data):
+        return FakeQueueItem(data["_title"])
+
 
-class TestTriggeredService(unittest.TestCase):
+class TestTriggeredService(FileSystemMixin, unittest.TestCase):
 
     def setUp(self):
+        super().setUp()
         patcher = patch("cms.io.service.get_service_address")
         self.get_service_address = patcher.start()
         self.addCleanup(patcher.stop)
@@ -118,6 +125,17 @@ class TestTriggeredService(unittest.TestCase):
         for notifier in self.notifiers:
             self.assertEqual(notifier.get_notifications(), 2)
 
+    def test_queue_span(self):
+        """Test that the time spent in the queue is traced."""
+        self.setUpService()
+        operation = FakeQueueItem('op 0')
+        operation.trace = {}
+        self.service.enqueue(operation)
+        self.assertEqual(operation.trace["queue"][1], None)
+        gevent.sleep(0.01)
+        start, end = operation.trace["queue"]
+        self.assertLessEqual(start, end)
+
     def test_sweeper(self):
         """Test the sweeper.
 
@@ -170,6 +188,72 @@ class TestTriggeredService(unittest.TestCase):
         # Just one call to the batch executor.
         self.assertEqual(batch_notifier.get_notifications(), 1)
 
+    def test_enqueue_many(self):
+        self.setUpService()
+        self.service.enqueue(FakeQueueItem('op 0'))
+        self.assertEqual(self.service.enqueue_many([
+            (FakeQueueItem('op 0'), None, None),
+            (FakeQueueItem('op 1'), None, None),
+            (FakeQueueItem('op 2'), None, None),
+        ]), 2 * len(self.notifiers))
+        gevent.sleep(0.01)
+        for notifier in self.notifiers:
+            self.assertEqual(notifier.get_notifications(), 3)
+
+    def test_metrics(self):
+        self.setUpService()
+        self.service.enqueue(FakeQueueItem('op 0'))
+        text = self.service.export_metrics()
+        self.assertIn('cms_queue_length{service="FakeTriggeredService",'
+                      'shard="0",executor="FakeExecutor",index="1"} 1\n',
+                      text)
+        gevent.sleep(0.01)
+        text = self.service.export_metrics()
+        self.assertIn('cms_operations_total{service="FakeTriggeredService",'
+                      'shard="0",executor="FakeExecutor",index="1"} 1\n',
+                      text)
+
+    def test_queue_snapshot(self):
+        """Test that a restarted service resumes the operations."""
+        with patch.object(config, "data_dir", self.base_dir):
+            self.setUpService()
+            # Not yielding, so the operations are still in the queues.
+            self.service.enqueue(FakeQueueItem('op 0'))
+            self.service.enqueue(FakeQueueItem('op 1'))
+            self.service.write_queue_snapshot()
+            self.assertTrue(os.path.exists(
+                self.service.get_queue_snapshot_path()))
+
+            notifiers = [Notifier(), Notifier()]
+            service = FakeTriggeredService(0, None)
+            for notifier in notifiers:
+                service.add_executor(FakeExecutor(notifier))
+            self.assertEqual(service.restore_queue_snapshot(), 4)
+            gevent.sleep(0.01)
+            for notifier in notifiers:
+                self.assertEqual(notifier.get_notifications(), 2)
+
+    def test_queue_snapshot_missing(self):
+        with patch.object(config, "data_dir", self.base_dir):
+            self.setUpService()
+            self.assertEqual(self.service.restore_queue_snapshot(), 0)
+
+    def test_queue_snapshot_not_restorable(self):
+        """Test that no snapshot is taken if it cannot be restored."""
+        class Service(TriggeredService):
+            def _missing_operations(self):
+                return 0
+
+        self.get_service_address.return_value = Address('127.0.0.1', '12345')
+        with patch.object(config, "data_dir", self.base_dir):
+            service = Service(0)
+            service.add_executor(FakeExecutor(Notifier()))
+            service.start_queue_snapshots(0.01)
+            service.enqueue(FakeQueueItem('op 0'))
+            gevent.sleep(0.05)
+            self.assertFalse(os.path.exists(
+                service.get_queue_snapshot_path()))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the logging handlers.
+
+"""
+
+import io
+import logging
+import unittest
+from unittest.mock import MagicMock, patch
+
+import gevent
+
+from cms.log import LogServiceHandler, StreamHandler
+
+
+def make_record(levelno, msg="message", *args):
+    return logging.LogRecord("test", levelno, __file__, 0, msg, args, None)
+
+
+class TestStreamHandler(unittest.TestCase):
+
+    def test_handle_many(self):
+        stream = io.StringIO()
+        handler = StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.addFilter(lambda record: record.levelno >= logging.INFO)
+        handler.handle_many([make_record(logging.INFO, "a"),
+                             make_record(logging.DEBUG, "b"),
+                             make_record(logging.ERROR, "c %s", "d")])
+        self.assertEqual(stream.getvalue(), "a\nc d\n")
+
+
+class TestLogServiceHandler(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_service = MagicMock()
+        self.log_service.connected = True
+        self.handler = LogServiceHandler(self.log_service)
+
+    def sent_messages(self):
+        return [record["msg"]
+                for call in self.log_service.LogBatch.call_args_list
+                for record in call[1]["records"]]
+
+    def test_batched_after_delay(self):
+        self.handler.handle(make_record(logging.INFO, "a"))
+        self.handler.handle(make_record(logging.INFO, "b %s", 1))
+        self.log_service.LogBatch.assert_not_called()
+
+        gevent.sleep(LogServiceHandler.MAX_DELAY * 2)
+        self.log_service.LogBatch.assert_called_once()
+        self.assertEqual(self.sent_messages(), ["a", "b 1"])
+
+    def test_batched_when_full(self):
+        with patch.object(LogServiceHandler, "BATCH_SIZE", 3):
+            for i in range(7):
+                self.handler.handle(make_record(logging.INFO, "%d", i))
+            self.log_service.LogBatch.assert_not_called()
+            # All the records pending when the flush runs are sent.
+            gevent.sleep(0)
+        self.assertEqual(self.sent_messages(), ["%d" % i for i in range(7)])
+        self.assertEqual(self.log_service.LogBatch.call_count, 3)
+
+    def test_not_connected(self):
+        self.log_service.connected = False
+        self.handler.handle(make_record(logging.INFO, "a"))
+        self.handler.flush()
+        self.log_service.LogBatch.assert_not_called()
+
+        self.log_service.connected = True
+        self.handler.flush()
+        self.assertEqual(self.sent_messages(), ["a"])
+
+    def test_unencodable_extra(self):
+        record = make_record(logging.INFO)
+        record.obj = object()
+        self.handler.handle(record)
+        self.handler.flush()
+        sent = self.log_service.LogBatch.call_args[1]["records"][0]
+        self.assertIsInstance(sent["obj"], str)
+
+    @patch.object(LogServiceHandler, "SOFT_LIMIT", 2)
+    @patch.object(LogServiceHandler, "HARD_LIMIT", 5)
+    @patch.object(LogServiceHandler, "INFO_SAMPLING", 2)
+    def test_overload(self):
+        self.log_service.connected = False
+        for msg in ["i1", "i2"]:
+            self.handler.handle(make_record(logging.INFO, msg))
+        # Over the soft limit: DEBUG dropped, INFO sampled.
+        self.handler.handle(make_record(logging.DEBUG, "d1"))
+        for msg in ["i3", "i4", "i5"]:
+            self.handler.handle(make_record(logging.INFO, msg))
+        self.handler.handle(make_record(logging.WARNING, "w1"))
+        # Over the hard limit: everything dropped.
+        self.handler.handle(make_record(logging.ERROR, "e1"))
+
+        self.log_service.connected = True
+        self.handler.flush()
+        messages = self.sent_messages()
+        self.assertEqual(messages[1:], ["i1", "i2", "i3", "i5", "w1"])
+        self.assertIn("1 DEBUG, 1 ERROR, 1 INFO", messages[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the metrics registry.
+
+"""
+
+import unittest
+
+from cms.metrics import MetricsRegistry, make_wsgi_app
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.registry = MetricsRegistry()
+
+    def test_counter_and_gauge(self):
+        counter = self.registry.counter("ops_total", "Operations.")
+        counter.inc()
+        counter.inc(2)
+        self.assertIs(self.registry.counter("ops_total", "Operations."),
+                      counter)
+        gauge = self.registry.gauge("length", "Length.", {"queue": "a"})
+        gauge.set(5)
+        gauge.dec()
+        text = self.registry.export_text({"service": "S"})
+        self.assertEqual(text, "\n".join([
+            "# HELP length Length.",
+            "# TYPE length gauge",
+            'length{service="S",queue="a"} 4',
+            "# HELP ops_total Operations.",
+            "# TYPE ops_total counter",
+            'ops_total{service="S"} 3',
+        ]) + "\n")
+
+    def test_function(self):
+        values = [1, 2]
+        self.registry.gauge("length", "Length.", {"queue": "a"},
+                            function=lambda: values[0])
+        self.registry.gauge("length", "Length.", {"queue": "b"},
+                            function=lambda: values[1])
+        values[1] = 7
+        self.assertEqual(self.registry.export_text(), "\n".join([
+            "# HELP length Length.",
+            "# TYPE length gauge",
+            'length{queue="a"} 1',
+            'length{queue="b"} 7',
+        ]) + "\n")
+
+    def test_failing_function(self):
+        self.registry.gauge("broken", "Broken.", function=lambda: 1 / 0)
+        self.registry.gauge("ok", "Ok.").set(1.5)
+        self.assertIn("ok 1.5\n", self.registry.export_text())
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("duration_seconds", "Duration.",
+                                            buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(self.registry.export_text(), "\n".join([
+            "# HELP duration_seconds Duration.",
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{le="0.1"} 1',
+            'duration_seconds_bucket{le="1.0"} 2',
+            'duration_seconds_bucket{le="+Inf"} 3',
+            "duration_seconds_sum 2.55",
+            "duration_seconds_count 3",
+        ]) + "\n")
+
+    def test_type_mismatch(self):
+        self.registry.counter("ops_total", "Operations.")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("ops_total", "Operations.")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("ops_total", "Operations.", {"a": "b"})
+
+    def test_label_escaping(self):
+        self.registry.gauge("g", "G.", {"name": 'a "b"\\'}).set(1)
+        self.assertIn('g{name="a \\"b\\"\\\\"} 1',
+                      self.registry.export_text())
+
+    def test_unregister(self):
+        self.registry.gauge("g", "G.", {"a": "1"})
+        self.registry.unregister("g", {"a": "1"})
+        self.assertEqual(self.registry.export_text(), "\n")
+
+
+class TestWsgiApp(unittest.TestCase):
+
+    def call(self, path):
+        responses = []
+        app = make_wsgi_app(lambda: "m 1\n")
+        body = app({"PATH_INFO": path},
+                   lambda status, headers: responses.append(status))
+        return responses[0], b"".join(body)
+
+    def test_metrics(self):
+        self.assertEqual(self.call("/metrics"), ("200 OK", b"m 1\n"))
+
+    def test_not_found(self):
+        self.assertEqual(self.call("/other")[0], "404 Not Found")
+
+
+if __name__ == "__main__":
+    unittest.main()
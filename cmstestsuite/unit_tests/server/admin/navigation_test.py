@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the navigation cache of AWS.
+
+"""
+
+import unittest
+from unittest.mock import patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.server.admin.navigation import NavigationCache
+
+
+class TestNavigationCache(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = NavigationCache()
+        self.user1 = self.add_user()
+        self.user2 = self.add_user()
+        self.session.flush()
+
+    def test_list(self):
+        users = self.cache.get_list(self.session, "user")
+        self.assertEqual([u.id for u in users],
+                         sorted([self.user1.id, self.user2.id]))
+        self.assertEqual(users[0].username,
+                         min(self.user1, self.user2,
+                             key=lambda u: u.id).username)
+        self.assertEqual(self.cache.get_count(self.session, "user"), 2)
+        self.assertEqual(self.cache.get_list(self.session, "team"), [])
+        self.assertEqual(self.cache.get_count(self.session, "team"), 0)
+
+    def test_cached_until_invalidated(self):
+        self.assertEqual(len(self.cache.get_list(self.session, "user")), 2)
+        self.assertEqual(self.cache.get_count(self.session, "user"), 2)
+        self.add_user()
+        self.session.flush()
+        self.assertEqual(len(self.cache.get_list(self.session, "user")), 2)
+        self.assertEqual(self.cache.get_count(self.session, "user"), 2)
+
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache.get_list(self.session, "user")), 3)
+        self.assertEqual(self.cache.get_count(self.session, "user"), 3)
+
+    def test_expired(self):
+        self.assertEqual(len(self.cache.get_list(self.session, "user")), 2)
+        self.add_user()
+        self.session.flush()
+        with patch.object(NavigationCache, "MAX_AGE", 0.0):
+            self.assertEqual(
+                len(self.cache.get_list(self.session, "user")), 3)
+
+    def test_not_stored_if_invalidated_meanwhile(self):
+        def compute():
+            # A write happens while the list is being fetched.
+            self.cache.invalidate()
+            return ["stale"]
+
+        self.assertEqual(self.cache._get(("list", "user"), compute),
+                         ["stale"])
+        self.assertEqual(len(self.cache.get_list(self.session, "user")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the submission lists of AWS.
+
+"""
+
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+import tornado.web
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db import Submission
+from cms.server.admin.handlers.base import BaseHandler
+from cms.server.admin.jinja2_toolbox import AWS_ENVIRONMENT
+from cms.server.util import Url
+
+
+class FakeHandler(BaseHandler):
+    """A handler with just what render_params_for_submissions needs."""
+
+    def __init__(self, session, arguments):
+        self.sql_session = session
+        self.r_params = dict()
+        self.arguments = arguments
+
+    def get_query_argument(self, name, default=None):
+        return self.arguments.get(name, default)
+
+
+class TestSubmissionPagination(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest()
+        self.task = self.add_task(contest=self.contest)
+        self.dataset = self.add_dataset(task=self.task)
+        self.task.active_dataset = self.dataset
+        self.participation = self.add_participation(contest=self.contest)
+        # Seven submissions, the middle three with the same timestamp,
+        # so that a page boundary (with pages of 2) falls among them.
+        start = self.contest.start
+        timestamps = [start + timedelta(seconds=s)
+                      for s in (1, 2, 3, 3, 3, 4, 5)]
+        for timestamp in timestamps:
+            self.add_submission(self.task, self.participation,
+                                timestamp=timestamp)
+        self.session.flush()
+        self.expected = sorted(self.session.query(Submission).all(),
+                               key=lambda s: (s.timestamp, s.id),
+                               reverse=True)
+
+    def render(self, page_size=2, estimate=False, **arguments):
+        handler = FakeHandler(self.session, arguments)
+        handler.render_params_for_submissions(
+            self.session.query(Submission), page_size=page_size,
+            estimate=estimate)
+        return handler.r_params
+
+    def test_first_page(self):
+        r_params = self.render()
+        self.assertEqual(r_params["submissions"], self.expected[:2])
+        self.assertEqual(r_params["submission_page"], {
+            "newer": None, "older": {"before": self.expected[1].id}})
+        self.assertEqual(r_params["submission_count"], 7)
+        self.assertFalse(r_params["submission_count_estimated"])
+
+    def test_walk_older_and_back(self):
+        pages = [self.render()]
+        while pages[-1]["submission_page"]["older"] is not None:
+            pages.append(self.render(**{
+                k: str(v)
+                for k, v in pages[-1]["submission_page"]["older"].items()}))
+        # Each submission appears exactly once, even those tied on the
+        # timestamp across the page boundaries.
+        self.assertEqual(
+            [s for page in pages for s in page["submissions"]],
+            self.expected)
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(pages[-1]["submissions"], self.expected[6:])
+
+        # Going to the newer page gives back the same page as before.
+        for i in range(len(pages) - 1, 0, -1):
+            newer = pages[i]["submission_page"]["newer"]
+            self.assertEqual(newer, {"after": pages[i]["submissions"][0].id})
+            r_params = self.render(after=str(newer["after"]))
+            self.assertEqual(r_params["submissions"],
+                             pages[i - 1]["submissions"])
+        self.assertIsNone(
+            self.render(after=str(self.expected[2].id))
+            ["submission_page"]["newer"])
+
+    def test_empty(self):
+        r_params = self.render(before=str(self.expected[-1].id))
+        self.assertEqual(r_params["submissions"], [])
+        self.assertEqual(r_params["submission_page"],
+                         {"newer": None, "older": None})
+
+    def test_invalid_argument(self):
+        with self.assertRaises(tornado.web.HTTPError) as context:
+            self.render(before="latest")
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_missing_submission(self):
+        missing = max(s.id for s in self.expected) + 1
+        self.assertEqual(self.render(before=str(missing))["submissions"],
+                         self.expected[:2])
+
+    def test_estimate_small_counted(self):
+        with patch("cms.server.admin.handlers.base.estimate_count",
+                   return_value=3):
+            r_params = self.render(estimate=True)
+        self.assertEqual(r_params["submission_count"], 7)
+        self.assertFalse(r_params["submission_count_estimated"])
+
+    def test_estimate_large(self):
+        with patch("cms.server.admin.handlers.base.estimate_count",
+                   return_value=123456):
+            r_params = self.render(estimate=True)
+        self.assertEqual(r_params["submission_count"], 123456)
+        self.assertTrue(r_params["submission_count_estimated"])
+
+    def test_evaluations_loaded_only_when_scoring(self):
+        testcase = self.add_testcase(self.dataset)
+        scoring, (scoring_sr,) = self.add_submission_with_results(
+            self.task, self.participation, True)
+        self.add_evaluation(scoring_sr, testcase)
+        scoring_sr.set_evaluation_outcome()
+        compiled, (compiled_sr,) = self.add_submission_with_results(
+            self.task, self.participation, True)
+        self.session.flush()
+        self.session.expire_all()
+
+        submissions = self.render(page_size=10)["submissions"]
+        by_id = dict((s.id, s) for s in submissions)
+        scoring_sr = by_id[scoring.id].get_result(self.dataset)
+        compiled_sr = by_id[compiled.id].get_result(self.dataset)
+        self.assertIn("evaluations", scoring_sr.__dict__)
+        self.assertEqual([ev.testcase for ev in scoring_sr.evaluations],
+                         [testcase])
+        self.assertNotIn("evaluations", compiled_sr.__dict__)
+
+
+class TestKeysetSelector(unittest.TestCase):
+
+    def render(self, page):
+        template = AWS_ENVIRONMENT.get_template("macro/pages.html")
+        return template.module.keyset_selector(Url("/list"), page)
+
+    def test_single_page(self):
+        self.assertNotIn("<a", self.render({"newer": None, "older": None}))
+
+    def test_first_page(self):
+        html = self.render({"newer": None, "older": {"before": 5}})
+        self.assertNotIn("Newest", html)
+        self.assertIn('href="/list?before=5">Older', html)
+
+    def test_middle_page(self):
+        html = self.render({"newer": {"after": 9}, "older": {"before": 5}})
+        self.assertIn('href="/list">Newest', html)
+        self.assertIn('href="/list?after=9">Newer', html)
+        self.assertIn('href="/list?before=5">Older', html)
+
+
+if __name__ == "__main__":
+    unittest.main()
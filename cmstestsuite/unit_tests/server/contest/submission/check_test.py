@@ -18,14 +18,15 @@
 
 import unittest
 from datetime import timedelta
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, call, patch
 
 # Needs to be first to allow for monkey patching the DB connection string.
 from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
 
 from cms.db import UserTest, Submission
-from cms.server.contest.submission import get_submission_count, \
-    check_max_number, get_latest_submission, check_min_interval
+from cms.server.contest.submission import SubmissionStats, \
+    get_submission_count, check_max_number, get_latest_submission, \
+    check_min_interval
 from cmscommon.datetime import make_datetime
 
 
@@ -199,6 +200,18 @@ class TestCheckMaxNumber(DatabaseMixin, unittest.TestCase):
         # Having calls signals an inefficiency.
         self.get_submission_count.assert_not_called()
 
+    def test_limit_with_stats(self):
+        stats = MagicMock()
+        stats.get_count.side_effect = lambda task: 2 if task else 5
+        self.assertFalse(check_max_number(
+            self.session, 5, self.participation, contest=self.contest,
+            stats=stats))
+        self.assertTrue(check_max_number(
+            self.session, 3, self.participation, task=self.task,
+            stats=stats))
+        # The count is taken from the stats.
+        self.get_submission_count.assert_not_called()
+
 
 class TestGetLatestSubmission(DatabaseMixin, unittest.TestCase):
 
@@ -398,6 +411,75 @@ class TestCheckMinInterval(DatabaseMixin, unittest.TestCase):
         # Having calls signals an inefficiency.
         self.get_latest_submission.assert_not_called()
 
+    def test_limit_with_stats(self):
+        stats = MagicMock()
+        stats.get_latest_timestamp.side_effect = \
+            lambda task: None if task else self.at(5)
+        self.assertFalse(check_min_interval(
+            self.session, timedelta(seconds=2), self.at(6),
+            self.participation, contest=self.contest, stats=stats))
+        self.assertTrue(check_min_interval(
+            self.session, timedelta(seconds=2), self.at(6),
+            self.participation, task=self.task, stats=stats))
+        # The timestamp is taken from the stats.
+        self.get_latest_submission.assert_not_called()
+
+
+class TestSubmissionStats(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.contest = self.add_contest()
+        self.task1 = self.add_task(contest=self.contest)
+        self.task2 = self.add_task(contest=self.contest)
+        self.participation = self.add_participation(contest=self.contest)
+        self.timestamp = make_datetime()
+
+    def at(self, seconds):
+        return self.timestamp + timedelta(seconds=seconds)
+
+    def test_no_submissions(self):
+        stats = SubmissionStats(self.session, self.participation, self.task1)
+        self.assertEqual(stats.get_count(), 0)
+        self.assertEqual(stats.get_count(task=self.task1), 0)
+        self.assertIsNone(stats.get_latest_timestamp())
+        self.assertIsNone(stats.get_latest_timestamp(task=self.task1))
+
+    def test_submissions(self):
+        self.add_submission(timestamp=self.at(1), task=self.task1,
+                            participation=self.participation)
+        self.add_submission(timestamp=self.at(3), task=self.task2,
+                            participation=self.participation)
+        self.add_submission(timestamp=self.at(2), task=self.task1,
+                            participation=self.participation)
+        # Doesn't mix submissions for different users, or user tests.
+        other_participation = self.add_participation(contest=self.contest)
+        self.add_submission(timestamp=self.at(4), task=self.task1,
+                            participation=other_participation)
+        self.add_user_test(timestamp=self.at(5), task=self.task1,
+                           participation=self.participation)
+
+        stats = SubmissionStats(self.session, self.participation, self.task1)
+        self.assertEqual(stats.get_count(), 3)
+        self.assertEqual(stats.get_count(task=self.task1), 2)
+        self.assertEqual(stats.get_latest_timestamp(), self.at(3))
+        self.assertEqual(stats.get_latest_timestamp(task=self.task1),
+                         self.at(2))
+
+    def test_user_tests(self):
+        self.add_user_test(timestamp=self.at(1), task=self.task1,
+                           participation=self.participation)
+        self.add_user_test(timestamp=self.at(2), task=self.task2,
+                           participation=self.participation)
+
+        stats = SubmissionStats(self.session, self.participation, self.task2,
+                                cls=UserTest)
+        self.assertEqual(stats.get_count(), 2)
+        self.assertEqual(stats.get_count(task=self.task2), 1)
+        self.assertEqual(stats.get_latest_timestamp(), self.at(2))
+        self.assertEqual(stats.get_latest_timestamp(task=self.task2),
+                         self.at(2))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -108,6 +108,11 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
         self.addCleanup(patcher.stop)
         self.check_min_interval.return_value = True
 
+        patcher = patch(
+            "cms.server.contest.submission.workflow.SubmissionStats")
+        self.stats = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
         patcher = patch(
             "cms.server.contest.submission.workflow.extract_files_from_tornado")
         self.extract_files_from_tornado = patcher.start()
@@ -146,8 +151,8 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
         self.addCleanup(patcher.stop)
 
         self.file_cacher = MagicMock()
-        self.file_cacher.put_file_content.side_effect = \
-            lambda content, _: bytes_digest(content)
+        self.file_cacher.put_many.side_effect = \
+            lambda contents: [bytes_digest(c) for c, _ in contents]
 
     def call(self):
         return accept_submission(
@@ -221,7 +226,8 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
             self.call()
 
         self.check_max_number.assert_called_with(
-            self.session, max_number, self.participation, contest=self.contest)
+            self.session, max_number, self.participation,
+            contest=self.contest, stats=self.stats)
 
     def test_failure_due_to_max_number_on_task(self):
         max_number = unique_long_id()
@@ -234,7 +240,8 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
             self.call()
 
         self.check_max_number.assert_called_with(
-            self.session, max_number, self.participation, task=self.task)
+            self.session, max_number, self.participation, task=self.task,
+            stats=self.stats)
 
     def test_failure_due_to_min_interval_on_contest(self):
         min_interval = timedelta(seconds=unique_long_id())
@@ -249,7 +256,7 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
 
         self.check_min_interval.assert_called_with(
             self.session, min_interval, self.timestamp, self.participation,
-            contest=self.contest)
+            contest=self.contest, stats=self.stats)
 
     def test_failure_due_to_min_interval_on_task(self):
         min_interval = timedelta(seconds=unique_long_id())
@@ -264,7 +271,7 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
 
         self.check_min_interval.assert_called_with(
             self.session, min_interval, self.timestamp, self.participation,
-            task=self.task)
+            task=self.task, stats=self.stats)
 
     def test_failure_due_to_extract_files_from_tornado(self):
         self.extract_files_from_tornado.side_effect = InvalidArchive
@@ -338,15 +345,16 @@ class TestAcceptSubmission(DatabaseMixin, unittest.TestCase):
             self.timestamp, self.files)
 
     def test_failure_due_to_file_cacher(self):
-        self.file_cacher.put_file_content.side_effect = Exception
+        self.file_cacher.put_many.side_effect = Exception
 
         with self.assertRaisesRegex(UnacceptableSubmission, "storage"):
             self.call()
 
-        args, kwargs = self.file_cacher.put_file_content.call_args
+        args, kwargs = self.file_cacher.put_many.call_args
         self.assertEqual(kwargs, dict())
-        self.assertEqual(len(args), 2)
-        content, description = args
+        contents, = args
+        self.assertEqual(len(contents), 1)
+        content, description = contents[0]
         self.assertEqual(content, FOO_CONTENT)
         self.assertIn("foo.%l", description)
         self.assertIn(self.participation.user.username, description)
@@ -412,6 +420,11 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
         self.addCleanup(patcher.stop)
         self.check_min_interval.return_value = True
 
+        patcher = patch(
+            "cms.server.contest.submission.workflow.SubmissionStats")
+        self.stats = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
         patcher = patch(
             "cms.server.contest.submission.workflow.extract_files_from_tornado")
         self.extract_files_from_tornado = patcher.start()
@@ -450,8 +463,8 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
         self.addCleanup(patcher.stop)
 
         self.file_cacher = MagicMock()
-        self.file_cacher.put_file_content.side_effect = \
-            lambda content, _: bytes_digest(content)
+        self.file_cacher.put_many.side_effect = \
+            lambda contents: [bytes_digest(c) for c, _ in contents]
 
     def call(self):
         return accept_user_test(
@@ -553,7 +566,7 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
 
         self.check_max_number.assert_called_with(
             self.session, max_number, self.participation, contest=self.contest,
-            cls=UserTest)
+            cls=UserTest, stats=self.stats)
 
     def test_failure_due_to_max_number_on_task(self):
         max_number = unique_long_id()
@@ -567,7 +580,7 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
 
         self.check_max_number.assert_called_with(
             self.session, max_number, self.participation, task=self.task,
-            cls=UserTest)
+            cls=UserTest, stats=self.stats)
 
     def test_failure_due_to_min_interval_on_contest(self):
         min_interval = timedelta(seconds=unique_long_id())
@@ -582,7 +595,7 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
 
         self.check_min_interval.assert_called_with(
             self.session, min_interval, self.timestamp, self.participation,
-            contest=self.contest, cls=UserTest)
+            contest=self.contest, cls=UserTest, stats=self.stats)
 
     def test_failure_due_to_min_interval_on_task(self):
         min_interval = timedelta(seconds=unique_long_id())
@@ -597,7 +610,7 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
 
         self.check_min_interval.assert_called_with(
             self.session, min_interval, self.timestamp, self.participation,
-            task=self.task, cls=UserTest)
+            task=self.task, cls=UserTest, stats=self.stats)
 
     def test_failure_due_to_extract_files_from_tornado(self):
         self.extract_files_from_tornado.side_effect = InvalidArchive
@@ -696,18 +709,19 @@ class TestAcceptUserTest(DatabaseMixin, unittest.TestCase):
             self.timestamp, self.files)
 
     def test_failure_due_to_file_cacher(self):
-        self.file_cacher.put_file_content.side_effect = Exception
+        self.file_cacher.put_many.side_effect = Exception
 
         with self.assertRaisesRegex(UnacceptableUserTest, "storage"):
             self.call()
 
-        args, kwargs = self.file_cacher.put_file_content.call_args
+        args, kwargs = self.file_cacher.put_many.call_args
         self.assertEqual(kwargs, dict())
-        self.assertEqual(len(args), 2)
-        content, description = args
-        self.assertIn(content, {FOO_CONTENT, SPAM_CONTENT, INPUT_CONTENT})
-        self.assertRegex(description, "foo.%l|spammock.1|input")
-        self.assertIn(self.participation.user.username, description)
+        contents, = args
+        self.assertCountEqual((content for content, _ in contents),
+                              self.files.values())
+        for codename, (_, description) in zip(self.files, contents):
+            self.assertIn(codename, description)
+            self.assertIn(self.participation.user.username, description)
 
 
 if __name__ == "__main__":
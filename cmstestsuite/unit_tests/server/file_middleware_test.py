@@ -17,18 +17,22 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import io
+import os
 import random
 import unittest
 from unittest.mock import Mock
 
+import gevent
 from werkzeug.http import quote_header_value
 from werkzeug.test import Client, EnvironBuilder
 from werkzeug.wrappers import Response
 from werkzeug.wsgi import responder
 
-from cms.db.filecacher import TombstoneError
-from cms.server.file_middleware import FileServerMiddleware
+from cms.db.filecacher import FileCacher, TombstoneError
+from cms.server.file_middleware import CachedFileServer, \
+    FileServerMiddleware
 from cmscommon.digest import bytes_digest
+from cmstestsuite.unit_tests.filesystemmixin import FileSystemMixin
 
 
 class TestFileByDigestMiddleware(unittest.TestCase):
@@ -160,5 +164,132 @@ class TestFileByDigestMiddleware(unittest.TestCase):
         self.assertEqual(response.status_code, 416)
 
 
+class TestCachedFileServer(unittest.TestCase):
+
+    def setUp(self):
+        self.content = b"some content"
+        self.digest = bytes_digest(self.content)
+
+        self.file_cacher = Mock()
+        self.file_cacher.get_file = Mock(
+            side_effect=lambda digest: io.BytesIO(self.content))
+
+        self.client = Client(CachedFileServer(self.file_cacher), Response)
+
+    def test_success(self):
+        response = self.client.get("/%s" % self.digest)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.content)
+        self.file_cacher.get_file.assert_called_once_with(self.digest)
+
+    def test_not_found(self):
+        self.file_cacher.get_file.side_effect = KeyError()
+
+        response = self.client.get("/%s" % self.digest)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_tombstone(self):
+        self.file_cacher.get_file.side_effect = TombstoneError()
+
+        response = self.client.get("/%s" % self.digest)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_digest(self):
+        response = self.client.get("/../%s" % self.digest)
+
+        self.assertEqual(response.status_code, 404)
+        self.file_cacher.get_file.assert_not_called()
+
+    def test_method_not_allowed(self):
+        response = self.client.post("/%s" % self.digest)
+
+        self.assertEqual(response.status_code, 405)
+
+    def test_allowed_address(self):
+        client = Client(CachedFileServer(self.file_cacher,
+                                         allowed_addresses={"10.0.0.1"}),
+                        Response)
+
+        response = client.get("/%s" % self.digest,
+                              environ_base={"REMOTE_ADDR": "10.0.0.1"})
+        self.assertEqual(response.status_code, 200)
+
+        response = client.get("/%s" % self.digest,
+                              environ_base={"REMOTE_ADDR": "10.0.0.2"})
+        self.assertEqual(response.status_code, 403)
+        self.file_cacher.get_file.assert_called_once_with(self.digest)
+
+    def test_concurrent_requests_fetch_once(self):
+        fetches = []
+
+        def get_file(digest):
+            # Simulate a cache that fetches the file on the first miss.
+            if not fetches or fetches[-1] is None:
+                fetches.append(None)
+                gevent.sleep(0.01)
+                fetches[-1] = digest
+            return io.BytesIO(self.content)
+        self.file_cacher.get_file.side_effect = get_file
+
+        greenlets = [gevent.spawn(self.client.get, "/%s" % self.digest)
+                     for _ in range(3)]
+        gevent.joinall(greenlets, raise_error=True)
+
+        for greenlet in greenlets:
+            self.assertEqual(greenlet.value.status_code, 200)
+            self.assertEqual(greenlet.value.get_data(), self.content)
+        # The requests arriving during the fetch waited for it.
+        self.assertEqual(fetches, [self.digest])
+
+    def test_concurrent_requests_not_found(self):
+        def get_file(digest):
+            gevent.sleep(0.01)
+            raise KeyError()
+        self.file_cacher.get_file.side_effect = get_file
+
+        greenlets = [gevent.spawn(self.client.get, "/%s" % self.digest)
+                     for _ in range(3)]
+        gevent.joinall(greenlets, raise_error=True)
+
+        for greenlet in greenlets:
+            self.assertEqual(greenlet.value.status_code, 404)
+        # The waiting requests share the failure of the fetch.
+        self.file_cacher.get_file.assert_called_once_with(self.digest)
+
+
+class TestCachedFileServerTree(FileSystemMixin, unittest.TestCase):
+    """Test a child fetching through a parent with an empty cache."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = b"some content"
+        storage = self.get_path("storage")
+        self.digest = FileCacher(path=storage).put_file_content(
+            self.content)
+        # The parent has the same backend (standing for the database),
+        # but has not cached the file yet.
+        self.parent = FileCacher(path=storage)
+        self.client = Client(CachedFileServer(self.parent), Response)
+
+    def test_parent_not_cached(self):
+        cached_path = os.path.join(self.parent.file_dir, self.digest)
+        self.assertFalse(os.path.exists(cached_path))
+
+        response = self.client.get("/%s" % self.digest)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.content)
+        # The parent kept the file for its other children.
+        self.assertTrue(os.path.exists(cached_path))
+
+    def test_missing_everywhere(self):
+        response = self.client.get("/%s" % bytes_digest(b"other"))
+
+        self.assertEqual(response.status_code, 404)
+
+
 if __name__ == "__main__":
     unittest.main()
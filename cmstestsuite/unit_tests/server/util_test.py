@@ -21,8 +21,16 @@
 """
 
 import unittest
+from unittest.mock import Mock, patch
 
-from cms.server.util import Url
+import tornado.web
+from tornado.httputil import HTTPServerRequest
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms.db.session import _session_duration, _session_statements
+from cms.server.util import CommonRequestHandler, Url
 
 
 class TestUrl(unittest.TestCase):
@@ -91,5 +99,28 @@ class TestUrl(unittest.TestCase):
                          "/?%3Ffoo=%2Fbar%23&f%3Do%3Fo=%3Fb%3Da%26r")
 
 
+class TestCommonRequestHandler(DatabaseMixin, unittest.TestCase):
+
+    def make_handler(self):
+        request = HTTPServerRequest(method="GET", uri="/",
+                                    connection=Mock())
+        return CommonRequestHandler(tornado.web.Application(), request)
+
+    def test_session_measured(self):
+        handler = self.make_handler()
+        handler.sql_session.execute("SELECT 1")
+        handler.sql_session.execute("SELECT 2")
+        count = _session_statements.count
+        total = _session_statements.sum
+        duration_count = _session_duration.count
+
+        with patch.object(tornado.web.RequestHandler, "finish"):
+            handler.finish()
+
+        self.assertEqual(_session_statements.count, count + 1)
+        self.assertEqual(_session_statements.sum, total + 2)
+        self.assertEqual(_session_duration.count, duration_count + 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for the evaluation service.
+
+"""
+
+import unittest
+from unittest.mock import PropertyMock, patch
+
+# Needs to be first to allow for monkey patching the DB connection string.
+from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
+
+from cms import config
+from cms.grading.scoretypes.GroupMin import GroupMin
+from cms.grading.tasktypes.Batch import Batch
+from cms.grading.tasktypes.OutputOnly import OutputOnly
+from cms.service.EvaluationService import EvaluationExecutor, \
+    EvaluationService
+from cms.service.esoperations import ESOperation
+
+
+class TestEvaluationExecutor(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # No workers, so that the pool does not try to connect.
+        patcher = patch("cms.service.EvaluationService.get_service_shards",
+                        return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch(
+            "cms.service.EvaluationService.get_task_type_class",
+            side_effect={"Batch": Batch, "OutputOnly": OutputOnly}.__getitem__)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.executor = EvaluationExecutor(None)
+        self.templates = {
+            1: {"task_type": "OutputOnly", "testcases": ["0", "1", "2"]},
+            2: {"task_type": "Batch", "testcases": ["0", "1", "2"]},
+        }
+        self.executor.pool.get_dataset_template = self.templates.__getitem__
+
+    def enqueue_evaluations(self, submission_id, dataset_id):
+        for codename in self.templates[dataset_id]["testcases"]:
+            self.executor.enqueue(ESOperation(
+                ESOperation.EVALUATION, submission_id, dataset_id, codename))
+
+    def test_output_only_together(self):
+        self.enqueue_evaluations(1, 1)
+        self.enqueue_evaluations(2, 1)
+        entry = self.executor._operation_queue.pop()
+        operation = entry.item
+
+        others = self.executor._other_testcases_entries([entry])
+
+        # All the other testcases of the same submission, and nothing
+        # else, are removed from the queue and added to the batch.
+        self.assertCountEqual(
+            [other.item for other in others],
+            [ESOperation(ESOperation.EVALUATION, operation.object_id, 1,
+                         codename)
+             for codename in ["0", "1", "2"]
+             if codename != operation.testcase_codename])
+        self.assertEqual(self.executor.get_queue_length(), 3)
+        for other in others:
+            self.assertNotIn(other.item, self.executor)
+            self.assertIsNotNone(other.item.trace["queue"][1])
+        self.assertEqual(self.executor.executed_operations, 2)
+
+    def test_other_task_types_separate(self):
+        self.enqueue_evaluations(1, 2)
+        entry = self.executor._operation_queue.pop()
+
+        self.assertEqual(self.executor._other_testcases_entries([entry]), [])
+        self.assertEqual(self.executor.get_queue_length(), 2)
+        self.assertEqual(self.executor.executed_operations, 0)
+
+    def test_compilation_separate(self):
+        self.enqueue_evaluations(1, 1)
+        entry = self.executor._operation_queue.pop()
+        entry.item = ESOperation(ESOperation.COMPILATION, 1, 1)
+
+        self.assertEqual(self.executor._other_testcases_entries([entry]), [])
+        self.assertEqual(self.executor.get_queue_length(), 2)
+
+
+class TestSkipIrrelevantEvaluations(DatabaseMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # No workers, no snapshots, and no greenlets extracting the
+        # operations from the queue or sweeping the DB.
+        for target, kwargs in [
+                ("cms.service.EvaluationService.get_service_shards",
+                 {"return_value": 0}),
+                ("cms.service.EvaluationService.EvaluationExecutor.run", {}),
+                ("cms.io.TriggeredService.start_sweeper", {}),
+        ]:
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(config, "queue_snapshot_period", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.task = self.add_task(contest=self.add_contest())
+        self.dataset = self.add_dataset(task=self.task,
+                                        short_circuit_evaluation=True)
+        self.testcases = [self.add_testcase(dataset=self.dataset,
+                                            codename=codename)
+                          for codename in ["1_0", "1_1", "2_0", "2_1"]]
+        self.submission = self.add_submission(task=self.task)
+        self.result = self.add_submission_result(
+            self.submission, self.dataset, compilation_outcome="ok")
+        self.session.flush()
+
+        patcher = patch("cms.db.Dataset.score_type_object",
+                        new_callable=PropertyMock)
+        patcher.start().return_value = GroupMin(
+            [[50, "1_*"], [50, "2_*"]],
+            {tc.codename: True for tc in self.testcases})
+        self.addCleanup(patcher.stop)
+
+        self.service = EvaluationService(0)
+        self.pool = self.service.get_executor().pool
+        patcher = patch.object(self.pool, "ignore_operation")
+        self.ignore_operation = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def operation(self, codename):
+        return ESOperation(ESOperation.EVALUATION, self.submission.id,
+                           self.dataset.id, codename)
+
+    def skip(self):
+        self.service.skip_irrelevant_evaluations(
+            self.session, self.submission.id, self.dataset.id)
+
+    def test_skip(self):
+        self.add_evaluation(self.result, self.testcases[0], outcome="0.0")
+        for codename in ["1_1", "2_0", "2_1"]:
+            self.service.enqueue(self.operation(codename), 0, None)
+        self.ignore_operation.side_effect = LookupError
+
+        self.skip()
+
+        # The other testcase of the failed subtask is not evaluated.
+        executor = self.service.get_executor()
+        self.assertNotIn(self.operation("1_1"), executor)
+        self.assertIn(self.operation("2_0"), executor)
+        self.assertIn(self.operation("2_1"), executor)
+        self.ignore_operation.assert_called_once_with(self.operation("1_1"))
+        self.session.flush()
+        evaluations = {evaluation.codename: evaluation.outcome
+                       for evaluation in self.result.evaluations}
+        self.assertEqual(evaluations, {"1_0": "0.0", "1_1": None})
+
+    def test_skip_in_pool(self):
+        self.add_evaluation(self.result, self.testcases[0], outcome="0.0")
+
+        self.skip()
+
+        # Operations already sent to a worker are ignored.
+        self.ignore_operation.assert_called_once_with(self.operation("1_1"))
+        self.assertEqual(len(self.result.evaluations), 2)
+
+    def test_nothing_settled(self):
+        self.add_evaluation(self.result, self.testcases[0], outcome="1.0")
+
+        self.skip()
+
+        self.ignore_operation.assert_not_called()
+        self.assertEqual(len(self.result.evaluations), 1)
+
+    def test_no_short_circuit(self):
+        self.dataset.short_circuit_evaluation = False
+        self.add_evaluation(self.result, self.testcases[0], outcome="0.0")
+
+        self.skip()
+
+        self.ignore_operation.assert_not_called()
+        self.assertEqual(len(self.result.evaluations), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -75,6 +75,26 @@ class TestLogService(unittest.TestCase):
         else:
             self.assertNotEquals(last_message["severity"], severity)
 
+    def test_log_batch(self):
+        self.service.LogBatch([
+            {"msg": TestLogService.MSG + severity,
+             "levelname": severity,
+             "levelno": getattr(logging, severity),
+             "created": TestLogService.CREATED,
+             "service_name": TestLogService.SERVICE_NAME,
+             "service_shard": TestLogService.SERVICE_SHARD}
+            for severity in ["ERROR", "INFO", "WARNING"]])
+        last_messages = self.service.last_messages()
+        self.assertEqual([m["message"] for m in last_messages[-2:]],
+                         [TestLogService.MSG + "ERROR",
+                          TestLogService.MSG + "WARNING"])
+
+        with open(self.service.file_handler.baseFilename,
+                  encoding="utf-8") as f:
+            content = f.read()
+        for severity in ["ERROR", "INFO", "WARNING"]:
+            self.assertIn(TestLogService.MSG + severity, content)
+
 
 if __name__ == "__main__":
     unittest.main()
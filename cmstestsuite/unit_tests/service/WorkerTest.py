@@ -21,13 +21,15 @@
 
 """
 
+import time
 import unittest
-from unittest.mock import Mock, call
+from unittest.mock import Mock, call, patch
 
 import gevent
 
 import cms.service.Worker
 from cms.grading import JobException
+from cms.db.filecacher import PeerBackend
 from cms.grading.Job import JobGroup, EvaluationJob
 from cms.service.Worker import Worker
 from cms.service.esoperations import ESOperation
@@ -249,6 +251,27 @@ class TestWorker(unittest.TestCase):
             JobGroup.import_from_dict(
                 self.service.execute_job_group(job_groups[0].export_to_dict()))
 
+    def test_execute_job_group_concurrent(self):
+        """Executes concurrently the jobs of a task type allowing it.
+
+        """
+        n_jobs = 4
+        job_groups, calls = TestWorker.new_job_groups([n_jobs])
+        task_type = FakeTaskType([0.2] * n_jobs)
+        cms.service.Worker.get_task_type = Mock(return_value=task_type)
+        task_type_class = Mock(EVALUATE_TESTCASES_TOGETHER=True)
+
+        start = time.monotonic()
+        with patch.object(cms.service.Worker, "get_task_type_class",
+                          return_value=task_type_class):
+            result = JobGroup.import_from_dict(
+                self.service.execute_job_group(job_groups[0].export_to_dict()))
+        elapsed = time.monotonic() - start
+
+        self.assertTrue(all(job.success for job in result.jobs))
+        self.assertEqual(task_type.call_count, n_jobs)
+        self.assertLess(elapsed, 0.2 * n_jobs)
+
     @staticmethod
     def new_jobs(number_of_jobs, prefix=None):
         prefix = prefix if prefix is not None else ""
@@ -283,6 +306,52 @@ class TestWorker(unittest.TestCase):
         return job_groups, calls
 
 
+class TestWorkerCacheSharing(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch("cms.service.Worker.get_service_address",
+                        side_effect=lambda coord: Mock(
+                            ip="10.0.0.%d" % coord.shard))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(cms.service.Worker.config,
+                               "worker_cache_listen_port",
+                               [27000, 27001, 27002, 27003])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tree(self):
+        service = Worker(1)
+        self.assertEqual(service.file_cacher.backend.peers,
+                         ["http://10.0.0.0:27000/"])
+        self.assertEqual(service.cache_server.address, ("10.0.0.1", 27001))
+        # Only the children (3, as 4 does not share its cache) can fetch
+        # the files.
+        self.assertEqual(service.cache_server.application.allowed_addresses,
+                         {"10.0.0.3"})
+
+    def test_root(self):
+        service = Worker(0)
+        self.assertNotIsInstance(service.file_cacher.backend, PeerBackend)
+        self.assertEqual(service.cache_server.application.allowed_addresses,
+                         {"10.0.0.1", "10.0.0.2"})
+
+    def test_configured_address(self):
+        with patch.object(cms.service.Worker.config,
+                          "worker_cache_listen_address",
+                          ["192.168.0.1", None, "192.168.0.3"]):
+            service = Worker(1)
+        self.assertEqual(service.file_cacher.backend.peers,
+                         ["http://192.168.0.1:27000/"])
+        self.assertEqual(service.cache_server.address, ("10.0.0.1", 27001))
+
+    def test_disabled(self):
+        service = Worker(4)
+        self.assertIsNone(service.cache_server)
+        self.assertNotIsInstance(service.file_cacher.backend, PeerBackend)
+
+
 class FakeTaskType:
     def __init__(self, execute_results):
         self.execute_results = execute_results
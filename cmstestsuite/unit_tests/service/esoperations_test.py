@@ -27,7 +27,8 @@ import unittest
 from cmstestsuite.unit_tests.databasemixin import DatabaseMixin
 
 from cms.io.priorityqueue import PriorityQueue
-from cms.service.esoperations import ESOperation, get_submissions_operations, \
+from cms.service.esoperations import ESOperation, \
+    get_relevant_operations_by_id, get_submissions_operations, \
     get_user_tests_operations
 
 
@@ -240,6 +241,28 @@ class TestESOperations(DatabaseMixin, unittest.TestCase):
             set(get_submissions_operations(self.session, self.contest.id)),
             expected_operations)
 
+    def test_get_submissions_operations_submission_ids(self):
+        """Test restricting the operations to some submissions."""
+        submission_a = self.add_submission(self.tasks[0], self.participation)
+        submission_b = self.add_submission(self.tasks[1], self.participation)
+        self.session.flush()
+
+        expected_operations = set(
+            self.submission_compilation_operation(submission_b, dataset)
+            for dataset in submission_b.task.datasets
+            if self.to_judge(dataset))
+
+        self.assertEqual(
+            set(get_submissions_operations(
+                self.session, self.contest.id,
+                submission_ids=[submission_b.id])),
+            expected_operations)
+        self.assertEqual(
+            len(get_submissions_operations(
+                self.session, submission_ids=[submission_a.id,
+                                              submission_b.id])),
+            2 * len(expected_operations))
+
     def submission_compilation_operation(
             self, submission, dataset, result=None):
         active_priority = PriorityQueue.PRIORITY_HIGH \
@@ -260,6 +283,35 @@ class TestESOperations(DatabaseMixin, unittest.TestCase):
                 else PriorityQueue.PRIORITY_EXTRA_LOW,
                 result.submission.timestamp)
 
+    # Testing ESOperation.
+
+    def test_dict_round_trip(self):
+        operation = ESOperation(ESOperation.EVALUATION, 1, 2, "003")
+        operation.trace["queue"] = [1.0, 2.5]
+        copy = ESOperation.from_dict(operation.to_dict())
+        self.assertEqual(copy, operation)
+        self.assertEqual(copy.trace, {"queue": [1.0, 2.5]})
+        # Traces don't affect the identity of the operations.
+        self.assertEqual(
+            ESOperation(ESOperation.EVALUATION, 1, 2, "003"), operation)
+
+    # Testing get_relevant_operations_by_id.
+
+    def test_get_relevant_operations_by_id(self):
+        codenames = {1: ["a", "b"], 2: []}
+        self.assertEqual(
+            get_relevant_operations_by_id(
+                "compilation", [(10, 1), (10, 2)], codenames),
+            [ESOperation(ESOperation.COMPILATION, 10, 1),
+             ESOperation(ESOperation.EVALUATION, 10, 1, "a"),
+             ESOperation(ESOperation.EVALUATION, 10, 1, "b"),
+             ESOperation(ESOperation.COMPILATION, 10, 2)])
+        self.assertEqual(
+            get_relevant_operations_by_id(
+                "evaluation", [(10, 1), (10, 2)], codenames),
+            [ESOperation(ESOperation.EVALUATION, 10, 1, "a"),
+             ESOperation(ESOperation.EVALUATION, 10, 1, "b")])
+
     # Testing get_user_tests_operations.
 
     def test_get_user_tests_operations_no_operations(self):
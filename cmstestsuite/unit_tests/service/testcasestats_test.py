@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Contest Management System - http://cms-dev.github.io/
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the testcase statistics of ES."""
+
+import unittest
+
+from cms.service.esoperations import ESOperation
+from cms.service.testcasestats import TestcaseStatistics
+
+
+class TestTestcaseStatistics(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.stats = TestcaseStatistics()
+
+    @staticmethod
+    def entries(codenames, dataset_id=1):
+        return [(ESOperation(ESOperation.EVALUATION, 1, dataset_id, codename),
+                 0, None)
+                for codename in codenames]
+
+    def sorted_codenames(self, codenames, dataset_id=1):
+        return [entry[0].testcase_codename for entry in self.stats.sort(
+            self.entries(codenames, dataset_id))]
+
+    def test_no_statistics(self):
+        self.assertEqual(self.sorted_codenames(["b", "a", "c"]),
+                         ["b", "a", "c"])
+
+    def test_failures_first(self):
+        self.stats.record(1, "c", "0.0", 0.1)
+        self.stats.record(1, "b", "1.0", 0.1)
+        self.stats.record(1, "a", "0.0", 0.1)
+        self.stats.record(1, "a", "0.0", 0.1)
+        self.stats.record(1, "c", "1.0", 0.1)
+        self.assertEqual(self.sorted_codenames(["a", "b", "c", "d"]),
+                         ["a", "c", "b", "d"])
+        # Statistics are per dataset.
+        self.assertEqual(self.sorted_codenames(["b", "c", "a"], 2),
+                         ["b", "c", "a"])
+
+    def test_slowest_first(self):
+        self.stats.record(1, "a", "1.0", 0.1)
+        self.stats.record(1, "b", "1.0", 2.0)
+        self.stats.record(1, "c", "1.0", None)
+        self.assertEqual(self.sorted_codenames(["a", "b", "c"]),
+                         ["b", "a", "c"])
+
+    def test_ignored(self):
+        self.stats.record(1, "b", None, 2.0)
+        self.assertEqual(self.sorted_codenames(["a", "b"]), ["a", "b"])
+
+        self.stats.record(1, "b", "0.0", 2.0)
+        compilation = (ESOperation(ESOperation.COMPILATION, 1, 1), 0, None)
+        entries = [compilation] + self.entries(["a", "b"])
+        self.assertEqual(self.stats.sort(entries)[0], entries[2])
+        self.assertEqual(self.stats.sort(entries)[1:],
+                         [compilation, entries[1]])
+
+    def test_moving_average(self):
+        self.stats.record(1, "a", "0.0", 0.0)
+        self.stats.record(1, "b", "0.0", 0.0)
+        # A testcase that stops failing moves back after a while.
+        for _ in range(10):
+            self.stats.record(1, "a", "1.0", 0.0)
+        self.assertEqual(self.sorted_codenames(["a", "b"]), ["b", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()